@@ -55,7 +55,6 @@ import threading
 import pox.core
 core = None
 
-import pox.openflow
 from pox.lib.util import str_to_bool
 
 # Function to run on main thread
@@ -66,6 +65,77 @@ try:
 except ImportError:
   __pypy__ = None
 
+
+class _ImportProfiler (object):
+  """
+  Times how long importing each module takes (for --startup-profile)
+
+  A module's time doesn't include the time spent importing the modules
+  it imports.
+  """
+  def __init__ (self):
+    self.times = {} # Module name -> seconds
+    self.started = None
+    self._stack = [] # Seconds spent in nested imports, for each level
+    self._known = set() # Modules which have been accounted for
+    self._import = None
+
+  def start (self):
+    import __builtin__
+    if self._import is not None: return
+    self.started = time.time()
+    self._known.update(sys.modules)
+    self._import = __builtin__.__import__
+    __builtin__.__import__ = self._timed_import
+
+  def stop (self):
+    import __builtin__
+    if self._import is None: return
+    if __builtin__.__import__ == self._timed_import:
+      __builtin__.__import__ = self._import
+    self._import = None
+
+  def _timed_import (self, name, *args, **kw):
+    modules = sys.modules
+    before = len(modules)
+    stack = self._stack
+    stack.append(0)
+    start = time.time()
+    try:
+      return self._import(name, *args, **kw)
+    finally:
+      elapsed = time.time() - start
+      nested = stack.pop()
+      if stack: stack[-1] += elapsed
+      if len(modules) != before:
+        # Something new got loaded.  Modules are put in sys.modules before
+        # they're run, so only take one with the name we were asked for
+        # (a module's own imports will see it there too).
+        known = self._known
+        new = [n for n in modules if n not in known and
+               (n == name or n.endswith("." + name)) and
+               modules[n] is not None]
+        if new:
+          module = max(new, key=len)
+          known.add(module)
+          self.times[module] = self.times.get(module, 0) + elapsed - nested
+
+  def report (self, count = 20):
+    """
+    Returns a summary of the slowest imports
+    """
+    total = sum(self.times.itervalues())
+    lines = ["Imports took %0.1f ms of %0.1f ms of startup (%s modules)"
+             % (total * 1000, (time.time() - self.started) * 1000,
+                len(self.times))]
+    slowest = sorted(self.times.items(), key=lambda x: -x[1])[:count]
+    for name,t in slowest:
+      lines.append("  %8.1f ms  %s" % (t * 1000, name))
+    return "\n".join(lines)
+
+_import_profiler = None
+
+
 def _do_import (name):
   """
   Try to import the named component.
@@ -180,7 +250,8 @@ def _do_launch (argv):
   else:
     core = pox.core.initialize(_options.threaded_selecthub,
                                _options.epoll_selecthub,
-                               _options.handle_signals)
+                               _options.handle_signals,
+                               _options.loop_selecthub)
 
   _pre_startup()
   modules = _do_imports(n.split(':')[0] for n in component_order)
@@ -359,6 +430,9 @@ Notable POX options include:
   --verbose       Print more debugging information (especially useful for
                   problems on startup)
   --no-openflow   Don't automatically load the OpenFlow module
+  --startup-profile[=N]
+                  Once started, log the N (default 20) modules which took
+                  longest to import
   --log-config=F  Load a Python log configuration file (if you include the
                   option without specifying F, it defaults to logging.cfg)
 
@@ -379,9 +453,16 @@ class POXOptions (Options):
     self.verbose = False
     self.enable_openflow = True
     self.log_config = None
-    self.threaded_selecthub = True
+    # The reactor (unthreaded SelectHub) avoids a thread handoff for every
+    # timer and Select; --threaded-sh goes back to running select() on its
+    # own thread.
+    self.threaded_selecthub = False
     self.epoll_selecthub = False
+    # --loop-sh runs tasks on a pox.lib.event_loop.EventLoop instead
+    self.loop_selecthub = False
     self.handle_signals = True
+    # --startup-profile[=N] reports the N slowest imports once up
+    self.startup_profile = 0
 
   def _set_h (self, given_name, name, value):
     self._set_help(given_name, name, value)
@@ -401,9 +482,22 @@ class POXOptions (Options):
   def _set_unthreaded_sh (self, given_name, name, value):
     self.threaded_selecthub = False
 
+  def _set_threaded_sh (self, given_name, name, value):
+    self.threaded_selecthub = str_to_bool(value)
+
   def _set_epoll_sh (self, given_name, name, value):
     self.epoll_selecthub = str_to_bool(value)
 
+  def _set_loop_sh (self, given_name, name, value):
+    self.loop_selecthub = str_to_bool(value)
+
+  def _set_startup_profile (self, given_name, name, value):
+    global _import_profiler
+    self.startup_profile = 20 if value is True else int(value)
+    if self.startup_profile and _import_profiler is None:
+      _import_profiler = _ImportProfiler()
+      _import_profiler.start()
+
   def _set_no_openflow (self, given_name, name, value):
     self.enable_openflow = not str_to_bool(value)
 
@@ -444,13 +538,14 @@ def _pre_startup ():
     logging.getLogger().setLevel(logging.DEBUG)
 
   if _options.enable_openflow:
+    import pox.openflow
     pox.openflow._launch() # Default OpenFlow launch
 
 
 def _post_startup ():
   if _options.enable_openflow:
     if core._openflow_wanted:
-      if not core.hasComponent("of_04") or not core.hasComponent("of_01"):
+      if not core.hasComponent("of_04"):
         # Launch a default of_04
         import pox.openflow.of_04
         pox.openflow.of_04.launch()
@@ -532,6 +627,10 @@ def boot (argv = None):
     if _do_launch(argv):
       _post_startup()
       core.goUp()
+      if _import_profiler is not None:
+        _import_profiler.stop()
+        logging.getLogger("boot").info(
+            _import_profiler.report(_options.startup_profile))
     else:
       #return
       quiet = True
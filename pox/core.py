@@ -190,8 +190,8 @@ class POXCore (EventMixin):
   version = (0,3,1)
   version_name = "dart-1.3"
 
-  def __init__ (self, threaded_selecthub=True, epoll_selecthub=False,
-                handle_signals=True):
+  def __init__ (self, threaded_selecthub=False, epoll_selecthub=False,
+                handle_signals=True, event_loop=False):
     self.debug = False
     self.running = True
     self.starting_up = True
@@ -207,7 +207,8 @@ class POXCore (EventMixin):
 
     self.scheduler = recoco.Scheduler(daemon=True,
                                       threaded_selecthub=threaded_selecthub,
-                                      use_epoll=epoll_selecthub)
+                                      use_epoll=epoll_selecthub,
+                                      event_loop=event_loop)
 
     self._waiters = [] # List of waiting components
 
@@ -223,11 +224,9 @@ class POXCore (EventMixin):
   def callDelayed (_self, _seconds, _func, *args, **kw):
     """
     Calls the function at a later time.
-    This is just a wrapper around a recoco timer.
+    Returns a recoco.DelayedCall, which has a cancel() method.
     """
-    t = recoco.Timer(_seconds, _func, args=args, kw=kw,
-                     scheduler = _self.scheduler)
-    return t
+    return _self.scheduler.callDelayed(_seconds, _func, *args, **kw)
 
   def callLater (_self, _func, *args, **kw):
     # first arg is `_self` rather than `self` in case the user wants
@@ -596,12 +595,13 @@ class POXCore (EventMixin):
 
 core = None
 
-def initialize (threaded_selecthub=True, epoll_selecthub=False,
-                handle_signals=True):
+def initialize (threaded_selecthub=False, epoll_selecthub=False,
+                handle_signals=True, event_loop=False):
   global core
   core = POXCore(threaded_selecthub=threaded_selecthub,
                  epoll_selecthub=epoll_selecthub,
-                 handle_signals=handle_signals)
+                 handle_signals=handle_signals,
+                 event_loop=event_loop)
   return core
 
 # The below is a big hack to make tests and doc tools work.
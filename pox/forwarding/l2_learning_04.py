@@ -18,12 +18,20 @@ An L2 learning switch.
 It is derived from one written live for an SDN crash course.
 It is somwhat similar to NOX's pyswitch in that it installs
 exact-match rules for each flow.
+
+With --proactive, it instead uses two OpenFlow 1.3 flow tables so that it
+installs a couple of entries per host rather than one per conversation.
+See TwoTableLearningSwitch.
 """
 
 from pox.core import core
 import pox.openflow.libopenflow_04 as of
 from pox.lib.util import dpid_to_str
 from pox.lib.util import str_to_bool
+from pox.lib.addresses import EthAddr
+import pox.lib.packet as pkt
+import pox.lib.metrics as metrics
+import struct
 import time
 
 import pickle
@@ -34,6 +42,24 @@ log = core.getLogger()
 # Can be overriden on commandline.
 _flood_delay = 0
 
+# How long a learned host may be silent before we forget it (proactive mode)
+_host_idle_timeout = 300
+
+# Tables used in proactive mode
+LEARN_TABLE = 0
+FORWARD_TABLE = 1
+
+# Cookie marking source-learning entries (the low 48 bits are the MAC)
+_LEARN_COOKIE = 0x4c32 << 48
+
+# Totals for all switches (including ones which have gone away), so the
+# effect of --proactive on the controller can be seen
+_packet_ins = metrics.counter("pox_l2_learning_packet_ins_total",
+                              "PacketIns handled by forwarding.l2_learning_04")
+_flow_mods = metrics.counter("pox_l2_learning_flow_mods_total",
+                             "flow_mods sent by forwarding.l2_learning_04")
+
+
 class LearningSwitch (object):
   """
   The learning switch "brain" associated with a single OpenFlow switch.
@@ -95,6 +121,7 @@ class LearningSwitch (object):
 
   # Handle packet in messages from the switch to implement above algorithm.
   def _handle_PacketIn (self, event):
+    _packet_ins.value += 1
 
     packet = event.parsed
 
@@ -241,25 +268,213 @@ class LearningSwitch (object):
             data = event.ofp 
             )
 
+        _flow_mods.value += 1
         self.connection.send(msg)
 
 
+class TwoTableLearningSwitch (object):
+  """
+  A learning switch which does most of its work in the switch itself
+
+  The reactive LearningSwitch installs an exact L2-L4 match for every new
+  conversation, so the number of PacketIns and flow entries grows with the
+  number of conversations.  This instead uses two tables:
+
+  Table 0 (LEARN_TABLE) has an entry for each known (in_port, eth_src)
+  which just continues to table 1.  Packets from unknown sources (or known
+  sources on a new port) miss, and come to the controller via the
+  table-miss entry of_04 installs when the switch connects.
+
+  Table 1 (FORWARD_TABLE) has an entry for each known eth_dst which
+  outputs to that host's port.  Its table-miss entry floods.
+
+  So the controller only hears about each host once (and again if it
+  moves), and the tables hold O(hosts) entries.  When a host moves, its
+  forwarding entry is updated in place with OFPFC_MODIFY_STRICT.  When a
+  host's learning entry idles out, we remove its forwarding entry too.
+  """
+  def __init__ (self, connection, transparent):
+    self.connection = connection
+    self.transparent = transparent
+
+    self.macToPort = {}
+
+    connection.addListeners(self)
+
+    self._install_static_entries()
+    if _flood_delay:
+      core.callDelayed(_flood_delay, self._install_flood_entry)
+    else:
+      self._install_flood_entry()
+
+  def _send_flow_mod (self, **kw):
+    _flow_mods.value += 1
+    self.connection.send(of.ofp_flow_mod(**kw))
+
+  def _install_static_entries (self):
+    # Clean out any previous forwarding state
+    self._send_flow_mod(table_id = FORWARD_TABLE, command = of.OFPFC_DELETE,
+                        out_port = of.OFPP_ANY, match = of.ofp_match(oxm_fields_pkt = []))
+    self._send_flow_mod(table_id = LEARN_TABLE, command = of.OFPFC_DELETE,
+                        cookie = _LEARN_COOKIE, cookie_mask = 0xffff << 48,
+                        out_port = of.OFPP_ANY, match = of.ofp_match(oxm_fields_pkt = []))
+
+    if not self.transparent:
+      # Keep link-local traffic coming to the controller so that it isn't
+      # forwarded once its source has been learned.
+      to_controller = of.ofp_action_output(port = of.OFPP_CONTROLLER,
+                                           max_len = of.OFPCML_NO_BUFFER)
+      self._send_flow_mod(table_id = LEARN_TABLE, priority = 0xffff - 1,
+          match = of.ofp_match(oxm_fields_pkt = [
+              of.oxm_match_field.from_name('OFPXMT_OFB_ETH_TYPE',
+                  struct.pack("!H", pkt.ethernet.LLDP_TYPE),
+                  pkt.ethernet.LLDP_TYPE)]),
+          actions = [to_controller])
+      self._send_flow_mod(table_id = LEARN_TABLE, priority = 0xffff - 1,
+          match = of.ofp_match(oxm_fields_pkt = [
+              of.oxm_match_field.from_name('OFPXMT_OFB_ETH_DST',
+                  b'\x01\x80\xc2\x00\x00\x00', "01:80:c2:00:00:00/44",
+                  mask = b'\xff\xff\xff\xff\xff\xf0')]),
+          actions = [to_controller])
+
+  def _install_flood_entry (self):
+    if not self.connection.connect_time: return # Went away
+    log.info("%s: Flood hold-down expired -- flooding",
+             dpid_to_str(self.connection.dpid))
+    self._send_flow_mod(table_id = FORWARD_TABLE, priority = 0,
+        match = of.ofp_match(oxm_fields_pkt = []),
+        actions = [of.ofp_action_output(port = of.OFPP_FLOOD)])
+
+  def _learn (self, mac, port):
+    """
+    Installs/updates entries for a host seen on a port
+    """
+    old_port = self.macToPort.get(mac)
+    self.macToPort[mac] = port
+    oxm = of.oxm_match_field.from_name
+    src_match = lambda p: of.ofp_match(oxm_fields_pkt = [
+        oxm('OFPXMT_OFB_IN_PORT', struct.pack("!L", p), p),
+        oxm('OFPXMT_OFB_ETH_SRC', mac.toRaw(), mac)])
+    dst_match = of.ofp_match(oxm_fields_pkt = [
+        oxm('OFPXMT_OFB_ETH_DST', mac.toRaw(), mac)])
+    cookie = _LEARN_COOKIE | int(mac.toRaw().encode('hex'), 16)
+
+    if old_port is not None and old_port != port:
+      log.debug("%s moved from %s to %s", mac, old_port, port)
+      self._send_flow_mod(table_id = LEARN_TABLE,
+                          command = of.OFPFC_DELETE_STRICT,
+                          out_port = of.OFPP_ANY,
+                          match = src_match(old_port))
+
+    self._send_flow_mod(table_id = LEARN_TABLE, cookie = cookie,
+        idle_timeout = _host_idle_timeout,
+        flags = of.OFPFF_SEND_FLOW_REM,
+        match = src_match(port),
+        instructions = [of.ofp_instruction_goto_table(
+                        table_id = FORWARD_TABLE)])
+
+    self._send_flow_mod(table_id = FORWARD_TABLE,
+        command = of.OFPFC_ADD if old_port is None
+                  else of.OFPFC_MODIFY_STRICT,
+        match = dst_match,
+        actions = [of.ofp_action_output(port = port)])
+
+  def _handle_FlowRemoved (self, event):
+    ofp = event.ofp
+    if ofp.table_id != LEARN_TABLE: return
+    if ofp.cookie & (0xffff << 48) != _LEARN_COOKIE: return
+    if ofp.reason == of.OFPRR_DELETE: return # We did it (e.g., a move)
+    mac = EthAddr(("%012x" % (ofp.cookie & 0xffffffffffff)).decode('hex'))
+    if self.macToPort.pop(mac, None) is None: return
+    log.debug("Forgetting %s", mac)
+    self._send_flow_mod(table_id = FORWARD_TABLE,
+                        command = of.OFPFC_DELETE_STRICT,
+                        out_port = of.OFPP_ANY,
+                        match = of.ofp_match(oxm_fields_pkt = [
+                            of.oxm_match_field.from_name('OFPXMT_OFB_ETH_DST',
+                                mac.toRaw(), mac)]))
+
+  def _handle_PacketIn (self, event):
+    _packet_ins.value += 1
+    packet = event.parsed
+
+    if not self.transparent:
+      if packet.type == packet.LLDP_TYPE or packet.dst.isBridgeFiltered():
+        if event.ofp.buffer_id is not None:
+          msg = of.ofp_packet_out(buffer_id = event.ofp.buffer_id,
+                                  in_port = event.port)
+          self.connection.send(msg)
+        return
+
+    if packet.src.is_multicast:
+      return # Not a real host
+
+    if self.macToPort.get(packet.src) != event.port:
+      self._learn(packet.src, event.port)
+
+    # Send this packet on its way (later ones won't come here)
+    msg = of.ofp_packet_out(data = event.ofp, in_port = event.port)
+    port = None if packet.dst.is_multicast else self.macToPort.get(packet.dst)
+    if port is None:
+      if time.time() - self.connection.connect_time < _flood_delay:
+        return # Holding down
+      port = of.OFPP_FLOOD
+    elif port == event.port:
+      return # Drop
+    msg.actions.append(of.ofp_action_output(port = port))
+    self.connection.send(msg)
+
+
 class l2_learning (object):
   """
   Waits for OpenFlow switches to connect and makes them learning switches.
   """
-  def __init__ (self, transparent):
+  def __init__ (self, transparent, proactive = False, stats_interval = 0):
     core.openflow.addListeners(self)
     self.transparent = transparent
+    self.proactive = proactive
+    self.switches = {} # dpid -> learning switch
+    self._last_stats = (time.time(), _packet_ins.value, _flow_mods.value)
+    if stats_interval:
+      core.callDelayed(stats_interval, self._log_stats, stats_interval)
 
   def _handle_ConnectionUp (self, event):
     log.debug("Connection %s" % (event.connection,))
-    LearningSwitch(event.connection, self.transparent)
+    if self.proactive:
+      sw = TwoTableLearningSwitch(event.connection, self.transparent)
+    else:
+      sw = LearningSwitch(event.connection, self.transparent)
+    self.switches[event.dpid] = sw
 
+  def _handle_ConnectionDown (self, event):
+    self.switches.pop(event.dpid, None)
 
-def launch (transparent=False, hold_down=_flood_delay):
+  def _log_stats (self, interval):
+    """
+    Logs PacketIn and flow_mod rates (so modes can be compared)
+    """
+    now = time.time()
+    pis = _packet_ins.value
+    fms = _flow_mods.value
+    then,last_pis,last_fms = self._last_stats
+    elapsed = max(now - then, 0.001)
+    log.info("%i switches: %.1f PacketIns/sec, %.1f flow_mods/sec, "
+             "%i hosts", len(self.switches), (pis - last_pis) / elapsed,
+             (fms - last_fms) / elapsed,
+             sum(len(sw.macToPort) for sw in self.switches.values()))
+    self._last_stats = (now, pis, fms)
+    core.callDelayed(interval, self._log_stats, interval)
+
+
+def launch (transparent=False, hold_down=_flood_delay, proactive=False,
+            idle_timeout=_host_idle_timeout, stats_interval=0):
   """
   Starts an L2 learning switch.
+
+  --proactive uses the two-table OpenFlow 1.3 mode (one learning entry
+    and one forwarding entry per host instead of one entry per flow)
+  --idle_timeout is how long a quiet host is remembered in proactive mode
+  --stats_interval=<secs> periodically logs PacketIn/flow_mod rates
   """
   try:
     global _flood_delay
@@ -268,4 +483,9 @@ def launch (transparent=False, hold_down=_flood_delay):
   except:
     raise RuntimeError("Expected hold-down to be a number")
 
-  core.registerNew(l2_learning, str_to_bool(transparent))
+  global _host_idle_timeout
+  _host_idle_timeout = int(idle_timeout)
+
+  core.registerNew(l2_learning, str_to_bool(transparent),
+                   proactive = str_to_bool(proactive),
+                   stats_interval = float(stats_interval))
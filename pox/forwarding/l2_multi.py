@@ -437,10 +437,13 @@ class l2_multi (EventMixin):
     # For link removals, this makes sure that we don't use a
     # path that may have been broken.
     #NOTE: This could be radically improved! (e.g., not *ALL* paths break)
-    clear = of.ofp_flow_mod(command=of.OFPFC_DELETE)
-    for sw in switches.itervalues():
-      if sw.connection is None: continue
-      sw.connection.send(clear)
+    # If more link changes are coming as part of the same batch, we only
+    # do this once, for the last of them.
+    if not event.more_pending:
+      clear = of.ofp_flow_mod(command=of.OFPFC_DELETE)
+      for sw in switches.itervalues():
+        if sw.connection is None: continue
+        sw.connection.send(clear)
     path_map.clear()
 
     if event.removed:
@@ -17,12 +17,20 @@ A stupid L3 switch
 
 For each switch:
 1) Keep a table that maps IP addresses to MAC addresses and switch ports.
-   Stock this table using information from ARP and IP packets.
+   Stock this table using information from ARP and IP packets.  (This table
+   is actually kept by the shared ARP cache in proto.arp_cache.)
 2) When you see an ARP query, try to answer it using information in the table
    from step 1.  If the info in the table is old, just flood the query.
 3) Flood all other ARPs.
 4) When you see an IP packet, if you know the destination port (because it's
    in the table from step 1), install a flow for it.
+5) If the destination isn't a known host but falls within one of the
+   configured routes, forward it to that route's gateway (once we know
+   where the gateway is).  This installs one flow for the whole prefix
+   rather than one per destination host.
+
+Routes are given as prefix=gateway pairs, e.g.:
+  --routes=10.2.0.0/16=10.0.0.254,10.3.0.0/16=10.0.0.253
 """
 
 from pox.core import core
@@ -32,9 +40,11 @@ log = core.getLogger()
 from pox.lib.packet.ethernet import ethernet, ETHER_BROADCAST
 from pox.lib.packet.ipv4 import ipv4
 from pox.lib.packet.arp import arp
-from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.addresses import IPAddr, EthAddr, PrefixTable
 from pox.lib.util import str_to_bool, dpid_to_str
-from pox.lib.recoco import Timer
+from pox.lib.timing_wheel import TimingWheel
+from pox.proto.arp_cache import encode_arp_reply
+import pox.proto.arp_cache as arp_cache
 
 import pox.openflow.libopenflow_01 as of
 
@@ -48,37 +58,8 @@ FLOW_IDLE_TIMEOUT = 10
 # Timeout for ARP entries
 ARP_TIMEOUT = 60 * 2
 
-# Maximum number of packet to buffer on a switch for an unknown IP
-MAX_BUFFERED_PER_IP = 5
-
-# Maximum time to hang on to a buffer for an unknown IP in seconds
-MAX_BUFFER_TIME = 5
-
-
-class Entry (object):
-  """
-  Not strictly an ARP entry.
-  We use the port to determine which port to forward traffic out of.
-  We use the MAC to answer ARP replies.
-  We use the timeout so that if an entry is older than ARP_TIMEOUT, we
-   flood the ARP request rather than try to answer it ourselves.
-  """
-  def __init__ (self, port, mac):
-    self.timeout = time.time() + ARP_TIMEOUT
-    self.port = port
-    self.mac = mac
-
-  def __eq__ (self, other):
-    if type(other) == tuple:
-      return (self.port,self.mac)==other
-    else:
-      return (self.port,self.mac)==(other.port,other.mac)
-  def __ne__ (self, other):
-    return not self.__eq__(other)
-
-  def isExpired (self):
-    if self.port == of.OFPP_NONE: return False
-    return time.time() > self.timeout
+# How long to wait for an answer before ARPing for the same IP again
+ARP_RETRY_TIME = 4
 
 
 def dpid_to_mac (dpid):
@@ -86,7 +67,7 @@ def dpid_to_mac (dpid):
 
 
 class l3_switch (EventMixin):
-  def __init__ (self, fakeways = [], arp_for_unknowns = False):
+  def __init__ (self, fakeways = [], arp_for_unknowns = False, routes = ()):
     # These are "fake gateways" -- we'll answer ARPs for them with MAC
     # of the switch they're connected to.
     self.fakeways = set(fakeways)
@@ -95,54 +76,40 @@ class l3_switch (EventMixin):
     # host, we'll ARP for it.
     self.arp_for_unknowns = arp_for_unknowns
 
-    # (dpid,IP) -> expire_time
+    # Of (dpid,IP)
     # We use this to keep from spamming ARPs
-    self.outstanding_arps = {}
-
-    # (dpid,IP) -> [(expire_time,buffer_id,in_port), ...]
-    # These are buffers we've gotten at this datapath for this IP which
-    # we can't deliver because we don't know where they go.
-    self.lost_buffers = {}
+    self.outstanding_arps = TimingWheel()
 
-    # For each switch, we map IP addresses to Entries
-    self.arpTable = {}
-
-    # This timer handles expiring stuff
-    self._expire_timer = Timer(5, self._handle_expiration, recurring=True)
+    # Network -> gateway IP, for destinations that aren't known hosts
+    self.routes = PrefixTable(routes)
 
+    # Buffers we've gotten for IPs we don't know the location of yet are
+    # held by the ARP cache, as is the table of IP locations.
     core.listen_to_dependencies(self)
 
-  def _handle_expiration (self):
-    # Called by a timer so that we can remove old items.
-    empty = []
-    for k,v in self.lost_buffers.iteritems():
-      dpid,ip = k
-
-      for item in list(v):
-        expires_at,buffer_id,in_port = item
-        if expires_at < time.time():
-          # This packet is old.  Tell this switch to drop it.
-          v.remove(item)
-          po = of.ofp_packet_out(buffer_id = buffer_id, in_port = in_port)
-          core.openflow.sendToDPID(dpid, po)
-      if len(v) == 0: empty.append(k)
-
-    # Remove empty buffer bins
-    for k in empty:
-      del self.lost_buffers[k]
+  def _lookup (self, dpid, ip):
+    """
+    Returns (port,MAC) for ip on switch dpid, or None
+    """
+    if ip in self.fakeways:
+      return (of.OFPP_NONE, dpid_to_mac(dpid))
+    return core.ARPCache.get_location(dpid, ip)
+
+  def _handle_ARPCache_NeighborUpdate (self, event):
+    if event.dpid is None: return
+    self._send_lost_buffers(event.dpid, event.ip, event.mac, event.port)
 
   def _send_lost_buffers (self, dpid, ipaddr, macaddr, port):
     """
     We may have "lost" buffers -- packets we got but didn't know
     where to send at the time.  We may know now.  Try and see.
     """
-    if (dpid,ipaddr) in self.lost_buffers:
+    bucket = core.ARPCache.pop_buffers(dpid, ipaddr)
+    if bucket:
       # Yup!
-      bucket = self.lost_buffers[(dpid,ipaddr)]
-      del self.lost_buffers[(dpid,ipaddr)]
       log.debug("Sending %i buffered packets to %s from %s"
                 % (len(bucket),ipaddr,dpid_to_str(dpid)))
-      for _,buffer_id,in_port in bucket:
+      for buffer_id,in_port in bucket:
         po = of.ofp_packet_out(buffer_id=buffer_id,in_port=in_port)
         po.actions.append(of.ofp_action_dl_addr.set_dst(macaddr))
         po.actions.append(of.ofp_action_output(port = port))
@@ -156,13 +123,6 @@ class l3_switch (EventMixin):
       log.warning("%i %i ignoring unparsed packet", dpid, inport)
       return
 
-    if dpid not in self.arpTable:
-      # New switch -- create an empty table
-      self.arpTable[dpid] = {}
-      for fake in self.fakeways:
-        self.arpTable[dpid][IPAddr(fake)] = Entry(of.OFPP_NONE,
-         dpid_to_mac(dpid))
-
     if packet.type == ethernet.LLDP_TYPE:
       # Ignore LLDP packets
       return
@@ -171,25 +131,28 @@ class l3_switch (EventMixin):
       log.debug("%i %i IP %s => %s", dpid,inport,
                 packet.next.srcip,packet.next.dstip)
 
-      # Send any waiting packets...
-      self._send_lost_buffers(dpid, packet.next.srcip, packet.src, inport)
-
-      # Learn or update port/MAC info
-      if packet.next.srcip in self.arpTable[dpid]:
-        if self.arpTable[dpid][packet.next.srcip] != (inport, packet.src):
-          log.info("%i %i RE-learned %s", dpid,inport,packet.next.srcip)
-      else:
-        log.debug("%i %i learned %s", dpid,inport,str(packet.next.srcip))
-      self.arpTable[dpid][packet.next.srcip] = Entry(inport, packet.src)
+      # (The ARP cache has already learned the source and sent any
+      # packets which were waiting for it.)
 
       # Try to forward
       dstaddr = packet.next.dstip
-      if dstaddr in self.arpTable[dpid]:
+      prefix = None
+      dst = self._lookup(dpid, dstaddr)
+      if dst is None:
+        # Not a host we know -- maybe it's somewhere we have a route to
+        route = self.routes.match(dstaddr)
+        if route is not None:
+          prefix,dstaddr = route
+          dst = self._lookup(dpid, dstaddr)
+
+      if dst is not None:
         # We have info about what port to send it out on...
 
-        prt = self.arpTable[dpid][dstaddr].port
-        mac = self.arpTable[dpid][dstaddr].mac
-        if prt == inport:
+        prt,mac = dst
+        if prefix is not None and prt == of.OFPP_NONE:
+          log.warning("%i %i gateway %s for %s is one of our fakeways",
+                      dpid, inport, dstaddr, prefix)
+        elif prt == inport:
           log.warning("%i %i not sending packet for %s back out of the " +
                       "input port" % (dpid, inport, str(dstaddr)))
         else:
@@ -199,16 +162,23 @@ class l3_switch (EventMixin):
           actions = []
           actions.append(of.ofp_action_dl_addr.set_dst(mac))
           actions.append(of.ofp_action_output(port = prt))
-          match = of.ofp_match.from_packet(packet, inport)
-          match.dl_src = None # Wildcard source MAC
+          priority = of.OFP_DEFAULT_PRIORITY
+          if prefix is None:
+            match = of.ofp_match.from_packet(packet, inport)
+          else:
+            # One flow for the whole prefix.  More specific prefixes need
+            # to win, so they get higher priority.
+            match = of.ofp_match(dl_type = ethernet.IP_TYPE,
+                                 nw_dst = (prefix.network, prefix.bits))
+            priority += prefix.bits
 
           msg = of.ofp_flow_mod(command=of.OFPFC_ADD,
                                 idle_timeout=FLOW_IDLE_TIMEOUT,
                                 hard_timeout=of.OFP_FLOW_PERMANENT,
                                 buffer_id=event.ofp.buffer_id,
+                                priority=priority,
                                 actions=actions,
-                                match=of.ofp_match.from_packet(packet,
-                                                               inport))
+                                match=match)
           event.connection.send(msg.pack())
       elif self.arp_for_unknowns:
         # We don't know this destination.
@@ -218,16 +188,11 @@ class l3_switch (EventMixin):
         # where it is
 
         # Add to tracked buffers
-        if (dpid,dstaddr) not in self.lost_buffers:
-          self.lost_buffers[(dpid,dstaddr)] = []
-        bucket = self.lost_buffers[(dpid,dstaddr)]
-        entry = (time.time() + MAX_BUFFER_TIME,event.ofp.buffer_id,inport)
-        bucket.append(entry)
-        while len(bucket) > MAX_BUFFERED_PER_IP: del bucket[0]
+        core.ARPCache.queue_buffer(dpid, dstaddr, event.ofp.buffer_id,
+                                   inport)
 
         # Expire things from our outstanding ARP list...
-        self.outstanding_arps = {k:v for k,v in
-         self.outstanding_arps.iteritems() if v > time.time()}
+        self.outstanding_arps.expire()
 
         # Check if we've already ARPed recently
         if (dpid,dstaddr) in self.outstanding_arps:
@@ -235,7 +200,8 @@ class l3_switch (EventMixin):
           return
 
         # And ARP...
-        self.outstanding_arps[(dpid,dstaddr)] = time.time() + 4
+        self.outstanding_arps.set((dpid,dstaddr),
+                                  time.time() + ARP_RETRY_TIME)
 
         r = arp()
         r.hwtype = r.HW_TYPE_ETHERNET
@@ -268,48 +234,28 @@ class l3_switch (EventMixin):
         if a.hwtype == arp.HW_TYPE_ETHERNET:
           if a.protosrc != 0:
 
-            # Learn or update port/MAC info
-            if a.protosrc in self.arpTable[dpid]:
-              if self.arpTable[dpid][a.protosrc] != (inport, packet.src):
-                log.info("%i %i RE-learned %s", dpid,inport,str(a.protosrc))
-            else:
-              log.debug("%i %i learned %s", dpid,inport,str(a.protosrc))
-            self.arpTable[dpid][a.protosrc] = Entry(inport, packet.src)
-
-            # Send any waiting packets...
-            self._send_lost_buffers(dpid, a.protosrc, packet.src, inport)
+            # (The ARP cache has already learned the source and sent any
+            # packets which were waiting for it.)
 
             if a.opcode == arp.REQUEST:
               # Maybe we can answer
 
-              if a.protodst in self.arpTable[dpid]:
-                # We have an answer...
-
-                if not self.arpTable[dpid][a.protodst].isExpired():
-                  # .. and it's relatively current, so we'll reply ourselves
-
-                  r = arp()
-                  r.hwtype = a.hwtype
-                  r.prototype = a.prototype
-                  r.hwlen = a.hwlen
-                  r.protolen = a.protolen
-                  r.opcode = arp.REPLY
-                  r.hwdst = a.hwsrc
-                  r.protodst = a.protosrc
-                  r.protosrc = a.protodst
-                  r.hwsrc = self.arpTable[dpid][a.protodst].mac
-                  e = ethernet(type=packet.type, src=dpid_to_mac(dpid),
-                               dst=a.hwsrc)
-                  e.set_payload(r)
-                  log.debug("%i %i answering ARP for %s" % (dpid, inport,
-                   str(r.protosrc)))
-                  msg = of.ofp_packet_out()
-                  msg.data = e.pack()
-                  msg.actions.append(of.ofp_action_output(port =
-                                                          of.OFPP_IN_PORT))
-                  msg.in_port = inport
-                  event.connection.send(msg)
-                  return
+              dst = self._lookup(dpid, a.protodst)
+              if dst is not None:
+                # We have an answer, and since the cache expires old
+                # entries, it's relatively current.  Reply ourselves.
+
+                log.debug("%i %i answering ARP for %s" % (dpid, inport,
+                 str(a.protodst)))
+                msg = of.ofp_packet_out()
+                msg.data = encode_arp_reply(dpid_to_mac(dpid), a.hwsrc,
+                                            dst[1], a.protodst,
+                                            a.hwsrc, a.protosrc)
+                msg.actions.append(of.ofp_action_output(port =
+                                                        of.OFPP_IN_PORT))
+                msg.in_port = inport
+                event.connection.send(msg)
+                return
 
       # Didn't know how to answer or otherwise handle this ARP, so just flood it
       log.debug("%i %i flooding ARP %s %s => %s" % (dpid, inport,
@@ -321,12 +267,16 @@ class l3_switch (EventMixin):
       event.connection.send(msg)
 
 
-def launch (fakeways="", arp_for_unknowns=None):
+def launch (fakeways="", arp_for_unknowns=None, routes=""):
   fakeways = fakeways.replace(","," ").split()
   fakeways = [IPAddr(x) for x in fakeways]
+  routes = routes.replace(","," ").split()
+  routes = [r.split("=",1) for r in routes]
+  routes = [(n,IPAddr(gw)) for n,gw in routes]
   if arp_for_unknowns is None:
-    arp_for_unknowns = len(fakeways) > 0
+    arp_for_unknowns = len(fakeways) > 0 or len(routes) > 0
   else:
     arp_for_unknowns = str_to_bool(arp_for_unknowns)
-  core.registerNew(l3_switch, fakeways, arp_for_unknowns)
+  arp_cache.launch(timeout = ARP_TIMEOUT, learn_from_ip = True)
+  core.registerNew(l3_switch, fakeways, arp_for_unknowns, routes)
 
@@ -35,7 +35,9 @@ from pox.lib.addresses import IPAddr,EthAddr,parse_cidr
 from pox.lib.addresses import IP_BROADCAST, IP_ANY
 from pox.lib.revent import *
 from pox.lib.util import dpid_to_str
-from pox.proto.dhcpd import DHCPLease, DHCPD
+from pox.proto.dhcpd import DHCPLease, DHCPD, SimpleAddressPool
+from pox.proto.dhcpd import LEASE_CHECK_INTERVAL, OFFER_TIME
+from pox.lib.recoco import Timer
 from collections import defaultdict
 from pox.openflow.discovery import Discovery
 import time
@@ -172,6 +174,13 @@ class TopoSwitch (DHCPD):
 
     self.ip_to_mac = {}
 
+    self.lease_time = 60 * 60 # An hour
+    self.offer_time = OFFER_TIME
+    self.lease_file = None
+    self._reset_leases()
+    self._lease_timer = Timer(LEASE_CHECK_INTERVAL, self._check_leases,
+                              recurring = True)
+
     # Listen to our own event... :)
     self.addListenerByName("DHCPLease", self._on_lease)
 
@@ -343,14 +352,10 @@ class TopoSwitch (DHCPD):
     self.pools = {}
     for p in connection.ports:
       if p < 0 or p >= of.OFPP_MAX: continue
-      self.pools[p] = [IPAddr("10.%s.%s.%s" % (self._id,p,n))
-                       for n in range(1,255)]
-
-    self.lease_time = 60 * 60 # An hour
-    #TODO: Actually make them expire :)
+      self.pools[p] = SimpleAddressPool("10.%s.%s.0/24" % (self._id,p),
+                                        first = 1, last = 254)
 
-    self.offers = {} # Eth -> IP we offered
-    self.leases = {} # Eth -> IP we leased
+    self._reset_leases()
 
 
   def _get_pool (self, event):
@@ -422,10 +427,13 @@ class topo_addressing (object):
     # For link removals, this makes sure that we don't use a
     # path that may have been broken.
     #NOTE: This could be radically improved! (e.g., not *ALL* paths break)
-    clear = of.ofp_flow_mod(command=of.OFPFC_DELETE)
-    for sw in switches_by_dpid.itervalues():
-      if sw.connection is None: continue
-      sw.connection.send(clear)
+    # If more link changes are coming as part of the same batch, we only
+    # do this once, for the last of them.
+    if not event.more_pending:
+      clear = of.ofp_flow_mod(command=of.OFPFC_DELETE)
+      for sw in switches_by_dpid.itervalues():
+        if sw.connection is None: continue
+        sw.connection.send(clear)
     path_map.clear()
 
     if event.removed:
@@ -454,6 +462,8 @@ class topo_addressing (object):
           adjacency[sw1][sw2] = l.port1
           adjacency[sw2][sw1] = l.port2
 
+    if event.more_pending: return
+
     for sw in switches_by_dpid.itervalues():
       sw.send_table()
 
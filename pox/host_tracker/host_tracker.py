@@ -38,6 +38,11 @@ Good values for testing:
 
 You can also specify how many ARP pings we try before deciding it failed:
   --pingLim=2
+
+ARP pings are queued per switch and sent at a limited rate so that lots of
+entries expiring together don't turn into a burst of packet_outs.  The
+rate (pings per second per switch) can be set with:
+  --pingRate=20
 """
 
 from pox.core import core
@@ -49,6 +54,8 @@ from pox.lib.packet.arp import arp
 
 from pox.lib.recoco import Timer
 from pox.lib.revent import Event, EventHalt
+from pox.lib.timing_wheel import TimingWheel
+from pox.lib.util import TokenBucket
 
 import pox.openflow.libopenflow_01 as of
 
@@ -57,6 +64,7 @@ import pox.openflow.discovery as discovery
 from pox.lib.revent.revent import *
 
 import time
+from collections import deque
 
 import pox
 log = core.getLogger()
@@ -120,6 +128,10 @@ class Alive (object):
     self.lastTimeSeen = time.time()
     self.interval=livelinessInterval
 
+  @property
+  def expiration (self):
+    return self.lastTimeSeen + self.interval
+
   def expired (self):
     return time.time() > self.lastTimeSeen + self.interval
 
@@ -134,9 +146,13 @@ class PingCtrl (Alive):
   # Number of ARP ping attemps before deciding it failed
   pingLim=3
 
+  # Maximum ARP pings per second to send to each switch
+  pingRate=20
+
   def __init__ (self):
     super(PingCtrl,self).__init__(timeoutSec['arpReply'])
     self.pending = 0
+    self.queued = False # Waiting to be sent
 
   def sent (self):
     self.refresh()
@@ -222,6 +238,18 @@ class host_tracker (EventMixin):
 
     # The following tables should go to Topology later
     self.entryByMAC = {}
+    self.entryByIP = {} # IP -> {MAC:MacEntry} for entries with that IP
+
+    # MAC entries (keyed by MAC) and IP entries (keyed by (MAC,IP)) filed
+    # by when they need checking, so we only look at ones which are due.
+    self._expiry = TimingWheel()
+
+    # Pending ARP pings for each DPID, and the rate limiter for each
+    self._ping_queues = {} # dpid -> deque of (MAC,IP)
+    self._ping_buckets = {} # dpid -> TokenBucket
+    self._ping_timer = None
+    self._ping_tick = 0.2 # How often we send queued pings
+
     self._t = Timer(timeoutSec['timerInterval'],
                     self._check_timeouts, recurring=True)
 
@@ -242,6 +270,27 @@ class host_tracker (EventMixin):
       result = None
     return result
 
+  def getMacEntryByIP (self, ipaddr):
+    """
+    Returns the MacEntry for the given IP address (or None)
+
+    If more than one host has the address, the most recently seen one
+    is returned.
+    """
+    entries = self.entryByIP.get(ipaddr)
+    if not entries: return None
+    if len(entries) == 1:
+      for e in entries.itervalues(): return e
+    return max(entries.itervalues(), key = lambda e: e.lastTimeSeen)
+
+  def _remove_ip (self, macEntry, ipAddr):
+    del macEntry.ipAddrs[ipAddr]
+    self._expiry.remove((macEntry.macaddr, ipAddr))
+    entries = self.entryByIP.get(ipAddr)
+    if entries is not None:
+      entries.pop(macEntry.macaddr, None)
+      if not entries: del self.entryByIP[ipAddr]
+
   def sendPing (self, macEntry, ipAddr):
     """
     Builds an ETH/IP any-to-any ARP packet (an "ARP ping")
@@ -261,11 +310,12 @@ class host_tracker (EventMixin):
     if core.openflow.sendToDPID(macEntry.dpid, msg.pack()):
       ipEntry = macEntry.ipAddrs[ipAddr]
       ipEntry.pings.sent()
+      self._expiry.set((macEntry.macaddr, ipAddr), ipEntry.pings.expiration)
     else:
       # macEntry is stale, remove it.
       log.debug("%i %i ERROR sending ARP REQ to %s %s",
                 macEntry.dpid, macEntry.port, str(r.hwdst), str(r.protodst))
-      del macEntry.ipAddrs[ipAddr]
+      self._remove_ip(macEntry, ipAddr)
     return
 
   def getSrcIPandARP (self, packet):
@@ -309,8 +359,13 @@ class host_tracker (EventMixin):
       ipEntry = IpEntry(hasARP)
       macEntry.ipAddrs[pckt_srcip] = ipEntry
       log.info("Learned %s got IP %s", str(macEntry), str(pckt_srcip) )
+    entries = self.entryByIP.get(pckt_srcip)
+    if entries is None:
+      entries = self.entryByIP[pckt_srcip] = {}
+    entries[macEntry.macaddr] = macEntry
     if hasARP:
       ipEntry.pings.received()
+    self._expiry.set((macEntry.macaddr, pckt_srcip), ipEntry.expiration)
 
   def _handle_openflow_ConnectionUp (self, event):
     if not self.install_flow: return
@@ -380,6 +435,7 @@ class host_tracker (EventMixin):
       macEntry.inport = e._new_port
 
     macEntry.refresh()
+    self._expiry.set(macEntry.macaddr, macEntry.expiration)
 
     (pckt_srcip, hasARP) = self.getSrcIPandARP(packet.next)
     if pckt_srcip is not None:
@@ -391,26 +447,94 @@ class host_tracker (EventMixin):
   def _check_timeouts (self):
     """
     Checks for timed out entries
+
+    Only entries which are due are looked at.  IP entries which have gone
+    quiet are queued for ARP pinging (see _send_pings()).
     """
-    for macEntry in self.entryByMAC.values():
-      entryPinged = False
-      for ip_addr, ipEntry in macEntry.ipAddrs.items():
-        if ipEntry.expired():
-          if ipEntry.pings.failed():
-            del macEntry.ipAddrs[ip_addr]
-            log.info("Entry %s: IP address %s expired",
-                     str(macEntry), str(ip_addr) )
-          else:
-            self.sendPing(macEntry,ip_addr)
-            ipEntry.pings.sent()
-            entryPinged = True
-      if macEntry.expired() and not entryPinged:
+    now = time.time()
+    expired = self._expiry.expire(now)
+    # Do IP entries before MAC entries so the MAC entries can see whether
+    # their IPs are being pinged.
+    expired.sort(key = lambda k: not isinstance(k, tuple))
+    for key in expired:
+      if isinstance(key, tuple):
+        macaddr,ip_addr = key
+        macEntry = self.entryByMAC.get(macaddr)
+        if macEntry is None: continue
+        ipEntry = macEntry.ipAddrs.get(ip_addr)
+        if ipEntry is None: continue
+        if ipEntry.expiration > now:
+          # Refreshed since it was filed
+          self._expiry.set(key, ipEntry.expiration)
+        elif ipEntry.pings.failed():
+          self._remove_ip(macEntry, ip_addr)
+          log.info("Entry %s: IP address %s expired",
+                   str(macEntry), str(ip_addr) )
+        elif ipEntry.pings.pending and ipEntry.pings.expiration > now:
+          # Waiting for a reply to the last ping
+          self._expiry.set(key, ipEntry.pings.expiration)
+        else:
+          self._queue_ping(macEntry, ip_addr, ipEntry)
+      else:
+        macEntry = self.entryByMAC.get(key)
+        if macEntry is None: continue
+        if macEntry.expiration > now:
+          self._expiry.set(key, macEntry.expiration)
+          continue
+        pinging = False
+        for ipEntry in macEntry.ipAddrs.itervalues():
+          if ipEntry.pings.queued or ipEntry.pings.pending:
+            pinging = True
+            break
+        if pinging:
+          # Give the pings a chance
+          self._expiry.set(key, now + timeoutSec['arpReply'])
+          continue
         log.info("Entry %s expired", str(macEntry))
         # sanity check: there should be no IP addresses left
         if len(macEntry.ipAddrs) > 0:
-          for ip in macEntry.ipAddrs.keys():
+          for ip_addr in macEntry.ipAddrs.keys():
             log.warning("Entry %s expired but still had IP address %s",
                         str(macEntry), str(ip_addr) )
-            del macEntry.ipAddrs[ip_addr]
+            self._remove_ip(macEntry, ip_addr)
         self.raiseEventNoErrors(HostEvent, macEntry, leave=True)
         del self.entryByMAC[macEntry.macaddr]
+
+  def _queue_ping (self, macEntry, ip_addr, ipEntry):
+    if ipEntry.pings.queued: return
+    ipEntry.pings.queued = True
+    q = self._ping_queues.get(macEntry.dpid)
+    if q is None:
+      q = self._ping_queues[macEntry.dpid] = deque()
+    q.append((macEntry.macaddr, ip_addr))
+    if self._ping_timer is None:
+      self._ping_timer = Timer(self._ping_tick, self._send_pings,
+                               recurring=True)
+
+  def _send_pings (self):
+    """
+    Sends queued ARP pings, limited by each switch's token bucket
+    """
+    now = time.time()
+    for dpid,q in self._ping_queues.items():
+      bucket = self._ping_buckets.get(dpid)
+      if bucket is None:
+        rate = PingCtrl.pingRate
+        bucket = TokenBucket(rate, max(1, rate * self._ping_tick), now)
+        self._ping_buckets[dpid] = bucket
+      while q and bucket.consume(now = now):
+        macaddr,ip_addr = q.popleft()
+        macEntry = self.entryByMAC.get(macaddr)
+        if macEntry is None: continue
+        ipEntry = macEntry.ipAddrs.get(ip_addr)
+        if ipEntry is None: continue
+        ipEntry.pings.queued = False
+        if not ipEntry.expired(): continue # Heard from it meanwhile
+        self.sendPing(macEntry, ip_addr)
+      if not q:
+        del self._ping_queues[dpid]
+        del self._ping_buckets[dpid]
+
+    if not self._ping_queues:
+      self._ping_timer.cancel()
+      self._ping_timer = None
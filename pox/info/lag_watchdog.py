@@ -0,0 +1,166 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Notices when something hogs the scheduler thread, and says what
+
+  ./pox.py info.lag_watchdog [--interval=<seconds>] [--threshold=<seconds>]
+
+Every interval seconds (default 0.1), a thread of its own asks the
+scheduler to run a tiny callback and times how long it takes to get
+run.  That's the scheduler's lag; percentiles of it (in microseconds) are
+kept in core.lag_watchdog.lag.
+
+If it takes more than threshold seconds (default 0.25), the scheduler
+is stalled, and the watchdog grabs the stack of the scheduler thread --
+which shows what the task that's running is stuck doing -- and logs it.
+The last few stalls are kept in core.lag_watchdog.stalls.
+
+From the py or telnet console:
+  core.lag_watchdog.show()
+
+This costs the scheduler nothing but running the callbacks.
+"""
+
+from pox.core import core
+from pox.lib.histogram import Histogram
+from pox.info.profiler import _task_name
+import pox.lib.recoco.recoco as recoco
+import pox.lib.metrics as metrics
+from collections import deque
+import threading
+import traceback
+import time
+import sys
+
+log = core.getLogger()
+
+
+class Stall (object):
+  """
+  What the scheduler was doing when it was found to be stalled
+  """
+  def __init__ (self, started, task, stack):
+    self.started = started
+    self.task = task # Its name
+    self.stack = stack # A list of strings like traceback.format_stack()
+    self.seconds = None # How long it lasted, once it's over
+
+  def __str__ (self):
+    lasted = "still going" if self.seconds is None else "%.3f seconds" % (
+             self.seconds,)
+    return "%s in %s (%s)\n%s" % (time.strftime("%H:%M:%S",
+        time.localtime(self.started)), self.task, lasted,
+        "".join(self.stack).rstrip())
+
+
+def _find_task (frame):
+  """
+  Returns the task a Scheduler.cycle() frame up the stack is executing
+  """
+  code = recoco.Scheduler.cycle.im_func.func_code
+  while frame is not None:
+    if frame.f_code is code:
+      return frame.f_locals.get('t')
+    frame = frame.f_back
+  return None
+
+
+class LagWatchdog (object):
+  def __init__ (self, interval = 0.1, threshold = 0.25, scheduler = None,
+                keep = 10):
+    if scheduler is None: scheduler = core.scheduler
+    self.scheduler = scheduler
+    self.interval = interval
+    self.threshold = threshold
+    self.lag = Histogram() # In microseconds
+    self.stall_count = 0
+    self.stalls = deque(maxlen = keep) # The most recent Stalls
+    self._ran = threading.Event()
+    self._running = False
+    self._thread = None
+
+  def start (self):
+    if self._running: return
+    self._running = True
+    self._thread = threading.Thread(target = self._run,
+                                    name = "LagWatchdog")
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop (self):
+    self._running = False
+
+  def _probe (self):
+    self._ran.set()
+
+  def _capture (self, started):
+    frame = sys._current_frames().get(self.scheduler._thread.ident)
+    if frame is None: return None
+    task = _find_task(frame)
+    return Stall(started, "?" if task is None else _task_name(task),
+                 traceback.format_stack(frame))
+
+  def _check (self):
+    """
+    Times one probe, and returns the lag in seconds
+    """
+    ran = self._ran
+    ran.clear()
+    start = time.time()
+    self.scheduler.callLater(self._probe)
+    if ran.wait(self.threshold):
+      return time.time() - start
+
+    stall = self._capture(start)
+    if stall is not None:
+      self.stall_count += 1
+      self.stalls.append(stall)
+      log.warning("Scheduler stalled for over %s seconds in %s:\n%s",
+                  self.threshold, stall.task, "".join(stall.stack).rstrip())
+    while self._running and not ran.wait(1):
+      pass
+    lag = time.time() - start
+    if stall is not None:
+      stall.seconds = lag
+      log.warning("Scheduler stall in %s lasted %.3f seconds", stall.task,
+                  lag)
+    return lag
+
+  def _run (self):
+    while self._running and self.scheduler._thread is None:
+      time.sleep(self.interval)
+    while self._running and not self.scheduler._hasQuit:
+      lag = self._check()
+      self.lag.record(lag * 1000000)
+      time.sleep(self.interval)
+
+  def show (self):
+    print("Lag (us): %s\nStalls: %s" % (self.lag, self.stall_count))
+    for s in self.stalls:
+      print("")
+      print(s)
+
+  def __repr__ (self):
+    return "<LagWatchdog lag:%s stalls:%s>" % (self.lag, self.stall_count)
+
+
+def launch (interval = 0.1, threshold = 0.25):
+  w = LagWatchdog(float(interval), float(threshold))
+  core.register("lag_watchdog", w)
+  metrics.counter("pox_scheduler_stalls_total",
+                  "Times the scheduler was found stalled by info.lag_watchdog",
+                  func = lambda: w.stall_count)
+  core.addListenerByName("GoingDownEvent", lambda e: w.stop())
+  w.start()
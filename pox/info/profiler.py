@@ -0,0 +1,283 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Finds out what's eating the scheduler thread
+
+Times event handler calls (per handler, and per event type for whole
+dispatches) and recoco task slices, and keeps histograms of them in
+microseconds.
+
+  ./pox.py info.profiler [--sample=N] [--disabled]
+
+With --sample=N, only one in N calls is timed (and counted N times),
+which keeps the overhead down.  With --disabled, it doesn't start until
+you call start().
+
+From the py or telnet console:
+  core.profiler.show()       # Top handlers, events and tasks
+  core.profiler.reset()
+  core.profiler.stop()       # And start()
+
+If web.webcore is running, the numbers are also at /profiler/ as JSON.
+
+This works by wrapping EventMixin.raiseEvent, Event._invoke and the
+tasks' execute() methods while running.  When stopped, the originals are
+put back, so it costs nothing.  Times are inclusive: a handler that
+raises another event is charged for that event's handlers too.
+"""
+
+from pox.core import core
+from pox.lib.histogram import Histogram
+import pox.lib.revent.revent as revent
+import pox.lib.recoco.recoco as recoco
+import time
+import json
+
+log = core.getLogger()
+
+_clock = time.time
+
+
+def _callable_name (f):
+  """
+  Returns a name like module.Class.method for a callable
+  """
+  obj = getattr(f, 'im_self', None)
+  func = getattr(f, 'im_func', None)
+  if isinstance(f, revent.CallProxy):
+    # A weak event handler
+    func = f.method
+    obj = f.obj() if f.obj is not None else None
+  if func is None:
+    func = f
+    if obj is None:
+      # Maybe a builtin method like somelist.append
+      obj = getattr(f, '__self__', None)
+  module = getattr(func, '__module__', None)
+  if module is None:
+    module = type(obj).__module__ if obj is not None else '?'
+  name = getattr(func, '__name__', None)
+  if name is None:
+    return "%s.%s" % (type(f).__module__, type(f).__name__)
+  if obj is not None:
+    return "%s.%s.%s" % (module, type(obj).__name__, name)
+  return "%s.%s" % (module, name)
+
+
+def _task_name (task):
+  if isinstance(task, recoco.DelayedCall):
+    return "callDelayed " + _callable_name(task.func)
+  if isinstance(task, recoco.LocalCalls):
+    return "callLater"
+  target = getattr(task, 'target', None)
+  if target is not None:
+    return "Task " + _callable_name(target)
+  return "%s.%s" % (type(task).__module__, type(task).__name__)
+
+
+class Profiler (object):
+  def __init__ (self, sample = 1):
+    self.sample = max(1, int(sample))
+    self.running = False
+    self._patches = [] # (class, attribute, original)
+    self._invokes = [] # (class, timed _invoke) when sampling
+    self._invoking = False # Are the _invoke timers in place?
+    self._names = {} # callable -> name
+    self.reset()
+
+  def reset (self):
+    self.handlers = {} # name -> Histogram
+    self.events = {} # event class name -> Histogram
+    self.tasks = {} # name -> Histogram
+    self.reset_time = time.time()
+
+  def _record (self, table, key, seconds):
+    h = table.get(key)
+    if h is None: h = table[key] = Histogram()
+    h.record(seconds * 1000000, self.sample)
+
+  def _name (self, f):
+    n = self._names.get(f)
+    if n is None:
+      n = self._names[f] = _callable_name(f)
+    return n
+
+  def _sampled (self, timed):
+    """
+    Returns a wrapper which calls timed() one in self.sample times
+
+    Otherwise it calls the original, which is timed's first argument.
+    """
+    orig = timed.orig
+    if self.sample == 1: return timed
+    sample = self.sample
+    left = [sample]
+    def wrapper (*args, **kw):
+      left[0] -= 1
+      if left[0]: return orig(*args, **kw)
+      left[0] = sample
+      return timed(*args, **kw)
+    return wrapper
+
+  def _patch (self, cls, attr, make, install = True):
+    orig = cls.__dict__[attr]
+    timed = make(orig)
+    timed.orig = orig
+    if install: setattr(cls, attr, self._sampled(timed))
+    self._patches.append((cls, attr, orig))
+    return timed
+
+  def _set_invokes (self, on):
+    self._invoking = on
+    for cls,timed in self._invokes:
+      setattr(cls, '_invoke', timed if on else timed.orig)
+
+  def _timed_invoke (self, orig):
+    clock = _clock
+    def _invoke (event, handler, *args, **kw):
+      t = clock()
+      try:
+        return orig(event, handler, *args, **kw)
+      finally:
+        self._record(self.handlers, self._name(handler), clock() - t)
+    return _invoke
+
+  def _timed_raise (self, orig):
+    clock = _clock
+    sampling = self.sample != 1
+    def raiseEvent (source, event, *args, **kw):
+      if sampling and not self._invoking:
+        # Time the handlers for just this dispatch
+        self._set_invokes(True)
+        try:
+          return raiseEvent(source, event, *args, **kw)
+        finally:
+          self._set_invokes(False)
+      t = clock()
+      rv = orig(source, event, *args, **kw)
+      if rv is not None:
+        # Someone was listening
+        self._record(self.events, type(rv).__name__, clock() - t)
+      return rv
+    return raiseEvent
+
+  def _timed_execute (self, orig):
+    clock = _clock
+    def execute (task):
+      t = clock()
+      try:
+        return orig(task)
+      finally:
+        self._record(self.tasks, _task_name(task), clock() - t)
+    return execute
+
+  def start (self):
+    if self.running: return
+    self.running = True
+    self._patch(revent.EventMixin, 'raiseEvent', self._timed_raise)
+    # Some events have their own _invoke()
+    todo = [revent.Event]
+    seen = set()
+    while todo:
+      cls = todo.pop()
+      if cls in seen: continue
+      seen.add(cls)
+      todo.extend(cls.__subclasses__())
+      if '_invoke' in cls.__dict__:
+        # When sampling, these only go in while a sampled event is being
+        # raised, so the other handler calls don't pay for a wrapper
+        timed = self._patch(cls, '_invoke', self._timed_invoke,
+                            install = self.sample == 1)
+        if self.sample != 1: self._invokes.append((cls, timed))
+    for cls in (recoco.BaseTask, recoco.DelayedCall, recoco.LocalCalls):
+      self._patch(cls, 'execute', self._timed_execute)
+    log.info("Profiling%s", "" if self.sample == 1 else
+             " one in %s calls" % (self.sample,))
+
+  def stop (self):
+    if not self.running: return
+    for cls,attr,orig in reversed(self._patches):
+      setattr(cls, attr, orig)
+    del self._patches[:]
+    del self._invokes[:]
+    self.running = False
+
+  def get_stats (self):
+    """
+    Returns everything as a dict (which can be turned into JSON)
+    """
+    def table (t):
+      return dict((k, h.to_dict()) for k,h in t.iteritems())
+    return dict(running = self.running, sample = self.sample,
+                seconds = time.time() - self.reset_time,
+                handlers = table(self.handlers),
+                events = table(self.events),
+                tasks = table(self.tasks))
+
+  def report (self, top = 15):
+    """
+    Returns a table of the handlers, events and tasks with the most time
+    """
+    lines = []
+    lines.append("%.1f seconds%s" % (time.time() - self.reset_time,
+                 "" if self.sample == 1 else
+                 ", sampling one in %s calls" % (self.sample,)))
+    fmt = "%-50s %9s %9s %8s %8s %8s %8s"
+    for title,t in (("Handlers", self.handlers), ("Events", self.events),
+                    ("Tasks", self.tasks)):
+      lines.append("")
+      lines.append(fmt % (title, "calls", "total ms", "mean us", "p50 us",
+                          "p99 us", "max us"))
+      entries = sorted(t.iteritems(), key = lambda e: -e[1].total)
+      for name,h in entries[:top]:
+        if len(name) > 50: name = "..." + name[-47:]
+        lines.append(fmt % (name, h.count, "%.1f" % (h.total / 1000.0,),
+                            "%.1f" % (h.mean,), h.percentile(50),
+                            h.percentile(99), h.max))
+    return "\n".join(lines)
+
+  def show (self, top = 15):
+    print(self.report(top))
+
+  def __repr__ (self):
+    return "<Profiler %s, %i handlers, %i tasks>" % ("running" if
+        self.running else "stopped", len(self.handlers), len(self.tasks))
+
+
+def _set_up_web (profiler):
+  from pox.web.webcore import SplitRequestHandler
+
+  class ProfilerHandler (SplitRequestHandler):
+    def do_GET (self):
+      # Stats are updated on the scheduler thread, so get them there
+      stats = self.call_on_scheduler(profiler.get_stats)
+      if stats is None: return
+      r = json.dumps(stats, sort_keys = True, indent = 2)
+      self.send_response(200)
+      self.send_header("Content-type", "application/json")
+      self.send_header("Content-Length", str(len(r)))
+      self.end_headers()
+      self.wfile.write(r)
+
+  core.WebServer.set_handler("/profiler/", ProfilerHandler)
+
+
+def launch (sample = 1, disabled = False):
+  profiler = Profiler(sample = sample)
+  core.register("profiler", profiler)
+  if not disabled:
+    profiler.start()
+  core.call_when_ready(lambda: _set_up_web(profiler), "WebServer",
+                       name = "info.profiler")
@@ -19,6 +19,8 @@ Classes and utilities for addresses of various types.
 from __future__ import print_function
 import struct
 import socket
+import re
+import os.path
 
 # Slightly tested attempt at Python 3 friendliness
 import sys
@@ -26,48 +28,32 @@ if 'long' not in sys.modules['__builtin__'].__dict__:
   long = int
 
 
-"""
-# Unfinished oui name stuff formerly from packet library.
-
-    oui = int(a[0]) << 16 | int(a[1]) << 8 | int(a[2])
+# OUI -> company name, from oui.txt.  It's big and is only needed for
+# EthAddr.toStr(resolveNames=True), so it's not loaded until then.
+_eth_oui_to_name = None
 
-    # check if globally unique
-    if resolve_name and not (a[0] & 0x2):
-        if _ethoui2name.has_key(oui):
-            return "(%s):%02x:%02x:%02x" %( _ethoui2name[oui], a[3],a[4],a[5])
-"""
-_eth_oui_to_name = {}
+_oui_re = re.compile(r"^([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})"
+                     r"[ \t]+\(hex\)[ \t]*(.*?)[ \t\r]*$", re.MULTILINE)
 
 def _load_oui_names ():
-    import inspect
-    import os.path
-    filename = os.path.join(os.path.dirname(inspect.stack()[0][1]), 'oui.txt')
-    f = None
-    try:
-        f = open(filename)
-        for line in f.readlines():
-            if len(line) < 1:
-                continue
-            if line[0].isspace():
-                continue
-            split = line.split(' ')
-            if not '-' in split[0]:
-                continue
-            # grab 3-byte OUI
-            oui_str  = split[0].replace('-','')
-            # strip off (hex) identifer and keep rest of name
-            end = ' '.join(split[1:]).strip()
-            end = end.split('\t')
-            end.remove('(hex)')
-            oui_name = ' '.join(end)
-            # convert oui to int
-            oui = int(oui_str, 16)
-            _eth_oui_to_name[oui] = oui_name.strip()
-    except:
-        import logging
-        logging.getLogger().warn("Could not load OUI list")
-    if f: f.close()
-_load_oui_names()
+  """
+  Returns the dictionary of OUI names, loading it if need be
+  """
+  global _eth_oui_to_name
+  if _eth_oui_to_name is not None: return _eth_oui_to_name
+  names = {}
+  filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'oui.txt')
+  try:
+    with open(filename) as f:
+      data = f.read()
+    for a,b,c,name in _oui_re.findall(data):
+      names[int(a+b+c, 16)] = name
+  except Exception:
+    import logging
+    logging.getLogger().warn("Could not load OUI list")
+  _eth_oui_to_name = names
+  return names
 
 
 class EthAddr (object):
@@ -186,10 +172,16 @@ class EthAddr (object):
     """
     Returns the address as string consisting of 12 hex chars separated
     by separator.
-    If resolveNames is True, it may return company names based on
-    the OUI. (Currently unimplemented)
+    If resolveNames is True and the address is globally unique, the
+    first three bytes are replaced with the company name for the OUI
+    (if known), like "(XEROX CORPORATION):00:00:01".
     """
-    #TODO: show OUI info from packet lib ?
+    if resolveNames and not (ord(self._value[0]) & 0x2):
+      name = _load_oui_names().get(struct.unpack("!L",
+                                   "\0" + self._value[:3])[0])
+      if name is not None:
+        return "(%s)%s%s" % (name, separator, separator.join(
+               ('%02x' % (ord(x),) for x in self._value[3:])))
     return separator.join(('%02x' % (ord(x),) for x in self._value))
 
   def __str__ (self):
@@ -299,8 +291,11 @@ class IPAddr (object):
     network is a dotted quad (with or without a CIDR or normal style
     netmask, which can also be specified separately via the netmask
     parameter), or it can be a tuple of (address,network-bits) like that
-    returned by parse_cidr().
+    returned by parse_cidr(), or an IPNetwork (which is much faster if
+    you're checking against the same network repeatedly).
     """
+    if isinstance(network, IPNetwork):
+      return self in network
     if type(network) is not tuple:
       if netmask is not None:
         network = str(network)
@@ -563,7 +558,10 @@ class IPAddr6 (object):
     textual network with netbits or netmask separated by a slash
     tuple of textual address and numeric netbits
     tuple of IPAddr6 and numeric netbits
+    IPNetwork (fastest if checking against the same network repeatedly)
     """
+    if isinstance(network, IPNetwork):
+      return self in network
     if type(network) is not tuple:
       if netmask is not None:
         network = str(network) + "/" + str(netmask)
@@ -767,6 +765,302 @@ def infer_netmask (addr):
     return 32-0
 
 
+class IPNetwork (object):
+  """
+  A pre-parsed IPv4 or IPv6 network
+
+  Parsing CIDR strings is relatively slow, so if you're going to check
+  many addresses against the same network, make one of these up front
+  and use "addr in network" (or pass it to IPAddr.in_network()).
+
+  network can be anything parse_cidr() or IPAddr6.parse_cidr() accept, a
+  tuple of (address, network-bits), an IPAddr/IPAddr6 (with the number of
+  network bits in bits), or another IPNetwork.  If allow_host is True,
+  host bits in the address are cleared rather than raising an exception.
+  """
+  def __init__ (self, network, bits = None, allow_host = False):
+    if isinstance(network, IPNetwork):
+      if bits is None: bits = network.bits
+      network = network.network
+    elif type(network) is tuple:
+      network,b = network
+      if bits is None: bits = b
+
+    if isinstance(network, basestring):
+      if ':' in network:
+        if bits is None:
+          network,bits = IPAddr6.parse_cidr(network, allow_host=True)
+        else:
+          network = IPAddr6(network)
+      elif bits is None:
+        network,bits = parse_cidr(network, infer=False, allow_host=True)
+      else:
+        network = IPAddr(network)
+
+    if isinstance(network, IPAddr):
+      self.width = 32
+      num = network.toUnsigned()
+    elif isinstance(network, IPAddr6):
+      self.width = 128
+      num = network.num
+    else:
+      raise RuntimeError("Unexpected network format")
+
+    if bits is None: bits = self.width
+    bits = int(bits)
+    if bits < 0 or bits > self.width:
+      raise RuntimeError("Bad network bits (%s)" % (bits,))
+
+    self.bits = bits
+    self.mask = ((1 << bits) - 1) << (self.width - bits)
+    self.value = num & self.mask
+    if self.value != num:
+      if not allow_host:
+        raise RuntimeError("Host part of CIDR address is not zero (%s/%s)"
+                           % (network, bits))
+      if self.width == 32:
+        network = IPAddr(self.value)
+      else:
+        network = IPAddr6.from_num(self.value)
+    self.network = network
+
+  @property
+  def netmask (self):
+    if self.width == 32:
+      return cidr_to_netmask(self.bits)
+    return IPAddr6.cidr_to_netmask(self.bits)
+
+  def __contains__ (self, addr):
+    width,num = _addr_to_num(addr)
+    return width == self.width and (num & self.mask) == self.value
+
+  def __eq__ (self, other):
+    if not isinstance(other, IPNetwork): return False
+    return ((self.width,self.value,self.bits)
+            == (other.width,other.value,other.bits))
+
+  def __ne__ (self, other):
+    return not self.__eq__(other)
+
+  def __hash__ (self):
+    return hash((self.width,self.value,self.bits))
+
+  def __str__ (self):
+    return "%s/%s" % (self.network, self.bits)
+
+  def __repr__ (self):
+    return "%s('%s')" % (type(self).__name__, self)
+
+
+def _addr_to_num (addr):
+  """
+  Returns (address width, address as an unsigned integer)
+  """
+  if isinstance(addr, IPAddr):
+    return 32, addr.toUnsigned()
+  if isinstance(addr, IPAddr6):
+    return 128, addr.num
+  if isinstance(addr, basestring) and ':' in addr:
+    return 128, IPAddr6(addr).num
+  return 32, IPAddr(addr).toUnsigned()
+
+
+class _PrefixNode (object):
+  __slots__ = ('prefix', 'bits', 'network', 'value', 'has_value', 'children')
+
+  def __init__ (self, prefix, bits):
+    self.prefix = prefix
+    self.bits = bits
+    self.network = None
+    self.value = None
+    self.has_value = False
+    self.children = [None, None]
+
+
+class PrefixTable (object):
+  """
+  A longest-prefix-match table mapping networks to values
+
+  This is a path-compressed binary trie over integer addresses, so lookups
+  cost at most one step per bit of the longest stored prefix no matter how
+  many prefixes there are.  IPv4 and IPv6 networks can be mixed; they are
+  kept in separate tries.
+
+  Networks may be given as anything the IPNetwork constructor takes.
+  """
+  def __init__ (self, items = None):
+    self._roots = {32:_PrefixNode(0, 0), 128:_PrefixNode(0, 0)}
+    self._count = 0
+    if items is not None:
+      self.load(items)
+
+  def __len__ (self):
+    return self._count
+
+  def load (self, items):
+    """
+    Adds many (network, value) pairs (or a dict) at once
+
+    Shorter prefixes are inserted first, which avoids splitting nodes
+    that were only just created.
+    """
+    if isinstance(items, dict): items = items.iteritems()
+    items = [(IPNetwork(n), v) for n,v in items]
+    items.sort(key = lambda item: (item[0].width, item[0].bits))
+    for n,v in items:
+      self.add(n, v)
+
+  def add (self, network, value = True):
+    """
+    Adds network (or replaces its value if it's already present)
+    """
+    net = IPNetwork(network)
+    width = net.width
+    prefix = net.value
+    bits = net.bits
+    node = self._roots[width]
+    while True:
+      if node.bits == bits:
+        break
+      branch = (prefix >> (width - 1 - node.bits)) & 1
+      child = node.children[branch]
+      if child is None:
+        child = _PrefixNode(prefix, bits)
+        node.children[branch] = child
+        node = child
+        break
+      common = self._common_bits(child.prefix, prefix, width,
+                                 min(child.bits, bits))
+      if common == child.bits:
+        node = child
+        continue
+      if common == bits:
+        # New node goes between node and child
+        n = _PrefixNode(prefix, bits)
+        n.children[(child.prefix >> (width - 1 - bits)) & 1] = child
+        node.children[branch] = n
+        node = n
+        break
+      # Split at the point where child and new prefix diverge
+      mask = ((1 << common) - 1) << (width - common)
+      mid = _PrefixNode(prefix & mask, common)
+      mid.children[(child.prefix >> (width - 1 - common)) & 1] = child
+      n = _PrefixNode(prefix, bits)
+      mid.children[(prefix >> (width - 1 - common)) & 1] = n
+      node.children[branch] = mid
+      node = n
+      break
+
+    if not node.has_value:
+      self._count += 1
+      node.has_value = True
+    node.network = net
+    node.value = value
+
+  @staticmethod
+  def _common_bits (a, b, width, limit):
+    diff = (a ^ b) >> (width - limit)
+    if diff == 0: return limit
+    return limit - diff.bit_length()
+
+  def _find (self, net):
+    """
+    Returns the path of nodes down to network's node, or None
+    """
+    width = net.width
+    node = self._roots[width]
+    path = [node]
+    while node.bits < net.bits:
+      node = node.children[(net.value >> (width - 1 - node.bits)) & 1]
+      if node is None or node.bits > net.bits: return None
+      if (net.value ^ node.prefix) >> (width - node.bits): return None
+      path.append(node)
+    if node.bits != net.bits or not node.has_value: return None
+    return path
+
+  def remove (self, network):
+    """
+    Removes network
+
+    Returns True if it was present.
+    """
+    path = self._find(IPNetwork(network))
+    if path is None: return False
+    node = path[-1]
+    node.has_value = False
+    node.value = None
+    node.network = None
+    self._count -= 1
+
+    # Prune nodes which no longer do anything
+    while len(path) > 1:
+      node = path.pop()
+      if node.has_value: break
+      parent = path[-1]
+      branch = 0 if parent.children[0] is node else 1
+      kids = [c for c in node.children if c is not None]
+      if len(kids) > 1: break
+      parent.children[branch] = kids[0] if kids else None
+    return True
+
+  def get (self, network, default = None):
+    """
+    Returns the value for exactly network
+    """
+    path = self._find(IPNetwork(network))
+    if path is None: return default
+    return path[-1].value
+
+  def __contains__ (self, network):
+    return self._find(IPNetwork(network)) is not None
+
+  def match (self, addr):
+    """
+    Returns (IPNetwork, value) for the longest prefix containing addr
+
+    Returns None if no prefix contains it.
+    """
+    width,num = _addr_to_num(addr)
+    node = self._roots[width]
+    best = None
+    while True:
+      if node.has_value: best = node
+      if node.bits == width: break
+      node = node.children[(num >> (width - 1 - node.bits)) & 1]
+      if node is None: break
+      if (num ^ node.prefix) >> (width - node.bits): break
+    if best is None: return None
+    return (best.network, best.value)
+
+  def lookup (self, addr, default = None):
+    """
+    Returns the value for the longest prefix containing addr
+    """
+    r = self.match(addr)
+    if r is None: return default
+    return r[1]
+
+  def items (self):
+    """
+    Returns a list of (IPNetwork, value) in address order
+    """
+    out = []
+    for width in (32, 128):
+      stack = [self._roots[width]]
+      while stack:
+        node = stack.pop()
+        if node.has_value: out.append((node.network, node.value))
+        stack.extend(c for c in reversed(node.children) if c is not None)
+    return out
+
+  def __iter__ (self):
+    return iter([n for n,v in self.items()])
+
+  def clear (self):
+    self._roots = {32:_PrefixNode(0, 0), 128:_PrefixNode(0, 0)}
+    self._count = 0
+
+
 IP_ANY = IPAddr("0.0.0.0")
 IP_BROADCAST = IPAddr("255.255.255.255")
 
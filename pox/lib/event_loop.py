@@ -0,0 +1,328 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A small callback-based event loop
+
+This has the callback parts of asyncio's event loop interface --
+add_reader(), call_later(), call_soon_threadsafe() and so on -- on top of
+epoll (or select() where there isn't epoll).  recoco can run its Tasks on
+one of these (see recoco.LoopHub), in which case other code can share the
+loop and its callbacks run in the co-operative context.
+
+As with asyncio, remove a reader or writer before closing its file.
+"""
+
+import select
+import time
+import errno
+import logging
+import itertools
+from heapq import heappush, heappop, heapify
+from collections import deque
+import pox.lib.util
+
+log = logging.getLogger("event_loop")
+
+EVENT_READ = 1
+EVENT_WRITE = 2
+
+
+def _fileno (fd):
+  if isinstance(fd, (int, long)): return fd
+  return fd.fileno()
+
+
+def _interrupted (e):
+  return getattr(e, 'errno', e.args[0] if e.args else None) == errno.EINTR
+
+
+class _EpollPoller (object):
+  def __init__ (self):
+    self._epoll = select.epoll()
+
+  @staticmethod
+  def _mask (events):
+    m = 0
+    if events & EVENT_READ: m |= select.EPOLLIN | select.EPOLLPRI
+    if events & EVENT_WRITE: m |= select.EPOLLOUT
+    return m
+
+  def register (self, fd, events):
+    try:
+      self._epoll.register(fd, self._mask(events))
+    except (IOError, OSError) as e:
+      if e.errno != errno.EEXIST: raise
+      self._epoll.modify(fd, self._mask(events))
+
+  def modify (self, fd, events):
+    try:
+      self._epoll.modify(fd, self._mask(events))
+    except (IOError, OSError) as e:
+      if e.errno != errno.ENOENT: raise
+      # It was closed and the number reused
+      self._epoll.register(fd, self._mask(events))
+
+  def unregister (self, fd):
+    try:
+      self._epoll.unregister(fd)
+    except (IOError, OSError, ValueError):
+      # Already closed
+      pass
+
+  def poll (self, timeout):
+    try:
+      events = self._epoll.poll(-1 if timeout is None else timeout)
+    except (IOError, OSError) as e:
+      if _interrupted(e): return []
+      raise
+    r = []
+    for fd,m in events:
+      ev = 0
+      if m & (select.EPOLLIN | select.EPOLLPRI | select.EPOLLERR
+              | select.EPOLLHUP):
+        ev |= EVENT_READ
+      if m & (select.EPOLLOUT | select.EPOLLERR | select.EPOLLHUP):
+        ev |= EVENT_WRITE
+      r.append((fd, ev))
+    return r
+
+  def close (self):
+    self._epoll.close()
+
+
+class _SelectPoller (object):
+  def __init__ (self):
+    self._r = set()
+    self._w = set()
+
+  def register (self, fd, events):
+    self.modify(fd, events)
+
+  def modify (self, fd, events):
+    if events & EVENT_READ: self._r.add(fd)
+    else: self._r.discard(fd)
+    if events & EVENT_WRITE: self._w.add(fd)
+    else: self._w.discard(fd)
+
+  def unregister (self, fd):
+    self._r.discard(fd)
+    self._w.discard(fd)
+
+  def poll (self, timeout):
+    try:
+      r,w,x = select.select(self._r, self._w, [], timeout)
+    except (select.error, IOError, OSError) as e:
+      if _interrupted(e): return []
+      raise
+    events = dict.fromkeys(r, EVENT_READ)
+    for fd in w:
+      events[fd] = events.get(fd, 0) | EVENT_WRITE
+    return events.items()
+
+  def close (self):
+    pass
+
+
+class Handle (object):
+  """
+  A callback scheduled on an EventLoop
+  """
+  __slots__ = ['_callback', '_args', '_cancelled', '_loop', '_when']
+
+  def __init__ (self, callback, args, loop = None, when = None):
+    self._callback = callback
+    self._args = args
+    self._cancelled = False
+    self._loop = loop
+    self._when = when
+
+  def when (self):
+    return self._when
+
+  def cancel (self):
+    if self._cancelled: return
+    self._cancelled = True
+    if self._when is not None:
+      self._loop._timer_cancelled()
+
+  def __repr__ (self):
+    return "<%s %s%s>" % (self.__class__.__name__, self._callback,
+                          " cancelled" if self._cancelled else "")
+
+
+class EventLoop (object):
+  """
+  The loop
+
+  Someone has to call run_once() (or run_forever()) on it.  Everything but
+  call_soon_threadsafe() and wakeup() should only be called from the
+  thread doing that.
+  """
+  def __init__ (self, use_epoll = None):
+    if use_epoll is None:
+      use_epoll = hasattr(select, 'epoll')
+    self._poller = _EpollPoller() if use_epoll else _SelectPoller()
+
+    self._readers = {} # fd -> Handle
+    self._writers = {} # fd -> Handle
+    self._ready = deque()
+
+    # Heap of (when, sequence number, Handle)
+    self._timers = []
+    self._timer_seq = itertools.count()
+    self._cancelled_timers = 0
+
+    self._stopping = False
+    self._wake_pending = False
+    self._pinger = pox.lib.util.make_pinger()
+    self.add_reader(self._pinger, self._woken)
+
+  def time (self):
+    return time.time()
+
+  def call_soon (self, callback, *args):
+    h = Handle(callback, args)
+    self._ready.append(h)
+    return h
+
+  def call_soon_threadsafe (self, callback, *args):
+    h = self.call_soon(callback, *args)
+    self.wakeup()
+    return h
+
+  def call_later (self, delay, callback, *args):
+    return self.call_at(self.time() + delay, callback, *args)
+
+  def call_at (self, when, callback, *args):
+    h = Handle(callback, args, self, when)
+    heappush(self._timers, (when, next(self._timer_seq), h))
+    return h
+
+  def _timer_cancelled (self):
+    self._cancelled_timers += 1
+    timers = self._timers
+    if self._cancelled_timers > 64 and self._cancelled_timers*2 > len(timers):
+      timers[:] = [t for t in timers if not t[2]._cancelled]
+      heapify(timers)
+      self._cancelled_timers = 0
+
+  def _update (self, fd, was_registered):
+    events = 0
+    if fd in self._readers: events |= EVENT_READ
+    if fd in self._writers: events |= EVENT_WRITE
+    if not events:
+      self._poller.unregister(fd)
+    elif was_registered:
+      self._poller.modify(fd, events)
+    else:
+      self._poller.register(fd, events)
+
+  def _add (self, table, fd, callback, args):
+    fd = _fileno(fd)
+    registered = fd in self._readers or fd in self._writers
+    new = fd not in table
+    table[fd] = Handle(callback, args)
+    if new: self._update(fd, registered)
+
+  def _remove (self, table, fd):
+    fd = _fileno(fd)
+    if fd not in table: return False
+    del table[fd]
+    self._update(fd, True)
+    return True
+
+  def add_reader (self, fd, callback, *args):
+    self._add(self._readers, fd, callback, args)
+
+  def remove_reader (self, fd):
+    return self._remove(self._readers, fd)
+
+  def add_writer (self, fd, callback, *args):
+    self._add(self._writers, fd, callback, args)
+
+  def remove_writer (self, fd):
+    return self._remove(self._writers, fd)
+
+  def wakeup (self):
+    """
+    Makes the loop stop waiting for IO (e.g., from another thread)
+    """
+    if self._wake_pending: return
+    self._wake_pending = True
+    self._pinger.ping()
+
+  def _woken (self):
+    self._wake_pending = False
+    self._pinger.pongAll()
+
+  def run_once (self, timeout = None):
+    """
+    Waits for IO or timers (up to timeout seconds; None is forever) and
+    runs the callbacks which are then due
+
+    Doesn't wait at all if there are callbacks ready to go.
+    """
+    ready = self._ready
+    timers = self._timers
+    while timers and timers[0][2]._cancelled:
+      heappop(timers)
+      self._cancelled_timers -= 1
+
+    if ready:
+      timeout = 0
+    elif timers:
+      t = max(0, timers[0][0] - self.time())
+      if timeout is None or t < timeout: timeout = t
+
+    for fd,events in self._poller.poll(timeout):
+      if events & EVENT_READ:
+        h = self._readers.get(fd)
+        if h is not None: ready.append(h)
+      if events & EVENT_WRITE:
+        h = self._writers.get(fd)
+        if h is not None: ready.append(h)
+
+    now = self.time()
+    while timers and timers[0][0] <= now:
+      h = heappop(timers)[2]
+      if h._cancelled:
+        self._cancelled_timers -= 1
+      else:
+        ready.append(h)
+
+    # Only the ones ready now; ones these add go next time
+    for i in xrange(len(ready)):
+      h = ready.popleft()
+      if h._cancelled: continue
+      try:
+        h._callback(*h._args)
+      except Exception:
+        log.exception("Exception in callback %s", h._callback)
+
+  def run_forever (self):
+    self._stopping = False
+    while not self._stopping:
+      self.run_once()
+
+  def stop (self):
+    self._stopping = True
+    self.wakeup()
+
+  def close (self):
+    self._poller.close()
+    self._readers.clear()
+    self._writers.clear()
+    del self._timers[:]
+    self._ready.clear()
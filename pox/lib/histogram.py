@@ -0,0 +1,111 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A compact histogram for latencies and the like
+
+Like an HdrHistogram, buckets are log-linear: each power of two is split
+into SUB_BUCKETS linear buckets, so any value is stored to within 1 part
+in SUB_BUCKETS (about 6%) no matter how big it is, and a histogram of
+values from microseconds to hours only needs a few hundred counters.
+Values are non-negative integers; pick the unit accordingly (e.g.,
+microseconds).
+"""
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+
+
+def _index (value):
+  shift = value.bit_length() - SUB_BITS - 1
+  if shift <= 0: return value
+  return (shift << SUB_BITS) + (value >> shift)
+
+
+def _bounds (index):
+  """
+  Returns the lowest and highest values that go in the bucket
+  """
+  if index < 2 * SUB_BUCKETS: return index, index
+  shift = (index >> SUB_BITS) - 1
+  low = (index - (shift << SUB_BITS)) << shift
+  return low, low + (1 << shift) - 1
+
+
+class Histogram (object):
+  """
+  Counts of values in log-linear buckets
+  """
+  def __init__ (self):
+    self._counts = {} # bucket index -> count
+    self.count = 0
+    self.total = 0
+    self.min = None
+    self.max = None
+
+  def record (self, value, count = 1):
+    value = int(value)
+    if value < 0: value = 0
+    i = _index(value)
+    self._counts[i] = self._counts.get(i, 0) + count
+    self.count += count
+    self.total += value * count
+    if self.min is None or value < self.min: self.min = value
+    if self.max is None or value > self.max: self.max = value
+
+  def merge (self, other):
+    for i,c in other._counts.iteritems():
+      self._counts[i] = self._counts.get(i, 0) + c
+    self.count += other.count
+    self.total += other.total
+    if other.min is not None:
+      if self.min is None or other.min < self.min: self.min = other.min
+      if other.max > self.max: self.max = other.max
+
+  @property
+  def mean (self):
+    if not self.count: return 0
+    return self.total / float(self.count)
+
+  def percentile (self, p):
+    """
+    Returns the value at or below which p percent of values fall
+
+    (Well, the top of its bucket, but not more than the maximum.)
+    """
+    if not self.count: return 0
+    want = self.count * p / 100.0
+    seen = 0
+    for i in sorted(self._counts):
+      seen += self._counts[i]
+      if seen >= want:
+        return min(_bounds(i)[1], self.max)
+    return self.max
+
+  def buckets (self):
+    """
+    Returns a sorted list of (low, high, count) for non-empty buckets
+    """
+    return [_bounds(i) + (self._counts[i],) for i in sorted(self._counts)]
+
+  def to_dict (self, percentiles = (50, 90, 99, 99.9)):
+    d = dict(count = self.count, total = self.total, min = self.min,
+             max = self.max, mean = self.mean)
+    for p in percentiles:
+      d["p%s" % (p,)] = self.percentile(p)
+    return d
+
+  def __str__ (self):
+    return "count:%s mean:%.1f p50:%s p99:%s max:%s" % (self.count,
+        self.mean, self.percentile(50), self.percentile(99), self.max)
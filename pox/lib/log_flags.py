@@ -0,0 +1,84 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Flags saying whether loggers are enabled, kept up to date
+
+Even when debug logging is off, log.debug(...) costs a call, a walk up
+the logger hierarchy, and evaluating its arguments (which might be
+something like msg.show()).  On hot paths, check a module-level flag
+instead:
+
+  _debug = False
+  def _update_log_flags ():
+    global _debug
+    _debug = log.isEnabledFor(logging.DEBUG)
+  pox.lib.log_flags.watch(_update_log_flags)
+  ...
+  if _debug: log.debug("Got %s", msg.show())
+
+watch() calls the function right away, and again whenever any logger's
+level is changed with setLevel() or logging.disable() is called.  If you
+change levels some other way (e.g., setting logger.level), call update().
+"""
+
+import logging
+
+_watchers = []
+_installed = False
+
+
+def update ():
+  """
+  Re-evaluates all the flags
+  """
+  for f in list(_watchers):
+    try:
+      f()
+    except Exception:
+      logging.getLogger("log_flags").exception("Error updating log flags")
+
+
+def _install ():
+  global _installed
+  if _installed: return
+  _installed = True
+
+  set_level = logging.Logger.setLevel
+  def setLevel (self, level):
+    set_level(self, level)
+    update()
+  logging.Logger.setLevel = setLevel
+
+  disable = logging.disable
+  def _disable (level):
+    disable(level)
+    update()
+  logging.disable = _disable
+
+
+def watch (func):
+  """
+  Calls func now and whenever log levels change
+  """
+  _install()
+  if func not in _watchers:
+    _watchers.append(func)
+  func()
+  return func
+
+
+def unwatch (func):
+  if func in _watchers:
+    _watchers.remove(func)
@@ -0,0 +1,237 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Counters, gauges and histograms for keeping an eye on the controller
+
+Metrics are kept in a Registry -- usually the module-level one, which is
+what counter(), gauge() and the rest register with.  They're meant to be
+cheap enough to update on hot paths: a Counter is just an object with a
+value attribute, and a CounterArray keeps a count for each small integer
+(like an OpenFlow message type) in a preallocated list:
+
+  msgs_in = metrics.counter_array("of_messages_in_total",
+                                  "OpenFlow messages received", "type",
+                                  256, names = of.ofp_type_map)
+  ...
+  msgs_in.counts[ofp_type] += 1
+
+Things which are easier to work out when someone asks can be given a
+function instead of being updated.  Such a function returns the value,
+or if the metric has a label, a dict of label value -> value.
+
+Registry.to_text() gives everything in Prometheus' text format.  The
+web.metrics component serves it over HTTP.
+
+Registering a metric with the name of an existing one replaces it.
+"""
+
+from bisect import bisect_left
+
+
+def _escape (v):
+  return str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format (v):
+  if isinstance(v, float):
+    if v != v: return "NaN"
+    if v == float("inf"): return "+Inf"
+    if v == float("-inf"): return "-Inf"
+    return repr(v)
+  return str(v)
+
+
+class Metric (object):
+  """
+  Superclass for metrics
+
+  Subclasses implement samples().
+  """
+  type = "untyped"
+
+  def __init__ (self, name, help, label = None, func = None):
+    self.name = name
+    self.help = help
+    self.label = label
+    self.func = func
+
+  def samples (self):
+    """
+    Returns a list of (name suffix, labels, value)
+
+    labels is a string like 'type="X"' or None.
+    """
+    raise NotImplementedError()
+
+  def _func_samples (self):
+    v = self.func()
+    if self.label is None: return [('', None, v)]
+    return [('', '%s="%s"' % (self.label, _escape(k)), x)
+            for k,x in sorted(v.iteritems())]
+
+  def to_text (self):
+    lines = ["# HELP %s %s" % (self.name, self.help.replace('\n', ' ')),
+             "# TYPE %s %s" % (self.name, self.type)]
+    for suffix,labels,value in self.samples():
+      if labels:
+        lines.append("%s%s{%s} %s" % (self.name, suffix, labels,
+                                      _format(value)))
+      else:
+        lines.append("%s%s %s" % (self.name, suffix, _format(value)))
+    return "\n".join(lines)
+
+
+class Counter (Metric):
+  """
+  A count of something which only goes up
+  """
+  type = "counter"
+
+  def __init__ (self, name, help, label = None, func = None):
+    if label is not None and func is None:
+      raise ValueError("Labeled counters need a function")
+    super(Counter, self).__init__(name, help, label, func)
+    self.value = 0
+
+  def inc (self, n = 1):
+    self.value += n
+
+  def samples (self):
+    if self.func is not None: return self._func_samples()
+    return [('', None, self.value)]
+
+
+class Gauge (Counter):
+  """
+  A value which can go up or down
+  """
+  type = "gauge"
+
+  def set (self, value):
+    self.value = value
+
+  def dec (self, n = 1):
+    self.value -= n
+
+
+class CounterArray (Metric):
+  """
+  Counters for each of a range of small integers, kept in a list
+
+  names maps the integers to label values (the integers themselves are
+  used for ones not in it).  Only counters which aren't zero are output.
+  """
+  type = "counter"
+
+  def __init__ (self, name, help, label, size, names = None):
+    super(CounterArray, self).__init__(name, help, label)
+    self.counts = [0] * size
+    self.names = names if names is not None else {}
+
+  def inc (self, index, n = 1):
+    self.counts[index] += n
+
+  def samples (self):
+    names = self.names
+    label = self.label
+    return [('', '%s="%s"' % (label, _escape(names.get(i, i))), c)
+            for i,c in enumerate(self.counts) if c]
+
+
+class BucketHistogram (Metric):
+  """
+  Counts of observations in fixed buckets
+
+  buckets are the upper bounds, smallest first; there's another bucket
+  for anything bigger.  (Not to be confused with pox.lib.histogram's
+  Histogram, which keeps log-linear buckets for percentiles.)
+  """
+  type = "histogram"
+
+  DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                     0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+  def __init__ (self, name, help, buckets = DEFAULT_BUCKETS):
+    super(BucketHistogram, self).__init__(name, help)
+    self.buckets = sorted(buckets)
+    self.counts = [0] * (len(self.buckets) + 1)
+    self.sum = 0
+    self.count = 0
+
+  def observe (self, value):
+    self.counts[bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+  def samples (self):
+    r = []
+    total = 0
+    for bound,c in zip(self.buckets, self.counts):
+      total += c
+      r.append(('_bucket', 'le="%s"' % (_format(float(bound)),), total))
+    r.append(('_bucket', 'le="+Inf"', total + self.counts[-1]))
+    r.append(('_sum', None, self.sum))
+    r.append(('_count', None, self.count))
+    return r
+
+
+class Registry (object):
+  def __init__ (self):
+    self._metrics = {} # name -> Metric
+    self._order = [] # names in the order they were registered
+
+  def register (self, metric):
+    if metric.name not in self._metrics:
+      self._order.append(metric.name)
+    self._metrics[metric.name] = metric
+    return metric
+
+  def unregister (self, name):
+    if self._metrics.pop(name, None) is not None:
+      self._order.remove(name)
+
+  def get (self, name, default = None):
+    return self._metrics.get(name, default)
+
+  def __contains__ (self, name):
+    return name in self._metrics
+
+  def __iter__ (self):
+    return (self._metrics[n] for n in list(self._order))
+
+  def to_text (self):
+    """
+    Returns all the metrics in Prometheus' text exposition format
+    """
+    return "".join(m.to_text() + "\n" for m in self)
+
+
+registry = Registry()
+
+
+def counter (name, help, label = None, func = None):
+  return registry.register(Counter(name, help, label, func))
+
+
+def gauge (name, help, label = None, func = None):
+  return registry.register(Gauge(name, help, label, func))
+
+
+def counter_array (name, help, label, size, names = None):
+  return registry.register(CounterArray(name, help, label, size, names))
+
+
+def bucket_histogram (name, help, buckets = BucketHistogram.DEFAULT_BUCKETS):
+  return registry.register(BucketHistogram(name, help, buckets))
@@ -16,6 +16,8 @@ from __future__ import print_function
 from collections import deque
 from Queue import PriorityQueue
 from Queue import Queue
+from heapq import heappush, heappop, heapify
+import itertools
 import time
 import threading
 from threading import Thread
@@ -24,9 +26,9 @@ import traceback
 import os
 import socket
 import pox.lib.util
-import random
 from types import GeneratorType
 from pox.lib.epoll_select import EpollSelect
+from pox.lib.event_loop import EventLoop
 
 #TODO: Need a way to redirect the prints in here to something else (the log).
 
@@ -36,6 +38,13 @@ CYCLE_MAXIMUM = 2
 # moment.
 ABORT = object()
 
+# Some Task priorities.  Priorities are weights: when tasks with different
+# priorities are all ready, each priority gets a share of the time slices
+# proportional to its priority.
+PRIORITY_BULK = 0.1     # Background work (e.g., polling stats)
+PRIORITY_NORMAL = 1
+PRIORITY_LATENCY = 10   # Work that other things are waiting on (e.g., I/O)
+
 defaultScheduler = None
 
 nextTaskID = 0
@@ -47,7 +56,10 @@ def generateTaskID ():
 class BaseTask  (object):
   id = None
   #running = False
-  priority = 1
+  priority = PRIORITY_NORMAL
+
+  # True while in a scheduler's ready queue
+  scheduled = False
 
   @classmethod
   def new (cls, *args, **kw):
@@ -133,21 +145,173 @@ class Task (BaseTask):
     return "<" + self.__class__.__name__ + "/tid" + str(self.name) + ">"
 
 
+class ReadyQueue (object):
+  """
+  A Scheduler's queue of Tasks which are ready to run
+
+  There's a FIFO for each priority, and we pick between them with stride
+  scheduling: each priority has a "pass" which advances by 1/priority each
+  time one of its tasks runs, and the one with the lowest pass goes next.
+  This is deterministic, and a priority which has had nothing ready
+  doesn't get to bank time for later.
+
+  Tasks put in with first=True run before all others.
+
+  Tasks may be appended from any thread, but only the scheduler's thread
+  should pop them.
+
+  Usually only one priority has anything ready, so we keep a list of the
+  levels which may have tasks and only look at those.  Appending adds a
+  level to it; popping takes out ones it finds empty (and then checks
+  again, in case another thread appended in the meantime).
+  """
+  class _Level (object):
+    __slots__ = ['priority', 'stride', 'tasks', 'pass_', 'active']
+    def __init__ (self, priority):
+      self.priority = priority
+      if priority > 0:
+        self.stride = 1.0 / priority
+      else:
+        self.stride = 1e9 # Only when there's nothing else
+      self.tasks = deque()
+      self.pass_ = 0.0
+      self.active = False # In the active list
+
+  def __init__ (self):
+    self._first = deque()
+    self._levels = {} # priority -> _Level
+    self._level_list = [] # For iterating while other threads add levels
+    self._level_lock = threading.Lock()
+    self._active = [] # Levels which may have tasks (may hold duplicates)
+    self._vtime = 0.0 # Pass of the level we last picked
+
+  def __len__ (self):
+    n = len(self._first)
+    for l in self._level_list:
+      n += len(l.tasks)
+    return n
+
+  def __nonzero__ (self):
+    if self._first: return True
+    for l in self._active:
+      if l.tasks: return True
+    return False
+
+  def __contains__ (self, task):
+    return task.scheduled
+
+  def _level (self, priority):
+    l = self._levels.get(priority)
+    if l is None:
+      with self._level_lock:
+        l = self._levels.get(priority)
+        if l is None:
+          l = self._Level(priority)
+          l.pass_ = self._vtime
+          self._level_list.append(l)
+          self._levels[priority] = l
+    return l
+
+  def append (self, task):
+    task.scheduled = True
+    try:
+      l = self._levels[task.priority]
+    except KeyError:
+      l = self._level(task.priority)
+    l.tasks.append(task)
+    if not l.active:
+      l.active = True
+      self._active.append(l)
+
+  def appendleft (self, task):
+    task.scheduled = True
+    self._first.append(task)
+
+  def popleft (self):
+    """
+    Removes and returns the next task to run
+
+    Raises IndexError if there isn't one.
+    """
+    if self._first:
+      t = self._first.popleft()
+      t.scheduled = False
+      return t
+
+    active = self._active
+    if len(active) == 1:
+      # Nothing to pick between.  Passes only matter relative to each
+      # other, so they can stay where they are until another level shows
+      # up (at which point it starts at _vtime, alongside this one).
+      l = active[0]
+      if l.tasks:
+        t = l.tasks.popleft()
+        t.scheduled = False
+        return t
+
+    best = None
+    vtime = self._vtime
+    best_pass = None
+    empty = None
+    for l in active:
+      if not l.tasks:
+        if empty is None: empty = []
+        empty.append(l)
+        continue
+      p = l.pass_
+      if p < vtime:
+        # It's been idle; it doesn't get to catch up
+        p = l.pass_ = vtime
+      if best is None or p < best_pass:
+        best = l
+        best_pass = p
+    if empty is not None:
+      for l in empty:
+        if l not in active: continue # Duplicate we already removed
+        l.active = False
+        active.remove(l)
+        if l.tasks and not l.active:
+          # Someone appended since we looked
+          l.active = True
+          active.append(l)
+    if best is None:
+      raise IndexError("no ready tasks")
+
+    self._vtime = best_pass
+    best.pass_ = best_pass + best.stride
+    t = best.tasks.popleft()
+    t.scheduled = False
+    return t
+
+
 class Scheduler (object):
   """ Scheduler for Tasks """
 
   def __init__ (self, isDefaultScheduler = None, startInThread = True,
-                daemon = False, use_epoll=False, threaded_selecthub = True):
+                daemon = False, use_epoll=False, threaded_selecthub = True,
+                event_loop = None):
+    """
+    event_loop is an EventLoop to run tasks on (see LoopHub), or True to
+    make one.  The default is to use a SelectHub.
+    """
 
-    self._ready = deque()
+    self._ready = ReadyQueue()
     self._hasQuit = False
 
-    self._selectHub = SelectHub(self, use_epoll=use_epoll,
-                                threaded=threaded_selecthub)
+    self.event_loop = None
+    if event_loop:
+      if event_loop is True:
+        event_loop = EventLoop(use_epoll = use_epoll or None)
+      self.event_loop = event_loop
+      self._selectHub = LoopHub(self, event_loop)
+    else:
+      self._selectHub = SelectHub(self, use_epoll=use_epoll,
+                                  threaded=threaded_selecthub)
     self._thread = None
 
     self._lock = threading.Lock()
     self._callLaterTask = None
+    self._localCalls = LocalCalls()
     self._allDone = False
 
     global defaultScheduler
@@ -169,6 +333,14 @@ class Scheduler (object):
     a co-op-thread-safe manner.
     """
 
+    if threading.current_thread() is self._thread:
+      # Already in the scheduler, so no need to go through the pinger
+      calls = self._localCalls
+      calls.calls.append((func,args,kw))
+      if not calls.scheduled:
+        self._ready.append(calls)
+      return
+
     with self._lock:
       if self._callLaterTask is None:
         self._callLaterTask = CallLaterTask()
@@ -176,6 +348,19 @@ class Scheduler (object):
 
     self._callLaterTask.callLater(func, *args, **kw)
 
+  def callDelayed (_self, _seconds, _func, *args, **kw):
+    # Underscores in case the user wants to pass func as a keyword argument
+    """
+    Calls func with the given arguments in the given number of seconds
+
+    Returns a DelayedCall, which you can cancel().  This is much lighter
+    than a Timer, but is only for one-shot calls.  Can be called from any
+    thread.
+    """
+    dc = DelayedCall(_func, args, kw, time.time() + _seconds)
+    _self._selectHub.registerCall(dc)
+    return dc
+
   def runThreaded (self, daemon = False):
     self._thread = Thread(target = self.run)
     self._thread.daemon = daemon
@@ -197,9 +382,7 @@ class Scheduler (object):
     if threading.current_thread() is self._thread:
       # We're know we're good.
       #TODO: Refactor the following with ScheduleTask
-      if task in self._ready:
-        # It might make sense to keep a flag on the task, since checking
-        # if it's in the ready list is not very efficient.
+      if task.scheduled:
         # Not sure if it makes sense to print out a message here or not.
         import logging
         logging.getLogger("recoco").info("Task %s scheduled multiple " +
@@ -233,7 +416,7 @@ class Scheduler (object):
     """
 
     # Sanity check.  Won't catch all cases.
-    assert task not in self._ready
+    assert not task.scheduled
 
     if first:
       self._ready.appendleft(task)
@@ -246,12 +429,27 @@ class Scheduler (object):
     self._hasQuit = True
 
   def run (self):
+    if self._thread is None:
+      # We're being run directly rather than by runThreaded()
+      self._thread = threading.current_thread()
+    hub = self._selectHub
+    # Slices left before a reactor-mode SelectHub should check for IO
+    burst = 0
     try:
       while self._hasQuit == False:
-        if len(self._ready) == 0:
-          self._selectHub.idle()
-          if self._hasQuit: break
-        r = self.cycle()
+        if burst <= 0:
+          if not self._ready:
+            hub.idle()
+            if self._hasQuit: break
+          elif hub.reactor:
+            # Tasks have been ready for a whole round; don't let them starve
+            # IO and timers.
+            hub.poll()
+          burst = len(self._ready)
+        burst -= 1
+        if not self.cycle():
+          # Nothing was ready
+          burst = 0
     finally:
       #print("Scheduler done")
       self._hasQuit = True
@@ -261,16 +459,9 @@ class Scheduler (object):
   def cycle (self):
     #if len(self._ready) == 0: return False
 
-    # Patented hilarious priority system
-    #TODO: Replace it with something better
-    t = None
+    # See ReadyQueue for how priorities work
     try:
-      while True:
-        t = self._ready.popleft()
-        if t.priority >= 1: break
-        if len(self._ready) == 0: break
-        if t.priority >= random.random(): break
-        self._ready.append(t)
+      t = self._ready.popleft()
     except IndexError:
       return False
 
@@ -581,6 +772,13 @@ class SelectHub (object):
   """
   This class is a single select() loop that handles all Select() requests for
   a scheduler as well as timed wakes (i.e., Sleep()).
+
+  If threaded, select() runs on its own thread, and every registration and
+  every wakeup is a trip between that thread and the scheduler's.  If not,
+  it's a reactor: select() runs on the scheduler's thread when it has
+  nothing else to do, and registrations made on that thread go straight
+  into the table.  The pinger is then only used when some other thread
+  wakes a task.
   """
   def __init__ (self, scheduler, use_epoll=False, threaded=True):
     # We store tuples of (elapse-time, task)
@@ -595,7 +793,15 @@ class SelectHub (object):
 
     self._tasks = {}
 
+    # Heap of (wake time, sequence number, entry in _tasks or DelayedCall).
+    # Entries which have since been removed from _tasks and cancelled
+    # DelayedCalls are skipped when they come up.
+    self._timers = []
+    self._timer_seq = itertools.count()
+    self._compact_at = 64
+
     self._thread = None
+    self.reactor = not threaded
     if threaded:
       self._thread = Thread(target = self._threadProc)
       self._thread.daemon = True
@@ -618,13 +824,22 @@ class SelectHub (object):
       # We're running select on the same thread as scheduler
       self._select(self._tasks, {})
 
+  def poll (self):
+    """
+    Handles any IO and timers which are ready without blocking
+
+    Only for reactor mode.
+    """
+    self._select(self._tasks, {}, block = False)
+
   def break_idle (self):
     """
     Break a call to idle()
     """
     if self._thread:
       self._event.set()
-    else:
+    elif threading.current_thread() is not self._scheduler._thread:
+      # The scheduler may be blocked in select()
       self._cycle()
 
   def _threadProc (self):
@@ -636,7 +851,63 @@ class SelectHub (object):
     while not _scheduler._hasQuit:
       _select(tasks, rets)
 
-  def _select (self, tasks, rets):
+  def _add (self, entry):
+    if type(entry) is DelayedCall:
+      self._add_timer(entry.when, entry)
+      return
+    task = entry[0]
+    assert task not in self._tasks
+    self._tasks[task] = entry
+    if entry[4] is not None:
+      self._add_timer(entry[4], entry)
+
+  def _live (self, entry):
+    if type(entry) is DelayedCall:
+      return not entry.cancelled
+    return self._tasks.get(entry[0]) is entry
+
+  def _add_timer (self, when, entry):
+    timers = self._timers
+    if len(timers) > self._compact_at:
+      # Mostly entries for tasks that were woken by IO before they timed
+      # out (like a Select() with a timeout in a busy loop) and cancelled
+      # calls
+      live = self._live
+      timers = [t for t in timers if live(t[2])]
+      heapify(timers)
+      self._timers = timers
+      self._compact_at = 4 * len(timers) + 64
+    heappush(timers, (when, next(self._timer_seq), entry))
+
+  def _expire (self, tasks, now):
+    """
+    Wakes tasks whose timeouts have passed
+
+    Returns the time until the next timeout (or None if there isn't one).
+    """
+    timers = self._timers
+    while timers:
+      when,_,entry = timers[0]
+      if type(entry) is DelayedCall:
+        if entry.cancelled:
+          heappop(timers)
+          continue
+        if when > now: return when - now
+        heappop(timers)
+        self._scheduler.fast_schedule(entry)
+        continue
+      task = entry[0]
+      if tasks.get(task) is not entry:
+        # Woken some other way since
+        heappop(timers)
+        continue
+      if when > now: return when - now
+      heappop(timers)
+      del tasks[task]
+      self._return(task, ([],[],[]))
+    return None
+
+  def _select (self, tasks, rets, block = True):
     #print("SelectHub cycle")
 
     #NOTE: Everything you select on eventually boils down to file descriptors,
@@ -647,29 +918,9 @@ class SelectHub (object):
     wl = {}
     xl = {}
 
-    timeout = None
-    timeoutTask = None
+    timeout = self._expire(tasks, time.time())
 
-    now = time.time()
-
-    expired = None
-
-    #TODO: Fix this.  It's pretty expensive.  There had been some code which
-    #      priority heaped this, but I don't think a fully working version
-    #      ever quite made it.
     for t,trl,twl,txl,tto in tasks.itervalues():
-      if tto != None:
-        if tto <= now:
-          # Already expired
-          if expired is None: expired = []
-          expired.append(t)
-          if tto-now > 0.1: print("preexpired",tto,now,tto-now)
-          continue
-        tt = tto - now
-        if tt < timeout or timeout is None:
-          timeout = tt
-          timeoutTask = t
-
       if trl:
         for i in trl: rl[i] = t
       if twl:
@@ -677,33 +928,21 @@ class SelectHub (object):
       if txl:
         for i in txl: xl[i] = t
 
-    if expired:
-      for t in expired:
-        del tasks[t]
-        self._return(t, ([],[],[]))
-
     if timeout is None: timeout = CYCLE_MAXIMUM
+    if not block or (self.reactor and self._scheduler._ready):
+      # (If we just woke something, it's ready to go now)
+      timeout = 0
     ro, wo, xo = self._select_func( rl.keys() + [self._pinger],
                                     wl.keys(),
                                     xl.keys(), timeout )
 
-    if len(ro) == 0 and len(wo) == 0 and len(xo) == 0 and timeoutTask != None:
-      # IO is idle - dispatch timers / release timeouts
-      del tasks[timeoutTask]
-      self._return(timeoutTask, ([],[],[]))
-    else:
+    if ro or wo or xo:
       # We have IO events
       if self._pinger in ro:
         self._pinger.pongAll()
         while not self._incoming.empty():
-          stuff = self._incoming.get(True)
-          task = stuff[0]
-          assert task not in tasks
-          tasks[task] = stuff
+          self._add(self._incoming.get(True))
           self._incoming.task_done()
-        if len(ro) == 1 and len(wo) == 0 and len(xo) == 0:
-          # Just recycle
-          return
         ro.remove(self._pinger)
 
       # At least one thread is going to be resumed
@@ -725,13 +964,31 @@ class SelectHub (object):
         self._return(t, v)
       rets.clear()
 
+    # Dispatch timers / release timeouts
+    self._expire(tasks, time.time())
+
   def registerSelect (self, task, rlist = None, wlist = None, xlist = None,
                       timeout = None, timeIsAbsolute = False):
     if not timeIsAbsolute:
       if timeout != None:
         timeout += time.time()
 
-    self._incoming.put((task, rlist, wlist, xlist, timeout))
+    entry = (task, rlist, wlist, xlist, timeout)
+    if self.reactor and threading.current_thread() is self._scheduler._thread:
+      # We're on the thread that runs select(), so no handoff needed
+      self._add(entry)
+      return
+    self._incoming.put(entry)
+    self._cycle()
+
+  def registerCall (self, call):
+    """
+    Schedules a DelayedCall to run at its time
+    """
+    if self.reactor and threading.current_thread() is self._scheduler._thread:
+      self._add(call)
+      return
+    self._incoming.put(call)
     self._cycle()
 
   def _cycle (self):
@@ -754,6 +1011,173 @@ class SelectHub (object):
     self._scheduler.fast_schedule(sleepingTask)
 
 
+class LoopHub (object):
+  """
+  Does SelectHub's job on top of an EventLoop
+
+  Tasks' Select()s and Sleep()s become reader/writer callbacks and timers
+  on the loop, which runs on the scheduler's thread whenever the scheduler
+  is idle (like the reactor SelectHub).  Other code can use the same loop
+  (it's the scheduler's event_loop attribute), and its callbacks run in
+  the co-operative context.
+
+  File descriptors stay registered with the loop between a task's
+  Select()s, so a task that keeps selecting on the same sockets doesn't
+  cost a system call per socket per wakeup.  Like EpollSelect, we don't
+  do anything for xlist; errors show up as readable or writable.
+  """
+  reactor = True
+
+  def __init__ (self, scheduler, loop = None):
+    self._scheduler = scheduler
+    if loop is None: loop = EventLoop()
+    self.loop = loop
+
+    self._tasks = {} # task -> (read fds, write fds, timer handle)
+
+    # fd -> (task, file) for current Select()s
+    self._rmap = {}
+    self._wmap = {}
+    # fd -> file registered with the loop (which may be for a finished
+    # Select that will be reused)
+    self._robjs = {}
+    self._wobjs = {}
+    self._stale = set() # fds which may no longer be wanted
+
+    self._rets = {} # task -> select()-style return value
+
+  def idle (self):
+    """
+    Runs the loop until something happens (up to CYCLE_MAXIMUM)
+    """
+    self._run(0 if self._scheduler._ready else CYCLE_MAXIMUM)
+
+  def poll (self):
+    """
+    Handles any IO and timers which are ready without blocking
+    """
+    self._run(0)
+
+  def _run (self, timeout):
+    if self._stale: self._prune()
+    self.loop.run_once(timeout)
+    if self._rets:
+      rets = self._rets
+      self._rets = {}
+      for task,rv in rets.iteritems():
+        self._finish(task)
+        self._return(task, rv)
+
+  def _prune (self):
+    loop = self.loop
+    for fd in self._stale:
+      if fd not in self._rmap and self._robjs.pop(fd, None) is not None:
+        loop.remove_reader(fd)
+      if fd not in self._wmap and self._wobjs.pop(fd, None) is not None:
+        loop.remove_writer(fd)
+    self._stale.clear()
+
+  def break_idle (self):
+    if threading.current_thread() is not self._scheduler._thread:
+      self._cycle()
+
+  def _cycle (self):
+    self.loop.wakeup()
+
+  def _watch (self, task, files, fmap, objs, add, remove, callback):
+    """
+    Watches files for the task, and returns their fds
+    """
+    fds = []
+    for f in files:
+      fd = f if isinstance(f, (int, long)) else f.fileno()
+      fds.append(fd)
+      fmap[fd] = (task, f)
+      old = objs.get(fd)
+      if old is f: continue
+      if old is not None:
+        # Number reused by a new file
+        remove(fd)
+      objs[fd] = f
+      add(fd, callback, fd)
+    return fds
+
+  def _register (self, task, rlist, wlist, timeout):
+    assert task not in self._tasks
+    loop = self.loop
+    rfds = wfds = ()
+    if rlist:
+      rfds = self._watch(task, rlist, self._rmap, self._robjs,
+                         loop.add_reader, loop.remove_reader, self._readable)
+    if wlist:
+      wfds = self._watch(task, wlist, self._wmap, self._wobjs,
+                         loop.add_writer, loop.remove_writer, self._writable)
+    timer = None
+    if timeout is not None:
+      timer = loop.call_at(timeout, self._timed_out, task)
+    self._tasks[task] = (rfds, wfds, timer)
+
+  def _finish (self, task):
+    rfds,wfds,timer = self._tasks.pop(task)
+    if timer is not None: timer.cancel()
+    stale = self._stale
+    for fds,fmap in ((rfds, self._rmap), (wfds, self._wmap)):
+      for fd in fds:
+        e = fmap.get(fd)
+        if e is not None and e[0] is task:
+          del fmap[fd]
+          stale.add(fd)
+
+  def _rv (self, task):
+    rv = self._rets.get(task)
+    if rv is None:
+      rv = self._rets[task] = ([],[],[])
+    return rv
+
+  def _readable (self, fd):
+    e = self._rmap.get(fd)
+    if e is not None: self._rv(e[0])[0].append(e[1])
+
+  def _writable (self, fd):
+    e = self._wmap.get(fd)
+    if e is not None: self._rv(e[0])[1].append(e[1])
+
+  def _timed_out (self, task):
+    if task in self._tasks: self._rv(task)
+
+  def _call_due (self, call):
+    if not call.cancelled:
+      self._scheduler.fast_schedule(call)
+
+  def _add_call (self, call):
+    self.loop.call_at(call.when, self._call_due, call)
+
+  def registerSelect (self, task, rlist = None, wlist = None, xlist = None,
+                      timeout = None, timeIsAbsolute = False):
+    if not timeIsAbsolute:
+      if timeout != None:
+        timeout += time.time()
+    if threading.current_thread() is self._scheduler._thread:
+      self._register(task, rlist, wlist, timeout)
+    else:
+      self.loop.call_soon_threadsafe(self._register, task, rlist, wlist,
+                                     timeout)
+
+  def registerCall (self, call):
+    if threading.current_thread() is self._scheduler._thread:
+      self._add_call(call)
+    else:
+      self.loop.call_soon_threadsafe(self._add_call, call)
+
+  def registerTimer (self, task, timeToWake, timeIsAbsolute = False):
+    return self.registerSelect(task, None, None, None, timeToWake,
+                               timeIsAbsolute)
+
+  def _return (self, sleepingTask, returnVal):
+    sleepingTask.rv = returnVal
+    self._scheduler.fast_schedule(sleepingTask)
+
+
 class ScheduleTask (BaseTask):
   """
   If multiple real threads (such as a recoco scheduler thread and any
@@ -773,9 +1197,7 @@ class ScheduleTask (BaseTask):
 
   def run (self):
     #TODO: Refactor the following, since it is copy/pasted from schedule().
-    if self._task in self._scheduler._ready:
-      # It might make sense to keep a flag on the task, since checking
-      # if it's in the ready list is not very efficient.
+    if self._task.scheduled:
       # Not sure if it makes sense to print out a message here or not.
       import logging
       logging.getLogger("recoco").info("Task %s scheduled multiple " +
@@ -876,6 +1298,73 @@ class Timer (Task):
     yield False # Quit
 
 
+class DelayedCall (object):
+  """
+  A function call to be made from within a scheduler
+
+  Returned by Scheduler.callDelayed().  Unlike a Timer, this isn't a Task:
+  it sits in the SelectHub's timer heap until it's due and then goes in
+  the ready queue, where the scheduler runs it like a task that finishes
+  in one slice.
+  """
+  __slots__ = ['func', 'args', 'kw', 'when', 'cancelled', 'scheduled',
+               'priority']
+
+  def __init__ (self, func, args = (), kw = {}, when = None):
+    assert callable(func)
+    self.func = func
+    self.args = args
+    self.kw = kw
+    self.when = when
+    self.cancelled = False
+    self.scheduled = False
+    self.priority = PRIORITY_NORMAL
+
+  def cancel (self):
+    self.cancelled = True
+
+  def execute (self):
+    if not self.cancelled:
+      self.cancelled = True # So cancel() after it's run is harmless
+      try:
+        self.func(*self.args, **self.kw)
+      except:
+        import logging
+        logging.getLogger("recoco").exception("Exception calling %s",
+                                              self.func)
+    return False
+
+  def __repr__ (self):
+    return "<DelayedCall %s>" % (self.func,)
+
+
+class LocalCalls (object):
+  """
+  callLater()s made from within the scheduler
+
+  Goes in the ready queue itself (rather than a DelayedCall per call)
+  so that a burst of calls is run in one slice.
+  """
+  __slots__ = ['calls', 'scheduled', 'priority']
+
+  def __init__ (self):
+    self.calls = deque()
+    self.scheduled = False
+    self.priority = PRIORITY_NORMAL
+
+  def execute (self):
+    calls = self.calls
+    # Only the ones we have now; calls made by these wait their turn
+    for i in xrange(len(calls)):
+      func,args,kw = calls.popleft()
+      try:
+        func(*args, **kw)
+      except:
+        import logging
+        logging.getLogger("recoco").exception("Exception calling %s", func)
+    return False
+
+
 class CallLaterTask (BaseTask):
   def __init__ (self):
     BaseTask.__init__(self)
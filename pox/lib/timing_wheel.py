@@ -0,0 +1,119 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A bucketed timing wheel for tracking expiration of many items
+
+Lots of components keep a table of things (links, hosts, flows) which
+expire if they haven't been refreshed recently.  The obvious way to do
+this is to keep a timestamp for each entry and periodically scan the whole
+table, which gets expensive when the table is big but hardly anything is
+actually expiring.
+
+A TimingWheel instead files each key into a bucket according to when it
+expires (rounded to some granularity).  Refreshing a key moves it between
+buckets, and expiring only looks at buckets whose time has passed, so the
+cost is proportional to the number of keys actually expiring.
+"""
+
+import time
+
+
+class TimingWheel (object):
+  """
+  Tracks expiration times for a collection of hashable keys
+
+  Keys expire at most one granularity period late (never early).
+  """
+  def __init__ (self, granularity = 1.0, now = None):
+    if now is None: now = time.time()
+    self.granularity = float(granularity)
+    self._buckets = {} # slot -> set of keys
+    self._slots = {} # key -> slot
+    self._cursor = self._slot_for(now) # First slot not yet expired
+
+  def _slot_for (self, when):
+    return int(when // self.granularity)
+
+  def __len__ (self):
+    return len(self._slots)
+
+  def __contains__ (self, key):
+    return key in self._slots
+
+  def __iter__ (self):
+    return iter(self._slots)
+
+  def set (self, key, expires_at):
+    """
+    Sets (or resets) the time at which key expires
+
+    Returns True if the key was not previously in the wheel.
+    """
+    slot = self._slot_for(expires_at)
+    if slot < self._cursor: slot = self._cursor
+    old = self._slots.get(key)
+    if old == slot: return False
+    if old is not None:
+      b = self._buckets[old]
+      b.discard(key)
+      if not b: del self._buckets[old]
+    self._slots[key] = slot
+    b = self._buckets.get(slot)
+    if b is None:
+      b = set()
+      self._buckets[slot] = b
+    b.add(key)
+    return old is None
+
+  def remove (self, key):
+    """
+    Stops tracking key
+
+    Returns True if it was being tracked.
+    """
+    slot = self._slots.pop(key, None)
+    if slot is None: return False
+    b = self._buckets[slot]
+    b.discard(key)
+    if not b: del self._buckets[slot]
+    return True
+
+  def clear (self):
+    self._buckets.clear()
+    self._slots.clear()
+
+  def expire (self, now = None):
+    """
+    Removes and returns a list of keys which have expired
+    """
+    if now is None: now = time.time()
+    current = self._slot_for(now)
+    if current <= self._cursor: return []
+
+    if current - self._cursor > len(self._buckets):
+      # Been a while; cheaper to look at the occupied buckets
+      slots = sorted(s for s in self._buckets if s < current)
+    else:
+      slots = xrange(self._cursor, current)
+    self._cursor = current
+
+    expired = []
+    for slot in slots:
+      b = self._buckets.pop(slot, None)
+      if not b: continue
+      for key in b:
+        del self._slots[key]
+      expired.extend(b)
+    return expired
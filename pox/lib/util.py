@@ -163,6 +163,46 @@ class DefaultDict (collections.defaultdict):
     return v
 
 
+class TokenBucket (object):
+  """
+  A token bucket for rate limiting
+
+  Holds up to burst tokens, which are replenished at rate tokens per
+  second.  Each thing you want to limit consumes a token (or more).
+  """
+  def __init__ (self, rate, burst = None, now = None):
+    if burst is None: burst = rate
+    self.rate = float(rate)
+    self.burst = float(burst)
+    self.tokens = self.burst
+    self._last = time.time() if now is None else now
+
+  def _refill (self, now):
+    if now is None: now = time.time()
+    elapsed = now - self._last
+    if elapsed > 0:
+      self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+    self._last = now
+
+  def consume (self, count = 1, now = None):
+    """
+    Tries to take count tokens
+
+    Returns True if there were enough (in which case they're used up).
+    """
+    self._refill(now)
+    if self.tokens < count: return False
+    self.tokens -= count
+    return True
+
+  def available (self, now = None):
+    """
+    Returns the number of whole tokens currently available
+    """
+    self._refill(now)
+    return int(self.tokens)
+
+
 def set_extend (l, index, item, emptyValue = None):
   """
   Sets l[index] = item, padding l if needed
@@ -61,7 +61,15 @@ def launch (__INSTANCE__ = None, **kw):
   it is used for the default logger.
   If a --format is specified, you can also specify a --datefmt="<str>"
   where the string is a strftime format string for date/time stamps.
+
+  --async[=<queue size>] moves all the handlers set up so far (including
+  the ones from this invocation) behind an AsyncHandler, so that logging
+  doesn't wait for them to write (see pox.log.async_handler).  Messages
+  logged more than --async_rate times a second (default 100, 0 for no
+  limit) are suppressed.
   """
+  async = kw.pop("async", None)
+  async_rate = kw.pop("async_rate", 100)
 
   if 'format' in kw:
     df = kw.pop("datefmt", None)
@@ -146,3 +154,16 @@ def launch (__INSTANCE__ = None, **kw):
       standard(use_kw, v, HTTPHandler)
     else:
       raise TypeError("Invalid argument: " + _k)
+
+  if async:
+    from pox.log.async_handler import make_async
+    import pox.lib.metrics as metrics
+    args = dict(rate = int(async_rate))
+    if async is not True: args['size'] = int(async)
+    h = make_async(**args)
+    metrics.counter("pox_log_dropped_total",
+                    "Log messages dropped because the log queue was full",
+                    func = lambda: h.dropped)
+    metrics.counter("pox_log_suppressed_total",
+                    "Log messages suppressed by rate limiting",
+                    func = lambda: h.suppressed)
@@ -0,0 +1,223 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A log handler which hands records to a thread to write
+
+Normally, whoever logs something waits while it's formatted and written
+to the terminal or file -- which is bad news when that's the scheduler
+thread in the middle of a PacketIn storm.  An AsyncHandler just puts the
+record in a queue (a deque, which doesn't need a lock) and returns.  A
+writer thread wakes up every so often, takes everything in the queue,
+and hands it to the real handlers, writing each stream's batch with one
+write() and one flush().
+
+If the queue fills up, new records are dropped (and counted; the writer
+logs how many).  Also, once a message (the same format string from the
+same logger) has been logged rate times in a second, more of it that
+second are suppressed (and counted, and reported).
+
+Since records are formatted on the writer thread, the objects in their
+arguments are turned into strings there, a little later.
+
+Usually set up with "./pox.py log --async", which moves all the root
+logger's handlers behind one of these.
+"""
+
+import logging
+import threading
+import time
+import atexit
+from collections import deque
+
+
+class AsyncHandler (logging.Handler):
+  def __init__ (self, handlers = (), size = 10000, rate = 100,
+                interval = 0.05):
+    """
+    handlers are the ones that actually write the records
+
+    size is how many records can be waiting.  rate is how many times a
+    message can be logged per second before it's suppressed (0 for no
+    limit).  The writer checks for records every interval seconds.
+    """
+    logging.Handler.__init__(self)
+    self.handlers = list(handlers)
+    self.size = size
+    self.rate = rate
+    self.interval = interval
+    self.dropped = 0 # Total records dropped because the queue was full
+    self.suppressed = 0 # Total records suppressed by rate limiting
+    self._queue = deque()
+    self._limits = {} # (logger name, msg) -> [second, count, unreported]
+    self._unreported_drops = 0
+    self._running = True
+    self._thread = threading.Thread(target = self._run, name = "AsyncLog")
+    self._thread.daemon = True
+    self._thread.start()
+    atexit.register(self.close)
+
+  def createLock (self):
+    # Not used by emit(), so don't bother
+    self.lock = None
+
+  def handle (self, record):
+    # The filtering and locking are up to the real handlers
+    self.emit(record)
+    return 1
+
+  def emit (self, record):
+    try:
+      if self.rate and self._limited(record): return
+
+      if len(self._queue) >= self.size:
+        self.dropped += 1
+        self._unreported_drops += 1
+        return
+      if record.exc_info:
+        # Don't keep the traceback (and everything it refers to) around
+        record.exc_text = _formatter.formatException(record.exc_info)
+        record.exc_info = None
+      self._queue.append(record)
+    except Exception:
+      self.handleError(record)
+
+  def _limited (self, record):
+    """
+    Returns True if record should be suppressed by rate limiting
+    """
+    key = (record.name, record.msg)
+    now = int(record.created)
+    try:
+      l = self._limits.get(key)
+    except TypeError:
+      # Unhashable msg (someone logged a list or something); don't limit
+      return False
+    if l is None:
+      self._limits[key] = [now, 1, 0]
+    elif l[0] != now:
+      l[0] = now
+      l[1] = 1
+    elif l[1] >= self.rate:
+      l[2] += 1
+      self.suppressed += 1
+      return True
+    else:
+      l[1] += 1
+    return False
+
+  def _report (self):
+    """
+    Returns records saying what was dropped or suppressed
+    """
+    r = []
+    n = self._unreported_drops
+    if n:
+      self._unreported_drops -= n
+      r.append(logging.LogRecord("log", logging.WARNING, __file__, 0,
+          "Log queue full; dropped %s messages", (n,), None))
+    if self.rate:
+      # Entries from before the last second can't limit anything anymore,
+      # so once reported, they're dropped (lots of messages are preformatted
+      # strings which would otherwise pile up here).
+      old = int(time.time()) - 1
+      for key,l in self._limits.items():
+        n = l[2]
+        if n:
+          l[2] -= n
+          r.append(logging.LogRecord(key[0], logging.WARNING, __file__, 0,
+              "Suppressed %s more messages like: %s", (n, key[1]), None))
+        elif l[0] < old:
+          self._limits.pop(key, None)
+    return r
+
+  def flush (self):
+    """
+    Writes everything that's waiting
+    """
+    q = self._queue
+    records = []
+    try:
+      while True:
+        records.append(q.popleft())
+    except IndexError:
+      pass
+    records.extend(self._report())
+    if not records: return
+    for h in self.handlers:
+      try:
+        self._write(h, records)
+      except Exception:
+        pass
+
+  @staticmethod
+  def _write (h, records):
+    records = [r for r in records if r.levelno >= h.level and h.filter(r)]
+    if not records: return
+    if type(h) not in (logging.StreamHandler, logging.FileHandler):
+      # Don't know how to batch for it
+      for r in records:
+        h.handle(r)
+      return
+    lines = []
+    for r in records:
+      try:
+        lines.append(h.format(r))
+      except Exception:
+        h.handleError(r)
+    try:
+      text = "\n".join(lines) + "\n"
+    except UnicodeError:
+      # Mixed unicode and non-ASCII bytes; let the handler sort it out
+      for r in records:
+        h.handle(r)
+      return
+    h.acquire()
+    try:
+      if h.stream is None:
+        h.stream = h._open() # A FileHandler with delay=True
+      h.stream.write(text)
+      h.flush()
+    except Exception:
+      h.handleError(records[0])
+    finally:
+      h.release()
+
+  def _run (self):
+    while self._running:
+      time.sleep(self.interval)
+      self.flush()
+
+  def close (self):
+    if not self._running: return
+    self._running = False
+    self.flush()
+    logging.Handler.close(self)
+
+
+_formatter = logging.Formatter()
+
+
+def make_async (logger = None, **kw):
+  """
+  Moves logger's handlers (the root logger's by default) behind an
+  AsyncHandler, and returns it
+  """
+  if logger is None: logger = logging.getLogger()
+  handlers = list(logger.handlers)
+  h = AsyncHandler(handlers, **kw)
+  for old in handlers:
+    logger.removeHandler(old)
+  logger.addHandler(h)
+  return h
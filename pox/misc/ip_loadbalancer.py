@@ -20,6 +20,12 @@ Run it with --ip=<Service IP> --servers=IP1,IP2,...
 By default, it will do load balancing on the first switch that connects.  If
 you want, you can add --dpid=<dpid> to specify a particular switch.
 
+New connections are assigned to servers using a Maglev-style consistent
+hash of the connection's addresses and ports, so when a server goes up or
+down, only the connections which have to move do.  --table-size sets the
+size of the lookup table (it should be a prime much larger than the number
+of servers).
+
 Please submit improvements. :)
 """
 
@@ -32,11 +38,13 @@ from pox.lib.packet.ipv4 import ipv4
 from pox.lib.packet.arp import arp
 from pox.lib.addresses import IPAddr, EthAddr
 from pox.lib.util import str_to_bool, dpid_to_str, str_to_dpid
+from pox.lib.timing_wheel import TimingWheel
 
 import pox.openflow.libopenflow_01 as of
 
 import time
-import random
+import hashlib
+import struct
 
 FLOW_IDLE_TIMEOUT = 10
 FLOW_MEMORY_TIMEOUT = 60 * 5
@@ -87,22 +95,102 @@ class MemoryEntry (object):
     return self.server,ipp.srcip,tcpp.dstport,tcpp.srcport
 
 
+def _next_prime (n):
+  """
+  Returns the smallest prime which is at least n
+  """
+  n = max(2, n)
+  while True:
+    if n == 2 or (n % 2 and all(n % d for d in xrange(3, int(n ** 0.5) + 1,
+                                                       2))):
+      return n
+    n += 1
+
+
+class MaglevTable (object):
+  """
+  Maps connection keys to servers using Maglev consistent hashing
+
+  Each server gets a pseudorandom permutation of the table's slots, and
+  servers take turns claiming their next preferred free slot until the
+  table is full.  This gives each server a nearly equal share of the table,
+  and adding or removing a server only moves a small fraction of slots.
+  Lookups are a hash and an index.
+
+  size should be prime; if it's not, the next prime up is used.  (With
+  a size that isn't prime, a server's permutation might not visit every
+  slot.)
+  """
+  def __init__ (self, size = 4099, servers = ()):
+    self.size = _next_prime(size)
+    self._table = None
+    self.build(servers)
+
+  def __len__ (self):
+    return len(self.servers)
+
+  @staticmethod
+  def _permutation (server, size):
+    h = hashlib.md5(str(server)).digest()
+    a,b = struct.unpack("!QQ", h)
+    return a % size, b % (size - 1) + 1
+
+  def build (self, servers):
+    """
+    Rebuilds the table for the given servers
+    """
+    self.servers = sorted(servers)
+    if not self.servers:
+      self._table = None
+      return
+    size = self.size
+    perms = [self._permutation(s, size) for s in self.servers]
+    nexts = [0] * len(self.servers)
+    table = [None] * size
+    filled = 0
+    while True:
+      for i,s in enumerate(self.servers):
+        offset,skip = perms[i]
+        c = (offset + nexts[i] * skip) % size
+        while table[c] is not None:
+          nexts[i] += 1
+          c = (offset + nexts[i] * skip) % size
+        table[c] = s
+        nexts[i] += 1
+        filled += 1
+        if filled == size:
+          self._table = table
+          return
+
+  def lookup (self, key):
+    """
+    Returns the server for key (any hashable), or None if no servers
+    """
+    if self._table is None: return None
+    return self._table[hash(key) % self.size]
+
+
 class iplb (object):
   """
   A simple IP load balancer
 
   Give it a service_ip and a list of server IP addresses.  New TCP flows
-  to service_ip will be randomly redirected to one of the servers.
+  to service_ip will be redirected to one of the servers chosen by hashing.
 
   We probe the servers to see if they're alive by sending them ARPs.
   """
-  def __init__ (self, connection, service_ip, servers = []):
+  def __init__ (self, connection, service_ip, servers = [],
+                table_size = 4099):
     self.service_ip = IPAddr(service_ip)
     self.servers = [IPAddr(a) for a in servers]
     self.con = connection
     self.mac = self.con.eth_addr
     self.live_servers = {} # IP -> MAC,port
 
+    # Picks servers for new connections.  Only rebuilt when the set of
+    # live servers changes.
+    self._table = MaglevTable(table_size)
+
     try:
       self.log = log.getChild(dpid_to_str(self.con.dpid))
     except:
@@ -118,9 +206,10 @@ class iplb (object):
     self.arp_timeout = 3
 
     # We remember where we directed flows so that if they start up again,
-    # we can send them to the same server if it's still up.  Alternate
-    # approach: hashing.
+    # we can send them to the same server if it's still up (even if the
+    # hash would now pick a different one).
     self.memory = {} # (srcip,dstip,srcport,dstport) -> MemoryEntry
+    self._memory_expiry = TimingWheel() # Of MemoryEntry
 
     self._do_probe() # Kick off the probing
 
@@ -142,13 +231,22 @@ class iplb (object):
         if ip in self.live_servers:
           self.log.warn("Server %s down", ip)
           del self.live_servers[ip]
+          self._table.build(self.live_servers)
 
     # Expire old flows
-    c = len(self.memory)
-    self.memory = {k:v for k,v in self.memory.items()
-                   if not v.is_expired}
-    if len(self.memory) != c:
-      self.log.debug("Expired %i flows", c-len(self.memory))
+    c = 0
+    for entry in self._memory_expiry.expire(t):
+      for key in (entry.key1, entry.key2):
+        # It may have been replaced by a newer entry
+        if self.memory.get(key) is entry:
+          del self.memory[key]
+      c += 1
+    if c:
+      self.log.debug("Expired %i flows", c)
+
+  def _refresh (self, entry):
+    entry.refresh()
+    self._memory_expiry.set(entry, entry.timeout)
 
   def _do_probe (self):
     """
@@ -194,7 +292,7 @@ class iplb (object):
     """
     Pick a server for a (hopefully) new connection
     """
-    return random.choice(self.live_servers.keys())
+    return self._table.lookup(key)
 
   def _handle_PacketIn (self, event):
     inport = event.port
@@ -222,7 +320,10 @@ class iplb (object):
               pass
             else:
               # Ooh, new server.
+              is_new = arpp.protosrc not in self.live_servers
               self.live_servers[arpp.protosrc] = arpp.hwsrc,inport
+              if is_new:
+                self._table.build(self.live_servers)
               self.log.info("Server %s up", arpp.protosrc)
         return
 
@@ -246,7 +347,7 @@ class iplb (object):
         return drop()
 
       # Refresh time timeout and reinstall.
-      entry.refresh()
+      self._refresh(entry)
 
       #self.log.debug("Install reverse flow for %s", key)
 
@@ -287,7 +388,7 @@ class iplb (object):
         self.memory[entry.key2] = entry
 
       # Update timestamp
-      entry.refresh()
+      self._refresh(entry)
 
       # Set up table entry towards selected server
       mac,port = self.live_servers[entry.server]
@@ -311,8 +412,9 @@ class iplb (object):
 _dpid = None
 
 
-def launch (ip, servers, dpid = None):
+def launch (ip, servers, dpid = None, table_size = 4099):
   global _dpid
+  table_size = int(table_size)
   if dpid is not None:
     _dpid = str_to_dpid(dpid)
 
@@ -348,7 +450,8 @@ def launch (ip, servers, dpid = None):
     else:
       if not core.hasComponent('iplb'):
         # Need to initialize first...
-        core.registerNew(iplb, event.connection, IPAddr(ip), servers)
+        core.registerNew(iplb, event.connection, IPAddr(ip), servers,
+                         table_size = table_size)
         log.info("IP Load Balancer Ready.")
       log.info("Load Balancing on %s", event.connection)
 
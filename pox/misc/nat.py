@@ -38,7 +38,7 @@ from pox.lib.packet.ipv4 import ipv4
 from pox.lib.packet.arp import arp
 import pox.lib.packet as pkt
 
-from pox.lib.addresses import IPAddr
+from pox.lib.addresses import IPAddr, IPNetwork, PrefixTable
 from pox.lib.addresses import EthAddr
 from pox.lib.util import str_to_bool, dpid_to_str, str_to_dpid
 from pox.lib.revent import EventMixin, Event
@@ -50,33 +50,91 @@ from pox.proto.dhcpd import DHCPD, SimpleAddressPool
 
 import time
 import random
+import heapq
+from collections import deque
 
 FLOW_TIMEOUT = 60
 FLOW_MEMORY_TIMEOUT = 60 * 10
 
 
+class PortAllocator (object):
+  """
+  Hands out outside ports for one protocol
+
+  A connection gets to keep its own source port if it's unprivileged and
+  not already taken.  Otherwise, it gets a port from the free list of the
+  dynamic range.  Both cases are O(1).
+  """
+  def __init__ (self, first = 49152, last = 65533):
+    self.first = first
+    self.last = last
+    self._used = set()
+    free = list(range(first, last + 1))
+    random.shuffle(free)
+    self._free = deque(free)
+    self._queued = set(free) # Ports currently in _free
+
+  def __len__ (self):
+    return len(self._used)
+
+  def __contains__ (self, port):
+    return port in self._used
+
+  def allocate (self, preferred = None):
+    """
+    Returns an unused port (preferred if possible) or None if none left
+    """
+    used = self._used
+    if preferred is not None and preferred >= 1024:
+      if preferred not in used:
+        used.add(preferred)
+        return preferred
+
+    free = self._free
+    while free:
+      port = free.popleft()
+      self._queued.discard(port)
+      # It may have been taken as someone's preferred port since
+      if port not in used:
+        used.add(port)
+        return port
+    return None
+
+  def release (self, port):
+    self._used.discard(port)
+    if self.first <= port <= self.last and port not in self._queued:
+      self._queued.add(port)
+      self._free.append(port)
+
+
 class Record (object):
   def __init__ (self):
     self.touch()
-    self.outgoing_match = None
-    self.incoming_match = None
+    self.outgoing_key = None # (proto, srcip, srcport, dstip, dstport)
+    self.incoming_key = None # Same, but as seen on the outside
     self.real_srcport = None
     self.fake_srcport = None
     self.outgoing_fm = None
     self.incoming_fm = None
+    self.dead = False
 
   @property
   def expired (self):
     return time.time() > self._expires_at
 
+  @property
+  def expires_at (self):
+    return self._expires_at
+
   def touch (self):
     self._expires_at = time.time() + FLOW_MEMORY_TIMEOUT
 
   def __str__ (self):
-    s = "%s:%s" % (self.outgoing_match.nw_src, self.real_srcport)
+    k = self.outgoing_key
+    s = "%s:%s" % (k[1], self.real_srcport)
     if self.fake_srcport != self.real_srcport:
       s += "/%s" % (self.fake_srcport,)
-    s += " -> %s:%s" % (self.outgoing_match.nw_dst, self.outgoing_match.tp_dst)
+    s += " -> %s:%s" % (k[3], k[4])
     return s
 
 
@@ -92,19 +150,34 @@ class NAT (object):
     self.dpid = dpid
     self.subnet = subnet
 
+    # Networks we consider to be on the inside
+    if subnet is not None:
+      subnet = IPNetwork(subnet, allow_host = True)
+      self._local_nets = PrefixTable([(subnet, True)])
+    else:
+      self._local_nets = PrefixTable([('192.168.0.0/16', True),
+                                      ('10.0.0.0/8', True),
+                                      ('172.16.0.0/12', True)])
+
     self._outside_portno = None
     self._gateway_eth = None
     self._connection = None
 
-    # Which NAT ports have we used?
-    # proto means TCP or UDP
-    self._used_ports = set() # (proto,port)
+    # Outside ports for each protocol (TCP or UDP)
+    self._ports = {ipv4.TCP_PROTOCOL:PortAllocator(),
+                   ipv4.UDP_PROTOCOL:PortAllocator()}
 
     # Flow records indexed in both directions
-    # match -> Record
+    # 5-tuple key -> Record
     self._record_by_outgoing = {}
     self._record_by_incoming = {}
 
+    # Heap of (expires_at, seq, record).  Records get touched a lot, so
+    # rather than fixing up the heap each time, we just check when they
+    # reach the top and push them back if they've been refreshed.
+    self._expiry = []
+    self._expiry_seq = 0
+
     core.listen_to_dependencies(self)
 
   def _all_dependencies_met (self):
@@ -118,57 +191,47 @@ class NAT (object):
     self.expire_timer = Timer(60, self._expire, recurring = True)
 
   def _expire (self):
-    dead = []
-    for r in self._record_by_outgoing.itervalues():
-      if r.expired:
-        dead.append(r)
-
-    for r in dead:
-      del self._record_by_outgoing[r.outgoing_match]
-      del self._record_by_incoming[r.incoming_match]
-      self._used_ports.remove((r.outgoing_match.nw_proto,r.fake_srcport))
+    now = time.time()
+    expiry = self._expiry
+    dead = 0
+    while expiry and expiry[0][0] < now:
+      _,_,r = heapq.heappop(expiry)
+      if r.dead: continue
+      if r.expires_at >= now:
+        # Touched since it was pushed
+        self._push_expiry(r)
+        continue
+      self._remove_record(r)
+      dead += 1
 
     if dead and not self._record_by_outgoing:
       log.debug("All flows expired")
 
+  def _push_expiry (self, r):
+    self._expiry_seq += 1
+    heapq.heappush(self._expiry, (r.expires_at, self._expiry_seq, r))
+
+  def _remove_record (self, r):
+    r.dead = True
+    del self._record_by_outgoing[r.outgoing_key]
+    del self._record_by_incoming[r.incoming_key]
+    self._ports[r.outgoing_key[0]].release(r.fake_srcport)
+
   def _is_local (self, ip):
     if ip.is_multicast: return True
-    if self.subnet is not None:
-      if ip.in_network(self.subnet): return True
-      return False
-    if ip.in_network('192.168.0.0/16'): return True
-    if ip.in_network('10.0.0.0/8'): return True
-    if ip.in_network('172.16.0.0/12'): return True
-    return False
-
-  def _pick_port (self, flow):
+    return self._local_nets.lookup(ip, False)
+
+  def _pick_port (self, proto, port):
     """
     Gets a possibly-remapped outside port
 
-    flow is the match of the connection
-    returns port (maybe from flow, maybe not)
+    proto and port are the connection's IP protocol and source port
+    returns port (maybe the same one, maybe not) or None
     """
-
-    port = flow.tp_src
-
-    if port < 1024:
-      # Never allow these
-      port = random.randint(49152, 65534)
-
-    # Pretty sloppy!
-
-    cycle = 0
-    while cycle < 2:
-      if (flow.nw_proto,port) not in self._used_ports:
-        self._used_ports.add((flow.nw_proto,port))
-        return port
-      port += 1
-      if port >= 65534:
-        port = 49152
-        cycle += 1
-
-    log.warn("No ports to give!")
-    return None
+    port = self._ports[proto].allocate(port)
+    if port is None:
+      log.warn("No ports to give!")
+    return port
 
   @property
   def _outside_eth (self):
@@ -229,12 +292,10 @@ class NAT (object):
       # Assume we only care about ourselves
       if ipp.dstip != self.outside_ip: return
 
-    match = self.make_match(event.ofp)
+    key = (ipp.protocol, ipp.srcip, tcpp.srcport, ipp.dstip, tcpp.dstport)
 
     if incoming:
-      match2 = match.clone()
-      match2.dl_dst = None # See note below
-      record = self._record_by_incoming.get(match2)
+      record = self._record_by_incoming.get(key)
       if record is None:
         # Ignore for a while
         fm = of.ofp_flow_mod()
@@ -246,12 +307,16 @@ class NAT (object):
       log.debug("%s reinstalled", record)
       record.incoming_fm.data = event.ofp # Hacky!
     else:
-      record = self._record_by_outgoing.get(match)
+      record = self._record_by_outgoing.get(key)
       if record is None:
+        fake_srcport = self._pick_port(ipp.protocol, tcpp.srcport)
+        if fake_srcport is None: return
+
+        match = self.make_match(event.ofp)
         record = Record()
 
         record.real_srcport = tcpp.srcport
-        record.fake_srcport = self._pick_port(match)
+        record.fake_srcport = fake_srcport
 
         # Outside heading in
         fm = of.ofp_flow_mod()
@@ -282,7 +347,8 @@ class NAT (object):
 
         fm.actions.append(of.ofp_action_output(port = event.port))
 
-        record.incoming_match = self.strip_match(fm.match)
+        record.incoming_key = (ipp.protocol, fm.match.nw_src, tcpp.dstport,
+                               self.outside_ip, record.fake_srcport)
         record.incoming_fm = fm
 
         # Inside heading out
@@ -301,11 +367,12 @@ class NAT (object):
         fm.actions.append(of.ofp_action_dl_addr.set_dst(self._gateway_eth))
         fm.actions.append(of.ofp_action_output(port = self._outside_portno))
 
-        record.outgoing_match = self.strip_match(fm.match)
+        record.outgoing_key = key
         record.outgoing_fm = fm
 
-        self._record_by_incoming[record.incoming_match] = record
-        self._record_by_outgoing[record.outgoing_match] = record
+        self._record_by_incoming[record.incoming_key] = record
+        self._record_by_outgoing[record.outgoing_key] = record
+        self._push_expiry(record)
 
         log.debug("%s installed", record)
       else:
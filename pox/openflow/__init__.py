@@ -35,6 +35,7 @@ NOTE: This module is usually automatically loaded by pox.py
 
 from pox.lib.revent import *
 from pox.lib.util import dpidToStr
+import pox.lib.metrics as metrics
 import libopenflow_01 as of
 from pox.lib.packet.ethernet import ethernet
 
@@ -425,9 +426,16 @@ class OpenFlowNexus (EventMixin):
   # Enable/Disable clearing of flows on switch connect
   clear_flows_on_connect = True
 
+  # If set, its admit(connection, ofp) decides whether PacketIns are raised
+  # (see openflow.packet_in_limiter)
+  packet_in_limiter = None
+
   def __init__ (self):
     self._connections = ConnectionDict() # DPID -> Connection
 
+    metrics.gauge("pox_openflow_connections", "Connected switches",
+                  func = lambda: len(self._connections))
+
     from pox.core import core
 
     self.listenTo(core)
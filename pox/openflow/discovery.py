@@ -26,6 +26,7 @@ Discovery module, or a Discovery superclass.
 from pox.lib.revent import *
 from pox.lib.recoco import Timer
 from pox.lib.util import dpid_to_str, str_to_bool
+from pox.lib.timing_wheel import TimingWheel
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 import pox.lib.packet as pkt
@@ -204,12 +205,18 @@ class LLDPSender (object):
 class LinkEvent (Event):
   """
   Link up/down event
+
+  When several links go away at once (e.g., a switch disconnects or a
+  bunch of links time out together), a LinkEvent is raised for each, and
+  all but the last have more_pending set.  Listeners which do expensive
+  recomputation of the whole topology can wait for the last one.
   """
-  def __init__ (self, add, link, event = None):
+  def __init__ (self, add, link, event = None, more_pending = False):
     self.link = link
     self.added = add
     self.removed = not add
     self.event = event # PacketIn which caused this, if any
+    self.more_pending = more_pending
 
   def port_for_dpid (self, dpid):
     if self.link.dpid1 == dpid:
@@ -244,6 +251,81 @@ class Link (namedtuple("LinkBase",("dpid1","port1","dpid2","port2"))):
         self.port1, self.dpid2, self.port2)
 
 
+_LLDP_TYPE_RAW = struct.pack("!H", pkt.ethernet.LLDP_TYPE)
+_NDP_MULTICAST_RAW = pkt.ETHERNET.NDP_MULTICAST.raw
+_VLAN_TYPE_RAW = struct.pack("!H", pkt.ethernet.VLAN_TYPE)
+_MIN_ETHERTYPE_RAW = struct.pack("!H", 1536) # Smaller means 802.3 length
+
+_tlv_header = struct.Struct("!H")
+_tlv_subtype_header = struct.Struct("!HB")
+_TTL_TLV_HEADER = (pkt.lldp.TTL_TLV << 9) | 2
+
+
+def _classify_raw (data):
+  """
+  Decides whether raw frame data is a discovery packet without parsing it
+
+  Returns True if it's LLDP to the discovery address, False if it's
+  definitely not, and None if we can't tell (e.g., VLAN tagged or 802.3
+  frames), in which case the caller should parse the packet.
+  """
+  if not data or len(data) < 14: return None
+  ethertype = data[12:14]
+  if ethertype == _LLDP_TYPE_RAW:
+    return data[:6] == _NDP_MULTICAST_RAW
+  if ethertype == _VLAN_TYPE_RAW or ethertype < _MIN_ETHERTYPE_RAW:
+    return None
+  return False
+
+
+def _decode_raw_lldp (data):
+  """
+  Extracts originator (dpid,port) from raw data of our own LLDP packets
+
+  This only understands the exact layout produced by
+  LLDPSender._create_discovery_packet() -- a local chassis ID and
+  a system description both containing "dpid:<hex>", a decimal port ID,
+  and a TTL.  For anything else (including VLAN tagged frames), returns
+  None, and the packet should be handled by Discovery._decode_lldp().
+  """
+  try:
+    if data[12:14] != _LLDP_TYPE_RAW: return None
+    offset = 14
+
+    typelen,subtype = _tlv_subtype_header.unpack_from(data, offset)
+    if typelen >> 9 != pkt.lldp.CHASSIS_ID_TLV: return None
+    if subtype != pkt.chassis_id.SUB_LOCAL: return None
+    end = offset + 2 + (typelen & 0x1ff)
+    chassis = data[offset+3:end]
+    if not chassis.startswith('dpid:'): return None
+    offset = end
+
+    typelen,subtype = _tlv_subtype_header.unpack_from(data, offset)
+    if typelen >> 9 != pkt.lldp.PORT_ID_TLV: return None
+    if subtype != pkt.port_id.SUB_PORT: return None
+    end = offset + 2 + (typelen & 0x1ff)
+    port = data[offset+3:end]
+    if not port.isdigit(): return None
+    offset = end
+
+    typelen, = _tlv_header.unpack_from(data, offset)
+    if typelen != _TTL_TLV_HEADER: return None
+    ttl, = _tlv_header.unpack_from(data, offset + 2)
+    if ttl == 0: return None # Revocation; let the slow path deal with it
+    offset += 4
+
+    # We prefer the system description, so it must agree with the chassis
+    typelen, = _tlv_header.unpack_from(data, offset)
+    if typelen >> 9 != pkt.lldp.SYSTEM_DESC_TLV: return None
+    end = offset + 2 + (typelen & 0x1ff)
+    if data[offset+2:end] != chassis: return None
+    if end > len(data): return None
+
+    return int(chassis[5:], 16), int(port)
+  except (struct.error, ValueError):
+    return None
+
+
 class Discovery (EventMixin):
   """
   Component that attempts to discover network toplogy.
@@ -271,6 +353,8 @@ class Discovery (EventMixin):
     if link_timeout: self._link_timeout = link_timeout
 
     self.adjacency = {} # From Link to time.time() stamp
+    self._link_expiry = TimingWheel() # Links filed by expiration time
+    self._links_by_dpid = {} # dpid -> set of Links involving it
     self._sender = LLDPSender(self.send_cycle_time)
 
     # Listen with a high priority (mostly so we get PacketIns early)
@@ -311,18 +395,13 @@ class Discovery (EventMixin):
 
   def _handle_openflow_ConnectionDown (self, event):
     # Delete all links on this switch
-    self._delete_links([link for link in self.adjacency
-                        if link.dpid1 == event.dpid
-                        or link.dpid2 == event.dpid])
+    self._delete_links(list(self._links_by_dpid.get(event.dpid, ())))
 
   def _expire_links (self):
     """
     Remove apparently dead links
     """
-    now = time.time()
-
-    expired = [link for link,timestamp in self.adjacency.iteritems()
-               if timestamp + self._link_timeout < now]
+    expired = self._link_expiry.expire()
     if expired:
       for link in expired:
         log.info('link timeout: %s', link)
@@ -334,10 +413,16 @@ class Discovery (EventMixin):
     Receive and process LLDP packets
     """
 
-    packet = event.parsed
+    # This handler sees every PacketIn, so we try to classify the packet
+    # by looking directly at the raw ethertype and destination address
+    # before falling back to a full parse (which is quite expensive).
+    is_lldp = _classify_raw(event.data)
+    if is_lldp is None:
+      packet = event.parsed
+      is_lldp = (packet.effective_ethertype == pkt.ethernet.LLDP_TYPE
+                 and packet.dst == pkt.ETHERNET.NDP_MULTICAST)
 
-    if (packet.effective_ethertype != pkt.ethernet.LLDP_TYPE
-        or packet.dst != pkt.ETHERNET.NDP_MULTICAST):
+    if not is_lldp:
       if not self._eat_early_packets: return
       if not event.connection.connect_time: return
       enable_time = time.time() - self.send_cycle_time - 1
@@ -353,22 +438,65 @@ class Discovery (EventMixin):
         msg.in_port = event.port
         event.connection.send(msg)
 
+    # Our own discovery packets can be decoded without the packet library
+    r = _decode_raw_lldp(event.data)
+    if r is None:
+      r = self._decode_lldp(event.parsed)
+      if r is None: return EventHalt
+    originatorDPID,originatorPort = r
+
+    if originatorDPID not in core.openflow.connections:
+      log.info('Received LLDP packet from unknown switch')
+      return EventHalt
+
+    if (event.dpid, event.port) == (originatorDPID, originatorPort):
+      log.warning("Port received its own LLDP packet; ignoring")
+      return EventHalt
+
+    link = Discovery.Link(originatorDPID, originatorPort, event.dpid,
+                          event.port)
+
+    now = time.time()
+    self._link_expiry.set(link, now + self._link_timeout)
+    if link not in self.adjacency:
+      self.adjacency[link] = now
+      for dpid in (link.dpid1, link.dpid2):
+        links = self._links_by_dpid.get(dpid)
+        if links is None:
+          links = self._links_by_dpid[dpid] = set()
+        links.add(link)
+      log.info('link detected: %s', link)
+      self.raiseEventNoErrors(LinkEvent, True, link, event)
+    else:
+      # Just update timestamp
+      self.adjacency[link] = now
+
+    return EventHalt # Probably nobody else needs this event
+
+  @staticmethod
+  def _decode_lldp (packet):
+    """
+    Extracts originator (dpid,port) from a parsed LLDP packet
+
+    This handles LLDP packets in a variety of formats (not just the ones
+    we send ourselves).  Returns None (after logging) on failure.
+    """
     lldph = packet.find(pkt.lldp)
     if lldph is None or not lldph.parsed:
       log.error("LLDP packet could not be parsed")
-      return EventHalt
+      return None
     if len(lldph.tlvs) < 3:
       log.error("LLDP packet without required three TLVs")
-      return EventHalt
+      return None
     if lldph.tlvs[0].tlv_type != pkt.lldp.CHASSIS_ID_TLV:
       log.error("LLDP packet TLV 1 not CHASSIS_ID")
-      return EventHalt
+      return None
     if lldph.tlvs[1].tlv_type != pkt.lldp.PORT_ID_TLV:
       log.error("LLDP packet TLV 2 not PORT_ID")
-      return EventHalt
+      return None
     if lldph.tlvs[2].tlv_type != pkt.lldp.TTL_TLV:
       log.error("LLDP packet TLV 3 not TTL")
-      return EventHalt
+      return None
 
     def lookInSysDesc ():
       r = None
@@ -414,16 +542,12 @@ class Discovery (EventMixin):
 
     if originatorDPID == None:
       log.warning("Couldn't find a DPID in the LLDP packet")
-      return EventHalt
-
-    if originatorDPID not in core.openflow.connections:
-      log.info('Received LLDP packet from unknown switch')
-      return EventHalt
+      return None
 
     # Get port number from port TLV
     if lldph.tlvs[1].subtype != pkt.port_id.SUB_PORT:
       log.warning("Thought we found a DPID, but packet didn't have a port")
-      return EventHalt
+      return None
     originatorPort = None
     if lldph.tlvs[1].id.isdigit():
       # We expect it to be a decimal value
@@ -437,36 +561,32 @@ class Discovery (EventMixin):
     if originatorPort is None:
       log.warning("Thought we found a DPID, but port number didn't " +
                   "make sense")
-      return EventHalt
+      return None
 
-    if (event.dpid, event.port) == (originatorDPID, originatorPort):
-      log.warning("Port received its own LLDP packet; ignoring")
-      return EventHalt
-
-    link = Discovery.Link(originatorDPID, originatorPort, event.dpid,
-                          event.port)
-
-    if link not in self.adjacency:
-      self.adjacency[link] = time.time()
-      log.info('link detected: %s', link)
-      self.raiseEventNoErrors(LinkEvent, True, link, event)
-    else:
-      # Just update timestamp
-      self.adjacency[link] = time.time()
-
-    return EventHalt # Probably nobody else needs this event
+    return originatorDPID,originatorPort
 
   def _delete_links (self, links):
+    # Links are removed before any events are raised, so that listeners
+    # see the final adjacency (and the last event can be used as a single
+    # trigger for recalculating things).
+    links = [link for link in links if link in self.adjacency]
     for link in links:
-      self.raiseEventNoErrors(LinkEvent, False, link)
-    for link in links:
-      self.adjacency.pop(link, None)
+      del self.adjacency[link]
+      self._link_expiry.remove(link)
+      for dpid in (link.dpid1, link.dpid2):
+        dpid_links = self._links_by_dpid.get(dpid)
+        if dpid_links is None: continue
+        dpid_links.discard(link)
+        if not dpid_links: del self._links_by_dpid[dpid]
+    last = len(links) - 1
+    for i,link in enumerate(links):
+      self.raiseEventNoErrors(LinkEvent, False, link, more_pending = i<last)
 
   def is_edge_port (self, dpid, port):
     """
     Return True if given port does not connect to another switch
     """
-    for link in self.adjacency:
+    for link in self._links_by_dpid.get(dpid, ()):
       if link.dpid1 == dpid and link.port1 == port:
         return False
       if link.dpid2 == dpid and link.port2 == port:
@@ -18,7 +18,9 @@ import struct
 import operator
 from itertools import chain, repeat
 import sys
+import logging
 from pox.core import core
+import pox.lib.log_flags as log_flags
 
 from pox.lib.packet.packet_base import packet_base
 from pox.lib.packet.ethernet import ethernet
@@ -47,6 +49,15 @@ log = core.getLogger()
 # Logging
 # ----------------------------------------------------------------------
 
+# Whether log is enabled for DEBUG.  Check this before calling
+# log.debug() in anything called per message, so that it doesn't cost
+# anything (including evaluating the arguments) when debugging is off.
+_debug = False
+def _update_log_flags ():
+  global _debug
+  _debug = log.isEnabledFor(logging.DEBUG)
+log_flags.watch(_update_log_flags)
+
 _logger = None
 def _log (debug=None, info=None, warn=None, error=None):
   if not _logger: return
@@ -100,8 +111,7 @@ class UnderrunError (RuntimeError):
 def _read (data, offset, length):
   if (len(data)-offset) < length:
     raise UnderrunError("wanted %s bytes but only have %s" % (length, len(data)-offset))
- 
-    return (offset+length, data[offset:offset+length])
+  return (offset+length, data[offset:offset+length])
 
 def _unpack (fmt, data, offset):
   size = struct.calcsize(fmt)
@@ -779,6 +789,11 @@ ofp_meter_mod_command_map = {
   1 : 'OFPMC_MODIFY',               # Modify specified meter.
   2 : 'OFPMC_DELETE',               # Delete specified meter.
 }
+ofp_meter_mod_command_rev_map = {
+  'OFPMC_ADD' : 0,
+  'OFPMC_MODIFY' : 1,
+  'OFPMC_DELETE' : 2,
+}
 
 
 # enum ofp_meter_flags
@@ -789,6 +804,12 @@ ofp_meter_flags_map = {
   1 << 2 : 'OFPMF_BURST',           # Do burst size.
   1 << 3 : 'OFPMF_STATS',           # Collect statistics.
 }
+ofp_meter_flags_rev_map = {
+  'OFPMF_KBPS' : 1 << 0,
+  'OFPMF_PKTPS' : 1 << 1,
+  'OFPMF_BURST' : 1 << 2,
+  'OFPMF_STATS' : 1 << 3,
+}
 
 # enum ofp_meter_band_type
 ofp_meter_band_type_map = {
@@ -1169,7 +1190,7 @@ class ofp_header (ofp_base):
 
   def unpack (self, raw, offset=0):
     offset,length = self._unpack_header(raw, offset)
-    log.debug("Header len %d", length)
+    if _debug: log.debug("Header len %d", length)
     return offset,length
 
   def _unpack_header (self, raw, offset):
@@ -1453,7 +1474,7 @@ class ofp_meter_band_header:
 class ofp_meter_band_drop:
   def __init__ (self, **kw):
     self.type = ofp_meter_band_type_rev_map['OFPMBT_DROP']
-    self.length = 0
+    self.length = 16
     self.rate = 0
     self.burst_size = 0
 
@@ -1461,9 +1482,9 @@ class ofp_meter_band_drop:
 
   def pack (self):
     packed  = b''
-    packed += struct.pack("HHLL4x", 
+    packed += struct.pack("!HHLL4x", 
                           ofp_meter_band_type_rev_map['OFPMBT_DROP'],
-                          self.length,
+                          len(self),
                           self.rate,
                           self.burst_size)
     return packed
@@ -1926,6 +1947,20 @@ class oxm_match_field:
 
     initHelper(self, kw)
 
+  @classmethod
+  def from_name (cls, field, data, value = None, mask = None):
+    """
+    Builds an OXM field from its name (e.g., 'OFPXMT_OFB_IN_PORT')
+
+    data is the packed value and mask (if any) the packed mask.  value is
+    only used for display.
+    """
+    if mask is not None: data = data + mask
+    return cls(oxm_field = oxm_ofb_match_fields_rev_map[field],
+               oxm_hasmask = 0 if mask is None else 1,
+               oxm_length = len(data), data = data,
+               value = str(value) if value is not None else None)
+
   def pack(self): 
     # 7 bits are oxm_field and highest bit is oxm_hasmask 
     field = ((self.oxm_field << 1) + (self.oxm_hasmask & 1)) & 0xff
@@ -2121,7 +2156,9 @@ class ofp_match (ofp_base):
         decoding here should perform better than calling oxm_class object methods
       """
       if (oxm_length_loc < 1) or ((oxm_length_loc+4) > length_oxm):
-        log.debug("Incorrect OXM field?? length %d+4 available %d", oxm_length_loc, length_oxm)
+        if _debug:
+          log.debug("Incorrect OXM field?? length %d+4 available %d",
+                    oxm_length_loc, length_oxm)
         length_oxm = 0
 
       # OFPXMT_OFB_IN_PORT 0
@@ -2623,7 +2660,7 @@ class ofp_match (ofp_base):
     match._oxm_fields_pkt = oxms
     match._length = 4 + sum(len(field) for field in match._oxm_fields_pkt)
 
-    log.debug("match from packet length %d", match._length)
+    if _debug: log.debug("match from packet length %d", match._length)
 
     p = packet.next
 
@@ -2801,7 +2838,8 @@ class ofp_match (ofp_base):
     msg = msg + " ".join(wcs)
 
     _log(warn = msg)
-    _log(debug = "Problematic match: " + str(self))
+    if _logger and _logger.isEnabledFor(logging.DEBUG):
+      _log(debug = "Problematic match: " + str(self))
 
     return True # Always; we don't actually want an assertion error
  
@@ -3308,15 +3346,12 @@ class ofp_action_set_field (ofp_action_base):
     packed = b""
     packed += struct.pack("!H", self.type)
 
-    # pack the correct length, OXM field and padding
+    # pack the correct length (padded to 64 bits), OXM field and padding
     if isinstance(self.oxm_field, oxm_match_field):
-      self.length = len(self.oxm_field) + 4
+      self.length = len(self)
       packed += struct.pack("!H", self.length)
       packed += self.oxm_field.pack()
- 
-      pad_len = (8 - (self.length % 8)) % 8
-      packed += struct.pack("!"+str(pad-len)+"x")
-
+      packed += b"\x00" * (self.length - 4 - len(self.oxm_field))
     else:
       packed += struct.pack("!H", self.length)
 
@@ -3327,16 +3362,21 @@ class ofp_action_set_field (ofp_action_base):
     offset,(self.type, 
             self.length) = _unpack("!HH", raw, offset)
 
-    self.oxm_field = self.oxm_field.pack()
-
-    pad_len = (8 - (self.length % 8)) % 8
+    offset,(oxm_class, field, oxm_length) = _unpack("!HBB", raw, offset)
+    offset,data = _read(raw, offset, oxm_length)
+    self.oxm_field = oxm_match_field(oxm_class = oxm_class,
+                                     oxm_field = field >> 1,
+                                     oxm_hasmask = field & 1,
+                                     oxm_length = oxm_length,
+                                     data = data, value = None)
 
-    offset = _unpack("!"+str(pad_len)+"x", raw, offset)
-
-    assert offset - _offset == len(self)
+    offset = _offset + self.length
     return offset
 
   def __len__ (self):
+    if isinstance(self.oxm_field, oxm_match_field):
+      l = 4 + len(self.oxm_field)
+      return l + (8 - (l % 8)) % 8
     return self.length
 
   def __eq__ (self, other):
@@ -3836,7 +3876,7 @@ class ofp_instruction_meter (ofp_instruction_base):
   _MIN_LENGTH = 8
 
   def __init__ (self, **kw):
-    self.type = 1
+    self.type = 6
     self.length = 8
     self.meter_id = 0
 
@@ -4694,9 +4734,9 @@ class ofp_table_mod (ofp_header):
 class ofp_meter_mod (ofp_header):
   def __init__ (self, **kw):
     ofp_header.__init__(self)
-    self.command = ofp_meter_mod_command_map['OFPMC_ADD']
+    self.command = ofp_meter_mod_command_rev_map['OFPMC_ADD']
     self.flags = 0
-    self.meter_id = ofp_meter_map['OFPM_ALL']
+    self.meter_id = ofp_meter_rev_map['OFPM_ALL']
     self.bands = []
 
     initHelper(self, kw)
@@ -4954,9 +4994,10 @@ class ofp_multipart_request (ofp_header):
     offset,(self.type, self.flags) = _unpack("!HH4x", raw, offset)
     offset,body = _read(raw, offset, length - 16)
 
-    log.debug("Multipart request type %d (%s)",
-              self.type,
-              ofp_multipart_type_map[self.type])
+    if _debug:
+      log.debug("Multipart request type %d (%s)",
+                self.type,
+                ofp_multipart_type_map[self.type])
 
     si = _multipart_type_to_class_info.get(self.type)
     if si is None:
@@ -4969,8 +5010,8 @@ class ofp_multipart_request (ofp_header):
       self.body.unpack(body, 0, len(body))
 
       #TODO: assert entire body is unpacked
-    
-    log.debug(self.show()) 
+
+    if _debug: log.debug(self.show())
 
     assert length == len(self)
     return offset,length
@@ -5308,7 +5349,7 @@ class ofp_desc_multipart (ofp_multipart_body_base):
     offset,self.serial_num = _readzs(raw, offset, SERIAL_NUM_LEN)
     offset,self.dp_desc    = _readzs(raw, offset, DESC_STR_LEN)
 
-    log.debug(self.show())
+    if _debug: log.debug(self.show())
 
     assert offset - _offset == len(self)
     return offset
@@ -7377,6 +7418,7 @@ class ofp_packet_in (ofp_header):
     if not self.match:
         self.match = ofp_match()
 
+    _offset = offset
     offset,length = self._unpack_header(raw, offset)   
 
 
@@ -7386,7 +7428,7 @@ class ofp_packet_in (ofp_header):
             self.table_id,
             self.cookie) = _unpack("!IHBBQ", raw, offset)
 
-    matchlength = length - 26 - self.total_len - 4             # TODO - check 30
+    matchlength, = struct.unpack_from("!H", raw, offset + 2)
 
     #log.debug("packet in - offset after header unpack %d", offset)
 
@@ -7400,15 +7442,14 @@ class ofp_packet_in (ofp_header):
     if self.match._in_port:
       self.in_port = self.match._in_port
 
-    offset += 2 # padding
-    
-    dataLen = length-16-(len(self.match)+4)-2
-    datastart = length - self.total_len
-
-    self.data = raw[datastart:]
-    offset += self.total_len
+    # The data follows the (padded) match and two bytes of padding, and
+    # runs to the end of this message (it may be shorter than total_len if
+    # the switch didn't send it all)
+    datastart = _offset + 24 + ((matchlength + 7) // 8) * 8 + 2
+    dataLen = _offset + length - datastart
 
-    offset += 4 # TODO check
+    self.data = raw[datastart:_offset + length]
+    offset = _offset + length
 
     #log.debug("packet in - offset after data unpack %d", offset)
 
@@ -7416,8 +7457,9 @@ class ofp_packet_in (ofp_header):
 
     #offset = length    # bug or feature? 
 
-    if length != len(self):
-      log.debug("length %d len(self) %d matchlen %d datalen %d datastart %d", length, len(self), matchlength, dataLen, datastart)
+    if _debug and length != len(self):
+      log.debug("length %d len(self) %d matchlen %d datalen %d datastart %d",
+                length, len(self), matchlength, dataLen, datastart)
       log.debug(self.show())
 
     assert length == len(self)
@@ -7425,7 +7467,7 @@ class ofp_packet_in (ofp_header):
 
   def __len__ (self):
     # TODO check
-    return len(ofp_header) + 16 + len(self.match) + 2 + self.total_len
+    return len(ofp_header) + 16 + len(self.match) + 2 + len(self.data)
 
   def __eq__ (self, other):
     if type(self) != type(other): return False
@@ -7803,7 +7845,7 @@ class ofp_echo_request (ofp_header):
 
     if length is None:
       offset,self.body = _read(raw, offset, length - 8)
-      log.debug('No data field')
+      if _debug: log.debug('No data field')
 
     assert length == len(self)
     return offset,length
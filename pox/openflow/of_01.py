@@ -26,8 +26,12 @@ from pox.lib.revent.revent import EventMixin
 import datetime
 import time
 from pox.lib.socketcapture import CaptureSocket
+import pox.lib.metrics as metrics
 import pox.openflow.debug
 from pox.openflow.util import make_type_to_unpacker_table
+from pox.openflow.util import count_message_types
+from pox.openflow.util import make_listeners, accept_pending, DEFAULT_BACKLOG
+from pox.openflow.util import ListenerBackoff, out_of_fds
 from pox.openflow import *
 
 log = core.getLogger()
@@ -183,6 +187,8 @@ class DefaultOpenFlowHandlers (OpenFlowHandlers):
 
   @staticmethod
   def handle_PACKET_IN (con, msg): #A
+    limiter = con.ofnexus.packet_in_limiter
+    if limiter is not None and not limiter.admit(con, msg): return
     e = con.ofnexus.raiseEventNoErrors(PacketIn, con, msg)
     if e is None or e.halt != True:
       con.raiseEventNoErrors(PacketIn, con, msg)
@@ -280,18 +286,24 @@ class HandshakeOpenFlowHandlers (OpenFlowHandlers):
     self._finish_connecting(con)
 
   def handle_HELLO (self, con, msg): #S
-    # Send features and switch desc requests
-    if not self._features_request_sent:
-      self._features_request_sent = True
-      fr = of.ofp_features_request()
+    # Send features and switch desc requests (unless we already did)
+    self.request_features(con)
 
-      if self.request_description:
-        ss = of.ofp_stats_request()
-        ss.body = of.ofp_desc_stats_request()
+  def request_features (self, con, hello = False):
+    """
+    Sends features and switch desc requests (once), maybe after a HELLO
+    """
+    if self._features_request_sent: return
+    self._features_request_sent = True
+    data = of.ofp_hello().pack() if hello else b''
+    data += of.ofp_features_request().pack()
 
-        con.send(fr.pack() + ss.pack())
-      else:
-        con.send(fr)
+    if self.request_description:
+      ss = of.ofp_stats_request()
+      ss.body = of.ofp_desc_stats_request()
+      data += ss.pack()
+
+    con.send(data)
 
   @staticmethod
   def handle_ECHO_REQUEST (con, msg): #S
@@ -339,6 +351,8 @@ class HandshakeOpenFlowHandlers (OpenFlowHandlers):
   def _finish_connecting (self, con):
     con.info("connected")
     con.connect_time = time.time()
+    con.handshake_time = con.connect_time - con._started
+    _handshake_seconds.observe(con.handshake_time)
     con.handlers = _default_handlers.handlers
     con.ofnexus.raiseEventNoErrors(ConnectionHandshakeComplete, con)
 
@@ -362,6 +376,22 @@ statsHandlerMap = {
 }
 
 
+_messages_in = metrics.counter_array("pox_of_01_messages_in_total",
+    "OpenFlow 1.0 messages received", "type", 256, of.ofp_type_map)
+_messages_out = metrics.counter_array("pox_of_01_messages_out_total",
+    "OpenFlow 1.0 messages sent", "type", 256, of.ofp_type_map)
+_bytes_in = metrics.counter("pox_of_01_bytes_in_total",
+    "OpenFlow 1.0 bytes received")
+_bytes_out = metrics.counter("pox_of_01_bytes_out_total",
+    "OpenFlow 1.0 bytes sent (or queued to send)")
+_handshake_seconds = metrics.bucket_histogram("pox_of_01_handshake_seconds",
+    "Time from an OpenFlow 1.0 switch connecting to ConnectionUp",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+metrics.gauge("pox_of_01_send_queue_bytes",
+    "Bytes waiting for OpenFlow 1.0 switches' sockets to be writable",
+    func = lambda: deferredSender.queued_bytes() if deferredSender else 0)
+
+
 # Deferred sending should be unusual, so don't worry too much about
 # efficiency
 class DeferredSender (threading.Thread):
@@ -407,6 +437,11 @@ class DeferredSender (threading.Thread):
 
       self._waker.ping()
 
+  def queued_bytes (self):
+    with self._lock:
+      return sum(len(d) for q in self._dataForConnection.itervalues()
+                 for d in q)
+
   def kill (self, con):
     with self._lock:
       try:
@@ -470,6 +505,7 @@ class DeferredSender (threading.Thread):
               pass
 
 class DummyOFNexus (object):
+  packet_in_limiter = None
   def raiseEventNoErrors (self, event, *args, **kw):
     log.warning("%s raised on dummy OpenFlow nexus" % event)
   def raiseEvent (self, event, *args, **kw):
@@ -732,8 +768,8 @@ class Connection (EventMixin):
     self.disconnection_raised = False
     self.connect_time = None
     self.idle_time = time.time()
-
-    self.send(of.ofp_hello())
+    self._started = self.idle_time
+    self.handshake_time = None # Seconds it took to get to ConnectionUp
 
     self.original_ports = PortCollection()
     self.ports = PortCollection()
@@ -743,7 +779,13 @@ class Connection (EventMixin):
     #      some timeout
 
     self.unpackers = unpackers
-    self.handlers = HandshakeOpenFlowHandlers().handlers
+    handshake = HandshakeOpenFlowHandlers()
+    self.handlers = handshake.handlers
+
+    # We only speak 1.0, so there's nothing to negotiate.  Rather than wait
+    # for the switch's HELLO, send ours along with the requests we'd send
+    # after it.  This saves a round trip for every switch that connects.
+    handshake.request_features(self, hello = True)
 
   @property
   def eth_addr (self):
@@ -827,6 +869,9 @@ class Connection (EventMixin):
       assert isinstance(data, of.ofp_header)
       data = data.pack()
 
+    _bytes_out.value += len(data)
+    count_message_types(_messages_out.counts, data)
+
     if deferredSender.sending:
       log.debug("deferred sender is sending!")
       deferredSender.send(self, data)
@@ -859,6 +904,7 @@ class Connection (EventMixin):
       return False
     if len(d) == 0:
       return False
+    _bytes_in.value += len(d)
     self.buf += d
     buf_len = len(self.buf)
 
@@ -884,6 +930,8 @@ class Connection (EventMixin):
 
       if buf_len - offset < msg_length: break
 
+      _messages_in.counts[ofp_type] += 1
+
       new_offset,msg = self.unpackers[ofp_type](self.buf, offset)
       assert new_offset - offset == msg_length
       offset = new_offset
@@ -968,7 +1016,8 @@ class OpenFlow_01_Task (Task):
   The main recoco thread for listening to openflow messages
   """
   def __init__ (self, port = 6633, address = '0.0.0.0',
-                ssl_key = None, ssl_cert = None, ssl_ca_cert = None):
+                ssl_key = None, ssl_cert = None, ssl_ca_cert = None,
+                backlog = DEFAULT_BACKLOG, listeners = 1, reuse_port = False):
     """
     Initialize
 
@@ -977,11 +1026,17 @@ class OpenFlow_01_Task (Task):
     Task.__init__(self)
     self.port = int(port)
     self.address = address
+    self.backlog = backlog
+    self.listeners = listeners
+    self.reuse_port = reuse_port
     self.started = False
     self.ssl_key = ssl_key
     self.ssl_cert = ssl_cert
     self.ssl_ca_cert = ssl_ca_cert
 
+    # Switch I/O should get ahead of background work
+    self.priority = PRIORITY_LATENCY
+
     if self.ssl_key or self.ssl_cert or ssl_ca_cert:
       global ssl
       ssl = None
@@ -1006,10 +1061,9 @@ class OpenFlow_01_Task (Task):
     # List of open sockets/connections to select on
     sockets = []
 
-    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
-      listener.bind((self.address, self.port))
+      listeners = make_listeners(self.address, self.port, self.backlog,
+                                 self.listeners, self.reuse_port)
     except socket.error as (errno, strerror):
       log.error("Error %i while binding %s:%s: %s",
                 errno, self.address, self.port, strerror)
@@ -1022,24 +1076,27 @@ class OpenFlow_01_Task (Task):
                   "another port.")
       return
 
-    listener.listen(16)
-    listener.setblocking(0)
-    sockets.append(listener)
+    sockets.extend(listeners)
+
+    log.debug("Listening on %s:%s (%i listener%s, backlog %i)",
+              self.address, self.port, len(listeners),
+              "" if len(listeners) == 1 else "s", self.backlog)
 
-    log.debug("Listening on %s:%s" %
-              (self.address, self.port))
+    # Listeners we can't accept on for now (see ListenerBackoff)
+    backoff = ListenerBackoff(sockets)
 
     con = None
     while core.running:
       try:
         while True:
           con = None
-          rlist, wlist, elist = yield Select(sockets, [], sockets, 5)
+          timeout = backoff.resume(5)
+          rlist, wlist, elist = yield Select(sockets, [], sockets, timeout)
           if len(rlist) == 0 and len(wlist) == 0 and len(elist) == 0:
             if not core.running: break
 
           for con in elist:
-            if con is listener:
+            if con in listeners:
               raise RuntimeError("Error on listener socket")
             else:
               try:
@@ -1053,41 +1110,40 @@ class OpenFlow_01_Task (Task):
 
           timestamp = time.time()
           for con in rlist:
-            if con is listener:
-              new_sock = listener.accept()[0]
-
-              if self.ssl_key or self.ssl_cert or self.ssl_ca_cert:
-                cert_reqs = ssl.CERT_REQUIRED
-                if self.ssl_ca_cert is None:
-                  cert_reqs = ssl.CERT_NONE
-                new_sock = ssl.wrap_socket(new_sock, server_side=True,
-                    keyfile = self.ssl_key, certfile = self.ssl_cert,
-                    ca_certs = self.ssl_ca_cert, cert_reqs = cert_reqs,
-                    do_handshake_on_connect = False,
-                    suppress_ragged_eofs = True)
-                #FIXME: We currently do a blocking handshake so that SSL errors
-                #       can't occur out of the blue later.  This isn't a good
-                #       thing, but getting around it will take some effort.
-                try:
-                  new_sock.setblocking(1)
-                  new_sock.do_handshake()
-                except ssl.SSLError as exc:
-                  if exc.errno == 8 and "EOF occurred" in exc.strerror:
-                    # Annoying, but just ignore
-                    pass
-                  else:
-                    #log.exception("SSL negotiation failed")
-                    log.warn("SSL negotiation failed: " + str(exc))
-                  continue
-
-              if pox.openflow.debug.pcap_traces:
-                new_sock = wrap_socket(new_sock)
-              new_sock.setblocking(0)
-              # Note that instantiating a Connection object fires a
-              # ConnectionUp event (after negotation has completed)
-              newcon = Connection(new_sock)
-              sockets.append( newcon )
-              #print str(newcon) + " connected"
+            if con in listeners:
+              for new_sock in accept_pending(con):
+                if self.ssl_key or self.ssl_cert or self.ssl_ca_cert:
+                  cert_reqs = ssl.CERT_REQUIRED
+                  if self.ssl_ca_cert is None:
+                    cert_reqs = ssl.CERT_NONE
+                  new_sock = ssl.wrap_socket(new_sock, server_side=True,
+                      keyfile = self.ssl_key, certfile = self.ssl_cert,
+                      ca_certs = self.ssl_ca_cert, cert_reqs = cert_reqs,
+                      do_handshake_on_connect = False,
+                      suppress_ragged_eofs = True)
+                  #FIXME: We currently do a blocking handshake so that SSL errors
+                  #       can't occur out of the blue later.  This isn't a good
+                  #       thing, but getting around it will take some effort.
+                  try:
+                    new_sock.setblocking(1)
+                    new_sock.do_handshake()
+                  except ssl.SSLError as exc:
+                    if exc.errno == 8 and "EOF occurred" in exc.strerror:
+                      # Annoying, but just ignore
+                      pass
+                    else:
+                      #log.exception("SSL negotiation failed")
+                      log.warn("SSL negotiation failed: " + str(exc))
+                    continue
+
+                if pox.openflow.debug.pcap_traces:
+                  new_sock = wrap_socket(new_sock)
+                new_sock.setblocking(0)
+                # Note that instantiating a Connection object fires a
+                # ConnectionUp event (after negotation has completed)
+                newcon = Connection(new_sock)
+                sockets.append( newcon )
+                #print str(newcon) + " connected"
             else:
               con.idle_time = timestamp
               if con.read() is False:
@@ -1106,12 +1162,13 @@ class OpenFlow_01_Task (Task):
         if sys.exc_info()[0] is socket.error:
           sock_error = sys.exc_info()[1][0]
 
-        if con is listener:
+        if con in listeners:
           do_close = False
           if sock_error == ECONNRESET:
             con.info("Connection reset")
-          elif sock_error == EMFILE:
+          elif out_of_fds(sys.exc_info()[1]):
             log.error("Couldn't accept connection: out of file descriptors.")
+            backoff.pause(con)
           else:
             do_close = True
             log_tb()
@@ -1149,6 +1206,7 @@ deferredSender = None
 
 def launch (port=6633, address="0.0.0.0", name=None,
             private_key=None, certificate=None, ca_cert=None,
+            backlog=DEFAULT_BACKLOG, listeners=1, reuse_port=False,
             __INSTANCE__=None):
   """
   Start a listener for OpenFlow connections
@@ -1157,6 +1215,11 @@ def launch (port=6633, address="0.0.0.0", name=None,
   combinations and pointing to reasonable key/cert files.  These have the same
   meanings as with Open vSwitch's old test controller, but they are more
   flexible (e.g., ca-cert can be skipped).
+
+  --backlog sets the length of the queue of connections waiting to be
+  accepted.  --listeners=N listens with N SO_REUSEPORT sockets, each with its
+  own accept queue.  --reuse_port sets SO_REUSEPORT so that several processes
+  can listen on the port.
   """
   if name is None:
     basename = "of_01"
@@ -1179,6 +1242,8 @@ def launch (port=6633, address="0.0.0.0", name=None,
 
   l = OpenFlow_01_Task(port = int(port), address = address,
                        ssl_key = private_key, ssl_cert = certificate,
-                       ssl_ca_cert = ca_cert)
+                       ssl_ca_cert = ca_cert, backlog = int(backlog),
+                       listeners = int(listeners),
+                       reuse_port = pox.lib.util.str_to_bool(reuse_port))
   core.register(name, l)
   return l
@@ -23,11 +23,28 @@ from pox.lib.revent.revent import EventMixin
 import datetime
 import time
 from pox.lib.socketcapture import CaptureSocket
+from pox.lib.timing_wheel import TimingWheel
+import pox.lib.metrics as metrics
+import pox.lib.log_flags as log_flags
 import pox.openflow.debug
 from pox.openflow.util import make_type_to_unpacker_table
+from pox.openflow.util import count_message_types
+from pox.openflow.util import make_listeners, accept_pending, DEFAULT_BACKLOG
+from pox.openflow.util import ListenerBackoff, out_of_fds
 from pox.openflow import *
 
+import logging
+import struct
+
 log = core.getLogger()
+_trace_log = core.getLogger("openflow.of_04.trace")
+
+# Whether log is enabled for DEBUG; check before logging on hot paths
+_debug = False
+def _update_log_flags ():
+  global _debug
+  _debug = log.isEnabledFor(logging.DEBUG)
+log_flags.watch(_update_log_flags)
 
 import socket
 import select
@@ -63,9 +80,9 @@ import traceback
 def handle_HELLO (con, msg): #S
   #con.msg("HELLO wire protocol " + hex(msg.version))
 
-  # Send a features request
-  msg = of.ofp_features_request()
-  con.send(msg)
+  # Nothing to do; our features request went out with our HELLO (see
+  # Handshake)
+  pass
 
 # reaction to reception of echo reply message
 def handle_ECHO_REPLY (con, msg):
@@ -99,8 +116,10 @@ def handle_FLOW_REMOVED (con, msg): #A
 def handle_FEATURES_REPLY (con, msg):
   connecting = con.connect_time == None
   con.features = msg
-  con.original_ports._ports = set(msg.ports)
-  con.ports._reset()
+  if msg.ports:
+    # (1.3 switches send them in a PORT_DESC reply instead)
+    con.original_ports._ports = set(msg.ports)
+    con.ports._reset()
   con.dpid = msg.datapath_id
 
   if not connecting:
@@ -121,79 +140,8 @@ def handle_FEATURES_REPLY (con, msg):
   con.ofnexus._connect(con)
   #connections[con.dpid] = con
 
-  barrier = of.ofp_barrier_request()
-
-  listeners = []
-
-  def finish_connecting (event):
-    if event.xid != barrier.xid:
-      con.dpid = None
-      con.err("failed connect")
-      con.disconnect()
-    else:
-      con.info("connected")
-      con.connect_time = time.time()
-      e = con.ofnexus.raiseEventNoErrors(ConnectionUp, con, msg)
-      if e is None or e.halt != True:
-        con.raiseEventNoErrors(ConnectionUp, con, msg)
-      e = con.ofnexus.raiseEventNoErrors(FeaturesReceived, con, msg)
-      if e is None or e.halt != True:
-        con.raiseEventNoErrors(FeaturesReceived, con, msg)
-    con.removeListeners(listeners)
-  listeners.append(con.addListener(BarrierIn, finish_connecting))
-
-  def also_finish_connecting (event):
-    if event.xid != barrier.xid: return
-    if event.ofp.type != of.OFPET_BAD_REQUEST: return
-    if event.ofp.code != of.OFPBRC_BAD_TYPE: return
-    # Okay, so this is probably an HP switch that doesn't support barriers
-    # (ugh).  We'll just assume that things are okay.
-    finish_connecting(event)
-  listeners.append(con.addListener(ErrorIn, also_finish_connecting))
-
-  #TODO: Add a timeout for finish_connecting
-  """
-  if con.ofnexus.miss_send_len is not None:
-    con.send(of.ofp_set_config(miss_send_len = con.ofnexus.miss_send_len))
-  if con.ofnexus.clear_flows_on_connect:
-    con.send(of.ofp_flow_mod(match=of.ofp_match(), command=of.OFPFC_DELETE, out_port=of.OFPP_ANY))
-  """
-
-  """
-  # delete previous flow entries
-  con.send(of.ofp_flow_mod(match=of.ofp_match(), 
-                           command=of.OFPFC_DELETE, 
-                           out_port=of.OFPP_ANY,
-                           instructions=None))
-  
-  con.send(barrier)
-  
-  """
-  # install flow miss entry
-  action = of.ofp_action_output(port = of.OFPP_CONTROLLER,
-                                max_len = of.OFPCML_NO_BUFFER)
-
-  instruction = of.ofp_instruction_actions(actions = [action],
-                                           type = of.OFPIT_APPLY_ACTIONS)
-
-  match_oxm = of.oxm_match_field(oxm_class = of.ofp_oxm_class_rev_map['OFPXMC_OPENFLOW_BASIC'],
-                                 oxm_field = of.oxm_ofb_match_fields_rev_map['OFPXMT_OFB_IN_PORT'],
-                                 oxm_length = 4,
-                                 data = b'\xff'*4,
-                                 value = 'OFPP_ANY') # ANY
-  #log.debug(match_oxm.show())                               
-
-  con.send(of.ofp_flow_mod(command = of.OFPFC_ADD, 
-                           out_port = of.OFPP_CONTROLLER, 
-                           _buffer_id = of.NO_BUFFER, 
-                           priority = 1,
-                           match = of.ofp_match(oxm_fields_pkt = []), 
-                           instructions = [instruction],
-                           idle_timeout = 0,
-                           hard_timeout = 0, ))
-  
-  # make sure everything is processed
-  con.send(barrier)
+  if con.handshake is not None:
+    con.handshake.got_features(msg)
 
 # reaction to reception of multipart message
 def handle_MULTIPART_REPLY (con, msg):
@@ -214,12 +162,16 @@ def handle_PORT_STATUS (con, msg): #A
 
 # reaction to reception of packet in message
 def handle_PACKET_IN (con, msg): #A
+  limiter = con.ofnexus.packet_in_limiter
+  if limiter is not None and not limiter.admit(con, msg): return
   e = con.ofnexus.raiseEventNoErrors(PacketIn, con, msg)
   if e is None or e.halt != True:
     con.raiseEventNoErrors(PacketIn, con, msg)
 
 # reaction to reception of error message
 def handle_ERROR_MSG (con, msg): #A
+  if con.handshake is not None:
+    con.handshake.got_error(msg)
   err = ErrorIn(con, msg)
   e = con.ofnexus.raiseEventNoErrors(err)
   if e is None or e.halt != True:
@@ -230,6 +182,9 @@ def handle_ERROR_MSG (con, msg): #A
 
 # reaction to reception of barrier message
 def handle_BARRIER (con, msg):
+  if con.handshake is not None:
+    con.handshake.got_barrier(msg)
+    if con.disconnected: return
   e = con.ofnexus.raiseEventNoErrors(BarrierIn, con, msg)
   if e is None or e.halt != True:
     con.raiseEventNoErrors(BarrierIn, con, msg)
@@ -353,6 +308,8 @@ def handle_OFPMP_PORT_DESC (con, parts):
   msg = []
   for part in parts:
     msg.extend(part.body)
+  if con.handshake is not None:
+    con.handshake.got_ports(msg)
   e = con.ofnexus.raiseEventNoErrors(MPPortDescMultipartReceived, con, parts, msg)
   if e is None or e.halt != True:
     con.raiseEventNoErrors(MPPortDescMultipartReceived, con, parts, msg)
@@ -447,6 +404,11 @@ class DeferredSender (threading.Thread):
 
       self._waker.ping()
 
+  def queued_bytes (self):
+    with self._lock:
+      return sum(len(d) for q in self._dataForConnection.itervalues()
+                 for d in q)
+
   def kill (self, con):
     with self._lock:
       try:
@@ -510,6 +472,7 @@ class DeferredSender (threading.Thread):
               pass
 
 class DummyOFNexus (object):
+  packet_in_limiter = None
   def raiseEventNoErrors (self, event, *args, **kw):
     log.warning("%s raised on dummy OpenFlow nexus" % event)
   def raiseEvent (self, event, *args, **kw):
@@ -694,6 +657,218 @@ class PortCollection (object):
     r._ports = set(self.values())
 
 
+class HandshakeStats (object):
+  """
+  Keeps track of how long switches take to get to ConnectionUp
+  """
+  def __init__ (self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.last = None
+    self.timeouts = 0
+    self.failures = 0
+
+  def record (self, seconds):
+    self.count += 1
+    self.total += seconds
+    self.last = seconds
+    if seconds > self.max: self.max = seconds
+
+  @property
+  def mean (self):
+    if not self.count: return None
+    return self.total / self.count
+
+  def __str__ (self):
+    if not self.count:
+      return "no handshakes (timeouts:%s failures:%s)" % (self.timeouts,
+                                                          self.failures)
+    return "handshakes:%s mean:%0.1fms max:%0.1fms timeouts:%s failures:%s" % (
+        self.count, self.mean * 1000, self.max * 1000, self.timeouts,
+        self.failures)
+
+handshake_stats = HandshakeStats()
+
+
+_messages_in = metrics.counter_array("pox_of_04_messages_in_total",
+    "OpenFlow 1.3 messages received", "type", 256, of.ofp_type_map)
+_messages_out = metrics.counter_array("pox_of_04_messages_out_total",
+    "OpenFlow 1.3 messages sent", "type", 256, of.ofp_type_map)
+_bytes_in = metrics.counter("pox_of_04_bytes_in_total",
+    "OpenFlow 1.3 bytes received")
+_bytes_out = metrics.counter("pox_of_04_bytes_out_total",
+    "OpenFlow 1.3 bytes sent (or queued to send)")
+_handshake_seconds = metrics.bucket_histogram("pox_of_04_handshake_seconds",
+    "Time from an OpenFlow 1.3 switch connecting to ConnectionUp",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+metrics.counter("pox_of_04_handshake_timeouts_total",
+    "OpenFlow 1.3 handshakes which timed out",
+    func = lambda: handshake_stats.timeouts)
+metrics.counter("pox_of_04_handshake_failures_total",
+    "OpenFlow 1.3 handshakes which failed (including timeouts)",
+    func = lambda: handshake_stats.failures)
+metrics.gauge("pox_of_04_send_queue_bytes",
+    "Bytes waiting for OpenFlow 1.3 switches' sockets to be writable",
+    func = lambda: deferredSender.queued_bytes() if deferredSender else 0)
+
+
+# Log one in this many messages to _trace_log (0 for none)
+_trace_sample = 0
+_trace_left = 0
+
+def set_trace_sample (n):
+  """
+  Logs one in n OpenFlow messages (in or out) at INFO level
+
+  This is on the openflow.of_04.trace logger, one line of key=value pairs
+  per message.  0 turns it off.
+  """
+  global _trace_sample, _trace_left
+  _trace_sample = _trace_left = int(n)
+
+def _trace (con, direction, data, offset):
+  global _trace_left
+  _trace_left -= 1
+  if _trace_left > 0: return
+  _trace_left = _trace_sample
+  ofp_type = ord(data[offset+1])
+  length,xid = struct.unpack_from("!HL", data, offset+2)
+  _trace_log.info("dir=%s dpid=%s con=%s type=%s len=%s xid=%s", direction,
+                  pox.lib.util.dpid_to_str(con.dpid) if con.dpid else None,
+                  con.ID, of.ofp_type_map.get(ofp_type, ofp_type), length,
+                  xid)
+
+
+class Handshake (object):
+  """
+  Gets a new switch connection to ConnectionUp
+
+  The obvious way to do this takes four round trips (HELLO, then
+  FEATURES_REQUEST, then the table-miss flow and a barrier once we have the
+  features reply).  Since we only speak 1.3, there's nothing to actually
+  negotiate, so we send everything -- including a PORT_DESC request, since
+  1.3 features replies don't have ports -- as soon as the switch connects.
+  The switch's replies are collected in whatever order they arrive, and the
+  connection is up once we have them all.
+
+  If that takes longer than HANDSHAKE_TIMEOUT seconds, the connection is
+  dropped.
+  """
+  def __init__ (self, con):
+    self.con = con
+    self.started = time.time()
+    self.features = None
+    self.ports = None
+    self.port_request = of.ofp_multipart_request(
+        body = of.ofp_port_desc_request())
+    self.barrier = of.ofp_barrier_request()
+
+    msgs = [of.ofp_hello(), of.ofp_features_request(), self.port_request,
+            self._table_miss_flow(), self.barrier]
+    con.send(b''.join(m.pack() for m in msgs))
+
+    if HANDSHAKE_TIMEOUT:
+      _handshakes.set(con, self.started + HANDSHAKE_TIMEOUT)
+
+  @staticmethod
+  def _table_miss_flow ():
+    # Send everything that doesn't match anything else to the controller
+    action = of.ofp_action_output(port = of.OFPP_CONTROLLER,
+                                  max_len = of.OFPCML_NO_BUFFER)
+    instruction = of.ofp_instruction_actions(actions = [action],
+                                             type = of.OFPIT_APPLY_ACTIONS)
+    return of.ofp_flow_mod(command = of.OFPFC_ADD,
+                           out_port = of.OFPP_CONTROLLER,
+                           _buffer_id = of.NO_BUFFER,
+                           priority = 1,
+                           match = of.ofp_match(oxm_fields_pkt = []),
+                           instructions = [instruction],
+                           idle_timeout = 0,
+                           hard_timeout = 0)
+
+  def got_features (self, msg):
+    self.features = msg
+    self._check()
+
+  def got_ports (self, ports):
+    self.ports = ports
+    con = self.con
+    con.original_ports._ports = set(ports)
+    con.ports._reset()
+    self._check()
+
+  def got_barrier (self, msg):
+    if msg.xid != self.barrier.xid:
+      self._fail("failed connect")
+      return
+    self.barrier = True
+    self._check()
+
+  def got_error (self, msg):
+    if msg.xid == self.port_request.xid:
+      # Doesn't do PORT_DESC?  Carry on without ports.
+      self.got_ports([])
+      return
+    if self.barrier is True: return
+    if msg.xid != self.barrier.xid: return
+    if msg.type != of.OFPET_BAD_REQUEST: return
+    if msg.code != of.OFPBRC_BAD_TYPE: return
+    # Okay, so this is probably an HP switch that doesn't support barriers
+    # (ugh).  We'll just assume that things are okay.
+    self.barrier = True
+    self._check()
+
+  def _check (self):
+    if self.features is None or self.ports is None: return
+    if self.barrier is not True: return
+    self._finish()
+
+  def cancel (self):
+    """
+    Stops waiting for the handshake to finish
+    """
+    if self.con.handshake is self:
+      self.con.handshake = None
+    _handshakes.remove(self.con)
+
+  def _fail (self, msg):
+    self.cancel()
+    handshake_stats.failures += 1
+    con = self.con
+    if con.dpid is not None:
+      # If FEATURES_REPLY came in, the nexus knows about us.  Take us out
+      # now, since with no DPID, disconnect() won't (and it won't raise
+      # ConnectionDown, which is right, since we never came up).
+      nexus = con.ofnexus
+      if nexus is not None and nexus.getConnection(con.dpid) is con:
+        nexus._disconnect(con.dpid)
+      con.dpid = None
+    con.err(msg)
+    con.disconnect()
+
+  def timed_out (self):
+    if self.con.handshake is not self: return
+    handshake_stats.timeouts += 1
+    self._fail("handshake timed out after %s seconds" % (HANDSHAKE_TIMEOUT,))
+
+  def _finish (self):
+    self.cancel()
+    con = self.con
+    msg = self.features
+    con.info("connected")
+    con.connect_time = time.time()
+    con.handshake_time = con.connect_time - self.started
+    handshake_stats.record(con.handshake_time)
+    _handshake_seconds.observe(con.handshake_time)
+    e = con.ofnexus.raiseEventNoErrors(ConnectionUp, con, msg)
+    if e is None or e.halt != True:
+      con.raiseEventNoErrors(ConnectionUp, con, msg)
+    e = con.ofnexus.raiseEventNoErrors(FeaturesReceived, con, msg)
+    if e is None or e.halt != True:
+      con.raiseEventNoErrors(FeaturesReceived, con, msg)
+
+
 class Connection (EventMixin):
   """
   A Connection object represents a single TCP session with an
@@ -735,7 +910,7 @@ class Connection (EventMixin):
 
   def msg (self, m):
     #print str(self), m
-    log.debug(str(self) + " " + str(m))
+    if _debug: log.debug(str(self) + " " + str(m))
   def err (self, m):
     #print str(self), m
     log.error(str(self) + " " + str(m))
@@ -760,15 +935,14 @@ class Connection (EventMixin):
     self.disconnection_raised = False
     self.connect_time = None
     self.idle_time = time.time()
-
-    self.send(of.ofp_hello())
+    self.handshake_time = None # Seconds it took to get to ConnectionUp
 
     self.original_ports = PortCollection()
     self.ports = PortCollection()
     self.ports._chain = self.original_ports
 
-    #TODO: set a time that makes sure we actually establish a connection by
-    #      some timeout
+    self.handshake = None
+    self.handshake = Handshake(self)
 
   @property
   def eth_addr (self):
@@ -795,6 +969,8 @@ class Connection (EventMixin):
       self.msg("already disconnected")
     self.info(msg)
     self.disconnected = True
+    if self.handshake is not None:
+      self.handshake.cancel()
     try:
       self.ofnexus._disconnect(self.dpid)
     except:
@@ -834,15 +1010,20 @@ class Connection (EventMixin):
       # so we check it anyway.
       assert isinstance(data, of.ofp_header)
       
-      log.debug('Message out, type: %s, length: %d', 
-                of.ofp_type_map.get(data.header_type, str(data.header_type) ),
-                len(data)
-      )
+      if _debug:
+        log.debug('Message out, type: %s, length: %d',
+                  of.ofp_type_map.get(data.header_type,
+                                      str(data.header_type)),
+                  len(data))
 
       data = data.pack()
 
+    _bytes_out.value += len(data)
+    count_message_types(_messages_out.counts, data)
+    if _trace_sample: _trace(self, "out", data, 0)
+
     if deferredSender.sending:
-      log.debug("deferred sender is sending!")
+      if _debug: log.debug("deferred sender is sending!")
       deferredSender.send(self, data)
       return
     try:
@@ -873,6 +1054,7 @@ class Connection (EventMixin):
       return False
     if len(d) == 0:
       return False
+    _bytes_in.value += len(d)
     self.buf += d
     buf_len = len(self.buf)
 
@@ -897,13 +1079,18 @@ class Connection (EventMixin):
 
       if buf_len - offset < msg_length: break
 
-      log.debug('Message in, type: %s, length: %d', 
-                of.ofp_type_map.get(ofp_type, str(ofp_type) ),
-                msg_length )
+      _messages_in.counts[ofp_type] += 1
+      if _trace_sample: _trace(self, "in", self.buf, offset)
+
+      if _debug:
+        log.debug('Message in, type: %s, length: %d',
+                  of.ofp_type_map.get(ofp_type, str(ofp_type)), msg_length)
 
       new_offset,msg = unpackers[ofp_type](self.buf, offset)
 
-      log.debug("new_offset %d offset %d msg_length %d", new_offset, offset, msg_length)
+      if _debug:
+        log.debug("new_offset %d offset %d msg_length %d", new_offset,
+                  offset, msg_length)
 
       # FIXME - assertion sometimes fails on unknown conditions (probably on packet in or multipart messages but not always)
       assert new_offset - offset == msg_length
@@ -931,7 +1118,8 @@ class Connection (EventMixin):
       if ofp.type not in [of.OFPMP_FLOW, 
                           of.OFPMP_TABLE,
                           of.OFPMP_PORT, 
-                          of.OFPMP_QUEUE]:
+                          of.OFPMP_QUEUE,
+                          of.OFPMP_PORT_DESC]:
         log.error("Don't know how to aggregate multipart message of type " + str(ofp.type))
         self._previous_multipart = []
         return
@@ -988,12 +1176,19 @@ class OpenFlow_04_Task (Task):
   """
   The main recoco thread for listening to openflow messages
   """
-  def __init__ (self, port = 6653, address = '0.0.0.0'):
+  def __init__ (self, port = 6653, address = '0.0.0.0',
+                backlog = DEFAULT_BACKLOG, listeners = 1, reuse_port = False):
     Task.__init__(self)
     self.port = int(port)
     self.address = address
+    self.backlog = backlog
+    self.listeners = listeners
+    self.reuse_port = reuse_port
     self.started = False
 
+    # Switch I/O should get ahead of background work
+    self.priority = PRIORITY_LATENCY
+
     core.addListener(pox.core.GoingUpEvent, self._handle_GoingUpEvent)
 
   def _handle_GoingUpEvent (self, event):
@@ -1009,37 +1204,28 @@ class OpenFlow_04_Task (Task):
     # List of open sockets/connections to select on
     sockets = []
 
-    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    try:
-      listener.bind((self.address, self.port))
-    except socket.error as (errno, strerror):
-      log.error("Error %i while binding %s:%s: %s",
-                errno, self.address, self.port, strerror)
-      if errno == EADDRNOTAVAIL:
-        log.error(" You may be specifying a local address which is "
-                  "not assigned to any interface.")
-      elif errno == EADDRINUSE:
-        log.error(" You may have another controller running.")
-        log.error(" Use openflow.of_04 --port=<port> to run POX on another port.")
-      return
+    # Sockets we accept switch connections on
+    listeners = []
 
-    listener.listen(16)
-    sockets.append(listener)
+    listeners = self._listen()
+    if listeners is None: return
+    sockets.extend(listeners)
 
-    log.debug("Listening on %s:%s" % (self.address, self.port))
+    # Listeners we can't accept on for now (see ListenerBackoff)
+    backoff = ListenerBackoff(sockets)
 
     con = None
     while core.running:
       try:
         while True:
           con = None
-          rlist, wlist, elist = yield Select(sockets, [], sockets, 5)
+          timeout = backoff.resume(5)
+          rlist, wlist, elist = yield Select(sockets, [], sockets, timeout)
           if len(rlist) == 0 and len(wlist) == 0 and len(elist) == 0:
             if not core.running: break
 
           for con in elist:
-            if con is listener:
+            if con in listeners:
               raise RuntimeError("Error on listener socket")
             else:
               try:
@@ -1053,16 +1239,16 @@ class OpenFlow_04_Task (Task):
 
           timestamp = time.time()
           for con in rlist:
-            if con is listener:
-              new_sock = listener.accept()[0]
-              if pox.openflow.debug.pcap_traces:
-                new_sock = wrap_socket(new_sock)
-              new_sock.setblocking(0)
-              # Note that instantiating a Connection object fires a
-              # ConnectionUp event (after negotation has completed)
-              newcon = Connection(new_sock)
-              sockets.append( newcon )
-              #print str(newcon) + " connected"
+            if con in listeners:
+              for new_sock in accept_pending(con):
+                if pox.openflow.debug.pcap_traces:
+                  new_sock = wrap_socket(new_sock)
+                new_sock.setblocking(0)
+                # Note that instantiating a Connection object fires a
+                # ConnectionUp event (after negotation has completed)
+                newcon = Connection(new_sock)
+                sockets.append( newcon )
+                #print str(newcon) + " connected"
             else:
               con.idle_time = timestamp
               if con.read() is False:
@@ -1076,11 +1262,15 @@ class OpenFlow_04_Task (Task):
           if sys.exc_info()[1][0] == ECONNRESET:
             con.info("Connection reset")
             doTraceback = False
+          elif con in listeners and out_of_fds(sys.exc_info()[1]):
+            log.error("Couldn't accept connection: out of file descriptors.")
+            backoff.pause(con)
+            continue
 
         if doTraceback:
           log.exception("Exception reading connection " + str(con))
 
-        if con is listener:
+        if con in listeners:
           log.error("Exception on OpenFlow listener.  Aborting.")
           break
         try:
@@ -1096,6 +1286,26 @@ class OpenFlow_04_Task (Task):
 
     #pox.core.quit()
 
+  def _listen (self):
+    try:
+      listeners = make_listeners(self.address, self.port, self.backlog,
+                                 self.listeners, self.reuse_port)
+    except socket.error as (errno, strerror):
+      log.error("Error %i while binding %s:%s: %s",
+                errno, self.address, self.port, strerror)
+      if errno == EADDRNOTAVAIL:
+        log.error(" You may be specifying a local address which is "
+                  "not assigned to any interface.")
+      elif errno == EADDRINUSE:
+        log.error(" You may have another controller running.")
+        log.error(" Use openflow.of_04 --port=<port> to run POX on another port.")
+      return None
+
+    log.debug("Listening on %s:%s (%i listener%s, backlog %i)",
+              self.address, self.port, len(listeners),
+              "" if len(listeners) == 1 else "s", self.backlog)
+    return listeners
+
 
 def _set_handlers ():
   handlers.extend([None] * (1 + sorted(handlerMap.keys(),reverse=True)[0]))
@@ -1108,7 +1318,37 @@ _set_handlers()
 # Used by the Connection class
 deferredSender = None
 
-def launch (port=6653, address="0.0.0.0", name=None, __INSTANCE__=None):
+# Seconds a switch has to get through the handshake (0 means forever)
+HANDSHAKE_TIMEOUT = 10
+
+# Connections in the middle of handshakes, by when they time out
+_handshakes = TimingWheel()
+_handshake_timer = None
+
+def _expire_handshakes ():
+  for con in _handshakes.expire(time.time()):
+    if con.handshake is not None:
+      con.handshake.timed_out()
+
+def launch (port=6653, address="0.0.0.0", name=None,
+            backlog=DEFAULT_BACKLOG, listeners=1, reuse_port=False,
+            handshake_timeout=HANDSHAKE_TIMEOUT, trace_sample=None,
+            __INSTANCE__=None):
+  """
+  Listens for OpenFlow 1.3 switches
+
+  --backlog=N sets the length of the queue of connections waiting to be
+  accepted.
+  --listeners=N listens with N SO_REUSEPORT sockets, each with its own
+  accept queue.
+  --reuse_port sets SO_REUSEPORT so that several processes can listen on
+  the port.
+  --handshake_timeout=N drops switches which haven't finished connecting
+  after N seconds (0 disables).  See handshake_stats for how long they
+  usually take.
+  --trace_sample=N logs one in N messages on the openflow.of_04.trace
+  logger (see set_trace_sample()).
+  """
   if name is None:
     basename = "of_04"
     counter = 1
@@ -1128,6 +1368,16 @@ def launch (port=6653, address="0.0.0.0", name=None, __INSTANCE__=None):
   if of._logger is None:
     of._logger = core.getLogger('libopenflow_04')
 
-  l = OpenFlow_04_Task(port = int(port), address = address)
+  if trace_sample is not None:
+    set_trace_sample(trace_sample)
+
+  global HANDSHAKE_TIMEOUT, _handshake_timer
+  HANDSHAKE_TIMEOUT = float(handshake_timeout)
+  if HANDSHAKE_TIMEOUT and _handshake_timer is None:
+    _handshake_timer = Timer(1, _expire_handshakes, recurring = True)
+
+  l = OpenFlow_04_Task(port = int(port), address = address,
+                       backlog = int(backlog), listeners = int(listeners),
+                       reuse_port = pox.lib.util.str_to_bool(reuse_port))
   core.register(name, l)
   return l
@@ -0,0 +1,209 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Admission control for PacketIns
+
+All PacketIns are handled in the one cooperative thread, so a broadcast
+storm or a port scan behind one switch can keep the controller too busy
+to serve any of the others.  This component gives each switch and each
+switch port a token bucket.  PacketIns which arrive when either is empty
+are dropped before any events are raised for them.
+
+When a port's bucket runs dry, we also ask the switch to stop sending us
+so many misses from it for a while.  On OpenFlow 1.3 switches, this is a
+flow which sends that port's misses to the controller through a meter.
+On OpenFlow 1.0 switches, which don't have meters, it's a flow which just
+drops them.  Either way, it has a hard timeout.
+
+Counters are kept for each switch in core.PacketInLimiter.counters.
+
+Options:
+ --rate=X           PacketIns per second allowed for each switch
+ --burst=X          Size of each switch's bucket (default is rate)
+ --port_rate=X      PacketIns per second allowed for each switch port
+ --port_burst=X     Size of each port's bucket (default is port_rate)
+ --throttle_time=X  Seconds to throttle a port on the switch (0 disables)
+ --stats_interval=X Log counters every X seconds (0 disables)
+"""
+
+from pox.core import core
+from pox.lib.util import dpid_to_str, TokenBucket
+from pox.lib.recoco import Timer
+import pox.lib.metrics as metrics
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.libopenflow_04 as of04
+
+import struct
+import time
+
+log = core.getLogger()
+
+# Cookie marking our throttling flows
+_THROTTLE_COOKIE = 0x5049 << 48
+
+# Priority of throttling flows.  These should be above the table-miss entry
+# (which of_04 installs at priority 1), but below anything else.
+THROTTLE_PRIORITY = 2
+
+
+class PacketInCounters (object):
+  """
+  Counts what happened to a switch's PacketIns
+  """
+  def __init__ (self):
+    self.admitted = 0
+    self.dropped = 0       # Because the switch's bucket was empty
+    self.port_dropped = 0  # Because a port's bucket was empty
+    self.throttles = 0     # Number of times we've throttled a port
+
+  def __str__ (self):
+    return "admitted:%s dropped:%s port_dropped:%s throttles:%s" % (
+        self.admitted, self.dropped, self.port_dropped, self.throttles)
+
+
+class PacketInLimiter (object):
+  def __init__ (self, rate = 1000, burst = None, port_rate = 200,
+                port_burst = None, throttle_time = 5):
+    self.rate = rate
+    self.burst = burst
+    self.port_rate = port_rate
+    self.port_burst = port_burst
+    self.throttle_time = throttle_time
+
+    self.counters = {} # DPID -> PacketInCounters
+    self._buckets = {} # DPID -> TokenBucket
+    self._port_buckets = {} # (DPID,port) -> TokenBucket
+    self._throttled = {} # (DPID,port) -> time throttle ends
+    self._meters = {} # DPID -> {port : meter ID}
+    for field,help in (("admitted", "PacketIns let through"),
+        ("dropped", "PacketIns dropped for exceeding the switch's rate"),
+        ("port_dropped", "PacketIns dropped for exceeding a port's rate"),
+        ("throttles", "Times a port's PacketIns were throttled")):
+      metrics.counter("pox_packet_in_limiter_%s_total" % (field,), help,
+                      "dpid", self._counter_getter(field))
+
+    core.listen_to_dependencies(self)
+
+  def _all_dependencies_met (self):
+    core.openflow.packet_in_limiter = self
+
+  def _handle_openflow_ConnectionDown (self, event):
+    dpid = event.dpid
+    self._buckets.pop(dpid, None)
+    self._meters.pop(dpid, None)
+    for key in [k for k in self._port_buckets if k[0] == dpid]:
+      del self._port_buckets[key]
+    for key in [k for k in self._throttled if k[0] == dpid]:
+      del self._throttled[key]
+
+  def admit (self, connection, ofp):
+    """
+    Returns True if a PacketIn should be processed
+    """
+    dpid = connection.dpid
+    counters = self.counters.get(dpid)
+    if counters is None:
+      counters = PacketInCounters()
+      self.counters[dpid] = counters
+
+    now = time.time()
+    key = (dpid, ofp.in_port)
+    port_bucket = self._port_buckets.get(key)
+    if port_bucket is None:
+      port_bucket = TokenBucket(self.port_rate, self.port_burst, now = now)
+      self._port_buckets[key] = port_bucket
+    if port_bucket.available(now = now) < 1:
+      counters.port_dropped += 1
+      if self.throttle_time and self._throttled.get(key, 0) <= now:
+        self._throttle(connection, ofp, now)
+      return False
+
+    b = self._buckets.get(dpid)
+    if b is None:
+      b = TokenBucket(self.rate, self.burst, now = now)
+      self._buckets[dpid] = b
+    if not b.consume(now = now):
+      # Don't charge the port for a PacketIn it didn't get
+      counters.dropped += 1
+      return False
+
+    port_bucket.consume(now = now)
+    counters.admitted += 1
+    return True
+
+  def _throttle (self, connection, ofp, now):
+    """
+    Asks the switch to send fewer misses from ofp's in_port for a while
+    """
+    dpid = connection.dpid
+    port = ofp.in_port
+    self._throttled[(dpid,port)] = now + self.throttle_time
+    self.counters[dpid].throttles += 1
+    log.warn("%s: Throttling PacketIns from port %s for %s seconds",
+             dpid_to_str(dpid), port, self.throttle_time)
+
+    if ofp.version == of04.OFP_VERSION:
+      # Meter IDs are handed out per switch starting at 1.  (Port numbers
+      # won't do; e.g., OFPP_LOCAL is the same as OFPM_CONTROLLER.)
+      meters = self._meters.setdefault(dpid, {})
+      meter_id = meters.get(port)
+      if meter_id is None:
+        command = of04.OFPMC_ADD
+        meter_id = len(meters) + 1
+        meters[port] = meter_id
+      else:
+        command = of04.OFPMC_MODIFY
+      burst = self.port_burst if self.port_burst is not None else self.port_rate
+      connection.send(of04.ofp_meter_mod(meter_id = meter_id,
+          command = command,
+          flags = of04.OFPMF_PKTPS | of04.OFPMF_BURST,
+          bands = [of04.ofp_meter_band_drop(rate = int(self.port_rate),
+                                            burst_size = int(burst))]))
+
+      match = of04.ofp_match(oxm_fields_pkt = [
+          of04.oxm_match_field.from_name('OFPXMT_OFB_IN_PORT',
+                                         struct.pack("!L", port), port)])
+      connection.send(of04.ofp_flow_mod(cookie = _THROTTLE_COOKIE | port,
+          priority = THROTTLE_PRIORITY, hard_timeout = self.throttle_time,
+          match = match,
+          instructions = [of04.ofp_instruction_meter(meter_id = meter_id)],
+          actions = [of04.ofp_action_output(port = of04.OFPP_CONTROLLER,
+                                            max_len = of04.OFPCML_NO_BUFFER)]))
+    else:
+      # No meters, so just drop
+      connection.send(of.ofp_flow_mod(cookie = _THROTTLE_COOKIE | port,
+          priority = THROTTLE_PRIORITY, hard_timeout = self.throttle_time,
+          match = of.ofp_match(in_port = port)))
+
+  def _counter_getter (self, field):
+    def get ():
+      return dict((dpid_to_str(dpid), getattr(c, field))
+                  for dpid,c in self.counters.iteritems())
+    return get
+
+  def log_stats (self):
+    for dpid,c in sorted(self.counters.iteritems()):
+      if c.dropped or c.port_dropped:
+        log.info("%s: %s", dpid_to_str(dpid), c)
+
+
+def launch (rate = 1000, burst = None, port_rate = 200, port_burst = None,
+            throttle_time = 5, stats_interval = 0):
+  def num (v):
+    return None if v is None else float(v)
+  l = core.registerNew(PacketInLimiter, float(rate), num(burst),
+                       float(port_rate), num(port_burst), int(throttle_time))
+  if float(stats_interval):
+    Timer(float(stats_interval), l.log_stats, recurring = True)
@@ -51,6 +51,9 @@ def _calc_spanning_tree ():
   Returns it as dictionary where the keys are DPID1, and the
   values are tuples of (DPID2, port-num), where port-num
   is the port on DPID1 connecting to DPID2.
+
+  This calculates the whole thing from scratch.  The component itself
+  maintains its tree incrementally using _IncrementalTree.
   """
   def flip (link):
     return Discovery.Link(link[2],link[3], link[0],link[1])
@@ -65,9 +68,9 @@ def _calc_spanning_tree ():
 
   # Cull links -- we want a single symmetric link connecting nodes
   for s1 in switches:
-    for s2 in switches:
+    for s2 in adj[s1].keys():
       if s2 not in adj[s1]:
-        continue
+        continue # Deleted while culling the other direction
       if not isinstance(adj[s1][s2], list):
         continue
       assert s1 is not s2
@@ -131,6 +134,186 @@ _noflood_by_default = False
 _hold_down = False
 
 
+class _IncrementalTree (object):
+  """
+  Maintains a spanning forest as links come and go
+
+  Rather than recalculating the whole tree on every link change (which is
+  what _calc_spanning_tree() does), this keeps the graph of symmetric
+  links, the current tree edges, and which tree component each switch is
+  in.  Adding a link only adds a tree edge if it joins two components.
+  Removing a tree edge splits a component, and we search just the smaller
+  half for a replacement edge.
+
+  Changes are reported as a set of (dpid,port) whose flood state may have
+  changed; see flood().
+  """
+  def __init__ (self):
+    self._links = defaultdict(set) # (dpid1,dpid2) -> Links in that direction
+    self._port_use = defaultdict(int) # (dpid,port) -> number of Links on it
+    self.edges = defaultdict(dict) # dpid1 -> dpid2 -> (port1,port2)
+    self.tree = defaultdict(set) # dpid1 -> dpid2s connected by tree edges
+    self._tree_ports = defaultdict(int) # (dpid,port) -> tree edge count
+    self._comp = {} # dpid -> component ID
+    self._members = {} # component ID -> set of dpids
+    self._next_comp = 0
+    self.switches = set() # All switches we've ever seen a link on
+
+  def flood (self, dpid, port):
+    """
+    Should the given port flood?
+
+    Ports on the tree flood, and so do ports which don't connect to other
+    switches at all.
+    """
+    if self._tree_ports.get((dpid,port)): return True
+    return not self._port_use.get((dpid,port))
+
+  def add_link (self, link, dirty):
+    """
+    Adds a (unidirectional) Link from discovery
+
+    (dpid,port)s which need their flood state checked are added to dirty.
+    Switches seen for the first time are put in the result list.
+    """
+    new_switches = []
+    for dpid in (link.dpid1, link.dpid2):
+      if dpid not in self.switches:
+        self.switches.add(dpid)
+        self._new_comp(dpid)
+        new_switches.append(dpid)
+    links = self._links[link.dpid1,link.dpid2]
+    if link in links: return new_switches
+    links.add(link)
+    for e in link.end:
+      self._port_use[e] += 1
+      dirty.add(e)
+    self._refresh_pair(link.dpid1, link.dpid2, dirty)
+    return new_switches
+
+  def remove_link (self, link, dirty):
+    """
+    Removes a (unidirectional) Link from discovery
+    """
+    links = self._links.get((link.dpid1,link.dpid2))
+    if not links or link not in links: return
+    links.discard(link)
+    if not links: del self._links[link.dpid1,link.dpid2]
+    for e in link.end:
+      self._port_use[e] -= 1
+      if not self._port_use[e]: del self._port_use[e]
+      dirty.add(e)
+    self._refresh_pair(link.dpid1, link.dpid2, dirty)
+
+  def _pick_edge (self, a, b):
+    """
+    Picks the symmetric link (port_a,port_b) to use between a and b
+    """
+    back = self._links.get((b,a))
+    if not back: return None
+    best = None
+    for l in self._links.get((a,b), ()):
+      if Discovery.Link(b,l.port2,a,l.port1) in back:
+        if best is None or l.port1 < best[0]:
+          best = (l.port1,l.port2)
+    return best
+
+  def _refresh_pair (self, a, b, dirty):
+    new = self._pick_edge(a, b)
+    old = self.edges[a].get(b)
+    if new == old: return
+
+    is_tree = b in self.tree[a]
+    if is_tree:
+      self._set_tree_ports(a, b, old, -1, dirty)
+
+    if new is None:
+      del self.edges[a][b]
+      del self.edges[b][a]
+      if is_tree:
+        self.tree[a].discard(b)
+        self.tree[b].discard(a)
+        self._split(a, b, dirty)
+      return
+
+    self.edges[a][b] = new
+    self.edges[b][a] = (new[1],new[0])
+    if is_tree:
+      # Same edge, different ports
+      self._set_tree_ports(a, b, new, 1, dirty)
+    elif self._comp[a] != self._comp[b]:
+      self._add_tree_edge(a, b, dirty)
+
+  def _set_tree_ports (self, a, b, ports, delta, dirty):
+    for e in ((a,ports[0]),(b,ports[1])):
+      self._tree_ports[e] += delta
+      if not self._tree_ports[e]: del self._tree_ports[e]
+      dirty.add(e)
+
+  def _new_comp (self, dpid):
+    c = self._next_comp
+    self._next_comp += 1
+    self._comp[dpid] = c
+    self._members[c] = set([dpid])
+    return c
+
+  def _add_tree_edge (self, a, b, dirty):
+    self.tree[a].add(b)
+    self.tree[b].add(a)
+    self._set_tree_ports(a, b, self.edges[a][b], 1, dirty)
+    # Merge the smaller component into the bigger one
+    ca,cb = self._comp[a],self._comp[b]
+    if len(self._members[ca]) < len(self._members[cb]): ca,cb = cb,ca
+    small = self._members.pop(cb)
+    for dpid in small:
+      self._comp[dpid] = ca
+    self._members[ca].update(small)
+
+  def _split (self, a, b, dirty):
+    """
+    Handles a and b no longer being connected by a tree edge
+    """
+    # Walk the tree from both sides at once until one side runs out,
+    # so we only pay for the smaller one.
+    sides = [[a],[b]]
+    seen = [set([a]),set([b])]
+    while sides[0] and sides[1]:
+      for side,s in zip(sides,seen):
+        v = side.pop()
+        for w in self.tree[v]:
+          if w not in s:
+            s.add(w)
+            side.append(w)
+    small = seen[0] if not sides[0] else seen[1]
+
+    old = self._comp[a]
+    self._members[old].difference_update(small)
+    c = self._next_comp
+    self._next_comp += 1
+    self._members[c] = small
+    for dpid in small:
+      self._comp[dpid] = c
+
+    # Look for another way to connect the halves
+    for v in sorted(small):
+      for w in sorted(self.edges[v]):
+        if self._comp[w] == old:
+          self._add_tree_edge(v, w, dirty)
+          return
+
+
+_tree = _IncrementalTree()
+
+# How long to collect link changes before acting on them.  A link which
+# goes down and comes back up (or vice versa) within this period doesn't
+# cause any port changes at all.
+_debounce_period = 0.5
+
+_pending_links = {} # Link -> True/False for added/removed
+_pending_switches = set() # DPIDs (re)connected; all their ports get checked
+_pending_timer = None
+
+
 def _handle_ConnectionUp (event):
   # When a switch connects, forget about previous port states
   _prev[event.dpid].clear()
@@ -151,19 +334,69 @@ def _handle_ConnectionUp (event):
   if _hold_down:
     t = Timer(core.openflow_discovery.send_cycle_time + 1, _update_tree,
               kw={'force_dpid':event.dpid})
+  else:
+    # A switch which reconnects may already be in the tree (so no new
+    # links will make us look at it), and we just forgot its port states.
+    _pending_switches.add(event.dpid)
+    _schedule_pending(later = True)
 
 
 def _handle_LinkEvent (event):
   # When links change, update spanning tree
+  _pending_links[event.link] = event.added
+
+  if _debounce_period:
+    _schedule_pending()
+  elif not event.more_pending:
+    # Several links went away at once; just update for the last of them
+    _apply_pending()
+
+
+def _schedule_pending (later = False):
+  """
+  Arranges for _apply_pending() to be called after the debounce period
+
+  If there's no debounce period, it's called right away, or if later is
+  set, as soon as the scheduler gets to it.
+  """
+  global _pending_timer
+  if _pending_timer is not None: return
+  if _debounce_period:
+    _pending_timer = core.callDelayed(_debounce_period, _apply_pending)
+  elif later:
+    _pending_timer = core.callDelayed(0, _apply_pending)
+  else:
+    _apply_pending()
 
-  (dp1,p1),(dp2,p2) = event.link.end
-  if _prev[dp1][p1] is False:
-    if _prev[dp2][p2] is False:
-      # We're disabling this link; who cares if it's up or down?
-      #log.debug("Ignoring link status for %s", event.link)
-      return
 
-  _update_tree()
+def _apply_pending ():
+  """
+  Applies pending link changes to the tree and updates ports
+  """
+  global _pending_timer
+  _pending_timer = None
+  dirty = set()
+  for link,added in _pending_links.iteritems():
+    if added:
+      for dpid in _tree.add_link(link, dirty):
+        # First time this switch is part of the tree; check all its ports
+        _dirty_all_ports(dpid, dirty)
+    else:
+      _tree.remove_link(link, dirty)
+  _pending_links.clear()
+  for dpid in _pending_switches:
+    _dirty_all_ports(dpid, dirty)
+  _pending_switches.clear()
+  if dirty:
+    _update_ports(dirty)
+
+
+def _dirty_all_ports (dpid, dirty):
+  con = core.openflow.getConnection(dpid)
+  if con is None: return
+  for p in con.ports.itervalues():
+    if p.port_no < of.OFPP_MAX:
+      dirty.add((dpid,p.port_no))
 
 
 def _update_tree (force_dpid = None):
@@ -171,13 +404,18 @@ def _update_tree (force_dpid = None):
   Update spanning tree
 
   force_dpid specifies a switch we want to update even if we are supposed
-  to be holding down changes.
+  to be holding down changes.  All of its ports are checked.
   """
+  dirty = set()
+  if force_dpid is not None:
+    _dirty_all_ports(force_dpid, dirty)
+  _update_ports(dirty, force_dpid)
 
-  # Get a spanning tree
-  tree = _calc_spanning_tree()
-  log.debug("Spanning tree updated")
 
+def _update_ports (dirty, force_dpid = None):
+  """
+  Sets the flood bit on the given (dpid,port)s according to the tree
+  """
   # Connections born before this time are old enough that a complete
   # discovery cycle should have completed (and, thus, all of their
   # links should have been discovered).
@@ -186,7 +424,8 @@ def _update_tree (force_dpid = None):
   # Now modify ports as needed
   try:
     change_count = 0
-    for sw, ports in tree.iteritems():
+    changed_switches = set()
+    for sw, port_no in dirty:
       con = core.openflow.getConnection(sw)
       if con is None: continue # Must have disconnected
       if con.connect_time is None: continue # Not fully connected
@@ -200,28 +439,24 @@ def _update_tree (force_dpid = None):
           else:
             continue
 
-      tree_ports = [p[1] for p in ports]
-      for p in con.ports.itervalues():
-        if p.port_no < of.OFPP_MAX:
-          flood = p.port_no in tree_ports
-          if not flood:
-            if core.openflow_discovery.is_edge_port(sw, p.port_no):
-              flood = True
-          if _prev[sw][p.port_no] is flood:
-            #print sw,p.port_no,"skip","(",flood,")"
-            continue # Skip
-          change_count += 1
-          _prev[sw][p.port_no] = flood
-          #print sw,p.port_no,flood
-          #TODO: Check results
-
-          pm = of.ofp_port_mod(port_no=p.port_no,
-                               hw_addr=p.hw_addr,
-                               config = 0 if flood else of.OFPPC_NO_FLOOD,
-                               mask = of.OFPPC_NO_FLOOD)
-          con.send(pm)
-
-          _invalidate_ports(con.dpid)
+      p = con.ports.get(port_no)
+      if p is None or p.port_no >= of.OFPP_MAX: continue
+      flood = _tree.flood(sw, port_no)
+      if _prev[sw][port_no] is flood:
+        continue # Skip
+      change_count += 1
+      _prev[sw][port_no] = flood
+      #TODO: Check results
+
+      pm = of.ofp_port_mod(port_no=p.port_no,
+                           hw_addr=p.hw_addr,
+                           config = 0 if flood else of.OFPPC_NO_FLOOD,
+                           mask = of.OFPPC_NO_FLOOD)
+      con.send(pm)
+      changed_switches.add(sw)
+
+    for sw in changed_switches:
+      _invalidate_ports(sw)
     if change_count:
       log.info("%i ports changed", change_count)
   except:
@@ -264,12 +499,20 @@ def _check_ports (dpid):
   log.debug("Requested switch features for %s", str(con))
 
 
-def launch (no_flood = False, hold_down = False):
-  global _noflood_by_default, _hold_down
+def launch (no_flood = False, hold_down = False, debounce = None):
+  """
+  Maintains a spanning tree by setting port flood bits
+
+  --debounce=<secs> sets how long link changes are collected before the
+  tree is updated (0 to update immediately).
+  """
+  global _noflood_by_default, _hold_down, _debounce_period
   if no_flood is True:
     _noflood_by_default = True
   if hold_down is True:
     _hold_down = True
+  if debounce is not None:
+    _debounce_period = float(debounce)
 
   def start_spanning_tree ():
     core.openflow.addListenerByName("ConnectionUp", _handle_ConnectionUp)
@@ -12,11 +12,119 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import pox.openflow.libopenflow_04 as of
 import struct
+import socket
+import time
+from errno import EAGAIN, EWOULDBLOCK, EMFILE, ENFILE
 from pox.lib.revent import EventMixin
 import pox.openflow
 
+# Default accept backlog for OpenFlow listeners.  The kernel clamps this to
+# net.core.somaxconn.
+DEFAULT_BACKLOG = 1024
+
+# Not all versions of Python know about SO_REUSEPORT; this is its value on
+# Linux.
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+
+def make_listeners (address, port, backlog = DEFAULT_BACKLOG, count = 1,
+                    reuse_port = False):
+  """
+  Returns a list of count non-blocking listening sockets
+
+  If count is more than one or reuse_port is set, the sockets are bound
+  with SO_REUSEPORT, so they (and those of other processes doing the same
+  thing) all listen on the same port, each with its own accept queue.  The
+  kernel spreads incoming connections across them.
+
+  Raises socket.error if binding fails.
+  """
+  reuse_port = reuse_port or count > 1
+  listeners = []
+  try:
+    for i in range(count):
+      listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+      listeners.append(listener)
+      listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+      if reuse_port:
+        listener.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+      listener.bind((address, port))
+      listener.listen(backlog)
+      listener.setblocking(0)
+  except:
+    for listener in listeners:
+      listener.close()
+    raise
+  return listeners
+
+
+def accept_pending (listener, limit = 64):
+  """
+  Accepts up to limit connections waiting on a non-blocking listener
+
+  During a connection storm, accepting one connection per trip through
+  the select loop lets the accept queue overflow.  The limit keeps a storm
+  from starving connections which are already up, though.
+
+  Returns a list of sockets.
+  """
+  r = []
+  while len(r) < limit:
+    try:
+      r.append(listener.accept()[0])
+    except socket.error as e:
+      if e.args[0] in (EAGAIN, EWOULDBLOCK): break
+      if r: break # Deal with it next time
+      raise
+  return r
+
+def out_of_fds (exc):
+  """
+  True if exc is a socket error from running out of file descriptors
+  """
+  return isinstance(exc, socket.error) and exc.args[0] in (EMFILE, ENFILE)
+
+class ListenerBackoff (object):
+  """
+  Takes listeners out of a select set for a while
+
+  When we're out of file descriptors, a listener with connections waiting
+  stays readable but accepting keeps failing, so leaving it in the set
+  means spinning in the select loop.  Pause it instead, and give it back
+  after delay seconds (by which time some connections may have closed).
+  """
+  def __init__ (self, sockets, delay = 1):
+    self.sockets = sockets
+    self.delay = delay
+    self.paused = {} # listener -> time to resume
+
+  def pause (self, listener, now = None):
+    if listener in self.paused: return
+    if now is None: now = time.time()
+    self.paused[listener] = now + self.delay
+    try:
+      self.sockets.remove(listener)
+    except ValueError:
+      pass
+
+  def resume (self, timeout, now = None):
+    """
+    Puts back listeners whose time is up
+
+    Returns timeout, or less if a listener is due back sooner.
+    """
+    if not self.paused: return timeout
+    if now is None: now = time.time()
+    for listener,when in self.paused.items():
+      if when <= now:
+        del self.paused[listener]
+        self.sockets.append(listener)
+      else:
+        timeout = min(timeout, when - now)
+    return timeout
+
+
 def make_type_to_unpacker_table ():
   """
   Returns a list of unpack methods.
@@ -24,6 +132,9 @@ def make_type_to_unpacker_table ():
   The resulting list maps OpenFlow types to functions which unpack
   data for those types into message objects.
   """
+  # Imported here so that importing this module doesn't mean loading all
+  # of libopenflow_04.
+  import pox.openflow.libopenflow_04 as of
 
   top = max(of._message_type_to_class)
 
@@ -32,6 +143,21 @@ def make_type_to_unpacker_table ():
   return r
 
 
+def count_message_types (counts, data):
+  """
+  Adds one to counts[type] for each OpenFlow message in data
+
+  Works for any OpenFlow version.
+  """
+  offset = 0
+  end = len(data) - 8
+  while offset <= end:
+    counts[ord(data[offset+1])] += 1
+    length = ord(data[offset+2]) << 8 | ord(data[offset+3])
+    if length < 8: break
+    offset += length
+
+
 class DPIDWatcher (EventMixin):
   """
   Strains OpenFlow messages by DPID
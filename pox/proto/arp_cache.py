@@ -0,0 +1,375 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A shared ARP (neighbor) cache
+
+Several components want to know which MAC goes with an IP address and
+which switch port it's behind.  Rather than have each of them snoop ARPs
+and keep (and expire) its own table, this component does it once and other
+components look things up in it and listen to its events:
+
+  core.ARPCache.lookup(ip)             -> EthAddr or None
+  core.ARPCache.get_location(dpid, ip) -> (port, EthAddr) or None
+  NeighborUpdate                       -> an IP's MAC or location changed
+  NeighborExpired                      -> an IP (or its location) timed out
+
+It also holds on to the buffer IDs of packets which are waiting for an
+address to be resolved (see queue_buffer() and pop_buffers()), with limits
+on how many it will hold for each IP and each switch.  Buffers which wait
+too long are dropped on the switch.
+
+Entries are expired using a timing wheel, so the cost of expiration is
+proportional to the number of entries actually expiring.
+
+encode_arp_reply() builds ARP reply frames by patching a pre-encoded
+template rather than going through the packet library.
+
+Components which use the cache launch it themselves, and there is only
+one, so its options are shared.  If any of them asks for learn_from_ip
+(l3_learning does), everyone gets entries learned from IP packets, not
+just ARPs.  The timeout is whatever the first launcher asked for; a
+different one from a later launcher is ignored (with a warning).
+"""
+
+from pox.core import core
+log = core.getLogger()
+
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.arp import arp
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.util import dpid_to_str, str_to_bool
+from pox.lib.revent import Event, EventMixin
+from pox.lib.recoco import Timer
+from pox.lib.timing_wheel import TimingWheel
+
+import pox.openflow.libopenflow_01 as of
+
+from collections import deque
+import struct
+import time
+
+
+# Timeout for learned entries
+ARP_TIMEOUT = 60 * 4
+
+# Maximum number of packets to buffer on a switch for an unknown IP
+MAX_BUFFERED_PER_IP = 5
+
+# Maximum number of packets to buffer on a switch for all unknown IPs
+MAX_BUFFERED_PER_DPID = 256
+
+# Maximum time to hang on to a buffer for an unknown IP in seconds
+MAX_BUFFER_TIME = 5
+
+
+_reply_header = struct.pack("!HHHBBH", ethernet.ARP_TYPE,
+                            arp.HW_TYPE_ETHERNET, arp.PROTO_TYPE_IP,
+                            6, 4, arp.REPLY)
+_reply_template = bytearray(12) + bytearray(_reply_header) + bytearray(20)
+_vlan_reply_template = (bytearray(12) + bytearray(struct.pack("!HH",
+                        ethernet.VLAN_TYPE, 0)) + bytearray(_reply_header)
+                        + bytearray(20))
+_eth_addrs = struct.Struct("!6s6s")
+_arp_addrs = struct.Struct("!6s4s6s4s")
+_vlan_tci = struct.Struct("!H")
+
+
+def encode_arp_reply (eth_src, eth_dst, hwsrc, protosrc, hwdst, protodst,
+                      vlan_id = None, vlan_pcp = 0):
+  """
+  Returns an Ethernet ARP reply frame as bytes
+
+  The frame is 802.1Q tagged if vlan_id is not None.
+  """
+  if vlan_id is None:
+    buf = bytearray(_reply_template)
+    offset = 22
+  else:
+    buf = bytearray(_vlan_reply_template)
+    _vlan_tci.pack_into(buf, 14, (vlan_pcp << 13) | vlan_id)
+    offset = 26
+  _eth_addrs.pack_into(buf, 0, EthAddr(eth_dst).raw, EthAddr(eth_src).raw)
+  _arp_addrs.pack_into(buf, offset, EthAddr(hwsrc).raw, IPAddr(protosrc).raw,
+                       EthAddr(hwdst).raw, IPAddr(protodst).raw)
+  return bytes(buf)
+
+
+class NeighborUpdate (Event):
+  """
+  Raised when we learn something new about an IP address
+
+  mac is its (maybe new) MAC and old_mac is the previous one (or None if
+  we didn't know it).  If it was seen on a switch, dpid and port are where;
+  old_port is where it was previously seen on that switch (if anywhere).
+  """
+  def __init__ (self, ip, mac, old_mac, dpid, port, old_port):
+    super(NeighborUpdate,self).__init__()
+    self.ip = ip
+    self.mac = mac
+    self.old_mac = old_mac
+    self.dpid = dpid
+    self.port = port
+    self.old_port = old_port
+
+  @property
+  def moved (self):
+    return self.old_port is not None and self.old_port != self.port
+
+
+class NeighborExpired (Event):
+  """
+  Raised when an entry times out
+
+  If dpid is None, we've forgotten the IP entirely; otherwise, we've just
+  forgotten where it is on that switch.
+  """
+  def __init__ (self, ip, mac, dpid = None):
+    super(NeighborExpired,self).__init__()
+    self.ip = ip
+    self.mac = mac
+    self.dpid = dpid
+
+
+class Neighbor (object):
+  def __init__ (self, mac, expires_at):
+    self.mac = mac
+    self.expires_at = expires_at
+
+
+class ARPCache (EventMixin):
+  _eventMixin_events = set([NeighborUpdate, NeighborExpired])
+
+  # We want to learn before anyone else looks at the packet
+  _listen_priority = 1000
+
+  def __init__ (self, timeout = ARP_TIMEOUT, learn_from_ip = False):
+    self.timeout = timeout
+
+    # If True, we also learn from source addresses of IP packets (which is
+    # only right if the switches aren't routing)
+    self.learn_from_ip = learn_from_ip
+
+    self.max_buffered_per_ip = MAX_BUFFERED_PER_IP
+    self.max_buffered_per_dpid = MAX_BUFFERED_PER_DPID
+    self.max_buffer_time = MAX_BUFFER_TIME
+
+    self._neighbors = {} # IP -> Neighbor
+    self._locations = {} # (dpid,IP) -> (port,MAC)
+    self._expiry = TimingWheel() # Of IP and (dpid,IP)
+
+    self._buffers = {} # (dpid,IP) -> deque of (expires_at,buffer_id,in_port)
+    self._buffer_counts = {} # dpid -> total buffers held
+    self._buffer_expiry = TimingWheel() # Of (dpid,IP)
+
+    self._expire_timer = Timer(1, self._expire, recurring=True)
+
+    core.listen_to_dependencies(self, listen_args={'openflow':
+        {'priority':self._listen_priority}})
+
+  def __len__ (self):
+    return len(self._neighbors)
+
+  def __contains__ (self, ip):
+    return ip in self._neighbors
+
+  def items (self):
+    """
+    Returns a list of (IP, Neighbor)
+    """
+    return self._neighbors.items()
+
+  def lookup (self, ip):
+    """
+    Returns the MAC for ip or None
+    """
+    n = self._neighbors.get(ip)
+    if n is None: return None
+    return n.mac
+
+  def get_location (self, dpid, ip):
+    """
+    Returns (port, MAC) for ip as seen on switch dpid, or None
+    """
+    return self._locations.get((dpid,ip))
+
+  def learn (self, ip, mac, dpid = None, port = None):
+    """
+    Learn (or refresh) that ip has mac (and is at dpid.port)
+
+    Returns True if anything changed.
+    """
+    expires_at = time.time() + self.timeout
+    n = self._neighbors.get(ip)
+    old_mac = None
+    changed = False
+    if n is None:
+      n = Neighbor(mac, expires_at)
+      self._neighbors[ip] = n
+      changed = True
+      log.debug("Learned %s -> %s", ip, mac)
+    else:
+      n.expires_at = expires_at
+      if n.mac != mac:
+        old_mac = n.mac
+        n.mac = mac
+        changed = True
+        log.info("RE-learned %s: %s -> %s", ip, old_mac, mac)
+      else:
+        old_mac = mac
+    self._expiry.set(ip, expires_at)
+
+    old_port = None
+    if dpid is not None:
+      key = (dpid,ip)
+      loc = self._locations.get(key)
+      if loc != (port,mac):
+        if loc is not None:
+          old_port = loc[0]
+          if old_port != port:
+            log.info("%s moved on %s from port %s to %s", ip,
+                     dpid_to_str(dpid), old_port, port)
+        self._locations[key] = (port,mac)
+        changed = True
+      else:
+        old_port = port
+      self._expiry.set(key, expires_at)
+
+    if changed:
+      self.raiseEventNoErrors(NeighborUpdate, ip, mac, old_mac, dpid, port,
+                              old_port)
+    return changed
+
+  def forget (self, ip):
+    """
+    Forget everything about ip
+    """
+    n = self._neighbors.pop(ip, None)
+    self._expiry.remove(ip)
+    for key in [k for k in self._locations if k[1] == ip]:
+      del self._locations[key]
+      self._expiry.remove(key)
+    return n is not None
+
+  def queue_buffer (self, dpid, ip, buffer_id, in_port):
+    """
+    Hold a buffered packet on dpid until we know where ip is
+
+    If there are already too many for ip, the oldest one is dropped.
+    Returns False if the buffer can't be held (in which case the caller
+    should deal with it).
+    """
+    if buffer_id is None or buffer_id == -1: return False
+    key = (dpid,ip)
+    count = self._buffer_counts.get(dpid, 0)
+    q = self._buffers.get(key)
+    if q is not None and len(q) >= self.max_buffered_per_ip:
+      _,old_id,old_port = q.popleft()
+      self._drop_buffer(dpid, old_id, old_port)
+      count -= 1
+    elif count >= self.max_buffered_per_dpid:
+      return False
+
+    expires_at = time.time() + self.max_buffer_time
+    if q is None:
+      q = deque()
+      self._buffers[key] = q
+      self._buffer_expiry.set(key, expires_at)
+    q.append((expires_at,buffer_id,in_port))
+    self._buffer_counts[dpid] = count + 1
+    return True
+
+  def pop_buffers (self, dpid, ip):
+    """
+    Returns and forgets [(buffer_id,in_port),...] waiting on dpid for ip
+    """
+    key = (dpid,ip)
+    q = self._buffers.pop(key, None)
+    if q is None: return []
+    self._buffer_expiry.remove(key)
+    self._buffer_counts[dpid] -= len(q)
+    return [(b,p) for _,b,p in q]
+
+  def _drop_buffer (self, dpid, buffer_id, in_port):
+    po = of.ofp_packet_out(buffer_id = buffer_id, in_port = in_port)
+    core.openflow.sendToDPID(dpid, po)
+
+  def _expire (self):
+    now = time.time()
+
+    for key in self._expiry.expire(now):
+      if type(key) is tuple:
+        loc = self._locations.pop(key, None)
+        if loc is None: continue
+        self.raiseEventNoErrors(NeighborExpired, key[1], loc[1], key[0])
+      else:
+        n = self._neighbors.pop(key, None)
+        if n is None: continue
+        log.debug("Expired %s -> %s", key, n.mac)
+        self.raiseEventNoErrors(NeighborExpired, key, n.mac)
+
+    for key in self._buffer_expiry.expire(now):
+      dpid = key[0]
+      q = self._buffers[key]
+      while q and q[0][0] <= now:
+        _,buffer_id,in_port = q.popleft()
+        self._drop_buffer(dpid, buffer_id, in_port)
+        self._buffer_counts[dpid] -= 1
+      if q:
+        self._buffer_expiry.set(key, q[0][0])
+      else:
+        del self._buffers[key]
+
+  def _handle_openflow_ConnectionDown (self, event):
+    # Buffers on that switch are gone
+    dpid = event.dpid
+    for key in [k for k in self._buffers if k[0] == dpid]:
+      del self._buffers[key]
+      self._buffer_expiry.remove(key)
+    self._buffer_counts.pop(dpid, None)
+
+  def _handle_openflow_PacketIn (self, event):
+    packet = event.parsed
+    if packet.type == ethernet.ARP_TYPE:
+      a = packet.next
+    elif packet.type == ethernet.VLAN_TYPE:
+      a = packet.find('arp')
+    else:
+      a = None
+
+    if a is not None:
+      if a.prototype != arp.PROTO_TYPE_IP: return
+      if a.hwtype != arp.HW_TYPE_ETHERNET: return
+      if a.protosrc == 0: return
+      # Note that the ARP's hwsrc isn't necessarily the Ethernet source
+      self.learn(a.protosrc, a.hwsrc, event.dpid, event.port)
+      return
+
+    if self.learn_from_ip:
+      ipp = packet.find('ipv4')
+      if ipp is None or ipp.srcip == 0: return
+      self.learn(ipp.srcip, packet.src, event.dpid, event.port)
+
+
+def launch (timeout = ARP_TIMEOUT, learn_from_ip = False):
+  if core.hasComponent("ARPCache"):
+    # Someone else already launched us; just adjust the options
+    cache = core.ARPCache
+    if int(timeout) != cache.timeout:
+      log.warn("ARP cache is already running with a %s second timeout; "
+               "ignoring timeout=%s", cache.timeout, timeout)
+    if str_to_bool(learn_from_ip):
+      cache.learn_from_ip = True
+    return
+  core.registerNew(ARPCache, int(timeout), str_to_bool(learn_from_ip))
@@ -32,6 +32,7 @@ from pox.lib.packet.arp import arp
 from pox.lib.addresses import EthAddr, IPAddr
 from pox.lib.util import dpid_to_str, str_to_bool
 from pox.lib.revent import EventHalt, Event, EventMixin
+from pox.proto.arp_cache import encode_arp_reply
 
 import pox.openflow.libopenflow_01 as of
 
@@ -54,16 +55,10 @@ def send_arp_reply (reply_to, mac, src_mac = None, src_ip = None):
     src_mac = reply_to.connection.ports[reply_to.port].hw_addr
   else:
     src_mac = EthAddr(src_mac)
-  r = arp()
-  r.opcode = r.REPLY
-  r.hwdst = arpp.hwsrc
-  r.protodst = arpp.protosrc
-  r.hwsrc = EthAddr(src_mac)
-  r.protosrc = IPAddr("0.0.0.0") if src_ip is None else IPAddr(src_ip)
-  e = ethernet(type=ethernet.ARP_TYPE, src=src_mac, dst=r.hwdst)
-  e.payload = r
+  protosrc = IPAddr("0.0.0.0") if src_ip is None else IPAddr(src_ip)
   msg = of.ofp_packet_out()
-  msg.data = e.pack()
+  msg.data = encode_arp_reply(src_mac, arpp.hwsrc, src_mac, protosrc,
+                              arpp.hwsrc, arpp.protosrc)
   msg.actions.append(of.ofp_action_output(port = reply_to.port))
   msg.in_port = of.OFPP_NONE
   reply_to.connection.send(msg)
@@ -207,22 +202,18 @@ class ARPHelper (EventMixin):
                       self.eat_packets, inport)
       self.raiseEvent(ev)
       if ev.reply is not None:
-        r = arp()
-        r.hwtype = a.hwtype
-        r.prototype = a.prototype
-        r.hwlen = a.hwlen
-        r.protolen = a.protolen
-        r.opcode = arp.REPLY
-        r.hwdst = a.hwsrc
-        r.protodst = a.protosrc
-        r.protosrc = a.protodst
-        r.hwsrc = EthAddr(ev.reply)
-        e = ethernet(type=packet.type, src=ev.reply_from, dst=a.hwsrc)
-        e.payload = r
+        vlan_id = None
+        vlan_pcp = 0
+        if packet.type == ethernet.VLAN_TYPE:
+          v_rcv = packet.find('vlan')
+          vlan_id = v_rcv.id
+          vlan_pcp = v_rcv.pcp
         log.debug("%s answering ARP for %s" % (dpid_to_str(dpid),
-            str(r.protosrc)))
+            str(a.protodst)))
         msg = of.ofp_packet_out()
-        msg.data = e.pack()
+        msg.data = encode_arp_reply(ev.reply_from, a.hwsrc, ev.reply,
+                                    a.protodst, a.hwsrc, a.protosrc,
+                                    vlan_id, vlan_pcp)
         msg.actions.append(of.ofp_action_output(port =
                                                 of.OFPP_IN_PORT))
         msg.in_port = inport
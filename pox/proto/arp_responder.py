@@ -23,6 +23,13 @@ Add ARP entries on commandline like:
   arp_responder --<IP>=<MAC> --<IP>=<MAC>
 
 Leave MAC unspecified if you want to use the switch MAC.
+
+Learned entries are kept in the shared ARP cache (proto.arp_cache), which
+is launched automatically unless --no_learn is given.
+
+With --of13, this speaks OpenFlow 1.3 (use it with openflow.of_04), and
+once it has answered a request it installs a flow which answers further
+ones in the switch using set-field actions.  See _offload().
 """
 
 from pox.core import core
@@ -31,20 +38,27 @@ log = core.getLogger()
 
 from pox.lib.packet.ethernet import ethernet, ETHER_BROADCAST
 from pox.lib.packet.arp import arp
-from pox.lib.packet.vlan import vlan
 from pox.lib.addresses import IPAddr, EthAddr
 from pox.lib.util import dpid_to_str, str_to_bool
 from pox.lib.recoco import Timer
 from pox.lib.revent import EventHalt
+from pox.lib.timing_wheel import TimingWheel
+from pox.proto.arp_cache import encode_arp_reply
+import pox.proto.arp_cache as arp_cache
 
 import pox.openflow.libopenflow_01 as of
+import pox.openflow.libopenflow_04 as of04
 
+import struct
 import time
 
 
 # Timeout for ARP entries
 ARP_TIMEOUT = 60 * 4
 
+# Cookie marking responder flows (the low 32 bits are the IP)
+_RESPONDER_COOKIE = 0x4152 << 48
+
 
 class Entry (object):
   """
@@ -85,8 +99,19 @@ class Entry (object):
 
 
 class ARPTable (dict):
+  """
+  Static (and manually added) entries
+
+  Learned entries live in the ARP cache, but show up here too.
+  """
   def __repr__ (self):
     o = []
+    if _learn and core.hasComponent("ARPCache"):
+      for k,n in core.ARPCache.items():
+        if k in self: continue
+        t = int(n.expires_at - time.time())
+        t = "X" if t < 0 else str(t) + "s left"
+        o.append((k,"%-17s %-20s %3s" % (k, n.mac, t)))
     for k,e in self.iteritems():
       t = int(e.timeout - time.time())
       if t < 0:
@@ -99,7 +124,7 @@ class ARPTable (dict):
       o.append((k,"%-17s %-20s %3s" % (k, mac, t)))
 
     for k,t in _failed_queries.iteritems():
-      if k not in self:
+      if k not in self and not (_learn and k in core.ARPCache):
         t = int(time.time() - t)
         o.append((k,"%-17s %-20s %3ss ago" % (k, '?', t)))
 
@@ -114,11 +139,15 @@ class ARPTable (dict):
     key = IPAddr(key)
     if not isinstance(val, Entry):
       val = Entry(val)
+    old = self.get(key)
+    if old is not None and (old.static,old.mac) != (val.static,val.mac):
+      _withdraw(key)
     dict.__setitem__(self, key, val)
 
   def __delitem__ (self, key):
     key = IPAddr(key)
     dict.__delitem__(self, key)
+    _withdraw(key)
 
   def set (self, key, value=True, static=True):
     if not isinstance(value, Entry):
@@ -127,16 +156,38 @@ class ARPTable (dict):
 
 
 def _handle_expiration ():
+  # This table only has static and manually added entries, so it's small
   for k,e in _arp_table.items():
     if e.is_expired:
       del _arp_table[k]
-  for k,t in _failed_queries.items():
-    if time.time() - t > ARP_TIMEOUT:
-      del _failed_queries[k]
+  for k in _failed_expiry.expire():
+    _failed_queries.pop(k, None)
+
+
+def _set_field (field, data):
+  return of04.ofp_action_set_field(
+      oxm_field = of04.oxm_match_field.from_name(field, data))
+
+def _withdraw (ip):
+  """
+  Removes responder flows for ip (because its answer changed)
+  """
+  dpids = _offloaded.pop(ip, None)
+  if not dpids: return
+  log.debug("Withdrawing responder flows for %s", ip)
+  for dpid in dpids:
+    fm = of04.ofp_flow_mod(command = of04.OFPFC_DELETE,
+                           cookie = _RESPONDER_COOKIE | ip.toUnsignedN(),
+                           cookie_mask = 0xffffffffffffffff,
+                           out_port = of04.OFPP_ANY, match = of04.ofp_match(oxm_fields_pkt = []))
+    core.openflow.sendToDPID(dpid, fm)
 
 
 class ARPResponder (object):
-  def __init__ (self):
+  def __init__ (self, of13 = False):
+    self.of13 = of13
+    self._of = of04 if of13 else of
+
     # This timer handles expiring stuff
     self._expire_timer = Timer(5, _handle_expiration, recurring=True)
 
@@ -144,21 +195,83 @@ class ARPResponder (object):
 
   def _handle_GoingUpEvent (self, event):
     core.openflow.addListeners(self)
+    if self.of13 and _learn:
+      core.ARPCache.addListeners(self)
     log.debug("Up...")
 
   def _handle_ConnectionUp (self, event):
+    if self.of13:
+      # Anything left over from before may be stale
+      event.connection.send(of04.ofp_flow_mod(command = of04.OFPFC_DELETE,
+          cookie = _RESPONDER_COOKIE, cookie_mask = 0xffff << 48,
+          out_port = of04.OFPP_ANY, match = of04.ofp_match(oxm_fields_pkt = [])))
     if _install_flow:
-      fm = of.ofp_flow_mod()
+      if self.of13:
+        fm = of04.ofp_flow_mod(match = of04.ofp_match(oxm_fields_pkt = [
+            of04.oxm_match_field.from_name('OFPXMT_OFB_ETH_TYPE',
+                struct.pack("!H", ethernet.ARP_TYPE), ethernet.ARP_TYPE)]),
+            actions = of04.ofp_action_output(port=of04.OFPP_CONTROLLER,
+                                             max_len=of04.OFPCML_NO_BUFFER))
+      else:
+        fm = of.ofp_flow_mod()
+        fm.match.dl_type = ethernet.ARP_TYPE
+        fm.actions.append(of.ofp_action_output(port=of.OFPP_CONTROLLER))
       fm.priority -= 0x1000 # lower than the default
-      fm.match.dl_type = ethernet.ARP_TYPE
-      fm.actions.append(of.ofp_action_output(port=of.OFPP_CONTROLLER))
       event.connection.send(fm)
 
+  def _handle_ConnectionDown (self, event):
+    for ip,dpids in _offloaded.items():
+      dpids.discard(event.dpid)
+      if not dpids: del _offloaded[ip]
+
+  def _handle_NeighborUpdate (self, event):
+    # A learned answer changed
+    if event.ip in _arp_table: return
+    if event.old_mac is not None and event.old_mac != event.mac:
+      _withdraw(event.ip)
+
+  def _handle_NeighborExpired (self, event):
+    # We don't answer for it any more (until it's relearned)
+    if event.dpid is not None or event.ip in _arp_table: return
+    _withdraw(event.ip)
+
+  def _offload (self, event, a, mac):
+    """
+    Installs a flow which answers this request in the switch
+
+    OpenFlow 1.3 can't copy fields from one header to another, so a flow
+    can't turn an arbitrary request into a reply.  What it can do is set
+    every field to a constant, so we install a flow for each requester
+    (matching its IP and MAC) and target we've answered for.  Each pair
+    comes to us once, and the flows are withdrawn when the answer for the
+    target changes or expires.  Flows for requesters which go quiet idle
+    out.
+    """
+    ip = a.protodst
+    actions = [
+        _set_field('OFPXMT_OFB_ETH_DST', a.hwsrc.toRaw()),
+        _set_field('OFPXMT_OFB_ETH_SRC', event.connection.eth_addr.toRaw()),
+        _set_field('OFPXMT_OFB_ARP_OP', struct.pack("!H", arp.REPLY)),
+        _set_field('OFPXMT_OFB_ARP_SHA', mac.toRaw()),
+        _set_field('OFPXMT_OFB_ARP_SPA', ip.toRaw()),
+        _set_field('OFPXMT_OFB_ARP_THA', a.hwsrc.toRaw()),
+        _set_field('OFPXMT_OFB_ARP_TPA', a.protosrc.toRaw()),
+        of04.ofp_action_output(port = of04.OFPP_IN_PORT)]
+    oxm = of04.oxm_match_field.from_name
+    fm = of04.ofp_flow_mod(cookie = _RESPONDER_COOKIE | ip.toUnsignedN(),
+        idle_timeout = ARP_TIMEOUT, actions = actions,
+        match = of04.ofp_match(oxm_fields_pkt = [
+          oxm('OFPXMT_OFB_ETH_TYPE', struct.pack("!H", ethernet.ARP_TYPE),
+              ethernet.ARP_TYPE),
+          oxm('OFPXMT_OFB_ARP_OP', struct.pack("!H", arp.REQUEST),
+              arp.REQUEST),
+          oxm('OFPXMT_OFB_ARP_SPA', a.protosrc.toRaw(), a.protosrc),
+          oxm('OFPXMT_OFB_ARP_TPA', ip.toRaw(), ip),
+          oxm('OFPXMT_OFB_ARP_SHA', a.hwsrc.toRaw(), a.hwsrc)]))
+    event.connection.send(fm)
+    _offloaded.setdefault(ip, set()).add(event.dpid)
+
   def _handle_PacketIn (self, event):
-    # Note: arp.hwsrc is not necessarily equal to ethernet.src
-    # (one such example are arp replies generated by this module itself
-    # as ethernet mac is set to switch dpid) so we should be careful
-    # to use only arp addresses in the learning code!
     squelch = False
 
     dpid = event.connection.dpid
@@ -179,72 +292,41 @@ class ARPResponder (object):
       if a.hwtype == arp.HW_TYPE_ETHERNET:
         if a.protosrc != 0:
 
-          if _learn:
-            # Learn or update port/MAC info
-            old_entry = _arp_table.get(a.protosrc)
-            if old_entry is None:
-              log.info("%s learned %s", dpid_to_str(dpid), a.protosrc)
-              _arp_table[a.protosrc] = Entry(a.hwsrc)
-            else:
-              if old_entry.mac is True:
-                # We never replace these special cases.
-                # Might want to warn on conflict?
-                pass
-              elif old_entry.mac != a.hwsrc:
-                if old_entry.static:
-                  log.warn("%s static entry conflict %s: %s->%s",
-                      dpid_to_str(dpid), a.protosrc, old_entry.mac, a.hwsrc)
-                else:
-                  log.warn("%s RE-learned %s: %s->%s", dpid_to_str(dpid),
-                      a.protosrc, old_entry.mac, a.hwsrc)
-                  _arp_table[a.protosrc] = Entry(a.hwsrc)
-              else:
-                # Update timestamp
-                _arp_table[a.protosrc] = Entry(a.hwsrc)
-
           if a.opcode == arp.REQUEST:
             # Maybe we can answer
 
-            if a.protodst in _arp_table:
+            mac = _lookup(a.protodst)
+            if mac is not None:
               # We have an answer...
 
-              r = arp()
-              r.hwtype = a.hwtype
-              r.prototype = a.prototype
-              r.hwlen = a.hwlen
-              r.protolen = a.protolen
-              r.opcode = arp.REPLY
-              r.hwdst = a.hwsrc
-              r.protodst = a.protosrc
-              r.protosrc = a.protodst
-              mac = _arp_table[a.protodst].mac
               if mac is True:
                 # Special case -- use ourself
                 mac = event.connection.eth_addr
-              r.hwsrc = mac
-              e = ethernet(type=packet.type, src=event.connection.eth_addr,
-                           dst=a.hwsrc)
-              e.payload = r
+              vlan_id = None
+              vlan_pcp = 0
               if packet.type == ethernet.VLAN_TYPE:
                 v_rcv = packet.find('vlan')
-                e.payload = vlan(eth_type = e.type,
-                                 payload = e.payload,
-                                 id = v_rcv.id,
-                                 pcp = v_rcv.pcp)
-                e.type = ethernet.VLAN_TYPE
+                vlan_id = v_rcv.id
+                vlan_pcp = v_rcv.pcp
               log.info("%s answering ARP for %s" % (dpid_to_str(dpid),
-                str(r.protosrc)))
-              msg = of.ofp_packet_out()
-              msg.data = e.pack()
-              msg.actions.append(of.ofp_action_output(port =
-                                                      of.OFPP_IN_PORT))
+                str(a.protodst)))
+              msg = self._of.ofp_packet_out()
+              msg.data = encode_arp_reply(event.connection.eth_addr,
+                                          a.hwsrc, mac, a.protodst,
+                                          a.hwsrc, a.protosrc,
+                                          vlan_id, vlan_pcp)
+              msg.actions.append(self._of.ofp_action_output(port =
+                                 self._of.OFPP_IN_PORT))
               msg.in_port = inport
               event.connection.send(msg)
+              if self.of13:
+                self._offload(event, a, mac)
               return EventHalt if _eat_packets else None
             else:
               # Keep track of failed queries
               squelch = a.protodst in _failed_queries
               _failed_queries[a.protodst] = time.time()
+              _failed_expiry.set(a.protodst, time.time() + ARP_TIMEOUT)
 
     if self._check_for_flood(dpid, a):
       # Didn't know how to handle this ARP, so just flood it
@@ -257,8 +339,9 @@ class ARPResponder (object):
       else:
         log.info(msg)
 
-      msg = of.ofp_packet_out()
-      msg.actions.append(of.ofp_action_output(port = of.OFPP_FLOOD))
+      msg = self._of.ofp_packet_out()
+      msg.actions.append(self._of.ofp_action_output(
+                         port = self._of.OFPP_FLOOD))
       msg.data = event.ofp
       event.connection.send(msg.pack())
 
@@ -273,21 +356,36 @@ class ARPResponder (object):
     return True
 
 
+def _lookup (ip):
+  """
+  Returns the MAC to answer with for ip (True means the switch's MAC)
+  """
+  e = _arp_table.get(ip)
+  if e is not None: return e.mac
+  if _learn: return core.ARPCache.lookup(ip)
+  return None
+
+
 _arp_table = ARPTable() # IPAddr -> Entry
 _install_flow = None
 _eat_packets = None
 _failed_queries = {} # IP -> time : queries we couldn't answer
+_failed_expiry = TimingWheel() # Of IPs in _failed_queries
 _learn = None
+_offloaded = {} # IP -> set of DPIDs with responder flows for it
 
 def launch (timeout=ARP_TIMEOUT, no_flow=False, eat_packets=True,
-            no_learn=False, **kw):
+            no_learn=False, of13=False, **kw):
   global ARP_TIMEOUT, _install_flow, _eat_packets, _learn
-  ARP_TIMEOUT = timeout
+  ARP_TIMEOUT = int(timeout)
   _install_flow = not no_flow
   _eat_packets = str_to_bool(eat_packets)
   _learn = not no_learn
 
+  if _learn:
+    arp_cache.launch(timeout = ARP_TIMEOUT)
+
   core.Interactive.variables['arp'] = _arp_table
   for k,v in kw.iteritems():
     _arp_table[IPAddr(k)] = Entry(v, static=True)
-  core.registerNew(ARPResponder)
+  core.registerNew(ARPResponder, of13=str_to_bool(of13))
@@ -27,9 +27,23 @@ from pox.lib.addresses import IPAddr,EthAddr,parse_cidr
 from pox.lib.addresses import IP_BROADCAST, IP_ANY
 from pox.lib.revent import *
 from pox.lib.util import dpid_to_str
+from pox.lib.recoco import Timer
+
+from collections import deque
+import heapq
+import time
+import os
 
 log = core.getLogger()
 
+# How often we check for expired leases and offers (and write the lease
+# file)
+LEASE_CHECK_INTERVAL = 10
+
+# How long an offered address is held for a client which hasn't asked for
+# it yet
+OFFER_TIME = 60
+
 
 def ip_for_event (event):
   """
@@ -140,7 +154,20 @@ class SimpleAddressPool (AddressPool):
     else:
       raise RuntimeError("Cannot specify both last and count")
 
-    self.removed = set()
+    self._net = self.network.toUnsigned()
+    self._host_mask = (1 << self.host_size) - 1
+
+    # Host numbers of addresses that have been removed from the pool
+    self._used = set()
+
+    # Addresses at or above _cursor have never been handed out, so we can
+    # just walk it forward.  Addresses which get appended back go on the
+    # _returned queue (and in _queued so they're only on it once).  Entries
+    # on the queue may have been removed again since; we skip them when
+    # they reach the front.
+    self._cursor = first
+    self._returned = deque()
+    self._queued = set()
 
     if self.count <= 0: raise RuntimeError("Bad first/last range")
     if first == 0: raise RuntimeError("Can't allocate 0th address")
@@ -165,58 +192,77 @@ class SimpleAddressPool (AddressPool):
   def count (self):
     return self.last - self.first + 1
 
-  def __contains__ (self, item):
-    item = IPAddr(item)
-    if item in self.removed: return False
+  def _host (self, item):
+    """
+    Returns host number of item if it's in our range, otherwise None
+    """
+    if type(item) is not IPAddr: item = IPAddr(item)
     n = item.toUnsigned()
-    mask = (1<<self.host_size)-1
-    nm = (n & mask) | self.network.toUnsigned()
-    if nm != n: return False
-    if (n & mask) == mask: return False
-    if (n & mask) < self.first: return False
-    if (n & mask) > self.last: return False
-    return True
+    h = n & self._host_mask
+    if (n ^ h) != self._net: return None
+    if h == self._host_mask: return None
+    if h < self.first or h > self.last: return None
+    return h
+
+  def __contains__ (self, item):
+    h = self._host(item)
+    return h is not None and h not in self._used
 
   def append (self, item):
-    item = IPAddr(item)
-    if item not in self.removed:
-      if item in self:
-        raise RuntimeError("%s is already in this pool" % (item,))
-      else:
-        raise RuntimeError("%s does not belong in this pool" % (item,))
-    self.removed.remove(item)
+    h = self._host(item)
+    if h is None:
+      raise RuntimeError("%s does not belong in this pool" % (item,))
+    if h not in self._used:
+      raise RuntimeError("%s is already in this pool" % (item,))
+    self._used.remove(h)
+    if h < self._cursor and h not in self._queued:
+      self._queued.add(h)
+      self._returned.append(h)
 
   def remove (self, item):
-    item = IPAddr(item)
-    if item not in self:
+    h = self._host(item)
+    if h is None or h in self._used:
       raise RuntimeError("%s not in this pool" % (item,))
-    self.removed.add(item)
+    self._used.add(h)
 
   def __len__ (self):
-    return (self.last-self.first+1) - len(self.removed)
+    return self.count - len(self._used)
+
+  def _first_free (self):
+    """
+    Returns host number of the first free address or None
+    """
+    used = self._used
+    while self._cursor <= self.last:
+      if self._cursor not in used: return self._cursor
+      self._cursor += 1
+    returned = self._returned
+    while returned:
+      h = returned[0]
+      if h not in used: return h
+      returned.popleft()
+      self._queued.discard(h)
+    return None
 
   def __getitem__ (self, index):
     if index < 0:
       raise RuntimeError("Negative indices not allowed")
     if index >= len(self):
       raise IndexError("Item does not exist")
-    c = self.first
-
-    # Use a heuristic to find the first element faster (we hope)
-    # Note this means that removing items changes the order of
-    # our "list".
-    c += len(self.removed)
-    while c > self.last:
-      c -= self.count
-
-    while True:
-      addr = IPAddr(c | self.network.toUnsigned())
-      if addr not in self.removed:
-        assert addr in self
+    if index == 0:
+      # The usual case
+      return IPAddr(self._first_free() | self._net)
+
+    # Slow path.  Order is fresh addresses, then returned ones.
+    for h in xrange(self._cursor, self.last + 1):
+      if h not in self._used:
+        index -= 1
+        if index < 0: return IPAddr(h | self._net)
+    for h in self._returned:
+      if h not in self._used:
         index -= 1
-        if index < 0: return addr
-      c += 1
-      if c > self.last: c -= self.count
+        if index < 0: return IPAddr(h | self._net)
+    raise IndexError("Item does not exist")
 
 
 class DHCPD (EventMixin):
@@ -224,7 +270,7 @@ class DHCPD (EventMixin):
 
   def __init__ (self, ip_address = "192.168.0.254", router_address = (),
                 dns_address = (), pool = None, subnet = None,
-                install_flow = True):
+                install_flow = True, lease_file = None):
 
     def fix_addr (addr, backup):
       if addr is None: return None
@@ -250,17 +296,131 @@ class DHCPD (EventMixin):
                            "pool with a subnet hint")
 
     self.lease_time = 60 * 60 # An hour
-    #TODO: Actually make them expire :)
 
-    self.offers = {} # Eth -> IP we offered
-    self.leases = {} # Eth -> IP we leased
+    self.offer_time = OFFER_TIME
+
+    self._reset_leases()
 
     if self.ip_addr in self.pool:
       log.debug("Removing my own IP (%s) from address pool", self.ip_addr)
       self.pool.remove(self.ip_addr)
 
+    # If set, we save leases here so that we can pick them up on restart
+    self.lease_file = lease_file
+    if lease_file is not None:
+      self._load_leases()
+
+    self._lease_timer = Timer(LEASE_CHECK_INTERVAL, self._check_leases,
+                              recurring = True)
+
     core.openflow.addListeners(self)
 
+  def _reset_leases (self):
+    """
+    Forgets all offers and leases
+    """
+    self.offers = {} # Eth -> IP we offered
+    self._offer_expires = {} # Eth -> (time its offer expires, pool)
+    self.leases = {} # Eth -> IP we leased
+    self._lease_expires = {} # Eth -> time its lease expires
+    self._lease_heap = [] # (expires_at, seq, Eth, IP, pool)
+    self._lease_seq = 0
+    self._leases_dirty = False
+
+  def _track_lease (self, mac, ip, pool, expires_at = None):
+    """
+    Note that mac has (re)leased ip from pool
+    """
+    if expires_at is None: expires_at = time.time() + self.lease_time
+    self._lease_expires[mac] = expires_at
+    self._lease_seq += 1
+    heapq.heappush(self._lease_heap,
+                   (expires_at, self._lease_seq, mac, ip, pool))
+    self._leases_dirty = True
+
+  def _make_offer (self, mac, ip, pool):
+    self.offers[mac] = ip
+    self._offer_expires[mac] = (time.time() + self.offer_time, pool)
+
+  def _take_offer (self, mac):
+    """
+    Forgets the offer to mac and returns the IP (which isn't in a pool)
+    """
+    del self._offer_expires[mac]
+    return self.offers.pop(mac)
+
+  def _check_leases (self):
+    """
+    Expire leases and offers, and save the lease file if needed
+
+    Renewing a lease just pushes a new heap entry, so entries which come off
+    the heap for leases that have been renewed, released, or changed since
+    are ignored.
+    """
+    now = time.time()
+    heap = self._lease_heap
+    while heap and heap[0][0] <= now:
+      _,_,mac,ip,pool = heapq.heappop(heap)
+      if self.leases.get(mac) != ip: continue
+      if self._lease_expires.get(mac, now) > now: continue
+      del self.leases[mac]
+      del self._lease_expires[mac]
+      pool.append(ip)
+      self._leases_dirty = True
+      log.info("Lease of %s to %s expired" % (ip, mac))
+
+    for mac,(expires_at,pool) in self._offer_expires.items():
+      if expires_at > now: continue
+      ip = self._take_offer(mac)
+      if ip not in pool: pool.append(ip)
+      log.debug("Offer of %s to %s expired" % (ip, mac))
+
+    if self._leases_dirty and self.lease_file is not None:
+      self._save_leases()
+
+  def _save_leases (self):
+    """
+    Write current leases to the lease file
+
+    Each line is "MAC IP expiration-time".
+    """
+    tmp = self.lease_file + ".tmp"
+    try:
+      with open(tmp, "w") as f:
+        for mac,ip in self.leases.iteritems():
+          f.write("%s %s %.0f\n" % (mac, ip, self._lease_expires[mac]))
+      os.rename(tmp, self.lease_file)
+      self._leases_dirty = False
+    except Exception:
+      log.exception("Couldn't write lease file %s", self.lease_file)
+
+  def _load_leases (self):
+    """
+    Reclaim unexpired leases from the lease file
+    """
+    now = time.time()
+    try:
+      f = open(self.lease_file)
+    except IOError:
+      return # Not there yet
+    count = 0
+    with f:
+      for line in f:
+        line = line.split()
+        if len(line) != 3: continue
+        try:
+          mac,ip,expires_at = EthAddr(line[0]),IPAddr(line[1]),float(line[2])
+        except Exception:
+          log.warn("Bad line in lease file %s", self.lease_file)
+          continue
+        if expires_at <= now: continue
+        if ip not in self.pool: continue
+        self.pool.remove(ip)
+        self.leases[mac] = ip
+        self._track_lease(mac, ip, self.pool, expires_at)
+        count += 1
+    log.debug("Restored %i leases from %s", count, self.lease_file)
+
   def _handle_ConnectionUp (self, event):
     if self._install_flow:
       msg = of.ofp_flow_mod()
@@ -369,6 +529,8 @@ class DHCPD (EventMixin):
       log.warn("%s tried to release unleased %s" % (src,p.ciaddr))
       return
     del self.leases[p.chaddr]
+    self._lease_expires.pop(p.chaddr, None)
+    self._leases_dirty = True
     pool.append(p.ciaddr)
     log.info("%s released %s" % (src,p.ciaddr))
 
@@ -383,15 +545,17 @@ class DHCPD (EventMixin):
       if wanted_ip != self.leases[src]:
         pool.append(self.leases[src])
         del self.leases[src]
+        self._lease_expires.pop(src, None)
+        self._leases_dirty = True
       else:
         got_ip = self.leases[src]
-    if got_ip is None:
-      if src in self.offers:
-        if wanted_ip != self.offers[src]:
-          pool.append(self.offers[src])
-          del self.offers[src]
-        else:
-          got_ip = self.offers[src]
+    if src in self.offers:
+      # Whatever happens, the offer is done with
+      offer = self._take_offer(src)
+      if got_ip is None and wanted_ip == offer:
+        got_ip = offer
+      elif offer != got_ip:
+        pool.append(offer)
     if got_ip is None:
       if wanted_ip in pool:
         pool.remove(wanted_ip)
@@ -403,6 +567,7 @@ class DHCPD (EventMixin):
 
     assert got_ip == wanted_ip
     self.leases[src] = got_ip
+    self._track_lease(src, got_ip, pool)
     ev = DHCPLease(src, got_ip)
     self.raiseEvent(ev)
     if ev._nak:
@@ -429,7 +594,9 @@ class DHCPD (EventMixin):
     if src in self.leases:
       offer = self.leases[src]
       del self.leases[src]
-      self.offers[src] = offer
+      self._lease_expires.pop(src, None)
+      self._leases_dirty = True
+      self._make_offer(src, offer, pool)
     else:
       offer = self.offers.get(src)
       if offer is None:
@@ -444,7 +611,7 @@ class DHCPD (EventMixin):
           if wanted_ip in pool:
             offer = wanted_ip
         pool.remove(offer)
-        self.offers[src] = offer
+      self._make_offer(src, offer, pool) # (Re)starts its timeout
     reply.yiaddr = offer
     reply.siaddr = self.ip_addr
 
@@ -473,11 +640,12 @@ def default (no_flow = False,
             first = 100, last = 199, count = None, # Address range
             ip = "192.168.0.254",
             router = (),                   # Auto
-            dns = ()):                     # Auto
+            dns = (),                      # Auto
+            lease_file = None):
   """
   Launch DHCP server defaulting to 192.168.0.100-199
   """
-  launch(no_flow, network, first, last, count, ip, router, dns)
+  launch(no_flow, network, first, last, count, ip, router, dns, lease_file)
 
 
 def launch (no_flow = False,
@@ -485,7 +653,8 @@ def launch (no_flow = False,
             first = 1, last = None, count = None, # Address range
             ip = "192.168.0.254",
             router = (),                   # Auto
-            dns = ()):                     # Auto
+            dns = (),                      # Auto
+            lease_file = None):
   """
   Launch DHCP server
 
@@ -500,6 +669,7 @@ def launch (no_flow = False,
            stop the server from telling clients anything
   dns      DNS IP to tell clients.  Defaults to 'router'.  'None' will
            stop the server from telling clients anything.
+  lease_file  File to save leases in so they survive a restart
   """
   def fixint (i):
     i = str(i)
@@ -520,6 +690,6 @@ def launch (no_flow = False,
 
   core.registerNew(DHCPD, install_flow = not no_flow, pool = pool,
                    ip_address = ip, router_address = router,
-                   dns_address = dns)
+                   dns_address = dns, lease_file = lease_file)
 
   log.debug("DHCP serving a%s", str(pool)[2:-1])
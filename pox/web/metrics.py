@@ -0,0 +1,74 @@
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Serves pox.lib.metrics at /metrics for Prometheus (or curl)
+
+  ./pox.py web.webcore web.metrics [--lag_interval=<seconds>]
+
+Also adds metrics for the scheduler: how many tasks are ready to run,
+and how late a check which is scheduled every lag_interval seconds
+actually runs (which is how long something else was hogging the
+scheduler thread).  0 turns the check off.
+"""
+
+from pox.core import core
+from pox.web.webcore import SplitRequestHandler
+import pox.lib.metrics as metrics
+import time
+
+log = core.getLogger()
+
+_lag_seconds = None
+
+
+class MetricsHandler (SplitRequestHandler):
+  """
+  Handles /metrics
+  """
+  def do_GET (self):
+    # Metrics with functions may look at things which the scheduler thread
+    # is changing, so get the text there.
+    r = self.call_on_scheduler(metrics.registry.to_text)
+    if r is None: return
+    self.send_response(200)
+    self.send_header("Content-Type", "text/plain; version=0.0.4")
+    self.send_header("Content-Length", str(len(r)))
+    self.end_headers()
+    self.wfile.write(r)
+
+
+def _check_lag (interval, expected):
+  now = time.time()
+  _lag_seconds.observe(max(0, now - expected))
+  core.callDelayed(interval, _check_lag, interval, now + interval)
+
+
+def launch (lag_interval = 1):
+  global _lag_seconds
+  lag_interval = float(lag_interval)
+
+  metrics.gauge("pox_scheduler_ready_tasks", "Tasks ready to run",
+                func = lambda: len(core.scheduler._ready))
+  if lag_interval:
+    _lag_seconds = metrics.bucket_histogram("pox_scheduler_lag_seconds",
+        "How late timers run on the scheduler thread",
+        (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+         5, 10))
+    core.callDelayed(lag_interval, _check_lag, lag_interval,
+                     time.time() + lag_interval)
+
+  def set_up ():
+    core.WebServer.set_handler("/metrics", MetricsHandler)
+  core.call_when_ready(set_up, "WebServer", name = "web.metrics")
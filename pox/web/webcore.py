@@ -125,6 +125,27 @@ class SplitRequestHandler (BaseHTTPRequestHandler):
     method = getattr(handler, mname)
     return method()
 
+  def call_on_scheduler (self, func, timeout = 5):
+    """
+    Calls func on the scheduler thread and returns what it returns
+
+    Handlers run on the web server's threads, so use this to look at
+    things which the scheduler thread changes.  If func raises or doesn't
+    finish within timeout seconds, this sends a 503 and returns None.
+    """
+    result = []
+    done = threading.Event()
+    def call ():
+      try:
+        result.append(func())
+      finally:
+        done.set()
+    core.callLater(call)
+    if not done.wait(timeout) or not result:
+      self.send_error(503, "Couldn't get a response from the scheduler")
+      return None
+    return result[0]
+
   def log_request (self, code = '-', size = '-'):
     weblog.debug(self.prefix + (':"%s" %s %s' %
               (self.requestline, str(code), str(size))))
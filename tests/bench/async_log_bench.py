@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures how long logging holds up the code doing the logging
+
+Logs lots of INFO messages (like l2_learning's "Same port" ones during a
+PacketIn storm) to a file and to a slow stream, with the handlers called
+directly and behind an AsyncHandler, and reports the time per call.
+
+Usage: async_log_bench.py [messages]
+"""
+
+import sys
+import os.path
+import time
+import logging
+import tempfile
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.log.async_handler import AsyncHandler
+
+
+class SlowStream (object):
+  """
+  A stream where each write takes a while (like a busy terminal)
+  """
+  def write (self, data):
+    time.sleep(0.0001)
+  def flush (self):
+    pass
+
+
+def run (handler, count, distinct):
+  log = logging.getLogger("bench")
+  log.propagate = False
+  log.setLevel(logging.INFO)
+  log.addHandler(handler)
+  start = time.time()
+  for i in xrange(count):
+    if distinct:
+      log.info("Message %s number %s", i % 50, i)
+    else:
+      log.info("Same port for packet from %s -> %s on %s.%s.  Drop.",
+               "00:00:00:00:00:01", "00:00:00:00:00:02", "00-00-01", i)
+  t = time.time() - start
+  log.removeHandler(handler)
+  handler.close()
+  return t / count * 1e6
+
+
+def main ():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  fmt = logging.Formatter(logging.BASIC_FORMAT)
+  def file_handler ():
+    f = tempfile.NamedTemporaryFile(prefix = "pox_log_bench")
+    h = logging.FileHandler(f.name)
+    h.setFormatter(fmt)
+    return h
+  def slow_handler ():
+    h = logging.StreamHandler(SlowStream())
+    h.setFormatter(fmt)
+    return h
+  for name,make in (("file", file_handler), ("slow stream", slow_handler)):
+    for distinct in (True, False):
+      kind = "varied" if distinct else "storm"
+      sync = run(make(), count, distinct)
+      # No rate limiting, so they all get written
+      unlimited = run(AsyncHandler([make()], size = count, rate = 0),
+                      count, distinct)
+      limited = run(AsyncHandler([make()]), count, distinct)
+      print "%-11s %-6s sync %7.2f us/msg   async %5.2f   async+limit %5.2f" % (
+          name, kind, sync, unlimited, limited)
+
+
+if __name__ == "__main__":
+  main()
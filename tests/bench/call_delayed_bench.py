@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares one-shot Timers with Scheduler.callDelayed()
+
+  memory    - bytes of RSS per pending call
+  delayed   - calls per second, all due at once
+  callLater - callLater()s per second from within the scheduler
+
+Each test runs in its own process so memory from one doesn't get reused
+by another.  Linux only (memory is read from /proc).
+
+Usage: call_delayed_bench.py [calls]
+"""
+
+import sys
+import os.path
+import time
+import threading
+import multiprocessing
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.recoco import Scheduler, Task, Timer
+
+
+def rss ():
+  with open("/proc/self/statm") as f:
+    return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def scheduler ():
+  return Scheduler(isDefaultScheduler = True, daemon = True,
+                   threaded_selecthub = False)
+
+
+def nop ():
+  pass
+
+
+def timer (s, delay, f):
+  Timer(delay, f, scheduler = s)
+
+
+def delayed (s, delay, f):
+  s.callDelayed(delay, f)
+
+
+def in_scheduler (s, f):
+  """
+  Runs f() within the scheduler and waits for it
+  """
+  done = threading.Event()
+  class T (Task):
+    def run (self):
+      f()
+      done.set()
+      yield False
+  T().start(s)
+  done.wait()
+
+
+def memory (kind, count):
+  s = scheduler()
+  time.sleep(0.1)
+  before = rss()
+  def add ():
+    for i in xrange(count):
+      kind(s, 3600, nop)
+  in_scheduler(s, add)
+  time.sleep(0.5) # Let any handoffs settle
+  return (rss() - before) / float(count)
+
+
+def throughput (kind, count):
+  s = scheduler()
+  done = threading.Event()
+  left = [count]
+  def call ():
+    left[0] -= 1
+    if not left[0]: done.set()
+  start = time.time()
+  def add ():
+    for i in xrange(count):
+      kind(s, 0, call)
+  in_scheduler(s, add)
+  done.wait()
+  return count / (time.time() - start)
+
+
+def call_later (count):
+  s = scheduler()
+  done = threading.Event()
+  left = [count]
+  def call ():
+    left[0] -= 1
+    if not left[0]: done.set()
+  start = time.time()
+  def add ():
+    for i in xrange(count):
+      s.callLater(call)
+  in_scheduler(s, add)
+  done.wait()
+  return count / (time.time() - start)
+
+
+def _run (q, f, args):
+  q.put(f(*args))
+
+
+def isolated (f, *args):
+  q = multiprocessing.Queue()
+  p = multiprocessing.Process(target = _run, args = (q, f, args))
+  p.start()
+  r = q.get()
+  p.join()
+  return r
+
+
+def main ():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  for name,kind in [("Timer", timer), ("callDelayed", delayed)]:
+    print "memory    %-11s: %6.0f bytes per pending call" % (name,
+        isolated(memory, kind, count))
+  for name,kind in [("Timer", timer), ("callDelayed", delayed)]:
+    print "delayed   %-11s: %8.0f calls/sec" % (name,
+        isolated(throughput, kind, count))
+  print "callLater %-11s: %8.0f calls/sec" % ("",
+      isolated(call_later, count))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Times filling a DHCP address pool
+
+Allocates every address in a /16 SimpleAddressPool the way DHCPD does
+(pool[0] followed by pool.remove()), then releases a random half and
+allocates them again.  Per-allocation time should stay flat as the pool
+fills up.
+
+Usage: dhcpd_bench.py [network]
+"""
+
+import sys
+import os.path
+import time
+import random
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.core
+pox.core.initialize(threaded_selecthub=False, handle_signals=False)
+
+from pox.proto.dhcpd import SimpleAddressPool
+
+
+def fill (pool, label):
+  count = len(pool)
+  got = []
+  start = time.time()
+  slowest = 0
+  for i in xrange(count):
+    t = time.time()
+    addr = pool[0]
+    pool.remove(addr)
+    slowest = max(slowest, time.time() - t)
+    got.append(addr)
+  elapsed = time.time() - start
+  print "%-24s %7i addresses %9.3f ms total %7.2f us each (max %.2f us)" % (
+      label, count, elapsed * 1000, elapsed / count * 1e6, slowest * 1e6)
+  return got
+
+
+def main (network = "10.0.0.0/16"):
+  pool = SimpleAddressPool(network)
+  got = fill(pool, "fill")
+  assert len(pool) == 0
+  assert len(set(got)) == len(got)
+
+  rng = random.Random(0)
+  rng.shuffle(got)
+  half = got[:len(got)//2]
+  start = time.time()
+  for addr in half:
+    pool.append(addr)
+  elapsed = time.time() - start
+  print "%-24s %7i addresses %9.3f ms total %7.2f us each" % (
+      "release half", len(half), elapsed * 1000, elapsed / len(half) * 1e6)
+
+  fill(pool, "refill")
+  assert len(pool) == 0
+
+
+if __name__ == '__main__':
+  main(*sys.argv[1:])
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares recoco's SelectHub with running tasks on an EventLoop
+
+Two tasks bounce a byte back and forth over a socketpair while lots of
+other tasks sit in Select()s on idle sockets (like a controller with lots
+of quiet switches).  Also measures Sleep() wakeups.
+
+  select   - reactor SelectHub with select() (the default)
+  epoll    - reactor SelectHub with EpollSelect (--epoll-sh)
+  threaded - SelectHub on its own thread (--threaded-sh)
+  loop     - LoopHub on an EventLoop (--loop-sh)
+
+select() can't handle more than 1024 file descriptors, so it's skipped
+for the big configurations.
+
+Usage: event_loop_bench.py [seconds]
+"""
+
+import sys
+import os.path
+import time
+import socket
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.recoco import Scheduler, Task, Select, Sleep
+
+HUBS = {
+  'select' : dict(threaded_selecthub = False),
+  'epoll' : dict(threaded_selecthub = False, use_epoll = True),
+  'threaded' : dict(threaded_selecthub = True),
+  'loop' : dict(event_loop = True),
+}
+ORDER = ['select', 'epoll', 'threaded', 'loop']
+
+IDLE = [0, 400, 4000]
+
+
+class Idle (Task):
+  def __init__ (self, sock):
+    Task.__init__(self)
+    self.sock = sock
+    self.done = False
+  def run (self):
+    while not self.done:
+      yield Select([self.sock], [], [], 1)
+
+
+class Bouncer (Task):
+  def __init__ (self, sock, serve):
+    Task.__init__(self)
+    self.sock = sock
+    self.serve = serve
+    self.count = 0
+    self.done = False
+  def run (self):
+    if self.serve: self.sock.send(b'x')
+    while not self.done:
+      rl,wl,xl = yield Select([self.sock], [], [], 1)
+      if not rl: continue
+      self.sock.recv(1)
+      self.sock.send(b'x')
+      self.count += 1
+
+
+class Sleeper (Task):
+  def __init__ (self):
+    Task.__init__(self)
+    self.count = 0
+    self.done = False
+  def run (self):
+    while not self.done:
+      yield Sleep(0)
+      self.count += 1
+
+
+def bounce (hub, idle, duration):
+  s = Scheduler(isDefaultScheduler = True, daemon = True, **HUBS[hub])
+  socks = []
+  tasks = []
+  for i in range(idle):
+    a,b = socket.socketpair()
+    socks += [a, b]
+    tasks.append(Idle(a))
+  a,b = socket.socketpair()
+  socks += [a, b]
+  bouncers = [Bouncer(a, True), Bouncer(b, False)]
+  tasks += bouncers
+  for t in tasks: t.start()
+  time.sleep(0.5)
+  start = bouncers[0].count
+  time.sleep(duration)
+  rate = (bouncers[0].count - start) / float(duration)
+  for t in tasks: t.done = True
+  s.quit()
+  time.sleep(1.2)
+  for sock in socks: sock.close()
+  return rate
+
+
+def sleeps (hub, duration):
+  s = Scheduler(isDefaultScheduler = True, daemon = True, **HUBS[hub])
+  tasks = [Sleeper() for i in range(100)]
+  for t in tasks: t.start()
+  time.sleep(0.5)
+  start = sum(t.count for t in tasks)
+  time.sleep(duration)
+  rate = (sum(t.count for t in tasks) - start) / float(duration)
+  for t in tasks: t.done = True
+  s.quit()
+  time.sleep(0.2)
+  return rate
+
+
+def main ():
+  duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+  for idle in IDLE:
+    for hub in ORDER:
+      if hub in ('select','threaded') and idle * 2 + 4 > 1000: continue
+      print "bounce %4i idle  %-8s: %8.0f round trips/sec" % (idle, hub,
+          bounce(hub, idle, duration))
+  for hub in ORDER:
+    print "sleep(0)         %-8s: %8.0f wakeups/sec" % (hub,
+        sleeps(hub, duration))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares PacketIns reaching the controller in forwarding.l2_learning_04's
+reactive and --proactive modes
+
+Runs the same traffic (hosts on one switch holding short UDP
+conversations with each other) through an emulated switch which applies
+the flow_mods the learning switch sends it, and counts how many packets
+miss in the switch and come to the controller as PacketIns, how many
+flow_mods are sent, and how many flow entries the switch ends up holding.
+
+Usage: l2_learning_04_bench.py [hosts [conversations [packets_each]]]
+"""
+
+import sys
+import os.path
+import time
+import random
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.core
+pox.core.initialize(threaded_selecthub=False, handle_signals=False)
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import EthAddr, IPAddr
+import pox.openflow.libopenflow_04 as of
+import pox.forwarding.l2_learning_04 as l2
+
+
+class FakePacketIn (object):
+  def __init__ (self, connection, packet, port):
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.parsed = packet
+    self.port = port
+    self.ofp = of.ofp_packet_in(data = packet.pack())
+
+
+class EmulatedSwitch (object):
+  """
+  Just enough of a switch's flow tables to see which packets miss
+
+  Entries are looked up by their packed match, which works because both
+  learning switches only use exact matches (other than the static
+  entries, which the traffic here doesn't hit).
+  """
+  def __init__ (self):
+    self.dpid = 1
+    self.connect_time = 1
+    self.now = 0
+    self.flows = {} # (table, packed match) -> (flow_mod, installed, used)
+    self.flow_mods = 0
+
+  def addListeners (self, *args, **kw):
+    pass
+
+  def send (self, msg):
+    if not isinstance(msg, of.ofp_flow_mod): return
+    self.flow_mods += 1
+    key = (msg.table_id, msg.match.pack())
+    if msg.command in (of.OFPFC_ADD, of.OFPFC_MODIFY_STRICT):
+      self.flows[key] = (msg, self.now, self.now)
+    elif msg.command == of.OFPFC_DELETE_STRICT:
+      self.flows.pop(key, None)
+    elif msg.command == of.OFPFC_DELETE:
+      for k in [k for k in self.flows if k[0] == msg.table_id]:
+        del self.flows[k]
+
+  def expired (self, entry):
+    fm,installed,used = entry
+    return ((fm.idle_timeout and self.now - used > fm.idle_timeout) or
+            (fm.hard_timeout and self.now - installed > fm.hard_timeout))
+
+  def entries (self):
+    return len([e for e in self.flows.itervalues() if not self.expired(e)])
+
+  def lookup (self, table, match):
+    key = (table, match.pack())
+    e = self.flows.get(key)
+    if e is None: return False
+    fm,installed,used = e
+    if self.expired(e):
+      del self.flows[key]
+      return False
+    self.flows[key] = (fm, installed, self.now)
+    return True
+
+  def packet (self, packet, port, proactive):
+    """
+    Returns True if the packet misses (and would be a PacketIn)
+    """
+    if proactive:
+      return not self.lookup(l2.LEARN_TABLE, l2._match(
+          l2._oxm('OFPXMT_OFB_IN_PORT', of.struct.pack("!L", port), port),
+          l2._oxm('OFPXMT_OFB_ETH_SRC', packet.src.toRaw(), packet.src)))
+    return not self.lookup(0, of.ofp_match.from_packet(packet, port,
+                                                       False, False))
+
+
+def make_packet (src, dst, sport):
+  mac = lambda h: EthAddr("00:00:00:00:%02x:%02x" % (h >> 8, h & 0xff))
+  ip = lambda h: IPAddr("10.0.%i.%i" % (h >> 8, h & 0xff))
+  u = pkt.udp(srcport = sport, dstport = 53, payload = b'x' * 18)
+  ip = pkt.ipv4(srcip = ip(src), dstip = ip(dst),
+                protocol = pkt.ipv4.UDP_PROTOCOL, payload = u)
+  return pkt.ethernet(src = mac(src), dst = mac(dst),
+                      type = pkt.ethernet.IP_TYPE, payload = ip)
+
+
+def traffic (hosts, conversations, packets_each):
+  """
+  Yields (time, packet, port) for conversations between random hosts
+
+  Each conversation is a request and reply repeated packets_each times,
+  and a new one starts every 10ms.
+  """
+  rng = random.Random(0)
+  for c in xrange(conversations):
+    a,b = rng.sample(range(1, hosts + 1), 2)
+    sport = rng.randint(1024, 65535)
+    t = c * 0.01
+    for i in xrange(packets_each):
+      yield t, make_packet(a, b, sport), a
+      yield t, make_packet(b, a, sport), b
+
+
+def run (proactive, hosts, conversations, packets_each):
+  sw = EmulatedSwitch()
+  if proactive:
+    ls = l2.TwoTableLearningSwitch(sw, transparent = False)
+  else:
+    ls = l2.LearningSwitch(sw, transparent = False)
+  # Pack outside the timed part (both modes pack the same packets)
+  packets = []
+  for t,packet,port in traffic(hosts, conversations, packets_each):
+    packets.append((t, pkt.ethernet(packet.pack()), port))
+
+  packet_ins = 0
+  start = time.time()
+  for t,packet,port in packets:
+    sw.now = t
+    if sw.packet(packet, port, proactive):
+      packet_ins += 1
+      ls._handle_PacketIn(FakePacketIn(sw, packet, port))
+  elapsed = time.time() - start
+
+  mode = "proactive" if proactive else "reactive"
+  print "%-10s %8i PacketIns %8i flow_mods %8i entries %8.3f s" % (
+        mode, packet_ins, sw.flow_mods, sw.entries(), elapsed)
+
+
+def main (hosts = 100, conversations = 5000, packets_each = 5):
+  print "%i hosts, %i conversations, %i packets" % (hosts, conversations,
+      conversations * packets_each * 2)
+  run(False, hosts, conversations, packets_each)
+  run(True, hosts, conversations, packets_each)
+
+
+if __name__ == '__main__':
+  main(*[int(x) for x in sys.argv[1:]])
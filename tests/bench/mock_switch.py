@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Mock OpenFlow 1.3 switches for generating load
+
+These speak just enough OpenFlow to get through the handshake and then
+send PacketIns as fast as the controller will take them, keeping a fixed
+number outstanding per switch.  A PacketIn is considered handled when a
+PacketOut comes back, so use them with a controller which sends one for
+each PacketIn (e.g., forwarding.l2_learning_04, since the packets are
+broadcasts).
+
+They use raw sockets and struct rather than POX itself so that the load
+generator doesn't compete with the controller for its own code paths.
+
+Run on its own, this starts some switches against a running controller:
+  mock_switch.py [host:port] [switches] [seconds] [processes]
+"""
+
+import socket
+import struct
+import select
+import time
+import sys
+import multiprocessing
+
+OFP_VERSION = 4
+OFPT_HELLO = 0
+OFPT_ECHO_REQUEST = 2
+OFPT_ECHO_REPLY = 3
+OFPT_FEATURES_REQUEST = 5
+OFPT_FEATURES_REPLY = 6
+OFPT_PACKET_IN = 10
+OFPT_PACKET_OUT = 13
+OFPT_MULTIPART_REQUEST = 18
+OFPT_MULTIPART_REPLY = 19
+OFPT_BARRIER_REQUEST = 20
+OFPT_BARRIER_REPLY = 21
+OFPMP_PORT_DESC = 13
+
+_header = struct.Struct("!BBHI")
+
+
+def _msg (type, xid, body = b''):
+  return _header.pack(OFP_VERSION, type, 8 + len(body), xid) + body
+
+def _packet_in (port, data):
+  match = struct.pack("!HHHBBI4x", 1, 12, 0x8000, 0, 4, port)
+  body = struct.pack("!IHBBQ", 0xffffffff, len(data), 0, 0, 0)
+  return _msg(OFPT_PACKET_IN, 0, body + match + b'\x00\x00' + data)
+
+def _port_desc (dpid, ports):
+  body = struct.pack("!HH4x", OFPMP_PORT_DESC, 0)
+  for port in range(1, ports + 1):
+    mac = struct.pack("!HI", dpid & 0xffff, port)
+    body += struct.pack("!I4x6s2x16s8I", port, mac, "eth%i" % (port,),
+                        0, 4, 0x840, 0x840, 0x840, 0, 1000000, 1000000)
+  return body
+
+def _frame (dpid, n):
+  # A broadcast from a host which depends on the switch and n
+  src = struct.pack("!HI", dpid & 0xffff, n & 0xffffffff)
+  return b'\xff' * 6 + src + b'\x08\x00' + b'\x00' * 46
+
+
+class MockSwitch (object):
+  def __init__ (self, dpid, address, window = 10, ports = 4):
+    self.dpid = dpid
+    self.window = window
+    self.ports = ports
+    self.sock = socket.create_connection(address)
+    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self.buf = b''
+    self.up = False
+    self.up_time = None
+    self.outstanding = 0
+    self.handled = 0
+    self.sent = 0
+    self.started = time.time()
+    self.sock.sendall(_msg(OFPT_HELLO, 1))
+
+  def fileno (self):
+    return self.sock.fileno()
+
+  def read (self):
+    """
+    Handles whatever the controller has sent
+
+    Returns False if the connection closed.
+    """
+    try:
+      d = self.sock.recv(65536)
+    except socket.error:
+      return False
+    if not d: return False
+    self.buf += d
+    out = []
+    while len(self.buf) >= 8:
+      version,type,length,xid = _header.unpack_from(self.buf)
+      if len(self.buf) < length: break
+      body = self.buf[8:length]
+      self.buf = self.buf[length:]
+      if type == OFPT_PACKET_OUT:
+        self.handled += 1
+        self.outstanding -= 1
+      elif type == OFPT_ECHO_REQUEST:
+        out.append(_msg(OFPT_ECHO_REPLY, xid, body))
+      elif type == OFPT_FEATURES_REQUEST:
+        out.append(_msg(OFPT_FEATURES_REPLY, xid,
+                        struct.pack("!QIBB2xII", self.dpid, 256, 2, 0, 0, 0)))
+      elif type == OFPT_MULTIPART_REQUEST:
+        mp_type, = struct.unpack_from("!H", body)
+        if mp_type == OFPMP_PORT_DESC:
+          out.append(_msg(OFPT_MULTIPART_REPLY, xid,
+                          _port_desc(self.dpid, self.ports)))
+      elif type == OFPT_BARRIER_REQUEST:
+        out.append(_msg(OFPT_BARRIER_REPLY, xid))
+        if not self.up:
+          self.up = True
+          self.up_time = time.time()
+    if out: self.sock.sendall(b''.join(out))
+    return True
+
+  def fill (self):
+    """
+    Sends PacketIns until window are outstanding
+    """
+    if not self.up: return
+    out = []
+    while self.outstanding < self.window:
+      self.sent += 1
+      self.outstanding += 1
+      out.append(_packet_in(1 + self.sent % self.ports,
+                            _frame(self.dpid, self.sent)))
+    if out: self.sock.sendall(b''.join(out))
+
+  def close (self):
+    try:
+      self.sock.close()
+    except:
+      pass
+
+
+def run_switches (address, dpids, duration, window = 10, load = True):
+  """
+  Runs switches for duration seconds after they've all connected
+
+  Returns (PacketIns handled, seconds taken for all to connect).
+  """
+  start = time.time()
+  switches = [MockSwitch(dpid, address, window) for dpid in dpids]
+  live = list(switches)
+  end = None
+  while live:
+    now = time.time()
+    if end is None and all(s.up for s in switches):
+      end = now + duration
+      connect_time = now - start
+      for s in switches: s.handled = 0
+    if end is not None and now >= end: break
+    if now - start > duration + 30: break # Something's wrong
+    if load:
+      for s in live: s.fill()
+    r,w,x = select.select(live, [], [], 0.5)
+    for s in r:
+      if s.read() is False:
+        live.remove(s)
+  for s in switches: s.close()
+  if end is None: return None,None
+  return sum(s.handled for s in switches), connect_time
+
+
+def _run (args):
+  return run_switches(*args)
+
+def generate (address, switches, duration, processes = 1, window = 10,
+              first_dpid = 1):
+  """
+  Runs switches spread across several processes
+
+  Returns PacketIns handled per second (or None if they didn't all
+  connect).
+  """
+  dpids = range(first_dpid, first_dpid + switches)
+  jobs = [(address, dpids[i::processes], duration, window)
+          for i in range(processes)]
+  pool = multiprocessing.Pool(processes)
+  try:
+    results = pool.map(_run, jobs)
+  finally:
+    pool.close()
+    pool.join()
+  if any(r[0] is None for r in results): return None
+  return sum(r[0] for r in results) / float(duration)
+
+
+def main ():
+  address = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1:6653"
+  host,port = address.rsplit(":", 1)
+  switches = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+  duration = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+  processes = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+  rate = generate((host, int(port)), switches, duration, processes)
+  if rate is None:
+    print "Not all switches connected"
+  else:
+    print "%.0f PacketIns/sec" % (rate,)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the cost of info.profiler
+
+Raises events with a few handlers that each do some work (roughly like
+a PacketIn handler parsing a packet), with the profiler stopped, timing
+every call, and sampling.  Also tries empty handlers, which is the worst
+case.
+
+Usage: profiler_bench.py [events]
+"""
+
+import sys
+import os.path
+import time
+import unittest # So that core initializes itself
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.revent import EventMixin, Event
+from pox.lib.packet import ethernet
+from pox.info.profiler import Profiler
+import pox.lib.revent.revent as revent
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+RAW = ethernet(dst = "\x01\x02\x03\x04\x05\x06",
+               src = "\x01\x02\x03\x04\x05\x07", type = 0x800).pack()
+RAW += "\x00" * 50
+
+
+class Ping (Event):
+  pass
+
+
+class Source (EventMixin):
+  _eventMixin_events = set([Ping])
+
+
+class Listener (object):
+  def __init__ (self, source, work):
+    self.work = work
+    source.addListenerByName("Ping", self._handle_Ping)
+    source.addListenerByName("Ping", self._handle_Ping_too)
+  def _handle_Ping (self, event):
+    if self.work: ethernet(RAW)
+  def _handle_Ping_too (self, event):
+    if self.work: ethernet(RAW)
+
+
+def run (events, work, sample):
+  source = Source()
+  Listener(source, work)
+  p = None
+  if sample:
+    p = Profiler(sample = sample)
+    p.start()
+  best = None
+  for attempt in range(3):
+    start = time.time()
+    for i in xrange(events):
+      source.raiseEvent(Ping)
+    t = time.time() - start
+    if best is None or t < best: best = t
+  if p: p.stop()
+  return best
+
+
+def main ():
+  events = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  run(events, True, None) # Warm up
+  for work in (True, False):
+    base = run(events, work, None)
+    print "%s handlers:" % ("Working" if work else "Empty",)
+    print "  %-10s %6.2f us/event" % ("off", base / events * 1e6)
+    for sample in (1, 10, 100):
+      t = run(events, work, sample)
+      print "  %-10s %6.2f us/event  %+5.1f%%" % ("sample=%s" % (sample,),
+          t / events * 1e6, (t - base) / base * 100)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures recoco timer throughput and event loop latency
+
+Compares the threaded SelectHub (which you get with --threaded-sh) with
+the reactor (the default).  It measures:
+  timers   - recurring Timer fires per second with lots of timers
+  sleep    - how late a task waking from a 1ms Sleep() is
+  callLater - how long a callLater() from another thread takes to run
+
+Usage: recoco_bench.py [seconds]
+"""
+
+import sys
+import os.path
+import time
+import threading
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.recoco import Scheduler, Task, Timer, Sleep
+
+
+def scheduler (threaded):
+  return Scheduler(isDefaultScheduler = True, daemon = True,
+                   threaded_selecthub = threaded)
+
+
+def stats (samples):
+  samples = sorted(samples)
+  if not samples: return "no samples"
+  mean = sum(samples) / len(samples)
+  p99 = samples[int(len(samples) * 0.99)]
+  return "mean %7.1fus  p99 %7.1fus" % (mean * 1e6, p99 * 1e6)
+
+
+def timers (threaded, duration, count = 200, interval = 0.001):
+  s = scheduler(threaded)
+  fired = [0]
+  def fire ():
+    fired[0] += 1
+  ts = [Timer(interval, fire, recurring = True) for i in range(count)]
+  time.sleep(0.5)
+  start = fired[0]
+  time.sleep(duration)
+  rate = (fired[0] - start) / float(duration)
+  for t in ts: t.cancel()
+  s.quit()
+  return "%8.0f fires/sec" % (rate,)
+
+
+class Sleeper (Task):
+  def __init__ (self, interval):
+    Task.__init__(self)
+    self.interval = interval
+    self.lateness = []
+    self.done = False
+
+  def run (self):
+    while not self.done:
+      wake = time.time() + self.interval
+      yield Sleep(wake, absoluteTime = True)
+      self.lateness.append(time.time() - wake)
+
+
+def sleep_latency (threaded, duration):
+  s = scheduler(threaded)
+  t = Sleeper(0.001)
+  t.start()
+  time.sleep(duration)
+  t.done = True
+  s.quit()
+  return stats(t.lateness[10:])
+
+
+def call_later_latency (threaded, duration):
+  s = scheduler(threaded)
+  latency = []
+  def called (sent):
+    latency.append(time.time() - sent)
+  end = time.time() + duration
+  while time.time() < end:
+    s.callLater(called, time.time())
+    time.sleep(0.001)
+  time.sleep(0.1)
+  s.quit()
+  return stats(latency[10:])
+
+
+def main ():
+  duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+  for name,f in [("timers", timers), ("sleep", sleep_latency),
+                 ("callLater", call_later_latency)]:
+    for threaded in (True, False):
+      r = f(threaded, duration)
+      print "%-9s %-8s: %s" % (name, "threaded" if threaded else "reactor", r)
+      time.sleep(0.5)
+
+
+if __name__ == "__main__":
+  main()
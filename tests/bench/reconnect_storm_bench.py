@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures how fast of_04 gets through a storm of switch (re)connections
+
+Starts POX with various accept backlogs and numbers of SO_REUSEPORT
+listeners, then has a bunch of mock switches (see mock_switch.py) connect
+all at once, waits for all their handshakes to finish, disconnects them
+all, and does it again a few times.  This is what happens when a
+controller restarts or a link to a rack of switches flaps.
+
+With a small backlog, connections which don't fit in the accept queue
+have their SYNs dropped and retried a second or more later, which shows
+up as a long tail.
+
+Usage: reconnect_storm_bench.py [switches] [rounds] [processes]
+"""
+
+import sys
+import os.path
+import socket
+import subprocess
+import time
+import multiprocessing
+
+sys.path.append(os.path.dirname(__file__))
+
+from mock_switch import run_switches
+
+POX = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   "..", "..", "pox.py")
+PORT = 16653
+
+# (backlog, listeners)
+CONFIGS = [(16, 1), (1024, 1), (1024, 4)]
+
+
+def start_pox (backlog, listeners):
+  args = [sys.executable, POX, "log.level", "--WARNING", "openflow.of_04",
+          "--port=%i" % (PORT,), "--backlog=%i" % (backlog,),
+          "--listeners=%i" % (listeners,),
+          # Switches stuck in a small backlog don't read until they've all
+          # connected, which can take longer than the usual timeout
+          "--handshake_timeout=60"]
+  p = subprocess.Popen(args, stdin=open(os.devnull))
+  for i in range(100):
+    try:
+      socket.create_connection(("127.0.0.1", PORT)).close()
+      time.sleep(0.5)
+      return p
+    except socket.error:
+      time.sleep(0.1)
+  p.kill()
+  raise RuntimeError("POX didn't start")
+
+
+def _connect (args):
+  address,dpids = args
+  return run_switches(address, dpids, 0, load = False)[1]
+
+
+def storm (address, switches, processes):
+  """
+  Connects switches from several processes at once
+
+  Returns seconds until the last one finished its handshake (or None if
+  some never did).
+  """
+  dpids = range(1, switches + 1)
+  jobs = [(address, dpids[i::processes]) for i in range(processes)]
+  pool = multiprocessing.Pool(processes)
+  try:
+    results = pool.map(_connect, jobs)
+  finally:
+    pool.close()
+    pool.join()
+  if None in results: return None
+  return max(results)
+
+
+def main ():
+  switches = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+  rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+  processes = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+  print "%i switches from %i processes, %i rounds" % (switches, processes,
+                                                      rounds)
+  for backlog,listeners in CONFIGS:
+    p = start_pox(backlog, listeners)
+    times = []
+    try:
+      for i in range(rounds):
+        t = storm(("127.0.0.1", PORT), switches, processes)
+        if t is None: break
+        times.append(t)
+        time.sleep(0.5) # Let POX notice the disconnects
+    finally:
+      p.terminate()
+      p.wait()
+    label = "backlog %4i, %i listener%s" % (backlog, listeners,
+                                           " " if listeners == 1 else "s")
+    if len(times) != rounds:
+      print "%s: switches failed to connect" % (label,)
+      continue
+    times.sort()
+    print "%s: %6.0f switches/sec  (best %.2fs, worst %.2fs)" % (label,
+        switches / (sum(times) / len(times)), times[0], times[-1])
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the recoco Scheduler's ready queue
+
+  slices   - time slices per second with lots of busy tasks
+  schedule - cost of schedule() on the scheduler thread with lots of
+             tasks ready (it has to check the task isn't already ready)
+  share    - fraction of slices each priority gets when all are busy
+
+Usage: scheduler_bench.py [tasks] [seconds]
+"""
+
+import sys
+import os.path
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.recoco import Scheduler, Task
+
+
+def scheduler ():
+  return Scheduler(isDefaultScheduler = True, daemon = True,
+                   threaded_selecthub = False)
+
+
+class Spinner (Task):
+  def __init__ (self, priority = 1):
+    Task.__init__(self)
+    self.priority = priority
+    self.slices = 0
+    self.done = False
+
+  def run (self):
+    while not self.done:
+      self.slices += 1
+      yield 0
+
+
+def spin (priorities, duration):
+  """
+  Runs a Spinner for each priority; returns their slice counts
+  """
+  s = scheduler()
+  tasks = [Spinner(p) for p in priorities]
+  for t in tasks: t.start()
+  time.sleep(0.2)
+  start = [t.slices for t in tasks]
+  time.sleep(duration)
+  counts = [t.slices - c for t,c in zip(tasks, start)]
+  for t in tasks: t.done = True
+  s.quit()
+  time.sleep(0.2)
+  return counts
+
+
+def slices (count, duration):
+  rate = sum(spin([1] * count, duration)) / float(duration)
+  return "%8.0f slices/sec" % (rate,)
+
+
+def schedule (count, duration):
+  s = scheduler()
+  spinners = [Spinner() for i in range(count)]
+  for t in spinners: t.start()
+  # A task which wakes an idle task over and over, like a producer
+  # waking a consumer
+  result = []
+  class Idle (Task):
+    def run (self):
+      yield False
+  class Waker (Task):
+    def run (self):
+      idle = Idle()
+      end = time.time() + duration
+      calls = 0
+      elapsed = 0
+      while time.time() < end:
+        start = time.time()
+        for i in range(100):
+          s.schedule(idle)
+          s.schedule(idle) # Second is a no-op, but has to check
+        elapsed += time.time() - start
+        calls += 200
+        yield 0
+      result.append(elapsed / calls)
+      for t in spinners: t.done = True
+  Waker().start()
+  while not result:
+    time.sleep(0.1)
+  s.quit()
+  time.sleep(0.2)
+  return "%8.2fus per schedule()" % (result[0] * 1e6,)
+
+
+def share (count, duration):
+  priorities = [0.1, 1, 10]
+  counts = spin(priorities * (count // 3), duration)
+  total = float(sum(counts))
+  r = []
+  for p in priorities:
+    n = sum(c for c,q in zip(counts, priorities * (count // 3)) if q == p)
+    r.append("%s: %5.1f%%" % (p, n / total * 100))
+  return "  ".join(r)
+
+
+def main ():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+  for name,f in [("slices", slices), ("schedule", schedule),
+                 ("share", share)]:
+    print "%-8s %5i tasks: %s" % (name, count, f(count, duration))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares full and incremental spanning tree calculation
+
+Builds a synthetic topology (a random graph with a ring through it so
+that it's connected), then times recalculating the whole tree with
+_calc_spanning_tree() against applying single link changes to an
+_IncrementalTree.
+
+Usage: spanning_tree_bench.py [switches [extra_links_per_switch]]
+"""
+
+import sys
+import os.path
+import time
+import random
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.core
+pox.core.initialize(threaded_selecthub=False, handle_signals=False)
+from pox.core import core
+
+from pox.openflow.discovery import Link
+from pox.openflow.spanning_tree import _calc_spanning_tree, _IncrementalTree
+
+
+class FakeDiscovery (object):
+  def __init__ (self):
+    self.adjacency = {}
+
+
+def make_topology (switches, extra):
+  rng = random.Random(0)
+  next_port = [1] * (switches + 1)
+  def connect (a, b):
+    pa = next_port[a]
+    pb = next_port[b]
+    next_port[a] += 1
+    next_port[b] += 1
+    return [Link(a,pa,b,pb), Link(b,pb,a,pa)]
+
+  links = []
+  for i in range(1, switches + 1):
+    links.extend(connect(i, i % switches + 1))
+  for _ in range(switches * extra):
+    a = rng.randint(1, switches)
+    b = rng.randint(1, switches)
+    if a != b: links.extend(connect(a, b))
+  return links
+
+
+def main (switches = 3000, extra = 1):
+  links = make_topology(switches, extra)
+  print "%i switches, %i unidirectional links" % (switches, len(links))
+
+  discovery = FakeDiscovery()
+  core.register("openflow_discovery", discovery)
+  for l in links:
+    discovery.adjacency[l] = 0
+
+  start = time.time()
+  _calc_spanning_tree()
+  full = time.time() - start
+  print "%-36s %10.3f ms" % ("full recalculation", full * 1000)
+
+  t = _IncrementalTree()
+  dirty = set()
+  start = time.time()
+  for l in links:
+    t.add_link(l, dirty)
+  elapsed = time.time() - start
+  print "%-36s %10.3f ms" % ("incremental bulk load", elapsed * 1000)
+
+  # Flap every link on the tree (worst case -- we need a replacement)
+  tree_links = [l for l in links if l.dpid2 in t.tree[l.dpid1]]
+  rng = random.Random(1)
+  rng.shuffle(tree_links)
+  tree_links = tree_links[:1000]
+  port_count = 0
+  start = time.time()
+  for l in tree_links:
+    dirty = set()
+    t.remove_link(l, dirty)
+    t.add_link(l, dirty)
+    port_count += len(dirty)
+  elapsed = time.time() - start
+  per = elapsed / len(tree_links) / 2
+  print "%-36s %10.3f ms (%.1f ports checked)" % (
+      "incremental tree link change", per * 1000,
+      port_count / float(len(tree_links)))
+  print "%-36s %10.1fx" % ("speedup per link event", full / per)
+
+
+if __name__ == '__main__':
+  main(*[int(x) for x in sys.argv[1:]])
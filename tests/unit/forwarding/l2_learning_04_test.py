@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import struct
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import EthAddr, IPAddr
+import pox.openflow.libopenflow_04 as of
+import pox.forwarding.l2_learning_04 as l2
+
+
+class FakeConnection (object):
+  def __init__ (self):
+    self.dpid = 1
+    self.connect_time = 1
+    self.sent = []
+  def send (self, msg):
+    self.sent.append(msg)
+  def addListeners (self, *args, **kw):
+    pass
+  def flow_mods (self):
+    r = [m for m in self.sent if isinstance(m, of.ofp_flow_mod)]
+    self.sent = [m for m in self.sent if m not in r]
+    return r
+
+
+class FakePacketIn (object):
+  def __init__ (self, connection, packet, port):
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.parsed = packet
+    self.port = port
+    self.ofp = of.ofp_packet_in(data = packet.pack())
+
+
+class FakeFlowRemoved (object):
+  def __init__ (self, **kw):
+    self.ofp = of.ofp_flow_removed(**kw)
+
+
+def fields (match):
+  """
+  Returns {field name : value} for an ofp_match's OXM fields
+  """
+  r = {}
+  for f in match._oxm_fields_pkt:
+    name = of.oxm_ofb_match_fields_map[f.oxm_field]
+    r[name] = f.data
+  return r
+
+
+A = EthAddr("00:00:00:00:00:0a")
+B = EthAddr("00:00:00:00:00:0b")
+
+
+def packet (src, dst):
+  return pkt.ethernet(src = src, dst = dst, type = pkt.ethernet.IP_TYPE,
+                      payload = pkt.ipv4(srcip = IPAddr("10.0.0.1"),
+                                         dstip = IPAddr("10.0.0.2")))
+
+
+class TwoTableTest (unittest.TestCase):
+  def setUp (self):
+    self.con = FakeConnection()
+    self.sw = l2.TwoTableLearningSwitch(self.con, transparent = False)
+
+  def packet_in (self, src, dst, port):
+    self.sw._handle_PacketIn(FakePacketIn(self.con, packet(src, dst), port))
+
+  def test_static_entries (self):
+    fms = self.con.flow_mods()
+    self.assertEqual([(fm.table_id, fm.command) for fm in fms],
+                     [(l2.FORWARD_TABLE, of.OFPFC_DELETE),
+                      (l2.LEARN_TABLE, of.OFPFC_DELETE),
+                      (l2.LEARN_TABLE, of.OFPFC_ADD),
+                      (l2.LEARN_TABLE, of.OFPFC_ADD),
+                      (l2.FORWARD_TABLE, of.OFPFC_ADD)])
+    flood = fms[-1]
+    self.assertEqual(fields(flood.match), {})
+    for fm in fms:
+      fm.pack()
+
+  def test_learn (self):
+    self.con.flow_mods()
+    self.packet_in(A, B, 3)
+    learn,forward = self.con.flow_mods()
+
+    self.assertEqual(learn.table_id, l2.LEARN_TABLE)
+    self.assertEqual(learn.command, of.OFPFC_ADD)
+    self.assertEqual(fields(learn.match),
+                     {'OFPXMT_OFB_IN_PORT' : struct.pack("!L", 3),
+                      'OFPXMT_OFB_ETH_SRC' : A.toRaw()})
+    self.assertTrue(learn.flags & of.OFPFF_SEND_FLOW_REM)
+    self.assertEqual(learn.cookie, l2._LEARN_COOKIE | 0x0a)
+    goto, = [i for i in learn.instructions
+             if isinstance(i, of.ofp_instruction_goto_table)]
+    self.assertEqual(goto.table_id, l2.FORWARD_TABLE)
+
+    self.assertEqual(forward.table_id, l2.FORWARD_TABLE)
+    self.assertEqual(forward.command, of.OFPFC_ADD)
+    self.assertEqual(fields(forward.match),
+                     {'OFPXMT_OFB_ETH_DST' : A.toRaw()})
+    learn.pack()
+    forward.pack()
+
+    # B is unknown, so the packet itself is flooded
+    po, = self.con.sent
+    self.assertEqual(po.actions[0].port, of.OFPP_FLOOD)
+
+    # Hearing from A on the same port again changes nothing
+    del self.con.sent[:]
+    self.packet_in(A, B, 3)
+    self.assertEqual(self.con.flow_mods(), [])
+
+  def test_move (self):
+    self.packet_in(A, B, 3)
+    self.con.flow_mods()
+    self.packet_in(A, B, 4)
+    old,learn,forward = self.con.flow_mods()
+    self.assertEqual(old.command, of.OFPFC_DELETE_STRICT)
+    self.assertEqual(fields(old.match)['OFPXMT_OFB_IN_PORT'],
+                     struct.pack("!L", 3))
+    self.assertEqual(fields(learn.match)['OFPXMT_OFB_IN_PORT'],
+                     struct.pack("!L", 4))
+    self.assertEqual(forward.command, of.OFPFC_MODIFY_STRICT)
+    self.assertEqual(forward.actions[0].port, 4)
+    self.assertEqual(self.sw.macToPort[A], 4)
+
+  def test_flow_removed (self):
+    self.packet_in(A, B, 3)
+    self.con.flow_mods()
+
+    # Removed because of our own DELETE_STRICT (a move); ignored
+    self.sw._handle_FlowRemoved(FakeFlowRemoved(table_id = l2.LEARN_TABLE,
+        cookie = l2._LEARN_COOKIE | 0x0a, reason = of.OFPRR_DELETE))
+    self.assertEqual(self.con.flow_mods(), [])
+
+    # Idled out; forget A and its forwarding entry
+    self.sw._handle_FlowRemoved(FakeFlowRemoved(table_id = l2.LEARN_TABLE,
+        cookie = l2._LEARN_COOKIE | 0x0a, reason = of.OFPRR_IDLE_TIMEOUT))
+    fm, = self.con.flow_mods()
+    self.assertEqual((fm.table_id, fm.command),
+                     (l2.FORWARD_TABLE, of.OFPFC_DELETE_STRICT))
+    self.assertEqual(fields(fm.match), {'OFPXMT_OFB_ETH_DST' : A.toRaw()})
+    self.assertNotIn(A, self.sw.macToPort)
+
+
+class FakeOpenFlow (object):
+  def addListeners (self, *args, **kw):
+    pass
+
+
+class FakeCore (object):
+  def __init__ (self):
+    self.openflow = FakeOpenFlow()
+  def callDelayed (self, *args):
+    pass
+
+
+class FakeLog (object):
+  def __init__ (self):
+    self.infos = []
+  def info (self, *args):
+    self.infos.append(args)
+  def debug (self, *args):
+    pass
+
+
+class FakeEvent (object):
+  def __init__ (self, connection):
+    self.connection = connection
+    self.dpid = connection.dpid
+
+
+class StatsTest (unittest.TestCase):
+  def setUp (self):
+    self._core = l2.core
+    self._log = l2.log
+    l2.core = FakeCore()
+    l2.log = FakeLog()
+
+  def tearDown (self):
+    l2.core = self._core
+    l2.log = self._log
+
+  def test_rate_after_disconnect (self):
+    app = l2.l2_learning(transparent = False, proactive = True)
+    con = FakeConnection()
+    app._handle_ConnectionUp(FakeEvent(con))
+    app.switches[con.dpid]._handle_PacketIn(FakePacketIn(con, packet(A, B), 3))
+    app._handle_ConnectionDown(FakeEvent(con))
+
+    app._log_stats(1)
+    args = l2.log.infos[-1]
+    self.assertEqual(args[1], 0) # switches
+    self.assertTrue(args[2] > 0) # PacketIns/sec
+    self.assertTrue(args[3] > 0) # flow_mods/sec
+
+    # Nothing new happened, so the rates are zero (not negative)
+    app._log_stats(1)
+    args = l2.log.infos[-1]
+    self.assertEqual(args[2:4], (0, 0))
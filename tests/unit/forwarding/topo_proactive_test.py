@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import IPAddr, EthAddr
+import pox.forwarding.topo_proactive as topo
+from pox.proto.dhcpd import SimpleAddressPool
+
+
+class FakeARPHelper (object):
+  def addListeners (self, *args, **kw):
+    pass
+
+
+class FakeCore (object):
+  def __init__ (self):
+    self.ARPHelper = FakeARPHelper()
+
+
+class FakeTimer (object):
+  def __init__ (self, *args, **kw):
+    pass
+
+
+class FakeEthernet (object):
+  def __init__ (self, src):
+    self.src = EthAddr(src)
+
+
+class FakeEvent (object):
+  def __init__ (self, src, port = 1):
+    self.parsed = FakeEthernet(src)
+    self.port = port
+
+
+class RecordingTopoSwitch (topo.TopoSwitch):
+  """
+  Keeps (message type, yiaddr) for replies instead of sending them
+  """
+  def reply (self, event, msg):
+    t = msg.options[msg.MSG_TYPE_OPT].type
+    self.replies.append((t, msg.yiaddr))
+
+  def nak (self, event, msg = None):
+    self.replies.append((pkt.dhcp.NAK_MSG, None))
+
+  def _send_rewrite_rule (self, ip, mac):
+    self.rewrites.append((ip, mac))
+
+
+class TopoSwitchDHCPTest (unittest.TestCase):
+  A = "00:00:00:00:00:0a"
+  B = "00:00:00:00:00:0b"
+  ip = IPAddr("10.100.1.1")
+
+  def setUp (self):
+    self._real = topo.core, topo.Timer
+    topo.core = FakeCore()
+    topo.Timer = FakeTimer
+    self.sw = RecordingTopoSwitch()
+    self.sw.replies = []
+    self.sw.rewrites = []
+    # What connect() would set up for switch 100 with a port 1
+    self.sw._id = 100
+    self.sw.network = IPAddr("10.100.0.0")
+    self.sw.ip_addr = IPAddr("10.100.0.1")
+    self.sw.router_addr = None
+    self.sw.dns_addr = None
+    self.sw.subnet = IPAddr("255.0.0.0")
+    self.pool = SimpleAddressPool("10.100.1.0/24", first = 1, last = 1)
+    self.sw.pools = {1: self.pool}
+
+  def tearDown (self):
+    topo.core, topo.Timer = self._real
+
+  def _msg (self, ip = None):
+    p = pkt.dhcp()
+    if ip is not None:
+      p.add_option(pkt.DHCP.DHCPRequestIPOption(ip))
+    return p
+
+  def discover (self, mac):
+    self.sw.exec_discover(FakeEvent(mac), self._msg(), self.pool)
+    return self.sw.replies.pop()
+
+  def request (self, mac, ip):
+    self.sw.exec_request(FakeEvent(mac), self._msg(ip), self.pool)
+    return self.sw.replies.pop()
+
+  def expire_all (self):
+    now = topo.time.time() - 1
+    d = self.sw
+    for mac in d._lease_expires:
+      d._lease_expires[mac] = now
+    d._lease_heap = [(now,) + e[1:] for e in d._lease_heap]
+    for mac,(_,pool) in d._offer_expires.items():
+      d._offer_expires[mac] = (now, pool)
+    d._check_leases()
+
+  def test_lease (self):
+    self.sw._check_leases() # The lease timer must work with nothing to do
+    self.assertEqual(self.discover(self.A), (pkt.dhcp.OFFER_MSG, self.ip))
+    self.assertEqual(self.request(self.A, self.ip), (pkt.dhcp.ACK_MSG,
+                                                      self.ip))
+    self.assertEqual(self.sw.leases, {EthAddr(self.A): self.ip})
+    self.assertEqual(self.sw.offers, {})
+    # The lease is learned, so traffic to the IP gets rewritten to A
+    self.assertEqual(self.sw.rewrites, [(self.ip, EthAddr(self.A))])
+
+  def test_expire_and_rediscover (self):
+    self.discover(self.A)
+    self.request(self.A, self.ip)
+    self.expire_all()
+    self.assertEqual(self.sw.leases, {})
+    self.assertEqual(len(self.pool), 1)
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.OFFER_MSG, self.ip))
+    self.assertEqual(self.request(self.B, self.ip), (pkt.dhcp.ACK_MSG,
+                                                      self.ip))
+    self.assertEqual(self.discover(self.A), (pkt.dhcp.NAK_MSG, None))
+
+  def test_offer_expires (self):
+    self.discover(self.A)
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.NAK_MSG, None))
+    self.expire_all()
+    self.assertEqual(self.sw.offers, {})
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.OFFER_MSG, self.ip))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.host_tracker.host_tracker as ht
+from pox.lib.addresses import EthAddr, IPAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.arp import arp
+
+
+class FakeTime (object):
+  def __init__ (self, now):
+    self.now = now
+  def time (self):
+    return self.now
+
+
+class FakeTimer (object):
+  def __init__ (self, *args, **kw):
+    pass
+  def cancel (self):
+    pass
+
+
+class FakeOpenFlow (object):
+  def __init__ (self):
+    self.sent = [] # (dpid, data)
+  def sendToDPID (self, dpid, data):
+    self.sent.append((dpid, data))
+    return True
+
+
+class FakeDiscovery (object):
+  def is_edge_port (self, dpid, port):
+    return True
+
+
+class FakeCore (object):
+  def __init__ (self):
+    self.openflow = FakeOpenFlow()
+    self.openflow_discovery = FakeDiscovery()
+  def listen_to_dependencies (self, *args, **kw):
+    pass
+
+
+class FakeConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+
+
+class FakePacketIn (object):
+  def __init__ (self, dpid, port, packet):
+    self.connection = FakeConnection(dpid)
+    self.port = port
+    self.parsed = ethernet(packet.pack())
+
+
+def mac (n):
+  return EthAddr("00:00:00:00:%02x:%02x" % (n >> 8, n & 0xff))
+
+def ip (n):
+  return IPAddr("10.0.%i.%i" % (n >> 8, n & 0xff))
+
+def arp_from (src, srcip):
+  a = arp(opcode = arp.REPLY, hwsrc = src, hwdst = EthAddr("02:00:00:00:be:ef"),
+          protosrc = srcip, protodst = IPAddr("10.0.0.254"))
+  return ethernet(type = ethernet.ARP_TYPE, src = src,
+                  dst = EthAddr("02:00:00:00:be:ef"), payload = a)
+
+
+class HostTrackerTestBase (unittest.TestCase):
+  def setUp (self):
+    self._core = ht.core
+    self._Timer = ht.Timer
+    self._time = ht.time
+    ht.core = FakeCore()
+    ht.Timer = FakeTimer
+    ht.time = FakeTime(self._time.time())
+    self.tracker = ht.host_tracker()
+    self.left = []
+    self.tracker.addListenerByName("HostEvent", self._handle_HostEvent)
+
+  def tearDown (self):
+    ht.core = self._core
+    ht.Timer = self._Timer
+    ht.time = self._time
+
+  def _handle_HostEvent (self, event):
+    if event.leave: self.left.append(event.entry.macaddr)
+
+  @property
+  def sent (self):
+    return ht.core.openflow.sent
+
+  def packet_in (self, dpid, port, n):
+    self.tracker._handle_openflow_PacketIn(FakePacketIn(dpid, port,
+                                                        arp_from(mac(n), ip(n))))
+
+  def run_until (self, when):
+    """
+    Runs the tracker's timers once a second until the given time
+    """
+    while ht.time.now < when:
+      ht.time.now = min(when, ht.time.now + 1)
+      self.tracker._check_timeouts()
+      if self.tracker._ping_timer is not None:
+        self.tracker._send_pings()
+
+
+class ExpiryTest (HostTrackerTestBase):
+  def test_quiet_host_is_pinged (self):
+    start = ht.time.now
+    self.packet_in(1, 1, 1)
+    self.run_until(start + ht.timeoutSec['arpAware'] - 1)
+    self.assertEqual(self.sent, [])
+    self.run_until(start + ht.timeoutSec['arpAware'] + 2)
+    self.assertEqual(len(self.sent), 1)
+    self.assertEqual(self.sent[0][0], 1)
+
+    # It answers, so it's kept
+    self.packet_in(1, 1, 1)
+    self.run_until(ht.time.now + ht.timeoutSec['arpReply'] * 2)
+    self.assertEqual(len(self.sent), 1)
+    self.assertIn(mac(1), self.tracker.entryByMAC)
+
+  def test_refresh_postpones (self):
+    start = ht.time.now
+    self.packet_in(1, 1, 1)
+    self.run_until(start + 100)
+    self.packet_in(1, 1, 1)
+    self.run_until(start + ht.timeoutSec['arpAware'] + 10)
+    self.assertEqual(self.sent, [])
+
+  def test_silent_host_expires (self):
+    start = ht.time.now
+    self.packet_in(1, 1, 1)
+    end = (start + ht.timeoutSec['arpAware']
+           + ht.timeoutSec['arpReply'] * (ht.PingCtrl.pingLim + 3))
+    self.run_until(end)
+    self.assertEqual(len(self.sent), ht.PingCtrl.pingLim + 1)
+    self.assertEqual(self.left, [mac(1)])
+    self.assertEqual(self.tracker.entryByMAC, {})
+    self.assertEqual(self.tracker.entryByIP, {})
+    self.assertEqual(len(self.tracker._expiry), 0)
+
+
+class GetMacEntryByIPTest (HostTrackerTestBase):
+  def test_lookup (self):
+    self.packet_in(1, 1, 1)
+    self.packet_in(1, 2, 2)
+    self.assertEqual(self.tracker.getMacEntryByIP(ip(1)).macaddr, mac(1))
+    self.assertEqual(self.tracker.getMacEntryByIP(ip(2)).macaddr, mac(2))
+    self.assertIs(self.tracker.getMacEntryByIP(ip(3)), None)
+
+  def test_shared_ip (self):
+    # Two MACs claiming the same IP; the most recently seen one wins
+    self.tracker._handle_openflow_PacketIn(FakePacketIn(1, 1,
+                                           arp_from(mac(1), ip(9))))
+    ht.time.now += 1
+    self.tracker._handle_openflow_PacketIn(FakePacketIn(1, 2,
+                                           arp_from(mac(2), ip(9))))
+    self.assertEqual(self.tracker.getMacEntryByIP(ip(9)).macaddr, mac(2))
+    ht.time.now += 1
+    self.tracker._handle_openflow_PacketIn(FakePacketIn(1, 1,
+                                           arp_from(mac(1), ip(9))))
+    self.assertEqual(self.tracker.getMacEntryByIP(ip(9)).macaddr, mac(1))
+
+    self.tracker._remove_ip(self.tracker.entryByMAC[mac(1)], ip(9))
+    self.assertEqual(self.tracker.getMacEntryByIP(ip(9)).macaddr, mac(2))
+    self.tracker._remove_ip(self.tracker.entryByMAC[mac(2)], ip(9))
+    self.assertIs(self.tracker.getMacEntryByIP(ip(9)), None)
+    self.assertNotIn(ip(9), self.tracker.entryByIP)
+
+
+class PingSpreadingTest (HostTrackerTestBase):
+  def test_per_dpid_rate (self):
+    start = ht.time.now
+    for n in range(1, 41):
+      self.packet_in(1, n, n)
+    for n in range(41, 44):
+      self.packet_in(2, n, n)
+
+    ht.time.now = start + ht.timeoutSec['arpAware'] + 2
+    self.tracker._check_timeouts()
+    self.assertEqual(self.sent, [])
+    self.tracker._send_pings()
+
+    # One tick's worth for each switch; the busy one doesn't hold up the
+    # other one
+    per_tick = int(ht.PingCtrl.pingRate * self.tracker._ping_tick)
+    dpids = [d for d,data in self.sent]
+    self.assertEqual(dpids.count(1), per_tick)
+    self.assertEqual(dpids.count(2), 3)
+
+    # The rest go out over the following ticks
+    ticks = 0
+    while self.tracker._ping_timer is not None:
+      ht.time.now += self.tracker._ping_tick
+      self.tracker._send_pings()
+      ticks += 1
+      dpids = [d for d,data in self.sent]
+      self.assertTrue(dpids.count(1) <= per_tick * (ticks + 1) + 1)
+    self.assertEqual(dpids.count(1), 40)
+    self.assertEqual(dpids.count(2), 3)
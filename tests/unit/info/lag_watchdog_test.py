@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import time
+import threading
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.recoco.recoco as recoco
+from pox.lib.recoco import Scheduler, Task
+from pox.info.lag_watchdog import LagWatchdog
+
+
+class Hog (Task):
+  def __init__ (self, done):
+    Task.__init__(self)
+    self.done = done
+  def run (self):
+    yield 0
+    hog_for_a_while()
+    self.done.set()
+
+
+def hog_for_a_while ():
+  time.sleep(0.3)
+
+
+class LagWatchdogTest (unittest.TestCase):
+  def setUp (self):
+    self._old_default = recoco.defaultScheduler
+    self.scheduler = Scheduler(isDefaultScheduler = True, daemon = True)
+    self.watchdog = LagWatchdog(interval = 0.01, threshold = 0.1,
+                                scheduler = self.scheduler)
+    self.watchdog.start()
+
+  def tearDown (self):
+    self.watchdog.stop()
+    self.scheduler.quit()
+    recoco.defaultScheduler = self._old_default
+
+  def test_lag (self):
+    deadline = time.time() + 5
+    while self.watchdog.lag.count < 5 and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertTrue(self.watchdog.lag.count >= 5)
+    self.assertEqual(self.watchdog.stall_count, 0)
+
+  def test_stall (self):
+    done = threading.Event()
+    Hog(done).start()
+    self.assertTrue(done.wait(5))
+    deadline = time.time() + 5
+    while not (self.watchdog.stalls and self.watchdog.stalls[0].seconds):
+      self.assertTrue(time.time() < deadline, "Timed out")
+      time.sleep(0.01)
+    stall = self.watchdog.stalls[0]
+    self.assertEqual(self.watchdog.stall_count, 1)
+    self.assertEqual(stall.task, __name__ + ".Hog")
+    self.assertIn("hog_for_a_while", "".join(stall.stack))
+    self.assertTrue(stall.seconds >= 0.2)
+
+
+if __name__ == '__main__':
+  unittest.main()
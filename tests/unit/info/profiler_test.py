@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import json
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.revent import EventMixin, Event
+from pox.lib.recoco import Task, DelayedCall
+import pox.lib.revent.revent as revent
+from pox.info.profiler import Profiler
+
+
+class Ping (Event):
+  pass
+
+
+class Source (EventMixin):
+  _eventMixin_events = set([Ping])
+
+
+class Listener (object):
+  def __init__ (self):
+    self.pings = 0
+  def _handle_Ping (self, event):
+    self.pings += 1
+
+
+class Worker (Task):
+  def run (self):
+    while True:
+      yield 0
+
+
+class ProfilerTest (unittest.TestCase):
+  def setUp (self):
+    self.source = Source()
+    self.listener = Listener()
+    self.source.addListener(Ping, self.listener._handle_Ping)
+    self.orig_raise = EventMixin.__dict__['raiseEvent']
+    self.orig_invoke = Event.__dict__['_invoke']
+
+  def profile (self, sample, raises):
+    p = Profiler(sample = sample)
+    p.start()
+    try:
+      for i in range(raises):
+        self.source.raiseEvent(Ping)
+    finally:
+      p.stop()
+    return p
+
+  def test_handlers_and_events (self):
+    p = self.profile(1, 3)
+    self.assertEqual(self.listener.pings, 3)
+    name = __name__ + ".Listener._handle_Ping"
+    self.assertEqual(p.handlers[name].count, 3)
+    self.assertEqual(p.events["Ping"].count, 3)
+    json.dumps(p.get_stats())
+    self.assertIn("_handle_Ping", p.report())
+
+  def test_stop_restores (self):
+    self.profile(1, 1)
+    self.assertIs(EventMixin.__dict__['raiseEvent'], self.orig_raise)
+    self.assertIs(Event.__dict__['_invoke'], self.orig_invoke)
+
+  def test_sampling (self):
+    p = self.profile(4, 8)
+    self.assertEqual(self.listener.pings, 8)
+    h = p.handlers[__name__ + ".Listener._handle_Ping"]
+    # Two were timed, and each counts for four
+    self.assertEqual(h.count, 8)
+    self.assertEqual(h.buckets()[-1][2] % 4, 0)
+
+  def test_tasks (self):
+    called = []
+    p = Profiler()
+    p.start()
+    try:
+      Worker().execute()
+      DelayedCall(called.append, (1,)).execute()
+    finally:
+      p.stop()
+    self.assertEqual(called, [1])
+    self.assertEqual(p.tasks[__name__ + ".Worker"].count, 1)
+    self.assertEqual(p.tasks["callDelayed __builtin__.list.append"].count, 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -31,6 +31,17 @@ class MockEthAddrTest(unittest.TestCase):
     self.assertEqual("00:11:22:33:44:55", str(EthAddr("00:11:22:33:44:55")),
         "str(eth) doesn't match original string")
 
+  def test_resolve_names (self):
+    e = EthAddr("00:00:00:33:44:55")
+    self.assertEqual(e.toStr(resolveNames=True),
+                     "(XEROX CORPORATION):33:44:55")
+    self.assertEqual(e.toStr('-', resolveNames=True),
+                     "(XEROX CORPORATION)-33-44-55")
+    # Locally administered addresses don't have OUIs
+    self.assertEqual(EthAddr("02:00:00:33:44:55").toStr(resolveNames=True),
+                     "02:00:00:33:44:55")
+    self.assertEqual(str(e), "00:00:00:33:44:55")
+
 #  def test_int_ctor(self):
 #    int_val = EthAddr("00:00:00:00:01:00").toInt()
 #    self.assertEqual(int_val, 1<<8)
@@ -101,3 +112,103 @@ class IPv6Tests (unittest.TestCase):
     assert IPAddr6('0:0:0:0:0:FFFF:222.1.41.90') == '::ffff:222.1.41.90'
     assert IPAddr6('::ffff:C0A8:5') == '::ffff:192.168.0.5'
     assert IPAddr6('::ffff:192.168.0.5') == '::ffff:c0a8:5'
+
+
+class IPNetworkTests (unittest.TestCase):
+  def test_parse (self):
+    n = IPNetwork("192.168.1.0/24")
+    self.assertEqual(n.network, IPAddr("192.168.1.0"))
+    self.assertEqual(n.bits, 24)
+    self.assertEqual(n.netmask, IPAddr("255.255.255.0"))
+    self.assertEqual(n, IPNetwork("192.168.1.0/255.255.255.0"))
+    self.assertEqual(n, IPNetwork((IPAddr("192.168.1.0"), 24)))
+    self.assertEqual(str(n), "192.168.1.0/24")
+    self.assertEqual(IPNetwork("10.0.0.1").bits, 32)
+
+  def test_host_bits (self):
+    self.assertRaises(RuntimeError, IPNetwork, "192.168.1.1/24")
+    n = IPNetwork("192.168.1.1/24", allow_host = True)
+    self.assertEqual(n.network, IPAddr("192.168.1.0"))
+
+  def test_contains (self):
+    n = IPNetwork("172.16.0.0/12")
+    self.assertTrue(IPAddr("172.31.255.255") in n)
+    self.assertFalse(IPAddr("172.32.0.0") in n)
+    self.assertTrue(IPAddr("172.20.1.1").in_network(n))
+    self.assertFalse(IPAddr6("::1") in n)
+
+  def test_ipv6 (self):
+    n = IPNetwork("2001:db8::/32")
+    self.assertEqual(n.bits, 32)
+    self.assertTrue(IPAddr6("2001:db8:1::1") in n)
+    self.assertTrue(IPAddr6("2001:db8:1::1").in_network(n))
+    self.assertFalse(IPAddr6("2001:db9::1") in n)
+
+
+class PrefixTableTests (unittest.TestCase):
+  def test_longest_match (self):
+    t = PrefixTable()
+    t.add("10.0.0.0/8", "a")
+    t.add("10.1.0.0/16", "b")
+    t.add("10.1.2.0/24", "c")
+    t.add("10.1.2.3/32", "d")
+    self.assertEqual(t.lookup("10.9.9.9"), "a")
+    self.assertEqual(t.lookup(IPAddr("10.1.9.9")), "b")
+    self.assertEqual(t.lookup("10.1.2.9"), "c")
+    self.assertEqual(t.lookup("10.1.2.3"), "d")
+    self.assertEqual(t.lookup("11.0.0.1"), None)
+    self.assertEqual(t.match("10.1.2.9"), (IPNetwork("10.1.2.0/24"), "c"))
+    self.assertEqual(len(t), 4)
+
+  def test_default_route (self):
+    t = PrefixTable({"0.0.0.0/0":"default", "192.168.0.0/16":"lan"})
+    self.assertEqual(t.lookup("8.8.8.8"), "default")
+    self.assertEqual(t.lookup("192.168.3.4"), "lan")
+
+  def test_remove (self):
+    t = PrefixTable()
+    t.load([("10.0.0.0/8", 1), ("10.128.0.0/9", 2), ("10.0.0.0/9", 3)])
+    self.assertTrue(t.remove("10.0.0.0/9"))
+    self.assertFalse(t.remove("10.0.0.0/9"))
+    self.assertEqual(t.lookup("10.1.1.1"), 1)
+    self.assertEqual(t.lookup("10.200.1.1"), 2)
+    self.assertTrue(t.remove("10.0.0.0/8"))
+    self.assertEqual(t.lookup("10.1.1.1"), None)
+    self.assertEqual(list(t), [IPNetwork("10.128.0.0/9")])
+
+  def test_exact (self):
+    t = PrefixTable()
+    t.add("10.0.0.0/8", 1)
+    self.assertTrue("10.0.0.0/8" in t)
+    self.assertFalse("10.0.0.0/9" in t)
+    self.assertEqual(t.get("10.0.0.0/8"), 1)
+    self.assertEqual(t.get("10.0.0.0/16", "x"), "x")
+
+  def test_ipv6 (self):
+    t = PrefixTable()
+    t.add("2001:db8::/32", "doc")
+    t.add("2001:db8:1::/48", "site")
+    t.add("10.0.0.0/8", "v4")
+    self.assertEqual(t.lookup(IPAddr6("2001:db8:1::5")), "site")
+    self.assertEqual(t.lookup("2001:db8:2::5"), "doc")
+    self.assertEqual(t.lookup("10.2.3.4"), "v4")
+    self.assertEqual(t.lookup("::1"), None)
+
+  def test_against_linear_scan (self):
+    import random
+    r = random.Random(4)
+    nets = set()
+    while len(nets) < 300:
+      bits = r.randint(0, 32)
+      nets.add(IPNetwork(IPAddr(r.getrandbits(32)), bits, allow_host=True))
+    t = PrefixTable((n,n) for n in nets)
+    for n in list(nets)[::3]:
+      t.remove(n)
+      nets.discard(n)
+    self.assertEqual(len(t), len(nets))
+    for _ in range(2000):
+      a = IPAddr(r.getrandbits(32))
+      best = None
+      for n in nets:
+        if a in n and (best is None or n.bits > best.bits): best = n
+      self.assertEqual(t.lookup(a), best)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+import threading
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.event_loop import EventLoop
+
+
+class EventLoopTest (unittest.TestCase):
+  use_epoll = None
+
+  def setUp (self):
+    self.loop = EventLoop(use_epoll = self.use_epoll)
+
+  def tearDown (self):
+    self.loop.close()
+
+  def test_timers (self):
+    fired = []
+    loop = self.loop
+    loop.call_later(0.02, fired.append, 2)
+    loop.call_later(0.01, fired.append, 1)
+    loop.call_later(0.015, fired.append, 0).cancel()
+    loop.call_later(0.03, loop.stop)
+    loop.run_forever()
+    self.assertEqual(fired, [1, 2])
+
+  def test_reader_writer (self):
+    a,b = socket.socketpair()
+    got = []
+    loop = self.loop
+    def readable ():
+      got.append(a.recv(100))
+      loop.remove_reader(a)
+      loop.stop()
+    def writable ():
+      b.send(b'x')
+      loop.remove_writer(b)
+    loop.add_reader(a, readable)
+    loop.add_writer(b.fileno(), writable)
+    loop.run_forever()
+    self.assertEqual(got, [b'x'])
+    self.assertFalse(loop.remove_reader(a))
+    a.close()
+    b.close()
+
+  def test_call_soon_threadsafe (self):
+    loop = self.loop
+    t = threading.Thread(target = loop.call_soon_threadsafe,
+                         args = (loop.stop,))
+    t.start()
+    loop.run_forever() # Would hang if the wakeup didn't work
+    t.join()
+
+  def test_ready_callbacks_dont_wait (self):
+    ran = []
+    self.loop.call_soon(ran.append, 1)
+    self.loop.run_once(5)
+    self.assertEqual(ran, [1])
+
+
+class SelectEventLoopTest (EventLoopTest):
+  use_epoll = False
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.histogram import Histogram
+
+
+class HistogramTest (unittest.TestCase):
+  def test_small_values_exact (self):
+    h = Histogram()
+    for v in range(1, 11):
+      h.record(v)
+    self.assertEqual(h.count, 10)
+    self.assertEqual(h.mean, 5.5)
+    self.assertEqual(h.percentile(50), 5)
+    self.assertEqual(h.percentile(100), 10)
+    self.assertEqual((h.min, h.max), (1, 10))
+
+  def test_precision (self):
+    for v in (100, 12345, 10**9):
+      h = Histogram()
+      h.record(v)
+      h.record(0)
+      p = h.percentile(100)
+      self.assertEqual(p, v) # Clamped to max
+      low,high,count = h.buckets()[-1]
+      self.assertTrue(low <= v <= high)
+      self.assertTrue(high - low <= v / 16.0)
+
+  def test_merge (self):
+    a = Histogram()
+    b = Histogram()
+    for v in range(100): a.record(v)
+    for v in range(100, 200): b.record(v, 2)
+    a.merge(b)
+    self.assertEqual(a.count, 300)
+    self.assertEqual((a.min, a.max), (0, 199))
+    self.assertTrue(120 <= a.percentile(50) <= 132)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import logging
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.log_flags as log_flags
+
+
+class LogFlagsTest (unittest.TestCase):
+  def test_watch (self):
+    log = logging.getLogger("log_flags_test")
+    seen = []
+    def update ():
+      seen.append(log.isEnabledFor(logging.DEBUG))
+    initially = log.isEnabledFor(logging.DEBUG)
+    log_flags.watch(update)
+    try:
+      log.setLevel(logging.DEBUG)
+      log.setLevel(logging.INFO)
+      logging.disable(logging.CRITICAL)
+      log.setLevel(logging.DEBUG)
+      logging.disable(logging.NOTSET)
+    finally:
+      log_flags.unwatch(update)
+      logging.disable(logging.NOTSET)
+      log.setLevel(logging.NOTSET)
+    self.assertEqual(seen, [initially, True, False, False, False, True])
+
+
+if __name__ == '__main__':
+  unittest.main()
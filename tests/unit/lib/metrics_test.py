@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.metrics import Registry, Counter, Gauge, CounterArray
+from pox.lib.metrics import BucketHistogram
+
+
+class MetricsTest (unittest.TestCase):
+  def lines (self, registry):
+    return [l for l in registry.to_text().split("\n")
+            if l and not l.startswith("#")]
+
+  def test_counters_and_gauges (self):
+    r = Registry()
+    c = r.register(Counter("c_total", "A counter"))
+    g = r.register(Gauge("g", "A gauge", "dpid",
+                         func = lambda: {"00-02":2, "00-01":1}))
+    c.inc()
+    c.value += 2
+    text = r.to_text()
+    self.assertIn("# HELP c_total A counter\n# TYPE c_total counter\n", text)
+    self.assertIn("# TYPE g gauge\n", text)
+    self.assertEqual(self.lines(r), ['c_total 3', 'g{dpid="00-01"} 1',
+                                     'g{dpid="00-02"} 2'])
+
+  def test_counter_array (self):
+    r = Registry()
+    a = r.register(CounterArray("m_total", "Messages", "type", 4,
+                                {1:'ONE', 3:'"3"'}))
+    a.counts[1] += 1
+    a.inc(2, 5)
+    a.inc(3)
+    self.assertEqual(self.lines(r), ['m_total{type="ONE"} 1',
+                                     'm_total{type="2"} 5',
+                                     'm_total{type="\\"3\\""} 1'])
+
+  def test_histogram (self):
+    r = Registry()
+    h = r.register(BucketHistogram("h_seconds", "Times", (0.1, 1)))
+    for v in (0.05, 0.1, 0.5, 2):
+      h.observe(v)
+    self.assertEqual(self.lines(r), ['h_seconds_bucket{le="0.1"} 2',
+                                     'h_seconds_bucket{le="1.0"} 3',
+                                     'h_seconds_bucket{le="+Inf"} 4',
+                                     'h_seconds_sum 2.65',
+                                     'h_seconds_count 4'])
+
+  def test_replace (self):
+    r = Registry()
+    r.register(Counter("a", "A"))
+    r.register(Counter("b", "B"))
+    r.register(Gauge("a", "Another A"))
+    self.assertEqual([m.name for m in r], ["a", "b"])
+    self.assertEqual(r.get("a").type, "gauge")
+    r.unregister("a")
+    self.assertNotIn("a", r)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+import threading
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.recoco.recoco as recoco
+from pox.lib.recoco import Scheduler, Task, Timer, Sleep, Select
+from pox.lib.recoco import ReadyQueue
+from pox.lib.recoco import PRIORITY_BULK, PRIORITY_NORMAL, PRIORITY_LATENCY
+
+
+class FakeTask (object):
+  scheduled = False
+  def __init__ (self, name, priority = PRIORITY_NORMAL):
+    self.name = name
+    self.priority = priority
+  def __repr__ (self):
+    return self.name
+
+
+class ReadyQueueTest (unittest.TestCase):
+  def run_queue (self, q, slices):
+    """
+    Pops and re-appends tasks (as if they were all busy)
+    """
+    counts = {}
+    order = []
+    for i in range(slices):
+      t = q.popleft()
+      counts[t.name] = counts.get(t.name, 0) + 1
+      order.append(t.name)
+      q.append(t)
+    return counts, order
+
+  def test_weighted_share (self):
+    q = ReadyQueue()
+    q.append(FakeTask("a", 1))
+    q.append(FakeTask("b", 0.25))
+    counts,_ = self.run_queue(q, 500)
+    self.assertEqual(counts, {"a":400, "b":100})
+
+  def test_fifo_within_priority (self):
+    q = ReadyQueue()
+    for n in "abc":
+      q.append(FakeTask(n))
+    _,order = self.run_queue(q, 6)
+    self.assertEqual("".join(order), "abcabc")
+
+  def test_latency_preempts_bulk (self):
+    q = ReadyQueue()
+    for i in range(5):
+      q.append(FakeTask("bulk", PRIORITY_BULK))
+    q.append(FakeTask("io", PRIORITY_LATENCY))
+    counts,_ = self.run_queue(q, 1010)
+    self.assertEqual(counts, {"io":1000, "bulk":10})
+
+  def test_idle_priority_doesnt_bank_time (self):
+    q = ReadyQueue()
+    a = FakeTask("a", 1)
+    b = FakeTask("b", 1)
+    q.append(a)
+    self.run_queue(q, 100)
+    # b has been idle all this time; it shouldn't get 100 slices in a row
+    q.append(b)
+    _,order = self.run_queue(q, 6)
+    self.assertEqual(sorted(order), ["a","a","a","b","b","b"])
+
+  def test_levels_come_and_go (self):
+    q = ReadyQueue()
+    a = FakeTask("a", 1)
+    b = FakeTask("b", 2)
+    q.append(a)
+    self.run_queue(q, 100) # a on its own
+    q.append(b)
+    counts,_ = self.run_queue(q, 30)
+    self.assertEqual(counts, {"a":10, "b":20})
+
+    # b goes quiet, so a has the queue to itself again
+    while q.popleft() is not b:
+      q.append(a)
+    q.append(a)
+    counts,_ = self.run_queue(q, 50)
+    self.assertEqual(counts, {"a":50})
+    self.assertEqual(q._active, [q._levels[1]])
+
+    # And back again, without having banked anything
+    q.append(b)
+    counts,_ = self.run_queue(q, 30)
+    self.assertEqual(counts, {"a":10, "b":20})
+
+  def test_first (self):
+    q = ReadyQueue()
+    q.append(FakeTask("a", PRIORITY_LATENCY))
+    q.appendleft(FakeTask("first", PRIORITY_BULK))
+    self.assertEqual(q.popleft().name, "first")
+
+  def test_scheduled_flag (self):
+    q = ReadyQueue()
+    t = FakeTask("a")
+    q.append(t)
+    self.assertTrue(t.scheduled)
+    self.assertTrue(t in q)
+    self.assertEqual(len(q), 1)
+    q.popleft()
+    self.assertFalse(t.scheduled)
+    self.assertFalse(q)
+    self.assertRaises(IndexError, q.popleft)
+
+
+class ReactorTest (unittest.TestCase):
+  scheduler_args = dict(threaded_selecthub = False)
+
+  def setUp (self):
+    self._old_default = recoco.defaultScheduler
+    self.scheduler = Scheduler(isDefaultScheduler = True, daemon = True,
+                               **self.scheduler_args)
+    self.done = threading.Event()
+
+  def tearDown (self):
+    self.scheduler.quit()
+    self.scheduler._selectHub._cycle()
+    recoco.defaultScheduler = self._old_default
+
+  def wait (self):
+    self.assertTrue(self.done.wait(5), "Timed out")
+
+  def test_timer_order (self):
+    fired = []
+    def fire (n):
+      fired.append(n)
+      if len(fired) == 3: self.done.set()
+    Timer(0.03, fire, args = (3,))
+    Timer(0.01, fire, args = (1,))
+    Timer(0.02, fire, args = (2,))
+    self.wait()
+    self.assertEqual(fired, [1, 2, 3])
+
+  def test_no_pings_on_scheduler_thread (self):
+    hub = self.scheduler._selectHub
+    pings = []
+    cycle = hub._cycle
+    def counting_cycle ():
+      pings.append(threading.current_thread())
+      cycle()
+    hub._cycle = counting_cycle
+
+    test = self
+    class Sleeper (Task):
+      def run (self):
+        for i in range(20):
+          yield Sleep(0.001)
+        test.done.set()
+    Sleeper().start()
+    self.wait()
+    self.assertNotIn(self.scheduler._thread, pings)
+
+  def test_busy_tasks_dont_starve_io (self):
+    a,b = socket.socketpair()
+    test = self
+    class Spinner (Task):
+      def run (self):
+        while not test.done.is_set():
+          yield 0
+    class Reader (Task):
+      def run (self):
+        rl,wl,xl = yield Select([a], [], [], 5)
+        if rl: test.done.set()
+    Spinner().start()
+    Reader().start()
+    time.sleep(0.05)
+    b.send(b'x')
+    self.wait()
+    a.close()
+    b.close()
+
+  def test_call_later_from_other_thread (self):
+    self.scheduler.callLater(self.done.set)
+    self.wait()
+
+  def test_call_later_same_thread (self):
+    called = []
+    def call ():
+      called.append(threading.current_thread())
+      self.done.set()
+    test = self
+    class Caller (Task):
+      def run (self):
+        test.scheduler.callLater(call)
+        yield False
+    Caller().start()
+    self.wait()
+    self.assertEqual(called, [self.scheduler._thread])
+    # Didn't need the pinger
+    self.assertIsNone(self.scheduler._callLaterTask)
+
+  def test_call_delayed (self):
+    fired = []
+    def fire (n):
+      fired.append(n)
+      if len(fired) == 3: self.done.set()
+    s = self.scheduler
+    s.callDelayed(0.03, fire, 3)
+    s.callDelayed(0.01, fire, n = 1)
+    s.callDelayed(0.02, fire, 0).cancel()
+    s.callDelayed(0.02, fire, 2)
+    self.wait()
+    self.assertEqual(fired, [1, 2, 3])
+
+
+class LoopHubTest (ReactorTest):
+  """
+  Runs the reactor tests on an EventLoop, plus some of its own
+  """
+  scheduler_args = dict(event_loop = True)
+
+  def test_registrations_kept (self):
+    a,b = socket.socketpair()
+    loop = self.scheduler.event_loop
+    adds = []
+    add_reader = loop.add_reader
+    def counting_add_reader (fd, *args):
+      adds.append(fd)
+      add_reader(fd, *args)
+    loop.add_reader = counting_add_reader
+
+    test = self
+    class Echo (Task):
+      def run (self):
+        for i in range(10):
+          rl,wl,xl = yield Select([a], [], [], 5)
+          if not rl: break
+          a.recv(100)
+          a.send(b'y')
+        test.done.set()
+    Echo().start()
+    for i in range(10):
+      b.send(b'x')
+      b.recv(100)
+    self.wait()
+    self.assertEqual(adds, [a.fileno()])
+    a.close()
+    b.close()
+
+  def test_fd_reuse (self):
+    test = self
+    got = []
+    class Reader (Task):
+      def run (self):
+        for i in range(2):
+          a,b = socket.socketpair()
+          b.send(b'x')
+          rl,wl,xl = yield Select([a], [], [], 5)
+          got.append(rl == [a])
+          a.close()
+          b.close()
+        test.done.set()
+    Reader().start()
+    self.wait()
+    self.assertEqual(got, [True, True])
+
+
+if __name__ == '__main__':
+  unittest.main()
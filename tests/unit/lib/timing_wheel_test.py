@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.timing_wheel import TimingWheel
+
+
+class TimingWheelTest (unittest.TestCase):
+  def test_expire (self):
+    w = TimingWheel(now = 100)
+    self.assertTrue(w.set('a', 105))
+    self.assertTrue(w.set('b', 110))
+    self.assertEqual(len(w), 2)
+    self.assertEqual(w.expire(105), [])
+    self.assertEqual(w.expire(106), ['a'])
+    self.assertFalse('a' in w)
+    self.assertEqual(w.expire(106), [])
+    self.assertEqual(w.expire(111), ['b'])
+    self.assertEqual(len(w), 0)
+
+  def test_refresh (self):
+    w = TimingWheel(now = 100)
+    w.set('a', 105)
+    self.assertFalse(w.set('a', 120))
+    self.assertEqual(w.expire(110), [])
+    self.assertEqual(w.expire(121), ['a'])
+
+  def test_remove (self):
+    w = TimingWheel(now = 100)
+    w.set('a', 105)
+    self.assertTrue(w.remove('a'))
+    self.assertFalse(w.remove('a'))
+    self.assertEqual(w.expire(200), [])
+
+  def test_past (self):
+    w = TimingWheel(now = 100)
+    w.expire(150)
+    w.set('a', 10) # Already expired
+    self.assertEqual(w.expire(150), [])
+    self.assertEqual(w.expire(151), ['a'])
+
+  def test_long_gap (self):
+    w = TimingWheel(granularity = 0.5, now = 0)
+    for i in range(10):
+      w.set(i, i)
+    self.assertEqual(sorted(w.expire(1e9)), range(10))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.util import TokenBucket
+
+
+class TokenBucketTest (unittest.TestCase):
+  def test_burst (self):
+    b = TokenBucket(10, 3, now = 100)
+    self.assertEqual(b.available(now = 100), 3)
+    self.assertTrue(b.consume(now = 100))
+    self.assertTrue(b.consume(2, now = 100))
+    self.assertFalse(b.consume(now = 100))
+    self.assertEqual(b.available(now = 100), 0)
+
+  def test_refill (self):
+    b = TokenBucket(4, 3, now = 100)
+    b.consume(3, now = 100)
+    self.assertFalse(b.consume(now = 100.125))
+    self.assertTrue(b.consume(now = 100.25))
+    self.assertFalse(b.consume(now = 100.25))
+    # Never more than the burst, however long it's been
+    self.assertEqual(b.available(now = 200), 3)
+
+  def test_default_burst (self):
+    b = TokenBucket(5, now = 100)
+    self.assertEqual(b.available(now = 100), 5)
+
+  def test_failed_consume_keeps_tokens (self):
+    b = TokenBucket(10, 3, now = 100)
+    self.assertFalse(b.consume(4, now = 100))
+    self.assertEqual(b.available(now = 100), 3)
+
+  def test_time_going_backwards (self):
+    b = TokenBucket(4, 3, now = 100)
+    b.consume(3, now = 100)
+    self.assertEqual(b.available(now = 99), 0)
+    self.assertEqual(b.available(now = 99.5), 2)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import logging
+import time
+from StringIO import StringIO
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.log.async_handler import AsyncHandler
+
+
+class AsyncHandlerTest (unittest.TestCase):
+  def setUp (self):
+    self.out = StringIO()
+    target = logging.StreamHandler(self.out)
+    target.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    target.setLevel(logging.INFO)
+    self.log = logging.getLogger("async_handler_test")
+    self.log.propagate = False
+    self.log.setLevel(logging.DEBUG)
+    self.target = target
+
+  def tearDown (self):
+    self.log.removeHandler(self.handler)
+    self.handler.close()
+
+  def make (self, **kw):
+    # The writer thread won't get to it; the tests call flush()
+    self.handler = AsyncHandler([self.target], interval = 3600, **kw)
+    self.log.addHandler(self.handler)
+
+  def lines (self):
+    self.handler.flush()
+    return self.out.getvalue().splitlines()
+
+  def test_write (self):
+    self.make()
+    self.log.info("one %s", 1)
+    self.log.debug("not for this handler")
+    self.log.warning("two")
+    self.assertEqual(self.out.getvalue(), "")
+    self.assertEqual(self.lines(), ["INFO one 1", "WARNING two"])
+
+  def test_exception (self):
+    self.make()
+    try:
+      raise RuntimeError("oops")
+    except RuntimeError:
+      self.log.exception("failed")
+    lines = self.lines()
+    self.assertEqual(lines[0], "ERROR failed")
+    self.assertEqual(lines[-1], "RuntimeError: oops")
+
+  def test_overflow (self):
+    self.make(size = 3)
+    for i in range(5):
+      self.log.info("m%s", i)
+    self.assertEqual(self.handler.dropped, 2)
+    self.assertEqual(self.lines(), ["INFO m0", "INFO m1", "INFO m2",
+        "WARNING Log queue full; dropped 2 messages"])
+
+  def test_rate_limit (self):
+    self.make(rate = 2)
+    while time.time() % 1 > 0.9:
+      # Don't let the second change in the middle
+      time.sleep(0.02)
+    for i in range(5):
+      self.log.info("Drop %s", i)
+    self.log.info("Other")
+    self.assertEqual(self.handler.suppressed, 3)
+    self.assertEqual(self.lines(), ["INFO Drop 0", "INFO Drop 1",
+        "INFO Other", "WARNING Suppressed 3 more messages like: Drop %s"])
+
+  def test_unhashable (self):
+    self.make(rate = 2)
+    self.log.warning(['a', 'b'])
+    self.assertEqual(self.lines(), ["WARNING ['a', 'b']"])
+
+  def test_prune (self):
+    self.make(rate = 2)
+    for i in range(100):
+      self.log.info("Message %s" % (i,))
+    self.assertEqual(len(self.handler._limits), 100)
+    # Pretend they were logged a while ago
+    for l in self.handler._limits.values():
+      l[0] -= 5
+    self.handler.flush()
+    self.assertEqual(len(self.handler._limits), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import IPAddr
+from pox.misc.ip_loadbalancer import MaglevTable
+
+
+class MaglevTableTest (unittest.TestCase):
+  servers = [IPAddr("10.0.0.%i" % (i,)) for i in range(1, 6)]
+
+  def _keys (self):
+    return [(IPAddr(0x0a010000 + i), IPAddr("10.0.1.1"), 1024 + i, 80)
+            for i in range(5000)]
+
+  def test_empty (self):
+    t = MaglevTable(101)
+    self.assertEqual(t.lookup((1,2,3,4)), None)
+
+  def test_balanced (self):
+    t = MaglevTable(4099, self.servers)
+    counts = dict((s,0) for s in self.servers)
+    for s in t._table:
+      counts[s] += 1
+    for c in counts.values():
+      self.assertTrue(abs(c - 4099/5.0) < 4099 * 0.05)
+
+  def test_minimal_disruption (self):
+    t = MaglevTable(4099, self.servers)
+    keys = self._keys()
+    before = dict((k,t.lookup(k)) for k in keys)
+    dead = self.servers[2]
+    t.build([s for s in self.servers if s != dead])
+    moved = 0
+    for k in keys:
+      s = t.lookup(k)
+      self.assertNotEqual(s, dead)
+      if before[k] != dead and s != before[k]: moved += 1
+    # Connections on surviving servers should almost all stay put
+    self.assertTrue(moved < len(keys) * 0.05)
+
+    # Order of servers shouldn't matter
+    t2 = MaglevTable(4099, reversed(self.servers))
+    t.build(self.servers)
+    self.assertEqual(t._table, t2._table)
+
+  def test_non_prime_size (self):
+    # Would never finish filling the table if 100 were used as is
+    t = MaglevTable(100, self.servers)
+    self.assertEqual(t.size, 101)
+    self.assertEqual(len(t._table), 101)
+    self.assertTrue(None not in t._table)
+    self.assertEqual(MaglevTable(1).size, 2)
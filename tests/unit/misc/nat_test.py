@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.misc.nat import PortAllocator
+
+
+class PortAllocatorTest (unittest.TestCase):
+  def test_preferred (self):
+    a = PortAllocator()
+    self.assertEqual(a.allocate(5000), 5000)
+    self.assertTrue(5000 in a)
+    p = a.allocate(5000)
+    self.assertTrue(49152 <= p <= 65533)
+    a.release(5000)
+    self.assertEqual(a.allocate(5000), 5000)
+
+  def test_privileged (self):
+    a = PortAllocator()
+    p = a.allocate(80)
+    self.assertNotEqual(p, 80)
+    self.assertTrue(49152 <= p <= 65533)
+
+  def test_exhaust (self):
+    a = PortAllocator(first = 60000, last = 60009)
+    # Take one of the dynamic range ports as a preferred port first
+    self.assertEqual(a.allocate(60005), 60005)
+    got = set([60005])
+    for i in range(9):
+      got.add(a.allocate(80))
+    self.assertEqual(got, set(range(60000, 60010)))
+    self.assertEqual(a.allocate(80), None)
+    a.release(60003)
+    self.assertEqual(a.allocate(80), 60003)
+    self.assertEqual(len(a), 10)
+
+  def test_no_duplicate_free_entries (self):
+    a = PortAllocator(first = 60000, last = 60001)
+    for i in range(5):
+      a.allocate(60000)
+      a.release(60000)
+    self.assertEqual(len(a._free), 2)
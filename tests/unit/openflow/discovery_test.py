@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import EthAddr
+from pox.openflow.discovery import *
+from pox.openflow.discovery import _classify_raw, _decode_raw_lldp
+
+
+class RawLLDPTest (unittest.TestCase):
+  def _discovery_packet (self, dpid, port):
+    return LLDPSender._create_discovery_packet(dpid, port,
+        EthAddr("00:11:22:33:44:55"), 120)
+
+  def test_classify (self):
+    lldp = self._discovery_packet(0x1234, 5).pack()
+    self.assertTrue(_classify_raw(lldp))
+
+    e = pkt.ethernet(type=pkt.ethernet.IP_TYPE,
+                     dst=EthAddr("00:00:00:00:00:01"))
+    e.payload = pkt.ipv4()
+    self.assertFalse(_classify_raw(e.pack()))
+
+    e = pkt.ethernet(type=pkt.ethernet.LLDP_TYPE,
+                     dst=EthAddr("01:80:c2:00:00:0e"))
+    e.payload = pkt.lldp()
+    self.assertFalse(_classify_raw(e.pack()))
+
+    # VLAN tagged -- needs a real parse
+    e = pkt.ethernet(type=pkt.ethernet.VLAN_TYPE)
+    e.payload = pkt.vlan(eth_type=pkt.ethernet.LLDP_TYPE)
+    self.assertEqual(_classify_raw(e.pack()), None)
+
+    self.assertEqual(_classify_raw(None), None)
+    self.assertEqual(_classify_raw('\x00' * 8), None)
+
+  def test_decode_matches_parser (self):
+    for dpid,port in [(1,1), (0x1234,65534), (0xfedcba9876543210,42)]:
+      raw = self._discovery_packet(dpid, port).pack()
+      self.assertEqual(_decode_raw_lldp(raw), (dpid,port))
+      self.assertEqual(Discovery._decode_lldp(pkt.ethernet(raw)),
+                       (dpid,port))
+
+  def test_decode_rejects_foreign (self):
+    raw = self._discovery_packet(0x1234, 5).pack()
+    # Truncated
+    self.assertEqual(_decode_raw_lldp(raw[:30]), None)
+
+    # Chassis ID and system description disagree
+    e = self._discovery_packet(0x1234, 5)
+    e.payload.tlvs[3].payload = 'dpid:99'
+    self.assertEqual(_decode_raw_lldp(e.pack()), None)
+    self.assertEqual(Discovery._decode_lldp(pkt.ethernet(e.pack())),
+                     (0x99,5))
+
+    # 16 bit binary port ID
+    e = self._discovery_packet(0x1234, 5)
+    e.payload.tlvs[1].id = '\x00\x07'
+    self.assertEqual(_decode_raw_lldp(e.pack()), None)
+    self.assertEqual(Discovery._decode_lldp(pkt.ethernet(e.pack())),
+                     (0x1234,7))
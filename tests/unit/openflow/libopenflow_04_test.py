@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import struct
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.libopenflow_04 import *
+
+ARP_OP = oxm_ofb_match_fields_rev_map['OFPXMT_OFB_ARP_OP']
+
+
+def packet_in (port, data, total_len = None):
+  if total_len is None: total_len = len(data)
+  match = struct.pack("!HHHBBI4x", 1, 12, 0x8000, 0, 4, port)
+  body = struct.pack("!IHBBQ", 0xffffffff, total_len, 0, 0, 0)
+  body += match + b'\x00\x00' + data
+  return struct.pack("!BBHI", 4, OFPT_PACKET_IN, 8 + len(body), 0) + body
+
+
+class packet_in_test (unittest.TestCase):
+  def test_consecutive (self):
+    raw = packet_in(1, b'a' * 60) + packet_in(2, b'b' * 70)
+    offset,first = ofp_packet_in.unpack_new(raw)
+    self.assertEqual(offset, len(raw) - 102 - 10)
+    self.assertEqual((first.in_port, first.data), (1, b'a' * 60))
+    offset,second = ofp_packet_in.unpack_new(raw, offset)
+    self.assertEqual(offset, len(raw))
+    self.assertEqual((second.in_port, second.data), (2, b'b' * 70))
+
+  def test_truncated (self):
+    raw = packet_in(3, b'c' * 128, total_len = 1500)
+    offset,msg = ofp_packet_in.unpack_new(raw)
+    self.assertEqual(offset, len(raw))
+    self.assertEqual(msg.data, b'c' * 128)
+    self.assertEqual(msg.total_len, 1500)
+    self.assertFalse(msg.is_complete)
+
+
+class oxm_match_field_test (unittest.TestCase):
+  def test_from_name (self):
+    f = oxm_match_field.from_name('OFPXMT_OFB_ARP_OP', b'\x00\x02', 2)
+    self.assertEqual(f.pack(), struct.pack("!HBB", 0x8000, ARP_OP << 1, 2)
+                               + b'\x00\x02')
+    self.assertEqual(f.value, '2')
+
+  def test_from_name_masked (self):
+    f = oxm_match_field.from_name('OFPXMT_OFB_ETH_DST', b'\x01' * 6,
+                                  mask = b'\xff' * 6)
+    self.assertEqual(f.oxm_hasmask, 1)
+    self.assertEqual(f.oxm_length, 12)
+    self.assertEqual(f.data, b'\x01' * 6 + b'\xff' * 6)
+    self.assertIsNone(f.value)
+
+
+class set_field_test (unittest.TestCase):
+  def test_pack_unpack (self):
+    f = oxm_match_field(oxm_field = ARP_OP, oxm_length = 2,
+                        data = b'\x00\x02')
+    a = ofp_action_set_field(oxm_field = f)
+    raw = a.pack()
+    self.assertEqual(len(raw), 16)
+    self.assertEqual(len(raw), len(a))
+    b = ofp_action_set_field()
+    self.assertEqual(b.unpack(raw), 16)
+    self.assertEqual(b.oxm_field.oxm_field, ARP_OP)
+    self.assertEqual(b.oxm_field.data, b'\x00\x02')
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import struct
+import logging
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_04 as of
+import pox.openflow.of_04 as of_04
+from pox.openflow import ConnectionUp, FeaturesReceived
+
+
+class FakeNexus (object):
+  def __init__ (self):
+    self.events = []
+    self._connections = {}
+  def raiseEventNoErrors (self, event, *args):
+    self.events.append(event)
+  def getConnection (self, dpid):
+    return self._connections.get(dpid)
+  def _connect (self, con):
+    self._connections[con.dpid] = con
+  def _disconnect (self, dpid):
+    return self._connections.pop(dpid, None) is not None
+
+
+class FakeConnection (object):
+  def __init__ (self):
+    self.sent = []
+    self.ofnexus = FakeNexus()
+    self.original_ports = of_04.PortCollection()
+    self.ports = of_04.PortCollection()
+    self.ports._chain = self.original_ports
+    self.dpid = 1
+    self.handshake = None
+    self.connect_time = None
+    self.handshake_time = None
+    self.disconnected = False
+  def send (self, data):
+    self.sent.append(data)
+  def raiseEventNoErrors (self, event, *args):
+    pass
+  def info (self, m):
+    pass
+  def err (self, m):
+    pass
+  def disconnect (self):
+    self.disconnected = True
+    if self.handshake is not None:
+      self.handshake.cancel()
+
+
+def message_types (data):
+  types = []
+  while data:
+    version,type,length = struct.unpack_from("!BBH", data)
+    types.append(type)
+    data = data[length:]
+  return types
+
+
+class HandshakeTest (unittest.TestCase):
+  def setUp (self):
+    of_04.handshake_stats = of_04.HandshakeStats()
+    self.con = FakeConnection()
+
+  def start (self):
+    self.con.handshake = of_04.Handshake(self.con)
+    return self.con.handshake
+
+  def test_pipelined (self):
+    self.start()
+    # Everything goes out at once
+    self.assertEqual(len(self.con.sent), 1)
+    self.assertEqual(message_types(self.con.sent[0]),
+                     [of.OFPT_HELLO, of.OFPT_FEATURES_REQUEST,
+                      of.OFPT_MULTIPART_REQUEST, of.OFPT_FLOW_MOD,
+                      of.OFPT_BARRIER_REQUEST])
+
+  def test_up_once_all_replies_in (self):
+    h = self.start()
+    h.got_barrier(of.ofp_barrier_reply(xid = h.barrier.xid))
+    h.got_features(of.ofp_features_reply(datapath_id = 1))
+    self.assertEqual(self.con.ofnexus.events, [])
+    self.assertIs(self.con.handshake, h)
+
+    port = of.ofp_port(port_no = 3)
+    h.got_ports([port])
+    self.assertEqual(self.con.ofnexus.events, [ConnectionUp, FeaturesReceived])
+    self.assertIsNone(self.con.handshake)
+    self.assertEqual(self.con.original_ports._ports, set([port]))
+    self.assertEqual(of_04.handshake_stats.count, 1)
+    self.assertIsNotNone(self.con.handshake_time)
+
+  def test_no_port_desc (self):
+    h = self.start()
+    h.got_features(of.ofp_features_reply(datapath_id = 1))
+    h.got_error(of.ofp_error(xid = h.port_request.xid))
+    h.got_barrier(of.ofp_barrier_reply(xid = h.barrier.xid))
+    self.assertEqual(self.con.ofnexus.events, [ConnectionUp, FeaturesReceived])
+
+  def test_timeout (self):
+    h = self.start()
+    h.got_features(of.ofp_features_reply(datapath_id = 1))
+    h.timed_out()
+    self.assertTrue(self.con.disconnected)
+    self.assertIsNone(self.con.handshake)
+    self.assertEqual(of_04.handshake_stats.timeouts, 1)
+    self.assertEqual(self.con.ofnexus.events, [])
+
+  def test_timeout_after_features (self):
+    h = self.start()
+    # As handle_FEATURES_REPLY does
+    self.con.ofnexus._connect(self.con)
+    h.got_features(of.ofp_features_reply(datapath_id = 1))
+    h.timed_out()
+    self.assertTrue(self.con.disconnected)
+    self.assertIsNone(self.con.ofnexus.getConnection(1))
+    self.assertEqual(self.con.ofnexus.events, [])
+
+    # A different connection for the same DPID is left alone
+    other = FakeConnection()
+    other.ofnexus._connect(other)
+    self.con = FakeConnection()
+    self.con.ofnexus = other.ofnexus
+    self.start().timed_out()
+    self.assertIs(other.ofnexus.getConnection(1), other)
+
+
+class ListHandler (logging.Handler):
+  def __init__ (self):
+    logging.Handler.__init__(self)
+    self.messages = []
+  def emit (self, record):
+    self.messages.append(record.getMessage())
+
+
+class TraceTest (unittest.TestCase):
+  def setUp (self):
+    self.handler = ListHandler()
+    of_04._trace_log.addHandler(self.handler)
+    of_04._trace_log.setLevel(logging.INFO)
+    of_04._trace_log.propagate = False
+
+  def tearDown (self):
+    of_04.set_trace_sample(0)
+    of_04._trace_log.removeHandler(self.handler)
+    of_04._trace_log.setLevel(logging.NOTSET)
+    of_04._trace_log.propagate = True
+
+  def test_sampling (self):
+    of_04.set_trace_sample(2)
+    con = FakeConnection()
+    con.ID = 3
+    data = of.ofp_echo_request(xid = 7).pack()
+    for i in range(4):
+      of_04._trace(con, "in", b'junk' + data, 4)
+    self.assertEqual(self.handler.messages, 2 * ["dir=in "
+        "dpid=00-00-00-00-00-01 con=3 type=OFPT_ECHO_REQUEST len=8 xid=7"])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import struct
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.libopenflow_04 as of04
+from pox.openflow.packet_in_limiter import PacketInLimiter
+
+
+class FakeConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.sent = []
+  def send (self, msg):
+    self.sent.append(msg)
+
+
+class LimiterTest (unittest.TestCase):
+  def setUp (self):
+    # Slow refills so that nothing comes back during the test
+    self.limiter = PacketInLimiter(rate = 0.001, burst = 5,
+                                   port_rate = 0.001, port_burst = 2)
+
+  def test_port_limit (self):
+    con = FakeConnection(1)
+    pi = of.ofp_packet_in(in_port = 1)
+    results = [self.limiter.admit(con, pi) for i in range(4)]
+    self.assertEqual(results, [True, True, False, False])
+    # Other ports are unaffected
+    self.assertTrue(self.limiter.admit(con, of.ofp_packet_in(in_port = 2)))
+
+    c = self.limiter.counters[1]
+    self.assertEqual((c.admitted, c.port_dropped, c.dropped), (3, 2, 0))
+
+    # Throttled only once
+    self.assertEqual(c.throttles, 1)
+    fm, = con.sent
+    self.assertTrue(isinstance(fm, of.ofp_flow_mod))
+    self.assertEqual(fm.match.in_port, 1)
+    self.assertEqual(fm.actions, [])
+    self.assertEqual(fm.hard_timeout, self.limiter.throttle_time)
+    fm.pack()
+
+  def test_switch_limit (self):
+    con1 = FakeConnection(1)
+    con2 = FakeConnection(2)
+    results = [self.limiter.admit(con1, of.ofp_packet_in(in_port = p))
+               for p in range(1, 8)]
+    self.assertEqual(results, [True] * 5 + [False] * 2)
+    self.assertEqual(self.limiter.counters[1].dropped, 2)
+    # Other switches are unaffected
+    self.assertTrue(self.limiter.admit(con2, of.ofp_packet_in(in_port = 1)))
+    self.assertEqual(con1.sent, [])
+
+  def test_meter (self):
+    con = FakeConnection(1)
+    pi = of04.ofp_packet_in(in_port = 3)
+    for i in range(3):
+      self.limiter.admit(con, pi)
+    mm,fm = con.sent
+    self.assertTrue(isinstance(mm, of04.ofp_meter_mod))
+    self.assertEqual(mm.command, of04.OFPMC_ADD)
+    self.assertEqual(mm.meter_id, 1)
+    mm.pack()
+    # The flow's first instruction (after the 48 byte header and the 16
+    # byte match) is OFPIT_METER for meter 1
+    data = fm.pack()
+    self.assertEqual(data[64:72], struct.pack("!HHL", of04.OFPIT_METER, 8, 1))
+
+    # Next time, the meter already exists
+    self.limiter._throttled.clear()
+    self.limiter.admit(con, pi)
+    self.assertEqual(con.sent[2].command, of04.OFPMC_MODIFY)
+    self.assertEqual(con.sent[2].meter_id, 1)
+
+    # Meter IDs aren't port numbers (OFPP_LOCAL would be OFPM_CONTROLLER)
+    pi = of04.ofp_packet_in(in_port = of04.OFPP_LOCAL)
+    for i in range(3):
+      self.limiter.admit(con, pi)
+    self.assertEqual(con.sent[4].meter_id, 2)
+    self.assertEqual(con.sent[4].command, of04.OFPMC_ADD)
+
+  def test_switch_drop_keeps_port_token (self):
+    limiter = PacketInLimiter(rate = 0.001, burst = 1,
+                              port_rate = 0.001, port_burst = 2)
+    con = FakeConnection(1)
+    pi = of.ofp_packet_in(in_port = 1)
+    self.assertEqual([limiter.admit(con, pi) for i in range(3)],
+                     [True, False, False])
+    c = limiter.counters[1]
+    self.assertEqual((c.dropped, c.port_dropped), (2, 0))
+    self.assertEqual(limiter._port_buckets[(1,1)].available(), 1)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import EthAddr
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.discovery import Link
+import pox.openflow.spanning_tree as st
+from pox.openflow.spanning_tree import _IncrementalTree
+
+
+def links (a, pa, b, pb):
+  return Link(a,pa,b,pb), Link(b,pb,a,pa)
+
+
+class IncrementalTreeTest (unittest.TestCase):
+  def setUp (self):
+    # A triangle: 1.1-2.1, 2.2-3.2, 3.1-1.2
+    self.t = _IncrementalTree()
+    self.dirty = set()
+    self.triangle = [links(1,1,2,1), links(2,2,3,2), links(3,1,1,2)]
+    for pair in self.triangle:
+      for l in pair:
+        self.t.add_link(l, self.dirty)
+
+  def tree_edges (self):
+    return set(frozenset((a,b)) for a in self.t.tree for b in self.t.tree[a])
+
+  def test_triangle (self):
+    self.assertEqual(len(self.tree_edges()), 2)
+    flooding = [(sw,p) for sw in (1,2,3) for p in (1,2)
+                if self.t.flood(sw,p)]
+    self.assertEqual(len(flooding), 4)
+    self.assertTrue(self.t.flood(1,99)) # Edge port
+
+  def test_unidirectional (self):
+    t = _IncrementalTree()
+    dirty = set()
+    t.add_link(Link(1,1,2,1), dirty)
+    self.assertEqual(dirty, set([(1,1),(2,1)]))
+    self.assertFalse(t.flood(1,1))
+    self.assertEqual(len(t.tree[1]), 0)
+    t.add_link(Link(2,1,1,1), dirty)
+    self.assertTrue(t.flood(1,1))
+    self.assertEqual(t.tree[1], set([2]))
+
+  def test_replacement (self):
+    # Remove whichever links are on the tree; the remaining one should
+    # take over.
+    edge = iter(self.tree_edges()).next()
+    a,b = sorted(edge)
+    for pair in self.triangle:
+      if set((pair[0].dpid1,pair[0].dpid2)) == edge:
+        for l in pair:
+          self.t.remove_link(l, self.dirty)
+    self.assertEqual(len(self.tree_edges()), 2)
+    self.assertFalse(edge in self.tree_edges())
+    for sw in (1,2,3):
+      for p in (1,2):
+        self.assertTrue(self.t.flood(sw,p))
+
+  def test_partition (self):
+    for pair in self.triangle[:2]:
+      for l in pair:
+        self.t.remove_link(l, self.dirty)
+    self.assertEqual(self.tree_edges(), set([frozenset((1,3))]))
+    self.assertTrue(self.t.flood(2,1))
+    self.assertTrue(self.t._comp[2] != self.t._comp[1])
+    self.assertEqual(self.t._comp[1], self.t._comp[3])
+
+
+class FakeConnection (object):
+  def __init__ (self, dpid, ports):
+    self.dpid = dpid
+    self.ports = dict((p, of.ofp_phy_port(port_no = p,
+                                          hw_addr = EthAddr("00:00:00:00:00:%02x" % (p,))))
+                      for p in ports)
+    self.connect_time = time.time() - 100
+    self.sent = []
+  def send (self, msg):
+    self.sent.append(msg)
+
+
+class FakeNexus (object):
+  def __init__ (self):
+    self.connections = {}
+  def getConnection (self, dpid):
+    return self.connections.get(dpid)
+
+
+class FakeDiscovery (object):
+  send_cycle_time = 5
+
+
+class FakeCore (object):
+  def __init__ (self):
+    self.openflow = FakeNexus()
+    self.openflow_discovery = FakeDiscovery()
+    self.delayed = []
+  def callDelayed (self, seconds, func, *args, **kw):
+    self.delayed.append(func)
+    return func
+  def run_delayed (self):
+    while self.delayed:
+      self.delayed.pop(0)()
+
+
+class FakeTimer (object):
+  def __init__ (self, *args, **kw):
+    pass
+
+
+class Event (object):
+  def __init__ (self, **kw):
+    self.__dict__.update(kw)
+
+
+class ReconnectTest (unittest.TestCase):
+  def setUp (self):
+    self._saved = dict((k, getattr(st, k)) for k in ('core', 'Timer',
+        '_tree', '_noflood_by_default', '_hold_down', '_debounce_period'))
+    st.core = FakeCore()
+    st.Timer = FakeTimer
+    st._tree = _IncrementalTree()
+    st._noflood_by_default = True
+    st._hold_down = False
+    st._debounce_period = 0
+    st._prev.clear()
+    # Switches 1 and 2 linked by their port 1s; port 2 on each is an edge
+    for dpid in (1, 2):
+      con = FakeConnection(dpid, (1, 2))
+      st.core.openflow.connections[dpid] = con
+      st._handle_ConnectionUp(Event(dpid = dpid, connection = con))
+    for l in links(1,1,2,1):
+      st._handle_LinkEvent(Event(link = l, added = True,
+                                 more_pending = False))
+    st.core.run_delayed()
+
+  def tearDown (self):
+    for k,v in self._saved.items():
+      setattr(st, k, v)
+    st._prev.clear()
+    st._pending_links.clear()
+    st._pending_switches.clear()
+    st._pending_timer = None
+
+  def flooding (self, dpid):
+    return dict((p, st._prev[dpid][p]) for p in (1, 2))
+
+  def test_reconnect (self):
+    self.assertEqual(self.flooding(1), {1:True, 2:True})
+
+    # Switch 1 reconnects; it's already in the tree and no links change
+    con = FakeConnection(1, (1, 2))
+    st.core.openflow.connections[1] = con
+    st._handle_ConnectionUp(Event(dpid = 1, connection = con))
+    self.assertEqual(self.flooding(1), {1:False, 2:False})
+    st.core.run_delayed()
+    self.assertEqual(self.flooding(1), {1:True, 2:True})
+    # Two to turn flooding off, two to turn it back on
+    mods = [m for m in con.sent if isinstance(m, of.ofp_port_mod)]
+    mods = [(m.port_no, m.config) for m in mods]
+    self.assertEqual(mods[:2], [(1, of.OFPPC_NO_FLOOD),
+                                (2, of.OFPPC_NO_FLOOD)])
+    self.assertEqual(sorted(mods[2:]), [(1, 0), (2, 0)])
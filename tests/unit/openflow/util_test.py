@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+from errno import EMFILE, ECONNRESET
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.util import make_listeners, accept_pending
+from pox.openflow.util import count_message_types
+from pox.openflow.util import ListenerBackoff, out_of_fds
+import pox.openflow.libopenflow_04 as of
+
+
+class ListenerTest (unittest.TestCase):
+  def setUp (self):
+    self.socks = []
+
+  def tearDown (self):
+    for s in self.socks:
+      s.close()
+
+  def _listen (self, *args, **kw):
+    r = make_listeners(*args, **kw)
+    self.socks.extend(r)
+    return r
+
+  def test_accept_pending (self):
+    l, = self._listen("127.0.0.1", 0, backlog = 8)
+    port = l.getsockname()[1]
+    for i in range(5):
+      self.socks.append(socket.create_connection(("127.0.0.1", port)))
+
+    first = accept_pending(l, limit = 3)
+    rest = accept_pending(l, limit = 3)
+    self.socks.extend(first + rest)
+    self.assertEqual(len(first), 3)
+    self.assertEqual(len(rest), 2)
+    self.assertEqual(accept_pending(l), [])
+
+  def test_reuse_port (self):
+    l, = self._listen("127.0.0.1", 0, reuse_port = True)
+    port = l.getsockname()[1]
+    more = self._listen("127.0.0.1", port, count = 2)
+    self.assertEqual(len(more), 2)
+    for s in more:
+      self.assertEqual(s.getsockname()[1], port)
+
+  def test_no_reuse_port (self):
+    l, = self._listen("127.0.0.1", 0)
+    port = l.getsockname()[1]
+    self.assertRaises(socket.error, make_listeners, "127.0.0.1", port)
+
+
+class FullListener (object):
+  """
+  A listener with connections waiting but no file descriptors for them
+  """
+  def __init__ (self, ok = 0):
+    self.ok = ok
+  def accept (self):
+    if self.ok:
+      self.ok -= 1
+      return object(), None
+    raise socket.error(EMFILE, "Too many open files")
+
+
+class BackoffTest (unittest.TestCase):
+  def test_out_of_fds (self):
+    l = FullListener()
+    try:
+      accept_pending(l)
+      self.fail("Expected socket.error")
+    except socket.error as e:
+      self.assertTrue(out_of_fds(e))
+    self.assertFalse(out_of_fds(socket.error(ECONNRESET, "reset")))
+    self.assertFalse(out_of_fds(ValueError()))
+
+    # If some were accepted, those are returned and the error waits
+    self.assertEqual(len(accept_pending(FullListener(ok = 2))), 2)
+
+  def test_pause_and_resume (self):
+    l = FullListener()
+    other = object()
+    sockets = [l, other]
+    b = ListenerBackoff(sockets, delay = 1)
+    self.assertEqual(b.resume(5, now = 100), 5)
+
+    b.pause(l, now = 100)
+    b.pause(l, now = 100.5) # Already paused; doesn't extend it
+    self.assertEqual(sockets, [other])
+    self.assertEqual(b.resume(5, now = 100.25), 0.75)
+    self.assertEqual(sockets, [other])
+
+    self.assertEqual(b.resume(5, now = 101), 5)
+    self.assertEqual(sockets, [other, l])
+    self.assertEqual(b.paused, {})
+
+
+class CountTest (unittest.TestCase):
+  def test_count_message_types (self):
+    counts = [0] * 256
+    data = b''.join(m.pack() for m in [of.ofp_hello(),
+        of.ofp_features_request(), of.ofp_barrier_request(),
+        of.ofp_barrier_request()])
+    count_message_types(counts, data + b'\x04\x00') # And a fragment
+    self.assertEqual(counts[of.OFPT_HELLO], 1)
+    self.assertEqual(counts[of.OFPT_FEATURES_REQUEST], 1)
+    self.assertEqual(counts[of.OFPT_BARRIER_REQUEST], 2)
+    self.assertEqual(sum(counts), 4)
+
+
+if __name__ == '__main__':
+  unittest.main()
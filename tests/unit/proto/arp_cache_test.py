@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import IPAddr, EthAddr
+import pox.proto.arp_cache as arp_cache
+from pox.proto.arp_cache import *
+
+
+class FakeClock (object):
+  def __init__ (self):
+    self.now = time.time()
+  def time (self):
+    return self.now
+
+
+class EncodeTest (unittest.TestCase):
+  def _reference (self, eth_src, eth_dst, hwsrc, protosrc, hwdst, protodst):
+    r = pkt.arp()
+    r.opcode = r.REPLY
+    r.hwsrc = EthAddr(hwsrc)
+    r.protosrc = IPAddr(protosrc)
+    r.hwdst = EthAddr(hwdst)
+    r.protodst = IPAddr(protodst)
+    e = pkt.ethernet(type=pkt.ethernet.ARP_TYPE, src=EthAddr(eth_src),
+                     dst=EthAddr(eth_dst))
+    e.payload = r
+    return e
+
+  def test_matches_packet_library (self):
+    args = ("00:00:00:00:00:01", "00:00:00:00:00:02", "00:00:00:00:00:03",
+            "10.0.0.3", "00:00:00:00:00:02", "10.0.0.2")
+    self.assertEqual(encode_arp_reply(*args), self._reference(*args).pack())
+
+  def test_vlan (self):
+    raw = encode_arp_reply("00:00:00:00:00:01", "00:00:00:00:00:02",
+                           "00:00:00:00:00:03", "10.0.0.3",
+                           "00:00:00:00:00:02", "10.0.0.2",
+                           vlan_id = 42, vlan_pcp = 3)
+    e = pkt.ethernet(raw)
+    v = e.find('vlan')
+    self.assertEqual((v.id, v.pcp), (42, 3))
+    a = e.find('arp')
+    self.assertEqual(a.opcode, a.REPLY)
+    self.assertEqual(a.protosrc, IPAddr("10.0.0.3"))
+    self.assertEqual(a.hwsrc, EthAddr("00:00:00:00:00:03"))
+
+
+class FakeLog (object):
+  def __init__ (self):
+    self.warnings = []
+  def warn (self, *args):
+    self.warnings.append(args)
+
+
+class FakeCore (object):
+  def __init__ (self, cache):
+    self.ARPCache = cache
+  def hasComponent (self, name):
+    return name == "ARPCache"
+
+
+class LaunchTest (unittest.TestCase):
+  def setUp (self):
+    self.cache = ARPCache(timeout = 10)
+    self.cache._expire_timer.cancel()
+    self._real_core = arp_cache.core
+    self._real_log = arp_cache.log
+    arp_cache.core = FakeCore(self.cache)
+    arp_cache.log = FakeLog()
+
+  def tearDown (self):
+    arp_cache.core = self._real_core
+    arp_cache.log = self._real_log
+
+  def test_second_launch (self):
+    arp_cache.launch(timeout = 10, learn_from_ip = True)
+    self.assertTrue(self.cache.learn_from_ip)
+    self.assertEqual(arp_cache.log.warnings, [])
+
+  def test_conflicting_timeout (self):
+    arp_cache.launch(timeout = 120)
+    self.assertEqual(self.cache.timeout, 10)
+    self.assertEqual(len(arp_cache.log.warnings), 1)
+    self.assertFalse(self.cache.learn_from_ip)
+
+
+class ARPCacheTest (unittest.TestCase):
+  def setUp (self):
+    self.clock = FakeClock()
+    self._real_time = arp_cache.time
+    arp_cache.time = self.clock
+    self.cache = ARPCache(timeout = 10)
+    self.cache._expire_timer.cancel()
+    self.events = []
+    self.cache.addListener(NeighborUpdate, self.events.append)
+    self.cache.addListener(NeighborExpired, self.events.append)
+    self.dropped = []
+    self.cache._drop_buffer = lambda *args: self.dropped.append(args)
+
+  def tearDown (self):
+    arp_cache.time = self._real_time
+
+  def _expire (self, seconds):
+    self.clock.now += seconds
+    self.cache._expire()
+
+  def test_learn (self):
+    ip = IPAddr("10.0.0.1")
+    mac = EthAddr("00:00:00:00:00:01")
+    self.assertTrue(self.cache.learn(ip, mac, 1, 3))
+    self.assertEqual(self.cache.lookup(ip), mac)
+    self.assertEqual(self.cache.get_location(1, ip), (3, mac))
+    self.assertEqual(self.cache.get_location(2, ip), None)
+    self.assertFalse(self.cache.learn(ip, mac, 1, 3))
+    self.assertTrue(self.cache.learn(ip, mac, 1, 4))
+    self.assertEqual(len(self.events), 2)
+    self.assertTrue(self.events[1].moved)
+
+  def test_expire (self):
+    ip = IPAddr("10.0.0.1")
+    mac = EthAddr("00:00:00:00:00:01")
+    self.cache.learn(ip, mac, 1, 3)
+    self._expire(5)
+    self.assertEqual(self.cache.lookup(ip), mac)
+    self._expire(7)
+    self.assertEqual(self.cache.lookup(ip), None)
+    self.assertEqual(self.cache.get_location(1, ip), None)
+    expired = [e for e in self.events if isinstance(e, NeighborExpired)]
+    self.assertEqual(sorted(e.dpid for e in expired), [None, 1])
+
+  def test_buffers (self):
+    ip = IPAddr("10.0.0.1")
+    self.cache.max_buffered_per_ip = 2
+    self.cache.max_buffered_per_dpid = 3
+    self.assertTrue(self.cache.queue_buffer(1, ip, 100, 1))
+    self.assertTrue(self.cache.queue_buffer(1, ip, 101, 1))
+    self.assertTrue(self.cache.queue_buffer(1, ip, 102, 1))
+    self.assertEqual(self.dropped, [(1, 100, 1)])
+    self.assertTrue(self.cache.queue_buffer(1, IPAddr("10.0.0.2"), 103, 1))
+    self.assertFalse(self.cache.queue_buffer(1, IPAddr("10.0.0.3"), 104, 1))
+    self.assertTrue(self.cache.queue_buffer(2, IPAddr("10.0.0.3"), 104, 1))
+    self.assertEqual(self.cache.pop_buffers(1, ip), [(101, 1), (102, 1)])
+    self.assertEqual(self.cache.pop_buffers(1, ip), [])
+
+    self._expire(10)
+    self.assertEqual(sorted(self.dropped),
+                     [(1, 100, 1), (1, 103, 1), (2, 104, 1)])
+    self.assertTrue(self.cache.queue_buffer(1, IPAddr("10.0.0.3"), 105, 1))
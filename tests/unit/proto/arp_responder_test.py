@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import IPAddr, EthAddr
+import pox.openflow.libopenflow_04 as of
+import pox.proto.arp_responder as arp_responder
+
+
+class FakeConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.eth_addr = EthAddr("00:00:00:00:ff:%02x" % (dpid,))
+    self.sent = []
+  def send (self, msg):
+    self.sent.append(msg)
+
+
+class FakeNexus (object):
+  def __init__ (self):
+    self.sent = []
+  def sendToDPID (self, dpid, msg):
+    self.sent.append((dpid, msg))
+
+
+class FakeCore (object):
+  def __init__ (self):
+    self.openflow = FakeNexus()
+
+
+class FakePacketIn (object):
+  def __init__ (self, connection, packet, port):
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.parsed = packet
+    self.port = port
+    self.ofp = None
+
+
+# Where set-field puts things in a parsed packet
+_fields = {
+  'OFPXMT_OFB_ETH_DST' : (lambda p: p, 'dst', EthAddr),
+  'OFPXMT_OFB_ETH_SRC' : (lambda p: p, 'src', EthAddr),
+  'OFPXMT_OFB_ARP_OP'  : (lambda p: p.next, 'opcode',
+                          lambda d: int(d.encode('hex'), 16)),
+  'OFPXMT_OFB_ARP_SHA' : (lambda p: p.next, 'hwsrc', EthAddr),
+  'OFPXMT_OFB_ARP_SPA' : (lambda p: p.next, 'protosrc', IPAddr),
+  'OFPXMT_OFB_ARP_THA' : (lambda p: p.next, 'hwdst', EthAddr),
+  'OFPXMT_OFB_ARP_TPA' : (lambda p: p.next, 'protodst', IPAddr),
+}
+
+def apply_actions (packet, actions):
+  """
+  Does what a switch would do with our set-field actions
+  """
+  packet = pkt.ethernet(packet.pack())
+  out = None
+  for a in actions:
+    if isinstance(a, of.ofp_action_set_field):
+      name = of.oxm_ofb_match_fields_map[a.oxm_field.oxm_field]
+      get,attr,conv = _fields[name]
+      setattr(get(packet), attr, conv(a.oxm_field.data))
+    elif isinstance(a, of.ofp_action_output):
+      out = a.port
+  return packet, out
+
+
+class OffloadTest (unittest.TestCase):
+  def setUp (self):
+    self._real_core = arp_responder.core
+    arp_responder.core = FakeCore()
+    arp_responder._learn = False
+    arp_responder._eat_packets = True
+    arp_responder._arp_table.clear()
+    arp_responder._offloaded.clear()
+    self.responder = arp_responder.ARPResponder.__new__(
+        arp_responder.ARPResponder)
+    self.responder.of13 = True
+    self.responder._of = of
+
+  def tearDown (self):
+    arp_responder.core = self._real_core
+    arp_responder._arp_table.clear()
+    arp_responder._offloaded.clear()
+
+  def _request (self, src_ip, src_mac, dst_ip):
+    a = pkt.arp(opcode = pkt.arp.REQUEST, hwsrc = EthAddr(src_mac),
+                protosrc = IPAddr(src_ip), protodst = IPAddr(dst_ip))
+    e = pkt.ethernet(type = pkt.ethernet.ARP_TYPE, src = EthAddr(src_mac),
+                     dst = pkt.ETHER_BROADCAST)
+    e.payload = a
+    return pkt.ethernet(e.pack())
+
+  def test_flow_answers_like_controller (self):
+    arp_responder._arp_table["10.0.0.2"] = "00:00:00:00:00:02"
+    con = FakeConnection(1)
+    req = self._request("10.0.0.1", "00:00:00:00:00:01", "10.0.0.2")
+    self.responder._handle_PacketIn(FakePacketIn(con, req, 3))
+
+    po,fm = con.sent
+    self.assertTrue(isinstance(fm, of.ofp_flow_mod))
+    fm.pack()
+    self.assertEqual(arp_responder._offloaded, {IPAddr("10.0.0.2"):set([1])})
+
+    reply,port = apply_actions(req, fm.instructions[0].actions)
+    self.assertEqual(port, of.OFPP_IN_PORT)
+    self.assertEqual(reply.pack(), po.data)
+
+  def test_withdraw (self):
+    arp_responder._arp_table["10.0.0.2"] = "00:00:00:00:00:02"
+    con = FakeConnection(1)
+    req = self._request("10.0.0.1", "00:00:00:00:00:01", "10.0.0.2")
+    self.responder._handle_PacketIn(FakePacketIn(con, req, 3))
+
+    # Same answer -- nothing to do
+    arp_responder._arp_table["10.0.0.2"] = "00:00:00:00:00:02"
+    self.assertEqual(arp_responder.core.openflow.sent, [])
+
+    arp_responder._arp_table["10.0.0.2"] = "00:00:00:00:00:22"
+    (dpid,fm), = arp_responder.core.openflow.sent
+    self.assertEqual(dpid, 1)
+    self.assertEqual(fm.command, of.OFPFC_DELETE)
+    self.assertEqual(fm.cookie & 0xffffffff,
+                     IPAddr("10.0.0.2").toUnsignedN())
+    self.assertEqual(arp_responder._offloaded, {})
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import IPAddr, EthAddr
+import pox.proto.dhcpd as dhcpd
+from pox.proto.dhcpd import SimpleAddressPool
+
+
+class SimpleAddressPoolTest (unittest.TestCase):
+  def test_basics (self):
+    p = SimpleAddressPool("192.168.0.0/24", first = 100, last = 199)
+    self.assertEqual(len(p), 100)
+    self.assertTrue(IPAddr("192.168.0.100") in p)
+    self.assertTrue("192.168.0.199" in p)
+    self.assertFalse(IPAddr("192.168.0.99") in p)
+    self.assertFalse(IPAddr("192.168.0.200") in p)
+    self.assertFalse(IPAddr("192.168.1.100") in p)
+    self.assertEqual(p.subnet_mask, IPAddr("255.255.255.0"))
+
+  def test_remove_append (self):
+    p = SimpleAddressPool("192.168.0.0/24", first = 1, last = 4)
+    self.assertEqual(p[0], IPAddr("192.168.0.1"))
+    p.remove(IPAddr("192.168.0.2"))
+    self.assertFalse(IPAddr("192.168.0.2") in p)
+    self.assertRaises(RuntimeError, p.remove, IPAddr("192.168.0.2"))
+    self.assertEqual(len(p), 3)
+    self.assertEqual(set(p[i] for i in range(3)),
+                     set(IPAddr("192.168.0.%i" % (i,)) for i in (1,3,4)))
+    self.assertRaises(IndexError, lambda: p[3])
+
+    p.append(IPAddr("192.168.0.2"))
+    self.assertRaises(RuntimeError, p.append, IPAddr("192.168.0.2"))
+    self.assertRaises(RuntimeError, p.append, IPAddr("192.168.1.2"))
+    self.assertEqual(len(p), 4)
+
+  def test_fill_and_reuse (self):
+    p = SimpleAddressPool("10.0.0.0/22")
+    got = []
+    while len(p):
+      a = p[0]
+      p.remove(a)
+      got.append(a)
+    self.assertEqual(len(got), 1022)
+    self.assertEqual(len(set(got)), 1022)
+    self.assertRaises(IndexError, lambda: p[0])
+
+    # Returned addresses get handed out again, even if they were removed
+    # and re-added while waiting
+    p.append(got[10])
+    p.append(got[20])
+    p.remove(got[10])
+    p.append(got[10])
+    again = []
+    while len(p):
+      a = p[0]
+      p.remove(a)
+      again.append(a)
+    self.assertEqual(sorted(again), sorted([got[10], got[20]]))
+
+
+class FakeNexus (object):
+  def addListeners (self, *args, **kw):
+    pass
+
+
+class FakeCore (object):
+  def __init__ (self):
+    self.openflow = FakeNexus()
+
+
+class FakeTimer (object):
+  def __init__ (self, *args, **kw):
+    pass
+
+
+class FakeEthernet (object):
+  def __init__ (self, src):
+    self.src = EthAddr(src)
+
+
+class FakeEvent (object):
+  def __init__ (self, src):
+    self.parsed = FakeEthernet(src)
+
+
+class RecordingDHCPD (dhcpd.DHCPD):
+  """
+  Keeps (message type, yiaddr) for replies instead of sending them
+  """
+  def reply (self, event, msg):
+    t = msg.options[msg.MSG_TYPE_OPT].type
+    self.replies.append((t, msg.yiaddr))
+
+  def nak (self, event, msg = None):
+    self.replies.append((pkt.dhcp.NAK_MSG, None))
+
+
+class DHCPDTest (unittest.TestCase):
+  A = "00:00:00:00:00:0a"
+  B = "00:00:00:00:00:0b"
+  ip = IPAddr("192.168.0.1")
+
+  def setUp (self):
+    self._real = dhcpd.core, dhcpd.Timer
+    dhcpd.core = FakeCore()
+    dhcpd.Timer = FakeTimer
+    # Just one address, so anything handed out twice is a conflict
+    self.pool = SimpleAddressPool("192.168.0.0/24", first = 1, last = 1)
+    self.d = RecordingDHCPD(ip_address = "192.168.0.254", pool = self.pool)
+    self.d.replies = []
+
+  def tearDown (self):
+    dhcpd.core, dhcpd.Timer = self._real
+
+  def _msg (self, ip = None):
+    p = pkt.dhcp()
+    if ip is not None:
+      p.add_option(pkt.DHCP.DHCPRequestIPOption(ip))
+    return p
+
+  def discover (self, mac):
+    self.d.exec_discover(FakeEvent(mac), self._msg(), self.pool)
+    return self.d.replies.pop()
+
+  def request (self, mac, ip):
+    self.d.exec_request(FakeEvent(mac), self._msg(ip), self.pool)
+    return self.d.replies.pop()
+
+  def expire_all (self):
+    now = dhcpd.time.time() - 1
+    for mac in self.d._lease_expires:
+      self.d._lease_expires[mac] = now
+    self.d._lease_heap = [(now,) + e[1:] for e in self.d._lease_heap]
+    for mac,(_,pool) in self.d._offer_expires.items():
+      self.d._offer_expires[mac] = (now, pool)
+    self.d._check_leases()
+
+  def test_lease_clears_offer (self):
+    self.assertEqual(self.discover(self.A), (pkt.dhcp.OFFER_MSG, self.ip))
+    self.assertEqual(self.request(self.A, self.ip), (pkt.dhcp.ACK_MSG,
+                                                      self.ip))
+    self.assertEqual(self.d.offers, {})
+    self.assertEqual(len(self.pool), 0)
+
+  def test_expire_and_rediscover (self):
+    self.discover(self.A)
+    self.request(self.A, self.ip)
+    self.expire_all()
+    self.assertEqual(len(self.pool), 1)
+
+    # B gets the address now...
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.OFFER_MSG, self.ip))
+    self.assertEqual(self.request(self.B, self.ip), (pkt.dhcp.ACK_MSG,
+                                                      self.ip))
+    # ...so A mustn't
+    self.assertEqual(self.discover(self.A), (pkt.dhcp.NAK_MSG, None))
+    self.assertEqual(self.request(self.A, self.ip), (pkt.dhcp.NAK_MSG, None))
+    self.assertEqual(self.d.leases, {EthAddr(self.B): self.ip})
+
+  def test_offer_expires (self):
+    self.discover(self.A)
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.NAK_MSG, None))
+    self.expire_all()
+    self.assertEqual(self.d.offers, {})
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.OFFER_MSG, self.ip))
+    self.assertEqual(self.request(self.A, self.ip), (pkt.dhcp.NAK_MSG, None))
+
+  def test_rediscover_while_leased (self):
+    # Rediscovering turns the lease back into an offer, which can expire
+    self.discover(self.A)
+    self.request(self.A, self.ip)
+    self.assertEqual(self.discover(self.A), (pkt.dhcp.OFFER_MSG, self.ip))
+    self.assertEqual(self.d.leases, {})
+    self.expire_all()
+    self.assertEqual(len(self.pool), 1)
+    self.assertEqual(self.discover(self.B), (pkt.dhcp.OFFER_MSG, self.ip))
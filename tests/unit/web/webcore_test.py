@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 James McCauley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.web.webcore as webcore
+
+
+class FakeCore (object):
+  """
+  Runs callLater()ed functions right away (or never, if not running)
+  """
+  def __init__ (self, running = True):
+    self.running = running
+  def callLater (self, func):
+    if not self.running: return
+    try:
+      func()
+    except Exception:
+      pass # The scheduler would log it
+
+
+class FakeHandler (webcore.SplitRequestHandler):
+  def __init__ (self):
+    self.errors = []
+  def send_error (self, code, message = None):
+    self.errors.append(code)
+
+
+class CallOnSchedulerTest (unittest.TestCase):
+  def setUp (self):
+    self._core = webcore.core
+
+  def tearDown (self):
+    webcore.core = self._core
+
+  def test_result (self):
+    webcore.core = FakeCore()
+    h = FakeHandler()
+    self.assertEqual(h.call_on_scheduler(lambda: "hi"), "hi")
+    self.assertEqual(h.errors, [])
+
+  def test_exception (self):
+    webcore.core = FakeCore()
+    h = FakeHandler()
+    def fail ():
+      raise RuntimeError()
+    self.assertIs(h.call_on_scheduler(fail, timeout = 5), None)
+    self.assertEqual(h.errors, [503])
+
+  def test_timeout (self):
+    webcore.core = FakeCore(running = False)
+    h = FakeHandler()
+    self.assertIs(h.call_on_scheduler(lambda: "hi", timeout = 0.01), None)
+    self.assertEqual(h.errors, [503])